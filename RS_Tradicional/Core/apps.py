@@ -1,6 +1,35 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core import checks
+
+
+def _usa_cache_templates():
+    for config in settings.TEMPLATES:
+        if config["BACKEND"] != "django.template.backends.django.DjangoTemplates":
+            continue
+        loaders = config.get("OPTIONS", {}).get("loaders")
+        # sem "loaders" o Django já usa o cached.Loader
+        if loaders is None:
+            continue
+        if not any(isinstance(l, (list, tuple)) and l[0] == "django.template.loaders.cached.Loader"
+                   for l in loaders):
+            return False
+    return True
+
+
+def verificar_cache_templates(app_configs, **kwargs):
+    if settings.DEBUG or _usa_cache_templates():
+        return []
+    return [checks.Warning(
+        "Os templates não usam o django.template.loaders.cached.Loader.",
+        hint="Em produção cada pedido voltaria a ler e compilar os templates (ver TEMPLATES em settings.py).",
+        id="Core.W001",
+    )]
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Core'
+
+    def ready(self):
+        checks.register(verificar_cache_templates, checks.Tags.templates)
@@ -0,0 +1,186 @@
+"""
+Caminho de leitura assíncrono (ASGI) das páginas mais lidas: loja, notícias
+e relatórios de admin.
+
+Com ASSINCRONO["VIEWS"] (ligado por omissão quando o processo arranca pelo
+RS_Tradicional/asgi.py) o Core/urls.py aponta essas páginas para as
+variantes `*_async` de Core/views.py, que não prendem um thread enquanto
+esperam pela BD:
+
+- PostgreSQL: asyncpg (um pool por event loop) com as credenciais de
+  DATABASES[ASSINCRONO["BD"]]. O Django continua no psycopg2: instalar o
+  psycopg 3 mudava também o driver síncrono (que usa copy_expert e o LISTEN
+  de Core/cache_invalidacao.py). O SQL é o mesmo dos helpers síncronos; os
+  marcadores %s passam a $1, $2, ...;
+- MongoDB: pymongo.AsyncMongoClient (ver Core/mongo.py);
+- consultas independentes da mesma página correm em simultâneo
+  (asyncio.gather), em ligações diferentes do pool.
+
+Sem o asyncpg instalado as consultas passam pelos helpers síncronos
+(sync_to_async): as views funcionam na mesma, mas uma consulta de cada vez.
+A sessão e as mensagens usam a BD do Django, por isso são carregadas antes
+da view (carregar_sessao) num thread, como o Django exige.
+"""
+import asyncio
+import itertools
+import os
+import re
+import time
+import weakref
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db import connection
+
+from Core.instrumentacao import estatisticas_atuais, registar_linhas
+
+_MARCADORES = re.compile(r"%%|%s")
+_pools = weakref.WeakKeyDictionary()  # event loop -> (pid, Task que cria o pool)
+
+
+def _config():
+    cfg = getattr(settings, "ASSINCRONO", {}) or {}
+    return {
+        "VIEWS": cfg.get("VIEWS", False),
+        "BD": cfg.get("BD", "default"),
+        "POOL_MIN": int(cfg.get("POOL_MIN", 1)),
+        "POOL_MAX": int(cfg.get("POOL_MAX", 10)),
+        "POOL_TIMEOUT": float(cfg.get("POOL_TIMEOUT", 10)),
+    }
+
+
+def views_async():
+    return _config()["VIEWS"]
+
+
+def escolher(view_sync, view_async):
+    """Para o Core/urls.py: a variante async sob ASGI, a síncrona sob WSGI."""
+    return view_async if views_async() else view_sync
+
+
+def asyncpg_disponivel():
+    try:
+        import asyncpg  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@lru_cache(maxsize=256)
+def converter_sql(sql):
+    """'... = %s AND x LIKE 'a%%'' -> '... = $1 AND x LIKE 'a%'' (formato do asyncpg)."""
+    numeros = itertools.count(1)
+    return _MARCADORES.sub(lambda m: "%" if m.group() == "%%" else f"${next(numeros)}", sql)
+
+
+# ------------------------------------------------------------------
+# Pool de ligações (asyncpg)
+# ------------------------------------------------------------------
+
+async def _criar_pool(cfg):
+    import asyncpg
+
+    bd = settings.DATABASES[cfg["BD"]]
+    return await asyncpg.create_pool(
+        database=bd["NAME"],
+        user=bd.get("USER") or None,
+        password=bd.get("PASSWORD") or None,
+        host=bd.get("HOST") or None,
+        port=int(bd["PORT"]) if bd.get("PORT") else None,
+        min_size=cfg["POOL_MIN"],
+        max_size=cfg["POOL_MAX"],
+        timeout=cfg["POOL_TIMEOUT"],
+        server_settings={"application_name": "rs_tradicional-async"},
+    )
+
+
+async def _pool():
+    loop = asyncio.get_running_loop()
+    pid = os.getpid()
+    atual = _pools.get(loop)
+    if atual is None or atual[0] != pid:
+        # uma só Task por loop: os pedidos que chegam durante a criação esperam por ela
+        atual = (pid, loop.create_task(_criar_pool(_config())))
+        _pools[loop] = atual
+    return await atual[1]
+
+
+async def fechar():
+    """Fecha o pool do event loop atual (fim de um benchmark, testes)."""
+    atual = _pools.pop(asyncio.get_running_loop(), None)
+    if atual is not None and atual[0] == os.getpid():
+        await (await atual[1]).close()
+
+
+# ------------------------------------------------------------------
+# Consultas
+# ------------------------------------------------------------------
+
+def _executar_sync(sql, params, dicts):
+    with connection.cursor() as cur:
+        cur.execute(sql, params or [])
+        rows = cur.fetchall()
+        if dicts:
+            cols = [c[0] for c in cur.description]
+            rows = [dict(zip(cols, row)) for row in rows]
+    registar_linhas(len(rows))
+    return rows
+
+
+async def _executar(sql, params, dicts):
+    if not asyncpg_disponivel():
+        return await sync_to_async(_executar_sync)(sql, params, dicts)
+
+    pool = await _pool()
+    stats = estatisticas_atuais()
+    inicio = time.perf_counter()
+    erro = False
+    try:
+        async with pool.acquire(timeout=_config()["POOL_TIMEOUT"]) as conn:
+            registos = await conn.fetch(converter_sql(sql), *(params or []))
+    except Exception:
+        erro = True
+        raise
+    finally:
+        # o execute_wrapper do Core.instrumentacao só vê as ligações do Django
+        if stats is not None:
+            stats.registar_query(sql, time.perf_counter() - inicio, erro=erro)
+
+    rows = [dict(r) if dicts else tuple(r) for r in registos]
+    registar_linhas(len(rows))
+    return rows
+
+
+async def fetchall(sql, params=None):
+    """Lista de tuplos."""
+    return await _executar(sql, params, dicts=False)
+
+
+async def fetchall_dicts(sql, params=None):
+    """Como Core.views._fetchall_dicts: lista de dicts."""
+    return await _executar(sql, params, dicts=True)
+
+
+async def fetchone_dict(sql, params=None):
+    """Como Core.views._fetchone_dict: um dict ou None."""
+    rows = await _executar(sql, params, dicts=True)
+    return rows[0] if rows else None
+
+
+# ------------------------------------------------------------------
+# Sessão
+# ------------------------------------------------------------------
+
+def _carregar_sessao(request):
+    sessao = getattr(request, "session", None)
+    if sessao is not None:
+        sessao.get("user_id")
+    # as mensagens guardadas na sessão também ficam lidas (sem as consumir)
+    len(get_messages(request))
+
+
+async def carregar_sessao(request):
+    """Lê a sessão (SessionStore na BD) antes de a view ou o template lhe tocarem."""
+    await sync_to_async(_carregar_sessao)(request)
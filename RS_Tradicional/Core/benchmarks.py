@@ -0,0 +1,90 @@
+"""
+Utilitários partilhados pelos comandos de benchmark (bench_*).
+
+Os resultados são guardados em JSON em BENCHMARKS["DIRETORIO"], um ficheiro
+por execução, com o commit atual, para poderem ser comparados entre commits.
+"""
+import json
+import os
+import subprocess
+import time
+from datetime import datetime
+
+from django.conf import settings
+
+
+def diretorio_resultados():
+    cfg = getattr(settings, "BENCHMARKS", {}) or {}
+    return str(cfg.get("DIRETORIO") or os.path.join(settings.BASE_DIR, "var", "benchmarks"))
+
+
+def percentil(valores, p):
+    """Percentil com interpolação linear (p entre 0 e 100)."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    if len(ordenados) == 1:
+        return ordenados[0]
+    k = (len(ordenados) - 1) * (p / 100.0)
+    i = int(k)
+    j = min(i + 1, len(ordenados) - 1)
+    return ordenados[i] + (ordenados[j] - ordenados[i]) * (k - i)
+
+
+def resumo_latencias(amostras_ms):
+    return {
+        "n": len(amostras_ms),
+        "p50_ms": percentil(amostras_ms, 50),
+        "p95_ms": percentil(amostras_ms, 95),
+        "p99_ms": percentil(amostras_ms, 99),
+        "max_ms": max(amostras_ms) if amostras_ms else None,
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def guardar_resultado(nome, dados, diretorio=None):
+    pasta = diretorio or diretorio_resultados()
+    os.makedirs(pasta, exist_ok=True)
+    commit = commit_atual()
+    registo = {
+        "benchmark": nome,
+        "commit": commit,
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "resultados": dados,
+    }
+    caminho = os.path.join(pasta, f"{nome}-{int(time.time())}-{commit}.json")
+    with open(caminho, "w") as f:
+        json.dump(registo, f, indent=2, ensure_ascii=False, default=str)
+    return caminho
+
+
+def ultimo_resultado(nome, diretorio=None, excluir=None):
+    """Resultado mais recente de um benchmark (para comparação)."""
+    pasta = diretorio or diretorio_resultados()
+    try:
+        nomes = sorted(n for n in os.listdir(pasta) if n.startswith(f"{nome}-") and n.endswith(".json"))
+    except FileNotFoundError:
+        return None
+
+    for n in reversed(nomes):
+        caminho = os.path.join(pasta, n)
+        if excluir and os.path.abspath(caminho) == os.path.abspath(excluir):
+            continue
+        with open(caminho) as f:
+            return json.load(f)
+    return None
+
+
+def formatar_ms(v):
+    return "—" if v is None else f"{v:8.2f}"
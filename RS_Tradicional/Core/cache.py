@@ -0,0 +1,306 @@
+"""
+Cache de cálculos caros (relatórios, catálogo) com proteção contra stampede.
+
+- single-flight: num miss só quem ganha o travão (cache.add) calcula; os
+  outros pedidos esperam que o valor apareça na cache;
+- stale-while-revalidate: passado o TTL o valor antigo continua a ser
+  servido durante STALE segundos, enquanto um único pedido o recalcula;
+- refresh antecipado probabilístico (XFetch): antes do TTL, cada leitura
+  pode decidir recalcular com probabilidade que cresce com a proximidade da
+  expiração e com o tempo que o cálculo demorou da última vez.
+
+Os valores ficam na cache do processo (a de Core/cache_invalidacao, por
+omissão a LocMemCache). Só os travões estão em CACHE_CALCULOS["CACHE"]
+(CACHES["calculos"], partilhada): com vários workers há no máximo um cálculo
+de cada chave de cada vez; quem esperou calcula a seguir para a sua cache,
+um processo de cada vez.
+
+Com `tabelas` o valor é apagado quando essas tabelas mudam (NOTIFY recebido
+por cada processo, ver Core/cache_invalidacao.py). A versão de em_cache(nome)
+é a linha 'cache:<nome>' de Versao_Dados, que invalidar(nome) incrementa
+com um só UPDATE.
+
+Uso:
+
+    @em_cache("relatorios:kpis", ttl=300)
+    def kpis(inicio, fim, granularidade): ...
+
+    produtos = obter("loja:produtos", lambda: ..., tabelas=["produto"])
+
+Nas views async o mesmo com obter_async() (e em_cache numa função async).
+"""
+import asyncio
+import hashlib
+import math
+import random
+import time
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+from Core import cache_invalidacao, versoes
+from Core.metricas import registo
+
+
+def _config():
+    cfg = getattr(settings, "CACHE_CALCULOS", {}) or {}
+    return {
+        "ATIVA": cfg.get("ATIVA", True),
+        "CACHE": cfg.get("CACHE", "calculos"),
+        "TTL": cfg.get("TTL", 300),
+        "STALE": cfg.get("STALE", 600),
+        "BETA": float(cfg.get("BETA", 1.0)),
+        "TRAVAO_SEGUNDOS": cfg.get("TRAVAO_SEGUNDOS", 30),
+        "ESPERA_SEGUNDOS": float(cfg.get("ESPERA_SEGUNDOS", 0.05)),
+        "ESPERA_MAX_SEGUNDOS": float(cfg.get("ESPERA_MAX_SEGUNDOS", 10)),
+    }
+
+
+def _cache():
+    """Os travões, partilhados pelos processos."""
+    return caches[_config()["CACHE"]]
+
+
+def _contar(nome, resultado):
+    registo.incrementar("rs_cache_calculos_total", {"nome": nome, "resultado": resultado})
+
+
+def _antecipar(delta, expira, beta, agora):
+    """XFetch (Vattani et al.): True se esta leitura deve recalcular já."""
+    if beta <= 0 or delta <= 0:
+        return False
+    return agora - delta * beta * math.log(1.0 - random.random()) >= expira
+
+
+def _travar(travoes, chave, cfg):
+    token = uuid.uuid4().hex
+    if travoes.add(f"travao:{chave}", token, cfg["TRAVAO_SEGUNDOS"]):
+        return token
+    return None
+
+
+async def _travar_async(travoes, chave, cfg):
+    token = uuid.uuid4().hex
+    if await travoes.aadd(f"travao:{chave}", token, cfg["TRAVAO_SEGUNDOS"]):
+        return token
+    return None
+
+
+def _destravar(travoes, chave, token):
+    # só apaga o próprio travão (o de outro pode já ter substituído um expirado)
+    if travoes.get(f"travao:{chave}") == token:
+        travoes.delete(f"travao:{chave}")
+
+
+async def _destravar_async(travoes, chave, token):
+    if await travoes.aget(f"travao:{chave}") == token:
+        await travoes.adelete(f"travao:{chave}")
+
+
+def _guardar(chave, valor, inicio, ttl, stale, tabelas, marca):
+    fim = time.time()
+    # (valor, tempo de cálculo, fim do TTL); a entrada vive mais STALE segundos
+    entrada = (valor, fim - inicio, fim + ttl)
+    valores = cache_invalidacao.cache_local()
+    if tabelas:
+        # não guarda se uma das tabelas mudou durante o cálculo (ou sem LISTEN)
+        cache_invalidacao.guardar(chave, tabelas, marca, lambda: valores.set(chave, entrada, ttl + stale))
+    else:
+        valores.set(chave, entrada, ttl + stale)
+
+
+def _calcular_e_guardar(chave, calcular, ttl, stale, tabelas):
+    marca = cache_invalidacao.marca(tabelas) if tabelas else None
+    inicio = time.time()
+    valor = calcular()
+    _guardar(chave, valor, inicio, ttl, stale, tabelas, marca)
+    return valor
+
+
+async def _calcular_e_guardar_async(chave, calcular, ttl, stale, tabelas):
+    marca = cache_invalidacao.marca(tabelas) if tabelas else None
+    inicio = time.time()
+    valor = await calcular()
+    _guardar(chave, valor, inicio, ttl, stale, tabelas, marca)
+    return valor
+
+
+def obter(chave, calcular, ttl=None, stale=None, tabelas=None, nome=None):
+    """Valor de `chave` na cache ou calcular(), com um só cálculo de cada vez por chave."""
+    cfg = _config()
+    nome = nome or chave.split(":", 1)[0]
+    if not cfg["ATIVA"]:
+        return calcular()
+    if tabelas:
+        cache_invalidacao.garantir_listener()
+        if not cache_invalidacao.ligado():
+            # sem LISTEN nada é guardado: esperar pelo travão só serializava os pedidos
+            _contar(nome, "sem_listener")
+            return calcular()
+
+    ttl = cfg["TTL"] if ttl is None else ttl
+    stale = cfg["STALE"] if stale is None else stale
+    valores, travoes = cache_invalidacao.cache_local(), _cache()
+
+    entrada = valores.get(chave)
+    if entrada is not None:
+        valor, delta, expira = entrada
+        agora = time.time()
+        if agora < expira and not _antecipar(delta, expira, cfg["BETA"], agora):
+            _contar(nome, "hit")
+            return valor
+
+        # expirado (ou sorteado pelo XFetch): um pedido recalcula, os outros levam o antigo
+        token = _travar(travoes, chave, cfg)
+        if token is None:
+            _contar(nome, "stale" if agora >= expira else "hit")
+            return valor
+        _contar(nome, "revalidar" if agora >= expira else "xfetch")
+        try:
+            return _calcular_e_guardar(chave, calcular, ttl, stale, tabelas)
+        finally:
+            _destravar(travoes, chave, token)
+
+    limite = time.monotonic() + cfg["ESPERA_MAX_SEGUNDOS"]
+    while True:
+        token = _travar(travoes, chave, cfg)
+        if token is not None:
+            try:
+                # outro pedido deste processo pode ter acabado entre o get e o add
+                entrada = valores.get(chave)
+                if entrada is not None:
+                    _contar(nome, "esperou")
+                    return entrada[0]
+                _contar(nome, "miss")
+                return _calcular_e_guardar(chave, calcular, ttl, stale, tabelas)
+            finally:
+                _destravar(travoes, chave, token)
+
+        # o travão é de outro pedido, deste processo ou de outro: no segundo
+        # caso o valor não aparece aqui e calcula-se quando o travão ficar livre
+        time.sleep(cfg["ESPERA_SEGUNDOS"])
+        entrada = valores.get(chave)
+        if entrada is not None:
+            _contar(nome, "esperou")
+            return entrada[0]
+        if time.monotonic() >= limite:
+            # o cálculo do outro está a demorar demasiado: calcular sem guardar
+            _contar(nome, "desistiu")
+            return calcular()
+
+
+async def obter_async(chave, calcular, ttl=None, stale=None, tabelas=None, nome=None):
+    """
+    obter() para as views async (Core/assincrono.py): `calcular` devolve uma
+    corrotina e nem os travões nem a espera pelo cálculo de outro pedido
+    bloqueiam o event loop. Partilha as entradas e os travões com obter().
+    """
+    cfg = _config()
+    nome = nome or chave.split(":", 1)[0]
+    if not cfg["ATIVA"]:
+        return await calcular()
+    if tabelas:
+        cache_invalidacao.garantir_listener()
+        if not cache_invalidacao.ligado():
+            _contar(nome, "sem_listener")
+            return await calcular()
+
+    ttl = cfg["TTL"] if ttl is None else ttl
+    stale = cfg["STALE"] if stale is None else stale
+    # a cache do processo está em memória: só os travões precisam dos a*
+    valores, travoes = cache_invalidacao.cache_local(), _cache()
+
+    entrada = valores.get(chave)
+    if entrada is not None:
+        valor, delta, expira = entrada
+        agora = time.time()
+        if agora < expira and not _antecipar(delta, expira, cfg["BETA"], agora):
+            _contar(nome, "hit")
+            return valor
+
+        token = await _travar_async(travoes, chave, cfg)
+        if token is None:
+            _contar(nome, "stale" if agora >= expira else "hit")
+            return valor
+        _contar(nome, "revalidar" if agora >= expira else "xfetch")
+        try:
+            return await _calcular_e_guardar_async(chave, calcular, ttl, stale, tabelas)
+        finally:
+            await _destravar_async(travoes, chave, token)
+
+    limite = time.monotonic() + cfg["ESPERA_MAX_SEGUNDOS"]
+    while True:
+        token = await _travar_async(travoes, chave, cfg)
+        if token is not None:
+            try:
+                entrada = valores.get(chave)
+                if entrada is not None:
+                    _contar(nome, "esperou")
+                    return entrada[0]
+                _contar(nome, "miss")
+                return await _calcular_e_guardar_async(chave, calcular, ttl, stale, tabelas)
+            finally:
+                await _destravar_async(travoes, chave, token)
+
+        await asyncio.sleep(cfg["ESPERA_SEGUNDOS"])
+        entrada = valores.get(chave)
+        if entrada is not None:
+            _contar(nome, "esperou")
+            return entrada[0]
+        if time.monotonic() >= limite:
+            _contar(nome, "desistiu")
+            return await calcular()
+
+
+def _recurso(nome):
+    return f"cache:{nome}"
+
+
+def invalidar(nome):
+    """Descarta todos os valores guardados por em_cache(nome), em todos os processos (ex: depois de um sync)."""
+    # um só UPDATE (atómico); o NOTIFY de versao_dados faz os outros processos relerem a versão
+    with connection.cursor() as cur:
+        cur.execute("""
+            INSERT INTO Versao_Dados (recurso, versao) VALUES (%s, 1)
+            ON CONFLICT (recurso) DO UPDATE
+                SET versao = Versao_Dados.versao + 1, atualizado_em = now()
+            RETURNING versao
+        """, [_recurso(nome)])
+        return cur.fetchone()[0]
+
+
+def _chave(nome, versao, args, kwargs):
+    argumentos = repr((args, sorted(kwargs.items()))).encode("utf-8")
+    return "{}:{}:{}".format(nome, versao, hashlib.sha1(argumentos).hexdigest())
+
+
+def em_cache(nome, ttl=None, stale=None, tabelas=None):
+    """
+    Decorador: guarda o resultado da função por argumentos, via obter() (ou
+    obter_async() numa função async). Duas funções com o mesmo `nome` e os
+    mesmos argumentos partilham o valor guardado.
+    """
+    def decorador(funcao):
+        if iscoroutinefunction(funcao):
+            @wraps(funcao)
+            async def wrapper(*args, **kwargs):
+                if not _config()["ATIVA"]:
+                    return await funcao(*args, **kwargs)
+                versao, _ = await sync_to_async(versoes.versao)(_recurso(nome))
+                chave = _chave(nome, versao, args, kwargs)
+                return await obter_async(chave, lambda: funcao(*args, **kwargs), ttl, stale, tabelas, nome)
+        else:
+            @wraps(funcao)
+            def wrapper(*args, **kwargs):
+                if not _config()["ATIVA"]:
+                    return funcao(*args, **kwargs)
+                versao, _ = versoes.versao(_recurso(nome))
+                chave = _chave(nome, versao, args, kwargs)
+                return obter(chave, lambda: funcao(*args, **kwargs), ttl, stale, tabelas, nome)
+        wrapper.sem_cache = funcao
+        return wrapper
+    return decorador
@@ -0,0 +1,196 @@
+"""
+Invalidação das caches em memória entre processos, via LISTEN/NOTIFY do Postgres.
+
+As escritas acontecem em stored procedures e triggers, fora do Django, por
+isso não há sinais a que ligar. Em vez disso, os triggers de
+ScriptsBD/Triggers.sql (fn_trg_notificar_cache) fazem NOTIFY com o nome da
+tabela alterada. Cada processo tem um thread com uma ligação própria em
+LISTEN que apaga as chaves que dependem dessa tabela.
+
+As views não usam este módulo diretamente: usam Core.cache.obter (com
+single-flight e stale-while-revalidate), que guarda os valores aqui:
+
+    produtos = cache.obter("loja:produtos", lambda: ..., tabelas=["produto", "fornecedor"])
+
+O obter() deste módulo fica para valores baratos de recalcular (ex: as
+versões de Core/versoes.py); repare-se na ordem diferente dos argumentos:
+
+    versao = obter(chave="versao_dados:catalogo", tabelas=["versao_dados"], calcular=lambda: ...)
+
+O valor fica em cache (CACHE_INVALIDACAO["CACHE"], por omissão a LocMemCache
+do processo) até uma das tabelas mudar ou passar o TIMEOUT. Enquanto o
+thread não estiver ligado nada é guardado, e depois de uma religação a cache
+é limpa (podem ter-se perdido notificações).
+"""
+import logging
+import os
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from Core.metricas import registo
+
+logger = logging.getLogger(__name__)
+
+_FALTA = object()
+_lock = threading.Lock()
+_chaves = {}      # tabela -> set(chaves)
+_geracoes = {}    # tabela -> nº de invalidações (descarta valores calculados durante uma)
+_epoca = [0]      # nº de invalidações totais (religações)
+_ligado = threading.Event()
+_listener = None  # (pid, thread)
+
+
+def _config():
+    cfg = getattr(settings, "CACHE_INVALIDACAO", {}) or {}
+    return {
+        "ATIVA": cfg.get("ATIVA", True),
+        "CANAL": cfg.get("CANAL", "rs_cache"),
+        "CACHE": cfg.get("CACHE", "default"),
+        "TIMEOUT": cfg.get("TIMEOUT", 3600),
+        "RELIGAR_SEGUNDOS": float(cfg.get("RELIGAR_SEGUNDOS", 5)),
+        "KEEPALIVE_SEGUNDOS": float(cfg.get("KEEPALIVE_SEGUNDOS", 60)),
+    }
+
+
+def _cache():
+    return caches[_config()["CACHE"]]
+
+
+def cache_local():
+    """A cache dos valores deste processo (também a de Core/cache.py)."""
+    return _cache()
+
+
+def invalidar(tabela):
+    with _lock:
+        chaves = _chaves.pop(tabela, set())
+        _geracoes[tabela] = _geracoes.get(tabela, 0) + 1
+    if chaves:
+        _cache().delete_many(list(chaves))
+    registo.incrementar("rs_cache_invalidacoes_total", {"tabela": tabela})
+
+
+def invalidar_tudo():
+    with _lock:
+        chaves = set().union(*_chaves.values()) if _chaves else set()
+        _chaves.clear()
+        _epoca[0] += 1
+    if chaves:
+        _cache().delete_many(list(chaves))
+
+
+def ligado():
+    """True se o LISTEN deste processo está ativo (só então se guardam valores)."""
+    return _ligado.is_set()
+
+
+def marca(tabelas):
+    """Estado das invalidações de `tabelas`, a tirar antes de calcular um valor."""
+    with _lock:
+        return [_epoca[0]] + [_geracoes.get(t.lower(), 0) for t in tabelas]
+
+
+def guardar(chave, tabelas, marca_antes, gravar):
+    """
+    Chama gravar() (que escreve `chave` na cache) se nada foi invalidado
+    desde `marca_antes`, e associa a chave às tabelas. Devolve se gravou.
+    """
+    tabelas = [t.lower() for t in tabelas]
+    with _lock:
+        # uma invalidação durante o cálculo pode já ter apagado a chave:
+        # guardar agora deixaria o valor antigo em cache
+        if not _ligado.is_set() or marca_antes != [_epoca[0]] + [_geracoes.get(t, 0) for t in tabelas]:
+            return False
+        for t in tabelas:
+            _chaves.setdefault(t, set()).add(chave)
+        gravar()
+        return True
+
+
+def obter(chave, tabelas, calcular, timeout=None):
+    """Valor de `chave` em cache ou calcular(), guardado até uma das `tabelas` mudar."""
+    cfg = _config()
+    if not cfg["ATIVA"]:
+        return calcular()
+
+    garantir_listener()
+    cache = _cache()
+    valor = cache.get(chave, _FALTA)
+    if valor is not _FALTA:
+        registo.incrementar("rs_cache_pedidos_total", {"resultado": "hit"})
+        return valor
+
+    registo.incrementar("rs_cache_pedidos_total", {"resultado": "miss"})
+    antes = marca(tabelas)
+    valor = calcular()
+    guardar(chave, tabelas, antes,
+            lambda: cache.set(chave, valor, cfg["TIMEOUT"] if timeout is None else timeout))
+    return valor
+
+
+def garantir_listener():
+    """Arranca o thread de LISTEN deste processo (uma vez, e de novo depois de um fork)."""
+    global _listener
+    pid = os.getpid()
+    if _listener is not None and _listener[0] == pid:
+        return
+
+    with _lock:
+        if _listener is not None and _listener[0] == pid:
+            return
+        if _listener is not None:
+            # filho de um fork (gunicorn --preload): o thread e a ligação
+            # ficaram no pai e o que veio na cache não tem quem o invalide
+            _chaves.clear()
+            _ligado.clear()
+            _cache().clear()
+        thread = threading.Thread(target=_escutar_sempre, name="cache-invalidacao", daemon=True)
+        _listener = (pid, thread)
+    thread.start()
+
+
+def _escutar_sempre():
+    cfg = _config()
+    while True:
+        try:
+            _escutar(cfg)
+        except Exception:
+            logger.warning("LISTEN %s interrompido; a religar.", cfg["CANAL"], exc_info=True)
+        _ligado.clear()
+        time.sleep(cfg["RELIGAR_SEGUNDOS"])
+
+
+def _escutar(cfg):
+    # ligação dedicada (as do Django pertencem a cada thread e fecham no fim do pedido)
+    db = connections["default"]
+    conn = db.get_new_connection(db.get_connection_params())
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f'LISTEN "{cfg["CANAL"]}"')
+
+        invalidar_tudo()
+        _ligado.set()
+        logger.info("LISTEN %s ativo (pid %s).", cfg["CANAL"], os.getpid())
+
+        while True:
+            if select.select([conn], [], [], cfg["KEEPALIVE_SEGUNDOS"]) == ([], [], []):
+                # sem tráfego: confirmar que a ligação continua viva
+                # (notificações que cheguem entretanto ficam em conn.notifies)
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+            else:
+                conn.poll()
+
+            tabelas = set()
+            while conn.notifies:
+                tabelas.add(conn.notifies.pop(0).payload)
+            for tabela in tabelas:
+                invalidar(tabela)
+    finally:
+        conn.close()
@@ -0,0 +1,115 @@
+"""
+Carrinho de visitantes (sem sessão iniciada).
+
+Fica num cookie assinado ("id:qtd,id:qtd"), por isso adicionar produtos não
+escreve nada na base de dados nem cria sessão. O stock e o estado dos
+produtos são validados sempre que o carrinho é lido (uma query a
+vw_loja_produtos) e o carrinho é passado para a BD de uma só vez no login
+(sp_loja_juntar_carrinho), só para quem chega a ser cliente.
+"""
+import time
+from decimal import Decimal
+
+from django.db import connection
+
+from Core.metricas import registar_procedure
+
+COOKIE = "carrinho"
+SALT = "Core.carrinho_convidado"
+IDADE_MAXIMA = 60 * 60 * 24 * 30  # 30 dias
+MAX_PRODUTOS = 50  # mantém o cookie bem abaixo dos 4 KB
+
+
+def ler(request):
+    """Devolve {id_produto: quantidade}; cookie ausente, expirado ou adulterado -> {}."""
+    valor = request.get_signed_cookie(COOKIE, default="", salt=SALT, max_age=IDADE_MAXIMA)
+    carrinho = {}
+    for par in valor.split(","):
+        try:
+            id_produto, qtd = (int(x) for x in par.split(":"))
+        except ValueError:
+            continue
+        if id_produto > 0 and qtd > 0:
+            carrinho[id_produto] = qtd
+    return carrinho
+
+
+def guardar(response, carrinho):
+    if not carrinho:
+        limpar(response)
+        return
+    valor = ",".join(f"{p}:{q}" for p, q in list(carrinho.items())[:MAX_PRODUTOS])
+    response.set_signed_cookie(
+        COOKIE, valor, salt=SALT, max_age=IDADE_MAXIMA, httponly=True, samesite="Lax",
+    )
+
+
+def limpar(response):
+    response.delete_cookie(COOKIE, samesite="Lax")
+
+
+def _produtos(ids):
+    if not ids:
+        return {}
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT id_produto, nome, preco, stock
+            FROM vw_loja_produtos
+            WHERE id_produto = ANY(%s)
+        """, [list(ids)])
+        return {r[0]: {"nome": r[1], "preco": r[2], "stock": r[3]} for r in cur.fetchall()}
+
+
+def stock_disponivel(id_produto):
+    """Stock do produto se estiver à venda, senão None."""
+    produto = _produtos([id_produto]).get(id_produto)
+    return produto["stock"] if produto else None
+
+
+def linhas_validadas(carrinho):
+    """
+    Valida o carrinho contra o stock atual.
+    Devolve (linhas, total, carrinho_valido, avisos): produtos que deixaram de
+    estar à venda saem do carrinho e quantidades acima do stock são reduzidas.
+    As linhas têm as mesmas chaves que vw_loja_carrinho_linhas.
+    """
+    produtos = _produtos(carrinho)
+    linhas, avisos, valido = [], [], {}
+    total = Decimal("0.00")
+
+    for id_produto, qtd in carrinho.items():
+        p = produtos.get(id_produto)
+        if p is None:
+            avisos.append(f"Um produto do carrinho deixou de estar disponível (#{id_produto}).")
+            continue
+        if qtd > p["stock"]:
+            avisos.append(f"Só há {p['stock']} unidades de {p['nome']}; a quantidade foi ajustada.")
+            qtd = p["stock"]
+
+        valido[id_produto] = qtd
+        linhas.append({
+            "id_produto": id_produto,
+            "nome_produto": p["nome"],
+            "preco_produto": p["preco"],
+            "quantidade": qtd,
+        })
+        total += p["preco"] * qtd
+
+    linhas.sort(key=lambda l: l["nome_produto"])
+    return linhas, total, valido, avisos
+
+
+def juntar_no_bd(id_utilizador, carrinho):
+    """Passa o carrinho para o Carrinho do cliente na BD numa só chamada."""
+    ids = list(carrinho)
+    inicio = time.perf_counter()
+    try:
+        with connection.cursor() as cur:
+            cur.execute(
+                "CALL sp_loja_juntar_carrinho(%s, %s, %s)",
+                [id_utilizador, ids, [carrinho[i] for i in ids]],
+            )
+    except Exception:
+        registar_procedure("sp_loja_juntar_carrinho", time.perf_counter() - inicio, ok=False)
+        raise
+    registar_procedure("sp_loja_juntar_carrinho", time.perf_counter() - inicio, ok=True)
@@ -0,0 +1,25 @@
+"""
+Context processors.
+
+A barra de navegação do base.html precisava de várias leituras à sessão e
+filtros |lower em cada página; `navegacao` calcula tudo uma vez e o
+cabeçalho fica em cache de fragmento por combinação (ver base.html).
+"""
+
+TIPOS_STAFF = ("admin", "gestor")
+
+
+def navegacao(request):
+    sessao = getattr(request, "session", None)
+    if sessao is None:
+        return {}
+
+    tipo = (sessao.get("user_tipo") or "").lower()
+    return {
+        "nav": {
+            "autenticado": bool(sessao.get("user_id")),
+            "nome": sessao.get("user_nome") or "",
+            "staff": tipo in TIPOS_STAFF,
+            "fornecedor": tipo == "fornecedor",
+        }
+    }
@@ -0,0 +1,272 @@
+"""
+Leitura de SELECTs em SQL cru, partilhada pelas views e pelos comandos.
+
+- fetchall_dicts / fetchone_dict: uma lista de dicts (um dict por linha,
+  com as chaves repetidas em cada um). Para quem altera as linhas depois
+  (ex: n["imagem"] = ...);
+- fetchall_linhas: linhas compactas, tuplos com nome (classe gerada uma vez
+  por conjunto de colunas, sem __dict__). Leem-se como os dicts nos
+  templates e no código (linha.nome, linha["nome"], .get, .keys) mas não
+  aceitam chaves novas. Para as listas grandes só de leitura;
+- em_lotes: fetchmany em blocos, sem manter o resultado todo em objetos
+  Python (o libpq continua a receber tudo de uma vez);
+- iterar: cursor com nome (do lado do servidor) lido em blocos de
+  `itersize`: memória constante no cliente para resultados de qualquer
+  tamanho. Fora de uma transação o Django declara-o WITH HOLD e o Postgres
+  guarda o resultado até o cursor fechar.
+
+Todas registam as linhas lidas em Core.instrumentacao e aceitam, em vez do
+texto do SQL, uma Preparada: o SQL das consultas mais repetidas, executado
+com PREPARE/EXECUTE. Cada ligação prepara-o na primeira execução e guarda o
+nome num registo próprio (apagado quando a ligação é recriada); as seguintes
+só enviam o EXECUTE, sem parse nem análise, e depois de algumas execuções o
+Postgres passa a usar o plano genérico, sem planear de novo. Só compensa com
+ligações persistentes (CONN_MAX_AGE em DATABASES); SQL_PREPARADO["ATIVO"]
+desliga tudo (ex: atrás de um pgbouncer em modo transaction, onde a ligação
+no servidor muda a cada transação).
+"""
+import itertools
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.backends.signals import connection_created
+
+from Core.assincrono import converter_sql
+from Core.instrumentacao import registar_linhas
+from Core.metricas import registo
+
+ITERSIZE_PADRAO = 2000
+
+# o statement deixou de servir (ex: a view mudou de colunas, "cached plan must
+# not change result type") ou desapareceu do servidor (DISCARD ALL)
+_PGCODES_INVALIDAM = {"0A000", "26000"}
+_geracoes = itertools.count(1)
+
+
+def _config():
+    cfg = getattr(settings, "SQL_PREPARADO", {}) or {}
+    return {
+        "ATIVO": cfg.get("ATIVO", True),
+    }
+
+
+class _Linha:
+    """Métodos de "dict só de leitura" das classes criadas por classe_linha()."""
+
+    __slots__ = ()
+    _indices = {}
+
+    def __getitem__(self, chave):
+        if isinstance(chave, str):
+            try:
+                chave = self._indices[chave]
+            except KeyError:
+                raise KeyError(chave) from None
+        return tuple.__getitem__(self, chave)
+
+    def __contains__(self, chave):
+        return chave in self._indices
+
+    def get(self, chave, padrao=None):
+        indice = self._indices.get(chave)
+        return padrao if indice is None else tuple.__getitem__(self, indice)
+
+    def keys(self):
+        return self._indices.keys()
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return zip(self._indices, self)
+
+    def para_dict(self):
+        return dict(zip(self._indices, self))
+
+
+@lru_cache(maxsize=512)
+def classe_linha(colunas):
+    """Classe das linhas com estas colunas (tuplo de nomes), criada uma vez."""
+    # rename: colunas como "?column?" ou repetidas ficam _0, _1, ... como atributo,
+    # mas continuam acessíveis pelo nome original com linha["..."]
+    base = namedtuple("Linha", colunas, rename=True)
+    indices = {}
+    for i, nome in enumerate(colunas):
+        indices.setdefault(nome, i)
+    return type("Linha", (_Linha, base), {"__slots__": (), "_indices": indices})
+
+
+def _colunas(cur):
+    return tuple(c[0] for c in cur.description)
+
+
+# ------------------------------------------------------------------
+# Statements preparados
+# ------------------------------------------------------------------
+
+class Preparada:
+    """
+    SQL com marcadores %s executado por PREPARE/EXECUTE. Criar uma vez (ao
+    nível do módulo) e passar aos helpers no lugar do texto:
+
+        SQL_CARRINHO = Preparada("loja_carrinho", "SELECT ... WHERE id_utilizador = %s")
+        carrinho = fetchone_dict(SQL_CARRINHO, [user_id])
+
+    `tipos` (ex: ("text",)) fixa os tipos dos parâmetros quando o Postgres
+    não os consegue inferir do SQL.
+    """
+
+    def __init__(self, nome, sql, tipos=()):
+        self.nome = nome
+        self.sql = sql
+        n = sql.replace("%%", "").count("%s")
+        self._tipos = f" ({', '.join(tipos)})" if tipos else ""
+        self._argumentos = f"({', '.join(['%s'] * n)})" if n else ""
+        self._texto = converter_sql(sql)
+
+    def __repr__(self):
+        return f"<Preparada {self.nome}>"
+
+    def texto_execute(self, ligacao):
+        """EXECUTE desta consulta na ligação (None se ainda não foi preparada); para EXPLAIN."""
+        nome_servidor, pronta = _preparadas(ligacao).get(self.nome) or (None, False)
+        return f"EXECUTE {nome_servidor}{self._argumentos}" if pronta else None
+
+    def executar(self, cur, params=None):
+        preparadas = _preparadas(cur.db)
+        nome_servidor, pronta = preparadas.get(self.nome) or (f"rs_{self.nome}", False)
+        if pronta:
+            _contar(self.nome, "hit")
+        else:
+            cur.execute(f"PREPARE {nome_servidor}{self._tipos} AS {self._texto}")
+            preparadas[self.nome] = (nome_servidor, True)
+            _contar(self.nome, "prepare")
+
+        try:
+            cur.execute(f"EXECUTE {nome_servidor}{self._argumentos}", params or [])
+        except DatabaseError as e:
+            if getattr(e.__cause__, "pgcode", None) in _PGCODES_INVALIDAM:
+                # o antigo pode continuar no servidor: a próxima execução usa outro nome
+                preparadas[self.nome] = (f"rs_{self.nome}_{next(_geracoes)}", False)
+                _contar(self.nome, "invalidada")
+            raise
+
+
+def _preparadas(ligacao):
+    """Registo da ligação: nome -> (nome no servidor, já preparado)."""
+    preparadas = getattr(ligacao, "rs_preparadas", None)
+    if preparadas is None:
+        preparadas = ligacao.rs_preparadas = {}
+    return preparadas
+
+
+def _ao_criar_ligacao(sender, connection, **kwargs):
+    # sessão nova no Postgres: não tem nada preparado
+    connection.rs_preparadas = {}
+
+
+connection_created.connect(_ao_criar_ligacao, dispatch_uid="Core.db")
+
+
+def _contar(nome, resultado):
+    registo.incrementar("rs_sql_preparadas_total", {"nome": nome, "resultado": resultado})
+
+
+def executar(cur, sql, params=None):
+    """cur.execute(sql, params), com PREPARE/EXECUTE se `sql` for uma Preparada."""
+    if not isinstance(sql, Preparada):
+        cur.execute(sql, params or [])
+    elif _config()["ATIVO"]:
+        sql.executar(cur, params)
+    else:
+        cur.execute(sql.sql, params or [])
+
+
+# ------------------------------------------------------------------
+# Resultado completo
+# ------------------------------------------------------------------
+
+def fetchall_dicts(sql, params=None):
+    """
+    Executa um SELECT e devolve lista de dicts:
+    [{"col1": valor, "col2": valor, ...}, ...]
+    """
+    with connection.cursor() as cur:
+        executar(cur, sql, params)
+        cols = [c[0] for c in cur.description]
+        rows = [dict(zip(cols, row)) for row in cur.fetchall()]
+    registar_linhas(len(rows))
+    return rows
+
+
+def fetchone_dict(sql, params=None):
+    """
+    Executa um SELECT que devolve 0 ou 1 linha.
+    Retorna um dict ou None.
+    """
+    with connection.cursor() as cur:
+        executar(cur, sql, params)
+        cols = [c[0] for c in cur.description]
+        row = cur.fetchone()
+    if not row:
+        return None
+    registar_linhas(1)
+    return dict(zip(cols, row))
+
+
+def fetchall_linhas(sql, params=None):
+    """Como fetchall_dicts, mas com linhas compactas (ver classe_linha)."""
+    with connection.cursor() as cur:
+        executar(cur, sql, params)
+        criar = classe_linha(_colunas(cur))._make
+        rows = [criar(row) for row in cur.fetchall()]
+    registar_linhas(len(rows))
+    return rows
+
+
+# ------------------------------------------------------------------
+# Em blocos
+# ------------------------------------------------------------------
+
+def em_lotes(sql, params=None, tamanho=ITERSIZE_PADRAO):
+    """Gerador de listas de até `tamanho` linhas compactas (fetchmany)."""
+    total = 0
+    try:
+        with connection.cursor() as cur:
+            executar(cur, sql, params)
+            criar = classe_linha(_colunas(cur))._make
+            while True:
+                bloco = cur.fetchmany(tamanho)
+                if not bloco:
+                    break
+                total += len(bloco)
+                yield [criar(row) for row in bloco]
+    finally:
+        registar_linhas(total)
+
+
+def iterar(sql, params=None, itersize=ITERSIZE_PADRAO):
+    """
+    Gerador de linhas compactas lidas de um cursor com nome, `itersize` de
+    cada vez. Consumir até ao fim (ou fechar o gerador) fecha o cursor.
+    """
+    if isinstance(sql, Preparada):
+        # DECLARE ... CURSOR só aceita o SQL, não um EXECUTE
+        sql = sql.sql
+    total = 0
+    try:
+        with connection.chunked_cursor() as cur:
+            # psycopg2: nº de linhas pedidas ao servidor em cada FETCH da iteração
+            cur.cursor.itersize = itersize
+            cur.execute(sql, params or [])
+            criar = None
+            for row in cur:
+                if criar is None:
+                    # num cursor com nome a descrição só existe depois do primeiro FETCH
+                    criar = classe_linha(_colunas(cur))._make
+                total += 1
+                yield criar(row)
+    finally:
+        registar_linhas(total)
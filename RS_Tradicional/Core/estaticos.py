@@ -0,0 +1,231 @@
+"""
+Ficheiros estáticos com hash no nome, pré-comprimidos, e servidos pelo
+próprio Django nas instalações de uma só máquina (sem nginx à frente).
+
+- ArmazenamentoEstaticos (STORAGES["staticfiles"]): o collectstatic grava
+  css/app.<hash>.css (manifesto do Django) e, ao lado, .gz e .br (o brotli
+  só se o pacote estiver instalado), para não comprimir em cada pedido;
+- EstaticosMiddleware: serve STATIC_ROOT antes do resto dos middlewares,
+  escolhe a versão comprimida pelo Accept-Encoding (cada uma com o seu ETag,
+  terminado em -gz/-br) e manda os ficheiros com hash com
+  "Cache-Control: immutable" de um ano.
+"""
+import gzip
+import json
+import mimetypes
+import os
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+UM_ANO = 365 * 24 * 3600
+
+
+def _config():
+    cfg = getattr(settings, "ESTATICOS", {}) or {}
+    return {
+        "SERVIR": cfg.get("SERVIR", not settings.DEBUG),
+        "COMPRIMIR": tuple(cfg.get("COMPRIMIR", ("css", "js", "svg", "json", "txt", "map"))),
+        "TAMANHO_MINIMO": cfg.get("TAMANHO_MINIMO", 256),
+        "MAX_AGE_SEM_HASH": cfg.get("MAX_AGE_SEM_HASH", 60),
+    }
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def comprimir(caminho, cfg=None):
+    """
+    Escreve caminho.gz (e caminho.br) se compensar. Devolve as extensões
+    gravadas; as que não poupam pelo menos 5% são apagadas.
+    """
+    cfg = cfg or _config()
+    if not caminho.endswith(tuple(f".{e}" for e in cfg["COMPRIMIR"])):
+        return []
+    with open(caminho, "rb") as f:
+        original = f.read()
+    if len(original) < cfg["TAMANHO_MINIMO"]:
+        return []
+
+    versoes = [(".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    brotli = _brotli()
+    if brotli is not None:
+        versoes.append((".br", lambda d: brotli.compress(d, quality=11)))
+
+    gravadas = []
+    for extensao, compressor in versoes:
+        comprimido = compressor(original)
+        destino = caminho + extensao
+        if len(comprimido) < len(original) * 0.95:
+            with open(destino, "wb") as f:
+                f.write(comprimido)
+            gravadas.append(extensao)
+        elif os.path.exists(destino):
+            os.remove(destino)
+    return gravadas
+
+
+class ArmazenamentoEstaticos(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        cfg = _config()
+        for nome in sorted(set(paths) | set(self.hashed_files.values())):
+            for extensao in comprimir(self.path(nome), cfg):
+                yield nome, nome + extensao, True
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            # sem collectstatic (desenvolvimento, testes): nome sem hash
+            return StaticFilesStorage.url(self, name)
+
+
+# ------------------------------------------------------------------
+# Servir STATIC_ROOT
+# ------------------------------------------------------------------
+
+def _prefixo():
+    prefixo = urlsplit(settings.STATIC_URL).path
+    if not prefixo.startswith("/"):
+        prefixo = "/" + prefixo
+    return prefixo if prefixo.endswith("/") else prefixo + "/"
+
+
+def _codificacoes_aceites(cabecalho):
+    aceites = set()
+    for parte in (cabecalho or "").split(","):
+        nome, _, parametros = parte.strip().partition(";")
+        q = parametros.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        if nome:
+            aceites.add(nome.strip().lower())
+    return aceites
+
+
+def indexar(raiz, prefixo, cfg=None):
+    """{url: ficheiro} de tudo o que está em `raiz` (lido uma vez, no arranque)."""
+    cfg = cfg or _config()
+    if not raiz or not os.path.isdir(raiz):
+        return {}
+
+    com_hash = set()
+    manifesto = os.path.join(raiz, "staticfiles.json")
+    if os.path.exists(manifesto):
+        with open(manifesto, encoding="utf-8") as f:
+            com_hash = set(json.load(f).get("paths", {}).values())
+
+    ficheiros = {}
+    for pasta, _subpastas, nomes in os.walk(raiz):
+        for nome in nomes:
+            if nome.endswith((".gz", ".br")) or nome == "staticfiles.json":
+                continue
+            caminho = os.path.join(pasta, nome)
+            relativo = os.path.relpath(caminho, raiz).replace(os.sep, "/")
+            estado = os.stat(caminho)
+            tipo, _ = mimetypes.guess_type(nome)
+            if tipo and (tipo.startswith("text/") or tipo in ("application/javascript", "image/svg+xml")):
+                tipo += "; charset=utf-8"
+
+            # o ETag identifica os bytes enviados: cada codificação tem o seu
+            # (um proxy ou browser não pode trocar o gzip pelo original)
+            etag = f"{int(estado.st_mtime):x}-{estado.st_size:x}"
+            variantes = {}
+            for codificacao, extensao in (("br", ".br"), ("gzip", ".gz")):
+                if os.path.exists(caminho + extensao):
+                    variantes[codificacao] = (
+                        caminho + extensao,
+                        os.stat(caminho + extensao).st_size,
+                        f'"{etag}-{extensao[1:]}"',
+                    )
+
+            imutavel = relativo in com_hash
+            ficheiros[prefixo + relativo] = {
+                "caminho": caminho,
+                "tamanho": estado.st_size,
+                "tipo": tipo or "application/octet-stream",
+                "etag": f'"{etag}"',
+                "modificado": http_date(estado.st_mtime),
+                "cache": (
+                    f"public, max-age={UM_ANO}, immutable" if imutavel
+                    else f"public, max-age={cfg['MAX_AGE_SEM_HASH']}"
+                ),
+                "variantes": variantes,
+            }
+    return ficheiros
+
+
+class EstaticosMiddleware:
+    """Serve os estáticos de STATIC_ROOT sem passar pelo resto da aplicação."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not _config()["SERVIR"]:
+            raise MiddlewareNotUsed
+        self.ficheiros = indexar(settings.STATIC_ROOT, _prefixo())
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        ficheiro = self._procurar(request)
+        if ficheiro is not None:
+            return self._servir(request, ficheiro)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        ficheiro = self._procurar(request)
+        if ficheiro is not None:
+            return self._servir(request, ficheiro)
+        return await self.get_response(request)
+
+    def _procurar(self, request):
+        if request.method in ("GET", "HEAD"):
+            return self.ficheiros.get(request.path_info)
+        return None
+
+    def _servir(self, request, ficheiro):
+        caminho, tamanho, etag = ficheiro["caminho"], ficheiro["tamanho"], ficheiro["etag"]
+        codificacao = None
+        aceites = _codificacoes_aceites(request.headers.get("Accept-Encoding"))
+        for nome in ("br", "gzip"):
+            if nome in aceites and nome in ficheiro["variantes"]:
+                (caminho, tamanho, etag), codificacao = ficheiro["variantes"][nome], nome
+                break
+
+        if request.headers.get("If-None-Match") == etag:
+            resposta = HttpResponseNotModified()
+        else:
+            if request.method == "HEAD":
+                resposta = HttpResponse(content_type=ficheiro["tipo"])
+            else:
+                resposta = FileResponse(open(caminho, "rb"), content_type=ficheiro["tipo"])
+            resposta["Content-Length"] = str(tamanho)
+            resposta["Last-Modified"] = ficheiro["modificado"]
+            if codificacao:
+                resposta["Content-Encoding"] = codificacao
+
+        resposta["ETag"] = etag
+        resposta["Cache-Control"] = ficheiro["cache"]
+        if ficheiro["variantes"]:
+            resposta["Vary"] = "Accept-Encoding"
+        return resposta
@@ -0,0 +1,360 @@
+"""
+Imagens de produtos, notícias e fornecedores guardadas por conteúdo.
+
+Cada ficheiro recebido é guardado uma só vez, com o sha256 no nome
+(MEDIA_ROOT/imagens/ab/<hash>.<ext>), e registado na tabela Imagem. As
+tabelas que já existiam (Imagem_Produto.caminho, Imagem_Noticia.uri,
+Fornecedor.imagem_fornecedor) guardam a referência 'sha256:<hash>.<ext>';
+valores antigos (URLs) continuam a ser mostrados tal como estão.
+
+Com o Pillow instalado são geradas variantes WebP e JPEG nas larguras de
+settings.IMAGENS["LARGURAS"] (<hash>-<largura>.webp/.jpg), num pool de
+processos. Os nomes nunca mudam de conteúdo, por isso podem ser servidos
+com cache "immutable". O template tag {% imagem %} (Core/templatetags)
+monta o srcset.
+"""
+import hashlib
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from Core import assincrono
+from Core.metricas import registar_procedure
+
+PREFIXO = "sha256:"
+
+# assinaturas dos formatos aceites (primeiros bytes do ficheiro)
+_FORMATOS = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+_pool = None  # (pid, ProcessPoolExecutor)
+
+
+class ImagemInvalida(Exception):
+    pass
+
+
+def _config():
+    cfg = getattr(settings, "IMAGENS", {}) or {}
+    return {
+        "DIRETORIO": cfg.get("DIRETORIO", "imagens"),
+        "LARGURAS": sorted(cfg.get("LARGURAS", [320, 640, 1024, 1600])),
+        "QUALIDADE": cfg.get("QUALIDADE", 80),
+        "MAX_BYTES": cfg.get("MAX_BYTES", 10 * 1024 * 1024),
+        "PROCESSOS": cfg.get("PROCESSOS", 2),
+    }
+
+
+def pillow_disponivel():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _extensao(cabecalho):
+    for assinatura, extensao in _FORMATOS:
+        if cabecalho.startswith(assinatura):
+            return extensao
+    if cabecalho[:4] == b"RIFF" and cabecalho[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def referencia(hash_, extensao):
+    return f"{PREFIXO}{hash_}.{extensao}"
+
+
+def ler_referencia(ref):
+    """(hash, extensao) de uma referência 'sha256:...', ou None para URLs antigos."""
+    if not ref or not ref.startswith(PREFIXO):
+        return None
+    hash_, _, extensao = ref[len(PREFIXO):].partition(".")
+    if len(hash_) != 64 or not extensao:
+        return None
+    return hash_, extensao
+
+
+def caminho_relativo(hash_, sufixo):
+    """Caminho relativo a MEDIA_ROOT/MEDIA_URL (sufixo: '.jpg', '-640.webp', ...)."""
+    return f"{_config()['DIRETORIO']}/{hash_[:2]}/{hash_}{sufixo}"
+
+
+def _caminho_absoluto(hash_, sufixo):
+    return os.path.join(settings.MEDIA_ROOT, caminho_relativo(hash_, sufixo))
+
+
+# ------------------------------------------------------------------
+# Upload
+# ------------------------------------------------------------------
+
+def guardar_uploads(ficheiros):
+    """
+    Guarda os UploadedFile recebidos e gera as variantes das imagens novas
+    (em paralelo no pool). Devolve as referências, pela mesma ordem; um
+    ficheiro igual a um já guardado devolve a referência existente.
+    """
+    cfg = _config()
+    guardadas = [_guardar_original(f, cfg) for f in ficheiros]
+
+    existentes = _registadas([h for h, _e, _t in guardadas])
+    novas = [g for g in guardadas if g[0] not in existentes]
+    if novas:
+        processar(novas)
+    return [referencia(h, e) for h, e, _t in guardadas]
+
+
+def guardar_upload(ficheiro):
+    return guardar_uploads([ficheiro])[0]
+
+
+def _guardar_original(ficheiro, cfg):
+    if ficheiro.size > cfg["MAX_BYTES"]:
+        raise ImagemInvalida(
+            f"A imagem '{ficheiro.name}' excede {cfg['MAX_BYTES'] // (1024 * 1024)} MB."
+        )
+
+    pasta_tmp = os.path.join(settings.MEDIA_ROOT, cfg["DIRETORIO"])
+    os.makedirs(pasta_tmp, exist_ok=True)
+    tmp = os.path.join(pasta_tmp, f".upload-{uuid.uuid4().hex}")
+
+    # hash calculado ao mesmo tempo que se escreve (uma só leitura do upload)
+    sha = hashlib.sha256()
+    cabecalho = b""
+    try:
+        with open(tmp, "wb") as destino:
+            for bloco in ficheiro.chunks():
+                if len(cabecalho) < 16:
+                    cabecalho += bloco[:16]
+                sha.update(bloco)
+                destino.write(bloco)
+
+        extensao = _extensao(cabecalho)
+        if extensao is None:
+            raise ImagemInvalida(
+                f"O ficheiro '{ficheiro.name}' não é uma imagem JPEG, PNG, WebP ou GIF."
+            )
+
+        hash_ = sha.hexdigest()
+        final = _caminho_absoluto(hash_, f".{extensao}")
+        if os.path.exists(final):
+            os.remove(tmp)
+        else:
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(tmp, final)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    return hash_, extensao, ficheiro.size
+
+
+def _registadas(hashes):
+    if not hashes:
+        return set()
+    with connection.cursor() as cur:
+        cur.execute("SELECT hash FROM Imagem WHERE hash = ANY(%s)", [list(hashes)])
+        return {r[0] for r in cur.fetchall()}
+
+
+# ------------------------------------------------------------------
+# Variantes (pool de processos)
+# ------------------------------------------------------------------
+
+def _obter_pool(processos):
+    global _pool
+    pid = os.getpid()
+    if _pool is None or _pool[0] != pid:
+        # spawn: os workers não herdam as ligações à BD nem os threads do Django
+        contexto = multiprocessing.get_context("spawn")
+        _pool = (pid, ProcessPoolExecutor(max_workers=processos, mp_context=contexto))
+    return _pool[1]
+
+
+def processar(itens):
+    """
+    Gera as variantes e regista as imagens. `itens`: [(hash, extensao, tamanho_bytes)].
+    Sem Pillow só o original é registado (sem dimensões nem variantes).
+    """
+    cfg = _config()
+    tarefas = [
+        (_caminho_absoluto(h, f".{e}"), _caminho_absoluto(h, ""), cfg["LARGURAS"], cfg["QUALIDADE"])
+        for h, e, _t in itens
+    ]
+
+    if not pillow_disponivel():
+        resultados = [(None, None, [])] * len(itens)
+    elif cfg["PROCESSOS"] > 0 and len(itens) > 0:
+        pool = _obter_pool(cfg["PROCESSOS"])
+        resultados = list(pool.map(_gerar_variantes_tarefa, tarefas))
+    else:
+        resultados = [gerar_variantes(*t) for t in tarefas]
+
+    for (h, e, tamanho), (largura, altura, larguras) in zip(itens, resultados):
+        inicio = time.perf_counter()
+        try:
+            with connection.cursor() as cur:
+                cur.execute(
+                    "CALL sp_imagem_registar(%s, %s, %s, %s, %s, %s)",
+                    [h, e, largura, altura, tamanho, larguras],
+                )
+        except Exception:
+            registar_procedure("sp_imagem_registar", time.perf_counter() - inicio, ok=False)
+            raise
+        registar_procedure("sp_imagem_registar", time.perf_counter() - inicio, ok=True)
+    return resultados
+
+
+def _gerar_variantes_tarefa(tarefa):
+    return gerar_variantes(*tarefa)
+
+
+def gerar_variantes(origem, base, larguras, qualidade):
+    """
+    Corre nos workers (só usa o Pillow): escreve <base>-<largura>.webp/.jpg
+    sem ampliar a imagem. Devolve (largura, altura, larguras geradas).
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(origem) as original:
+        img = ImageOps.exif_transpose(original)
+        img.load()
+    largura, altura = img.size
+
+    alvo = sorted({w for w in larguras if w < largura} | {min(largura, max(larguras))})
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        opaca = Image.new("RGB", img.size, (255, 255, 255))
+        opaca.paste(img, mask=img.getchannel("A"))
+    else:
+        img = img.convert("RGB")
+        opaca = img
+
+    for w in alvo:
+        tamanho = (w, max(1, round(altura * w / largura)))
+        for imagem, formato, sufixo, extra in (
+            (img, "WEBP", "webp", {"method": 4}),
+            (opaca, "JPEG", "jpg", {"optimize": True, "progressive": True}),
+        ):
+            destino = f"{base}-{w}.{sufixo}"
+            if os.path.exists(destino):
+                continue
+            tmp = f"{destino}.{os.getpid()}.tmp"
+            imagem.resize(tamanho, Image.LANCZOS).save(tmp, formato, quality=qualidade, **extra)
+            os.replace(tmp, destino)
+
+    return largura, altura, alvo
+
+
+# ------------------------------------------------------------------
+# Leitura (uma consulta por página)
+# ------------------------------------------------------------------
+
+_COLUNAS = """
+    i.hash, i.extensao, i.largura, i.altura, i.larguras
+"""
+
+
+def _linha_para_imagem(ref, hash_, extensao, largura, altura, larguras):
+    if hash_ is None:
+        # URL antigo ou referência sem registo: mostrado como está
+        return {"ref": ref, "hash": None}
+    return {
+        "ref": ref,
+        "hash": hash_,
+        "extensao": extensao,
+        "largura": largura,
+        "altura": altura,
+        "larguras": list(larguras or []),
+    }
+
+
+def _sql_imagens_produtos(filtro):
+    return f"""
+        SELECT DISTINCT ON (ip.id_produto)
+            ip.id_produto, ip.caminho, {_COLUNAS}
+        FROM Imagem_Produto ip
+        LEFT JOIN Imagem i
+               ON ip.caminho LIKE 'sha256:%%'
+              AND i.hash = substr(ip.caminho, 8, 64)
+        WHERE {filtro}
+        ORDER BY ip.id_produto, ip.id_imagem
+    """
+
+
+def _sql_imagens_noticias(filtro, todas):
+    return f"""
+        SELECT {'' if todas else 'DISTINCT ON (im.id_noticia)'}
+            im.id_noticia, im.uri, {_COLUNAS}
+        FROM Imagem_Noticia im
+        LEFT JOIN Imagem i
+               ON im.uri LIKE 'sha256:%%'
+              AND i.hash = substr(im.uri, 8, 64)
+        WHERE {filtro}
+        ORDER BY im.id_noticia, im.id_imagem
+    """
+
+
+def _por_produto(rows):
+    return {r[0]: _linha_para_imagem(*r[1:]) for r in rows}
+
+
+def _por_noticia(rows, todas):
+    resultado = {}
+    for r in rows:
+        resultado.setdefault(r[0], []).append(_linha_para_imagem(*r[1:]))
+    if todas:
+        return resultado
+    return {k: v[0] for k, v in resultado.items()}
+
+
+def imagens_produtos(ids):
+    """{id_produto: imagem principal} para todos os produtos da página, numa consulta."""
+    if not ids:
+        return {}
+    with connection.cursor() as cur:
+        cur.execute(_sql_imagens_produtos("ip.id_produto = ANY(%s)"), [list(ids)])
+        return _por_produto(cur.fetchall())
+
+
+def imagens_noticias(ids, todas=False):
+    """{id_noticia: [imagens]} (ou só a primeira de cada, com todas=False), numa consulta."""
+    if not ids:
+        return {}
+    with connection.cursor() as cur:
+        cur.execute(_sql_imagens_noticias("im.id_noticia = ANY(%s)", todas), [list(ids)])
+        return _por_noticia(cur.fetchall(), todas)
+
+
+# Variantes async (Core/assincrono.py). Sem `ids` a consulta filtra pela
+# própria view da página, para poder correr ao mesmo tempo que a lista.
+
+async def imagens_loja_async():
+    """imagens_produtos() de todos os produtos de vw_loja_produtos."""
+    rows = await assincrono.fetchall(_sql_imagens_produtos(
+        "ip.id_produto IN (SELECT id_produto FROM vw_loja_produtos)"
+    ), [])
+    return _por_produto(rows)
+
+
+async def imagens_noticias_async(ids=None, todas=False):
+    """imagens_noticias() de `ids`, ou (ids=None) de todas as notícias de vw_noticias."""
+    if ids is None:
+        filtro, params = "im.id_noticia IN (SELECT id_noticia FROM vw_noticias)", []
+    elif not ids:
+        return {}
+    else:
+        filtro, params = "im.id_noticia = ANY(%s)", [list(ids)]
+    rows = await assincrono.fetchall(_sql_imagens_noticias(filtro, todas), params)
+    return _por_noticia(rows, todas)
@@ -0,0 +1,231 @@
+"""
+Instrumentação por pedido: número de queries, tempo total de BD, query mais
+lenta, linhas lidas e comandos Mongo.
+
+O middleware abre um "contexto" por pedido (uma ContextVar); o SQL é
+apanhado por um execute_wrapper instalado em cada ligação Django quando é
+criada, e o Mongo por um CommandListener do pymongo (ver Core.mongo). Os
+helpers de SQL em Core.views registam as linhas lidas com registar_linhas().
+
+Sob ASGI o SQL do Django corre nos threads do sync_to_async, com ligações
+desses threads; a ContextVar acompanha o pedido até lá. As consultas do
+psycopg async (Core/assincrono.py) são registadas por lá.
+"""
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+try:
+    from pymongo import monitoring
+except ImportError:  # pragma: no cover - Mongo é opcional para a instrumentação
+    monitoring = None
+
+
+logger = logging.getLogger("Core.instrumentacao")
+
+_pedido_atual = ContextVar("rs_instrumentacao_pedido", default=None)
+
+
+def _config():
+    cfg = getattr(settings, "INSTRUMENTACAO", {}) or {}
+    return {
+        "ATIVA": cfg.get("ATIVA", True),
+        "LIMITE_QUERIES": cfg.get("LIMITE_QUERIES", 20),
+        "HEADER_SERVER_TIMING": cfg.get("HEADER_SERVER_TIMING", True),
+        "SQL_MAX_CHARS": cfg.get("SQL_MAX_CHARS", 300),
+    }
+
+
+class EstatisticasPedido:
+    """Acumulador simples (um por pedido)."""
+
+    def __init__(self):
+        self.queries = 0
+        self.tempo_db = 0.0
+        self.linhas = 0
+        self.mais_lenta_sql = None
+        self.mais_lenta_tempo = 0.0
+        self.erros_db = 0
+        self.mongo_comandos = 0
+        self.mongo_tempo = 0.0
+        self.queries_sql = []
+
+    def registar_query(self, sql, duracao, erro=False):
+        self.queries += 1
+        self.tempo_db += duracao
+        if erro:
+            self.erros_db += 1
+        if duracao >= self.mais_lenta_tempo:
+            self.mais_lenta_tempo = duracao
+            self.mais_lenta_sql = sql
+        self.queries_sql.append((sql, duracao))
+
+    def para_dict(self, max_chars=300):
+        sql = self.mais_lenta_sql
+        if sql and len(sql) > max_chars:
+            sql = sql[:max_chars] + "…"
+        return {
+            "queries": self.queries,
+            "tempo_db_ms": round(self.tempo_db * 1000, 2),
+            "linhas": self.linhas,
+            "erros_db": self.erros_db,
+            "mais_lenta_ms": round(self.mais_lenta_tempo * 1000, 2),
+            "mais_lenta_sql": " ".join(sql.split()) if sql else None,
+            "mongo_comandos": self.mongo_comandos,
+            "mongo_tempo_ms": round(self.mongo_tempo * 1000, 2),
+        }
+
+
+def estatisticas_atuais():
+    """Devolve o acumulador do pedido atual (ou None fora de um pedido)."""
+    return _pedido_atual.get()
+
+
+def registar_linhas(n):
+    stats = _pedido_atual.get()
+    if stats is not None:
+        stats.linhas += n
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    stats = _pedido_atual.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    inicio = time.perf_counter()
+    erro = False
+    try:
+        return execute(sql, params, many, context)
+    except Exception:
+        erro = True
+        raise
+    finally:
+        stats.registar_query(sql, time.perf_counter() - inicio, erro=erro)
+
+
+def _instalar_wrapper(ligacao):
+    if _sql_wrapper not in ligacao.execute_wrappers:
+        ligacao.execute_wrappers.append(_sql_wrapper)
+
+
+def _ao_criar_ligacao(sender, connection, **kwargs):
+    # sem pedido em curso o wrapper só chama execute()
+    _instalar_wrapper(connection)
+
+
+connection_created.connect(_ao_criar_ligacao, dispatch_uid="Core.instrumentacao")
+
+
+if monitoring is not None:
+
+    class MonitorMongo(monitoring.CommandListener):
+        """Conta comandos Mongo do pedido atual (registado no MongoClient)."""
+
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            self._registar(event)
+
+        def failed(self, event):
+            self._registar(event)
+
+        @staticmethod
+        def _registar(event):
+            stats = _pedido_atual.get()
+            if stats is not None:
+                stats.mongo_comandos += 1
+                stats.mongo_tempo += event.duration_micros / 1_000_000
+
+else:  # pragma: no cover
+    MonitorMongo = None
+
+
+def _server_timing(stats, total):
+    partes = [
+        f'db;dur={stats.tempo_db * 1000:.1f};desc="{stats.queries} queries"',
+    ]
+    if stats.mongo_comandos:
+        partes.append(f'mongo;dur={stats.mongo_tempo * 1000:.1f};desc="{stats.mongo_comandos} cmds"')
+    partes.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(partes)
+
+
+class InstrumentacaoMiddleware:
+    """
+    Mede o SQL/Mongo de cada pedido, acrescenta o header Server-Timing e
+    escreve uma linha de log estruturada (JSON). Pedidos acima de
+    INSTRUMENTACAO["LIMITE_QUERIES"] são registados como WARNING.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+        # ligações abertas antes de este módulo ser importado
+        for ligacao in connections.all(initialized_only=True):
+            _instalar_wrapper(ligacao)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        cfg = _config()
+        if not cfg["ATIVA"]:
+            return self.get_response(request)
+
+        stats = EstatisticasPedido()
+        token = _pedido_atual.set(stats)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _pedido_atual.reset(token)
+        return self._registar(request, response, stats, time.perf_counter() - inicio, cfg)
+
+    async def __acall__(self, request):
+        cfg = _config()
+        if not cfg["ATIVA"]:
+            return await self.get_response(request)
+
+        stats = EstatisticasPedido()
+        token = _pedido_atual.set(stats)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pedido_atual.reset(token)
+        return self._registar(request, response, stats, time.perf_counter() - inicio, cfg)
+
+    def _registar(self, request, response, stats, total, cfg):
+        request.rs_instrumentacao = stats
+
+        if cfg["HEADER_SERVER_TIMING"]:
+            response["Server-Timing"] = _server_timing(stats, total)
+
+        registo = {
+            "metodo": request.method,
+            "caminho": request.path,
+            "url_name": getattr(getattr(request, "resolver_match", None), "url_name", None),
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 2),
+            **stats.para_dict(cfg["SQL_MAX_CHARS"]),
+        }
+
+        limite = cfg["LIMITE_QUERIES"]
+        if limite is not None and stats.queries > limite:
+            registo["alerta"] = f"mais de {limite} queries"
+            logger.warning(json.dumps(registo, ensure_ascii=False, default=str))
+        else:
+            logger.info(json.dumps(registo, ensure_ascii=False, default=str))
+
+        return response
@@ -0,0 +1,160 @@
+import gzip
+import os
+import re
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from Core.metricas import registar_job
+
+ESTADOS_FINAIS = ("Concluída", "Cancelada")
+PARTICAO = re.compile(r"^encomenda_p(\d{4})_(\d{2})$")
+
+
+def _somar_meses(d, meses):
+    total = d.year * 12 + (d.month - 1) + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Manutenção das partições mensais de Encomenda/Encomendas_Produtos: cria as "
+        "partições dos próximos meses e desanexa as dos meses antigos para o schema "
+        "'arquivo', opcionalmente exportadas para CSV comprimido (ver ScriptsBD/Particionamento.sql)."
+    )
+
+    def add_arguments(self, parser):
+        config = settings.ARQUIVO
+        parser.add_argument("--manter-meses", type=int, default=config["MANTER_MESES"],
+                            help="Meses completos que ficam nas tabelas, além do atual.")
+        parser.add_argument("--meses-futuros", type=int, default=config["MESES_FUTUROS"],
+                            help="Partições a criar à frente do mês atual.")
+        parser.add_argument("--exportar", action="store_true",
+                            help=f"Exportar cada partição arquivada para {config['DIRETORIO']} (csv.gz).")
+        parser.add_argument("--apagar", action="store_true",
+                            help="Apagar as partições desanexadas (só com --exportar).")
+        parser.add_argument("--forcar", action="store_true",
+                            help="Arquivar também meses com encomendas por concluir.")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Apenas listar o que seria feito.")
+
+    def handle(self, *args, **opts):
+        if opts["manter_meses"] < 1 or opts["meses_futuros"] < 0:
+            raise CommandError("--manter-meses tem de ser >= 1 e --meses-futuros >= 0.")
+        if opts["apagar"] and not opts["exportar"]:
+            raise CommandError("--apagar só pode ser usado com --exportar.")
+
+        with connection.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'encomenda'::regclass")
+            if cur.fetchone() is None:
+                raise CommandError("A tabela Encomenda não está particionada (ver ScriptsBD/Particionamento.sql).")
+
+        inicio = time.perf_counter()
+        hoje = date.today().replace(day=1)
+
+        if not opts["dry_run"]:
+            with connection.cursor() as cur:
+                cur.execute("SELECT fn_particoes_garantir(%s, %s)",
+                            [hoje, _somar_meses(hoje, opts["meses_futuros"])])
+                criadas = cur.fetchone()[0]
+            self.stdout.write(f"Partições novas: {criadas}.")
+
+        limite = _somar_meses(hoje, -opts["manter_meses"])
+        arquivadas = linhas = 0
+        for mes in self._meses_antes_de(limite):
+            n = self._arquivar(mes, opts)
+            if n is not None:
+                arquivadas += 1
+                linhas += n
+
+        self._avisar_default()
+
+        duracao = time.perf_counter() - inicio
+        if not opts["dry_run"]:
+            registar_job("arquivar_encomendas", duracao, documentos=linhas)
+        self.stdout.write(self.style.SUCCESS(
+            f"{arquivadas} meses arquivados (anteriores a {limite:%Y-%m}), {linhas} encomendas, {duracao:.1f}s."
+        ))
+
+    def _meses_antes_de(self, limite):
+        with connection.cursor() as cur:
+            cur.execute("""
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'encomenda'::regclass
+            """)
+            nomes = [r[0] for r in cur.fetchall()]
+
+        meses = []
+        for nome in nomes:
+            m = PARTICAO.match(nome)
+            if m:
+                mes = date(int(m.group(1)), int(m.group(2)), 1)
+                if mes < limite:
+                    meses.append(mes)
+        return sorted(meses)
+
+    def _arquivar(self, mes, opts):
+        sufixo = f"p{mes:%Y_%m}"
+        encomendas, linhas = f"encomenda_{sufixo}", f"encomendas_produtos_{sufixo}"
+        fim = _somar_meses(mes, 1)
+
+        with connection.cursor() as cur:
+            cur.execute(f"SELECT COUNT(*), COUNT(*) FILTER (WHERE estado_encomenda NOT IN %s) FROM {encomendas}",
+                        [ESTADOS_FINAIS])
+            total, abertas = cur.fetchone()
+
+        if abertas and not opts["forcar"]:
+            self.stdout.write(self.style.WARNING(
+                f"  {mes:%Y-%m}: {abertas} encomendas por concluir, não arquivado (usar --forcar)."
+            ))
+            return None
+        if opts["dry_run"]:
+            self.stdout.write(f"  {mes:%Y-%m}: {total} encomendas seriam arquivadas.")
+            return total
+
+        # DETACH bloqueia a tabela-mãe, mas só pelo tempo de mexer no catálogo
+        with transaction.atomic(), connection.cursor() as cur:
+            cur.execute("CREATE SCHEMA IF NOT EXISTS arquivo")
+            # o resumo (não particionado) referencia as encomendas a desanexar
+            cur.execute("""
+                DELETE FROM Fornecedor_Encomenda_Resumo
+                WHERE data_encomenda >= %s AND data_encomenda < %s
+            """, [mes, fim])
+            cur.execute(f"ALTER TABLE Encomendas_Produtos DETACH PARTITION {linhas}")
+            cur.execute(f"ALTER TABLE {linhas} DROP CONSTRAINT FK_linha_encomenda")
+            cur.execute(f"ALTER TABLE Encomenda DETACH PARTITION {encomendas}")
+            cur.execute(f"ALTER TABLE {linhas} SET SCHEMA arquivo")
+            cur.execute(f"ALTER TABLE {encomendas} SET SCHEMA arquivo")
+
+        ficheiros = []
+        if opts["exportar"]:
+            ficheiros = [self._exportar(t) for t in (encomendas, linhas)]
+        if opts["apagar"]:
+            with connection.cursor() as cur:
+                cur.execute(f"DROP TABLE arquivo.{linhas}, arquivo.{encomendas}")
+
+        destino = ", ".join(ficheiros) if ficheiros else f"arquivo.{encomendas}"
+        self.stdout.write(f"  {mes:%Y-%m}: {total} encomendas -> {destino}")
+        return total
+
+    def _exportar(self, tabela):
+        pasta = settings.ARQUIVO["DIRETORIO"]
+        os.makedirs(pasta, exist_ok=True)
+        caminho = os.path.join(pasta, f"{tabela}.csv.gz")
+        with gzip.open(caminho, "wt", encoding="utf-8") as f, connection.cursor() as cur:
+            cur.copy_expert(f"COPY arquivo.{tabela} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+        return caminho
+
+    def _avisar_default(self):
+        with connection.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM encomenda_default")
+            n = cur.fetchone()[0]
+        if n:
+            self.stdout.write(self.style.WARNING(
+                f"Há {n} encomendas na partição DEFAULT (datas sem partição mensal)."
+            ))
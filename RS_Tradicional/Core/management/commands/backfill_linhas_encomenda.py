@@ -0,0 +1,88 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Preenche preco_unitario/nome_produto nas linhas antigas e o total_encomenda "
+        "das encomendas finalizadas (ver ScriptsBD/Upgrade.sql). Corre em lotes de "
+        "id_encomenda, cada um na sua transação, e no fim aplica os NOT NULL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=5000,
+                            help="Número de ids de encomenda por transação.")
+
+    def handle(self, *args, **opts):
+        lote = opts["lote"]
+        if lote < 1:
+            raise CommandError("--lote tem de ser >= 1.")
+
+        with connection.cursor() as cur:
+            cur.execute("SELECT MIN(id_encomenda), MAX(id_encomenda) FROM Encomenda")
+            id_min, id_max = cur.fetchone()
+
+        if id_min is None:
+            self.stdout.write("Não existem encomendas.")
+        else:
+            self._preencher(id_min, id_max, lote)
+
+        self._aplicar_not_null()
+
+    def _preencher(self, id_min, id_max, lote):
+        inicio = time.perf_counter()
+        total_linhas = total_encomendas = 0
+
+        for a in range(id_min, id_max + 1, lote):
+            b = min(a + lote - 1, id_max)
+            with transaction.atomic(), connection.cursor() as cur:
+                # os triggers de Encomendas_Produtos recalculam o resumo e o total
+                # das encomendas finalizadas afetadas
+                cur.execute("""
+                    UPDATE Encomendas_Produtos ep
+                    SET
+                        preco_unitario = COALESCE(ep.preco_unitario, p.preco),
+                        nome_produto   = COALESCE(ep.nome_produto, p.nome)
+                    FROM Produto p
+                    WHERE p.id_produto = ep.id_produto
+                      AND ep.id_encomenda BETWEEN %s AND %s
+                      AND (ep.preco_unitario IS NULL OR ep.nome_produto IS NULL)
+                """, [a, b])
+                total_linhas += cur.rowcount
+
+                # encomendas sem linhas alteradas mas ainda sem total
+                cur.execute("""
+                    SELECT fn_encomenda_total_recalcular(array_agg(id_encomenda)), COUNT(*)
+                    FROM Encomenda
+                    WHERE id_encomenda BETWEEN %s AND %s
+                      AND estado_encomenda <> 'Carrinho'
+                      AND total_encomenda IS NULL
+                """, [a, b])
+                total_encomendas += cur.fetchone()[1]
+
+            self.stdout.write(f"  #{a}–#{b}: {total_linhas} linhas, {total_encomendas} totais")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfill concluído: {total_linhas} linhas e {total_encomendas} totais "
+            f"em {time.perf_counter() - inicio:.1f}s."
+        ))
+
+    def _aplicar_not_null(self):
+        with connection.cursor() as cur:
+            cur.execute("""
+                SELECT COUNT(*)
+                FROM Encomendas_Produtos
+                WHERE preco_unitario IS NULL OR nome_produto IS NULL
+            """)
+            em_falta = cur.fetchone()[0]
+            if em_falta:
+                raise CommandError(f"Ainda há {em_falta} linhas sem preço/nome (produtos apagados?).")
+
+            cur.execute("""
+                ALTER TABLE Encomendas_Produtos
+                    ALTER COLUMN preco_unitario SET NOT NULL,
+                    ALTER COLUMN nome_produto   SET NOT NULL
+            """)
+        self.stdout.write(self.style.SUCCESS("Colunas preco_unitario/nome_produto marcadas NOT NULL."))
@@ -0,0 +1,250 @@
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from Core import assincrono
+from Core.benchmarks import formatar_ms, guardar_resultado, resumo_latencias, ultimo_resultado
+from Core.management.commands.gerar_dados_sinteticos import PASSWORD_PADRAO
+
+MODOS = ("wsgi", "asgi")
+URLS = ("loja_produtos", "noticias_lista", "noticia_detalhe", "admin_relatorios")
+MARCA = "RESULTADO "
+
+
+def _um(sql, params=None):
+    with connection.cursor() as cur:
+        cur.execute(sql, params or [])
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara WSGI (threads, views síncronas) com ASGI (event loop, views async de "
+        "Core/assincrono.py) nas páginas de leitura, com N pedidos em simultâneo. Cada "
+        "modo corre num processo próprio, na mesma máquina e contra a mesma BD; por "
+        "omissão sem as caches de cálculo e sem GET condicional, para medir a BD."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concorrencia", type=int, default=32,
+                            help="Pedidos em simultâneo (threads no WSGI, tarefas no ASGI).")
+        parser.add_argument("--pedidos", type=int, default=400, help="Pedidos por URL e modo.")
+        parser.add_argument("--aquecimento", type=int, default=5)
+        parser.add_argument("--com-cache", action="store_true",
+                            help="Manter CACHE_CALCULOS e GET_CONDICIONAL ligados.")
+        parser.add_argument("--email-admin", help="Admin para admin_relatorios.")
+        parser.add_argument("--password", default=PASSWORD_PADRAO)
+        parser.add_argument("--apenas", nargs="*", choices=URLS)
+        parser.add_argument("--nao-guardar", action="store_true")
+        # interno: corre um só modo e escreve o resultado em JSON
+        parser.add_argument("--modo", choices=MODOS, help="(interno)")
+
+    def handle(self, *args, **opts):
+        if opts["concorrencia"] < 1 or opts["pedidos"] < 1:
+            raise CommandError("--concorrencia e --pedidos têm de ser >= 1.")
+        if opts["modo"]:
+            resultado = self._correr_modo(opts)
+            self.stdout.write(MARCA + json.dumps(resultado))
+            return
+
+        self.stdout.write(
+            f"{opts['concorrencia']} em simultâneo, {opts['pedidos']} pedidos por URL, "
+            f"caches {'ligadas' if opts['com_cache'] else 'desligadas'}; "
+            f"asyncpg: {'sim' if assincrono.asyncpg_disponivel() else 'não (sync_to_async)'}\n"
+        )
+        self.stdout.write(f"{'url':18} {'modo':5} {'pedidos/s':>10} {'p50':>8} {'p99':>8} {'erros':>6}")
+
+        resultados = {
+            "opcoes": {k: opts[k] for k in ("concorrencia", "pedidos", "com_cache")},
+            "modos": {},
+        }
+        for modo in MODOS:
+            resultados["modos"][modo] = self._subprocesso(modo, opts)
+
+        for url_name in opts["apenas"] or URLS:
+            for modo in MODOS:
+                r = resultados["modos"][modo].get(url_name)
+                if r is None:
+                    continue
+                self.stdout.write(
+                    f"{url_name:18} {modo:5} {r['por_segundo']:>10.1f} "
+                    f"{formatar_ms(r['p50_ms'])} {formatar_ms(r['p99_ms'])} {r['erros']:>6}"
+                )
+
+        anterior = ultimo_resultado("bench_asgi")
+        if anterior:
+            self.stdout.write(f"\nAnterior ({anterior['commit']}, {anterior['data']}), pedidos/s:")
+            for modo, urls in anterior["resultados"]["modos"].items():
+                for url_name, r in urls.items():
+                    atual = resultados["modos"].get(modo, {}).get(url_name)
+                    if atual:
+                        self.stdout.write(
+                            f"{url_name:18} {modo:5} {r['por_segundo']:>10.1f} -> {atual['por_segundo']:.1f}"
+                        )
+
+        if not opts["nao_guardar"]:
+            caminho = guardar_resultado("bench_asgi", resultados)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados em {caminho}"))
+
+    # --------------------------------------------------------------
+    # Processo de cada modo
+    # --------------------------------------------------------------
+
+    def _subprocesso(self, modo, opts):
+        env = dict(os.environ)
+        # settings.ASSINCRONO["VIEWS"] é lido no arranque: um processo por modo
+        env["RS_SERVIDOR"] = modo
+        env["ASSINCRONO_VIEWS"] = "1" if modo == "asgi" else "0"
+        env["ASSINCRONO_POOL_MAX"] = str(opts["concorrencia"])
+        if not opts["com_cache"]:
+            env["CACHE_CALCULOS_ATIVA"] = "0"
+            env["CACHE_INVALIDACAO_ATIVA"] = "0"
+            env["GET_CONDICIONAL_ATIVO"] = "0"
+
+        comando = [
+            sys.executable, str(settings.BASE_DIR / "manage.py"), "bench_asgi",
+            "--modo", modo,
+            "--concorrencia", str(opts["concorrencia"]),
+            "--pedidos", str(opts["pedidos"]),
+            "--aquecimento", str(opts["aquecimento"]),
+            "--password", opts["password"],
+        ]
+        if opts["email_admin"]:
+            comando += ["--email-admin", opts["email_admin"]]
+        if opts["apenas"]:
+            comando += ["--apenas", *opts["apenas"]]
+
+        saida = subprocess.run(comando, env=env, capture_output=True, text=True)
+        for linha in reversed(saida.stdout.splitlines()):
+            if linha.startswith(MARCA):
+                return json.loads(linha[len(MARCA):])
+        raise CommandError(f"O modo {modo} falhou:\n{saida.stderr[-2000:]}")
+
+    def _urls(self, opts):
+        urls = {
+            "loja_produtos": reverse("loja_produtos"),
+            "noticias_lista": reverse("noticias_lista"),
+        }
+        noticia = _um("SELECT id_noticia FROM vw_noticias ORDER BY id_noticia LIMIT 1")
+        if noticia:
+            urls["noticia_detalhe"] = reverse("noticia_detalhe", args=[noticia])
+        admin = opts["email_admin"] or _um("""
+            SELECT u.email
+            FROM Utilizador u
+            JOIN Tipo_Utilizador t ON t.id_tipo_utilizador = u.id_tipo_utilizador
+            WHERE lower(t.designacao) = 'admin'
+              AND u.email LIKE '%%@bench.rstradicional.pt'
+            ORDER BY u.id_utilizador
+            LIMIT 1
+        """)
+        if admin:
+            urls["admin_relatorios"] = reverse("admin_relatorios")
+        if opts["apenas"]:
+            urls = {k: v for k, v in urls.items() if k in opts["apenas"]}
+        return urls, admin
+
+    def _sessao_admin(self, email, password):
+        client = Client(HTTP_HOST="localhost")
+        client.post(reverse("login"), {"email": email, "password": password})
+        if "user_id" not in client.session:
+            raise CommandError(f"Login falhou para {email}.")
+        return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def _correr_modo(self, opts):
+        urls, admin = self._urls(opts)
+        sessao = self._sessao_admin(admin, opts["password"]) if "admin_relatorios" in urls else None
+        connections.close_all()
+
+        resultado = {}
+        for url_name, url in urls.items():
+            cookie = sessao if url_name == "admin_relatorios" else None
+            if opts["modo"] == "wsgi":
+                latencias, erros, total = self._wsgi(url, cookie, opts)
+            else:
+                latencias, erros, total = asyncio.run(self._asgi(url, cookie, opts))
+            r = resumo_latencias(latencias)
+            r.update({"por_segundo": len(latencias) / total if total else 0.0, "erros": erros})
+            resultado[url_name] = r
+        return resultado
+
+    def _wsgi(self, url, cookie, opts):
+        """Como um worker gthread: um thread (e uma ligação à BD) por pedido em curso."""
+        senhas = itertools.count()
+        lock = threading.Lock()
+        latencias, erros = [], [0]
+
+        def cliente():
+            client = Client(HTTP_HOST="localhost")
+            if cookie:
+                client.cookies[settings.SESSION_COOKIE_NAME] = cookie
+            return client
+
+        def trabalhador(_):
+            client = cliente()
+            proprias = []
+            try:
+                while next(senhas) < opts["pedidos"]:
+                    inicio = time.perf_counter()
+                    status = client.get(url).status_code
+                    proprias.append((time.perf_counter() - inicio) * 1000)
+                    if status != 200:
+                        with lock:
+                            erros[0] += 1
+            finally:
+                connections.close_all()
+                with lock:
+                    latencias.extend(proprias)
+
+        aquecimento = cliente()
+        for _ in range(opts["aquecimento"]):
+            aquecimento.get(url)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=opts["concorrencia"]) as pool:
+            list(pool.map(trabalhador, range(opts["concorrencia"])))
+        return latencias, erros[0], time.perf_counter() - inicio
+
+    async def _asgi(self, url, cookie, opts):
+        """Como um worker uvicorn: um event loop, as views async e o pool do asyncpg."""
+        senhas = itertools.count()
+        latencias, erros = [], [0]
+
+        def cliente():
+            client = AsyncClient(headers={"host": "localhost"})
+            if cookie:
+                client.cookies[settings.SESSION_COOKIE_NAME] = cookie
+            return client
+
+        async def tarefa():
+            client = cliente()
+            while next(senhas) < opts["pedidos"]:
+                inicio = time.perf_counter()
+                status = (await client.get(url)).status_code
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                if status != 200:
+                    erros[0] += 1
+
+        try:
+            aquecimento = cliente()
+            for _ in range(opts["aquecimento"]):
+                await aquecimento.get(url)
+
+            inicio = time.perf_counter()
+            await asyncio.gather(*(tarefa() for _ in range(opts["concorrencia"])))
+            total = time.perf_counter() - inicio
+        finally:
+            await assincrono.fechar()
+        return latencias, erros[0], total
@@ -0,0 +1,112 @@
+import gc
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Core import db
+from Core.benchmarks import guardar_resultado, ultimo_resultado
+
+# mesmas colunas que vw_admin_encomendas (lista de admin e sync do Mongo)
+SQL = """
+    SELECT
+        g AS id_encomenda,
+        current_date - (g %% 365) AS data_encomenda,
+        (ARRAY['Pendente', 'Em preparação', 'Enviada', 'Entregue'])[1 + g %% 4] AS estado_encomenda,
+        g %% 5000 AS id_utilizador,
+        'Cliente ' || (g %% 5000) AS utilizador_nome,
+        'cliente' || (g %% 5000) || '@exemplo.pt' AS utilizador_email
+    FROM generate_series(1, %s) AS g
+"""
+
+
+def _lista_dicts(n, _lote):
+    return db.fetchall_dicts(SQL, [n])
+
+
+def _lista_linhas(n, _lote):
+    return db.fetchall_linhas(SQL, [n])
+
+
+def _em_lotes(n, lote):
+    # consumidor que não guarda as linhas (ex: sync, exportação)
+    total = 0
+    for bloco in db.em_lotes(SQL, [n], lote):
+        total += len(bloco)
+    return total
+
+
+def _iterar(n, lote):
+    total = 0
+    for _linha in db.iterar(SQL, [n], lote):
+        total += 1
+    return total
+
+
+MODOS = (
+    ("dicts", _lista_dicts),
+    ("linhas", _lista_linhas),
+    ("em_lotes", _em_lotes),
+    ("iterar", _iterar),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Memória (pico, via tracemalloc) e tempo de leitura de N linhas com cada helper "
+        "de Core/db.py: lista de dicts, lista de linhas compactas, fetchmany em lotes e "
+        "cursor com nome (itersize)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--linhas", type=int, default=200000)
+        parser.add_argument("--lote", type=int, default=db.ITERSIZE_PADRAO,
+                            help="fetchmany / itersize.")
+        parser.add_argument("--repeticoes", type=int, default=3)
+        parser.add_argument("--nao-guardar", action="store_true")
+
+    def handle(self, *args, **opts):
+        n, lote = opts["linhas"], opts["lote"]
+        if n < 1 or lote < 1 or opts["repeticoes"] < 1:
+            raise CommandError("--linhas, --lote e --repeticoes têm de ser >= 1.")
+
+        self.stdout.write(f"{n} linhas, lote {lote}, melhor de {opts['repeticoes']}\n")
+        self.stdout.write(f"{'modo':9} {'pico MB':>8} {'B/linha':>8} {'ms':>8}")
+
+        resultados = {"linhas": n, "lote": lote, "modos": {}}
+        for nome, funcao in MODOS:
+            # tempo sem o tracemalloc (que torna cada alocação mais lenta)
+            tempos = []
+            for _ in range(opts["repeticoes"]):
+                gc.collect()
+                inicio = time.perf_counter()
+                resultado = funcao(n, lote)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+                del resultado
+
+            gc.collect()
+            tracemalloc.start()
+            try:
+                resultado = funcao(n, lote)
+                _atual, pico = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            del resultado
+
+            r = {"pico_bytes": pico, "bytes_por_linha": pico / n, "ms": min(tempos)}
+            resultados["modos"][nome] = r
+            self.stdout.write(
+                f"{nome:9} {pico / 1024 / 1024:>8.1f} {r['bytes_por_linha']:>8.0f} {r['ms']:>8.0f}"
+            )
+
+        anterior = ultimo_resultado("bench_linhas")
+        if anterior:
+            self.stdout.write(f"\nAnterior ({anterior['commit']}, {anterior['data']}), B/linha:")
+            for nome, r in anterior["resultados"]["modos"].items():
+                atual = resultados["modos"].get(nome)
+                if atual:
+                    self.stdout.write(f"{nome:9} {r['bytes_por_linha']:>8.0f} -> {atual['bytes_por_linha']:.0f}")
+
+        if not opts["nao_guardar"]:
+            caminho = guardar_resultado("bench_linhas", resultados)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados em {caminho}"))
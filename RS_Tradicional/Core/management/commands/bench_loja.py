@@ -0,0 +1,221 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from Core.benchmarks import (
+    formatar_ms,
+    guardar_resultado,
+    resumo_latencias,
+    ultimo_resultado,
+)
+from Core.management.commands.gerar_dados_sinteticos import PASSWORD_PADRAO
+
+
+def _um(sql, params=None):
+    with connection.cursor() as cur:
+        cur.execute(sql, params or [])
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark dos URLs principais (catálogo, carrinho, checkout, as minhas encomendas, "
+        "relatórios, área de fornecedor) com o test client do Django. Reporta p50/p95/p99 "
+        "e queries por pedido, e guarda o resultado para comparar entre commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iteracoes", type=int, default=30)
+        parser.add_argument("--aquecimento", type=int, default=3)
+        parser.add_argument("--password", default=PASSWORD_PADRAO,
+                            help="Password dos utilizadores gerados por gerar_dados_sinteticos.")
+        parser.add_argument("--email-cliente")
+        parser.add_argument("--email-admin")
+        parser.add_argument("--email-fornecedor")
+        parser.add_argument("--apenas", nargs="*", help="Limitar a estes url names.")
+        parser.add_argument("--nao-guardar", action="store_true")
+
+    # --------------------------------------------------------------
+
+    def _descobrir(self, opts):
+        cliente = opts["email_cliente"] or _um("""
+            SELECT u.email
+            FROM Utilizador u
+            JOIN Tipo_Utilizador t ON t.id_tipo_utilizador = u.id_tipo_utilizador
+            JOIN Encomenda e ON e.id_utilizador = u.id_utilizador
+            WHERE lower(t.designacao) = 'cliente'
+              AND u.email LIKE '%%@bench.rstradicional.pt'
+            GROUP BY u.email
+            ORDER BY COUNT(*) DESC
+            LIMIT 1
+        """)
+        admin = opts["email_admin"] or _um("""
+            SELECT u.email
+            FROM Utilizador u
+            JOIN Tipo_Utilizador t ON t.id_tipo_utilizador = u.id_tipo_utilizador
+            WHERE lower(t.designacao) = 'admin'
+              AND u.email LIKE '%%@bench.rstradicional.pt'
+            ORDER BY u.id_utilizador
+            LIMIT 1
+        """)
+        fornecedor = opts["email_fornecedor"] or _um("""
+            SELECT f.email
+            FROM Fornecedor f
+            JOIN Produto p ON p.id_fornecedor = f.id_fornecedor
+            JOIN Encomendas_Produtos ep ON ep.id_produto = p.id_produto
+            WHERE f.email LIKE '%%@bench.rstradicional.pt'
+            GROUP BY f.email
+            ORDER BY COUNT(*) DESC
+            LIMIT 1
+        """)
+        if not (cliente and admin and fornecedor):
+            raise CommandError(
+                "Não foram encontrados utilizadores de benchmark. "
+                "Corre primeiro 'manage.py gerar_dados_sinteticos' ou indica --email-*."
+            )
+        return cliente, admin, fornecedor
+
+    def _cliente_http(self, email, password):
+        client = Client(HTTP_HOST="localhost")
+        if email:
+            client.post(reverse("login"), {"email": email, "password": password})
+            if "user_id" not in client.session:
+                raise CommandError(f"Login falhou para {email}.")
+        return client
+
+    def _cenarios(self, opts):
+        email_cliente, email_admin, email_fornecedor = self._descobrir(opts)
+
+        produto_quente = _um("""
+            SELECT ep.id_produto
+            FROM Encomendas_Produtos ep
+            JOIN vw_loja_produtos p ON p.id_produto = ep.id_produto
+            GROUP BY ep.id_produto
+            ORDER BY SUM(ep.quantidade) DESC
+            LIMIT 1
+        """)
+        noticia = _um("SELECT id_noticia FROM Noticia ORDER BY id_noticia LIMIT 1")
+        encomenda_cliente = _um("""
+            SELECT e.id_encomenda
+            FROM Encomenda e
+            JOIN Utilizador u ON u.id_utilizador = e.id_utilizador
+            WHERE lower(u.email) = lower(%s) AND e.estado_encomenda <> 'Carrinho'
+            ORDER BY e.id_encomenda DESC
+            LIMIT 1
+        """, [email_cliente])
+        encomenda_fornecedor = _um("""
+            SELECT ep.id_encomenda
+            FROM Encomendas_Produtos ep
+            JOIN Produto p ON p.id_produto = ep.id_produto
+            JOIN Fornecedor f ON f.id_fornecedor = p.id_fornecedor
+            JOIN Encomenda e ON e.id_encomenda = ep.id_encomenda
+            WHERE lower(f.email) = lower(%s) AND e.estado_encomenda <> 'Carrinho'
+            ORDER BY ep.id_encomenda DESC
+            LIMIT 1
+        """, [email_fornecedor])
+
+        anonimo = self._cliente_http(None, None)
+        cliente = self._cliente_http(email_cliente, opts["password"])
+        admin = self._cliente_http(email_admin, opts["password"])
+        fornecedor = self._cliente_http(email_fornecedor, opts["password"])
+
+        # (url_name, client, método, args, dados)
+        cenarios = [
+            ("home", anonimo, "get", [], None),
+            ("loja_produtos", anonimo, "get", [], None),
+            ("noticias_lista", anonimo, "get", [], None),
+            ("loja_adicionar_produto", cliente, "post", [produto_quente], {"quantidade": "1"}),
+            ("loja_carrinho", cliente, "get", [], None),
+            ("loja_finalizar_encomenda", cliente, "post", [], None),
+            ("minhas_encomendas", cliente, "get", [], None),
+            ("admin_encomenda_list", admin, "get", [], None),
+            ("admin_product_list", admin, "get", [], None),
+            ("admin_relatorios", admin, "get", [], None),
+            ("fornecedor_product_list", fornecedor, "get", [], None),
+            ("fornecedor_encomendas_list", fornecedor, "get", [], None),
+        ]
+        if noticia:
+            cenarios.append(("noticia_detalhe", anonimo, "get", [noticia], None))
+        if encomenda_cliente:
+            cenarios.append(("minha_encomenda_detail", cliente, "get", [encomenda_cliente], None))
+            cenarios.append(("admin_encomenda_detail", admin, "get", [encomenda_cliente], None))
+        if encomenda_fornecedor:
+            cenarios.append(("fornecedor_encomenda_detail", fornecedor, "get", [encomenda_fornecedor], None))
+
+        if opts["apenas"]:
+            cenarios = [c for c in cenarios if c[0] in opts["apenas"]]
+        return cenarios
+
+    def _pedido(self, client, metodo, url, dados):
+        with CaptureQueriesContext(connection) as ctx:
+            inicio = time.perf_counter()
+            if metodo == "post":
+                response = client.post(url, dados or {})
+            else:
+                response = client.get(url)
+            duracao = (time.perf_counter() - inicio) * 1000
+
+        stats = getattr(response.wsgi_request, "rs_instrumentacao", None)
+        queries = stats.queries if stats is not None else len(ctx.captured_queries)
+        return duracao, queries, response.status_code
+
+    # --------------------------------------------------------------
+
+    def handle(self, *args, **opts):
+        cenarios = [
+            (url_name, client, metodo, reverse(url_name, args=args_url), dados)
+            for url_name, client, metodo, args_url, dados in self._cenarios(opts)
+        ]
+
+        # cada ronda percorre todos os cenários por ordem, para que o fluxo
+        # adicionar -> carrinho -> finalizar se repita de forma realista
+        for _ in range(opts["aquecimento"]):
+            for _nome, client, metodo, url, dados in cenarios:
+                self._pedido(client, metodo, url, dados)
+
+        amostras = {nome: ([], [], set()) for nome, *_ in cenarios}
+        for _ in range(opts["iteracoes"]):
+            for nome, client, metodo, url, dados in cenarios:
+                ms, q, st = self._pedido(client, metodo, url, dados)
+                latencias, queries, status = amostras[nome]
+                latencias.append(ms)
+                queries.append(q)
+                status.add(st)
+
+        resultados = {}
+        for nome, (latencias, queries, status) in amostras.items():
+            resultados[nome] = {
+                **resumo_latencias(latencias),
+                "queries_media": sum(queries) / len(queries) if queries else 0,
+                "queries_max": max(queries) if queries else 0,
+                "status": sorted(status),
+            }
+
+        anterior = ultimo_resultado("bench_loja")
+        self._imprimir(resultados, anterior)
+
+        if not opts["nao_guardar"]:
+            caminho = guardar_resultado("bench_loja", resultados)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados em {caminho}"))
+
+    def _imprimir(self, resultados, anterior):
+        antes = (anterior or {}).get("resultados", {})
+        if anterior:
+            self.stdout.write(f"Comparação com o commit {anterior.get('commit')} ({anterior.get('data')})")
+
+        self.stdout.write(
+            f"{'url_name':32} {'p50':>8} {'p95':>8} {'p99':>8} {'q/pedido':>9} {'Δp95':>9}  status"
+        )
+        for nome, r in resultados.items():
+            delta = ""
+            if nome in antes and antes[nome].get("p95_ms") and r["p95_ms"] is not None:
+                delta = f"{(r['p95_ms'] / antes[nome]['p95_ms'] - 1) * 100:+8.1f}%"
+            self.stdout.write(
+                f"{nome:32} {formatar_ms(r['p50_ms'])} {formatar_ms(r['p95_ms'])} {formatar_ms(r['p99_ms'])} "
+                f"{r['queries_media']:9.1f} {delta:>9}  {','.join(map(str, r['status']))}"
+            )
@@ -0,0 +1,131 @@
+import json
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from Core.benchmarks import formatar_ms, guardar_resultado, resumo_latencias, ultimo_resultado
+
+TABELAS = ("encomenda", "encomendas_produtos")
+
+
+def _consultas(amostra):
+    """(nome, sql, params) das consultas quentes; as que não filtram pela data servem de contraste."""
+    hoje = date.today()
+    id_encomenda, data_encomenda, id_utilizador = amostra
+    return [
+        ("admin_lista_90_dias", """
+            SELECT id_encomenda, data_encomenda, estado_encomenda, utilizador_nome
+            FROM vw_admin_encomendas
+            WHERE data_encomenda >= %s
+            ORDER BY data_encomenda DESC, id_encomenda DESC
+        """, [hoje - timedelta(days=90)]),
+        ("vendas_30_dias", """
+            SELECT data_encomenda, COUNT(*), SUM(total_encomenda)
+            FROM Encomenda
+            WHERE estado_encomenda <> 'Carrinho'
+              AND data_encomenda >= %s
+            GROUP BY data_encomenda
+        """, [hoje - timedelta(days=30)]),
+        ("linhas_id_e_data", """
+            SELECT id_produto, quantidade, preco_unitario
+            FROM Encomendas_Produtos
+            WHERE id_encomenda = %s AND data_encomenda = %s
+        """, [id_encomenda, data_encomenda]),
+        ("linhas_so_id", """
+            SELECT id_produto, quantidade, preco_unitario
+            FROM Encomendas_Produtos
+            WHERE id_encomenda = %s
+        """, [id_encomenda]),
+        ("carrinho_cliente", """
+            SELECT id_encomenda
+            FROM Encomenda
+            WHERE id_utilizador = %s AND estado_encomenda = 'Carrinho'
+        """, [id_utilizador]),
+    ]
+
+
+def _relacoes(plano, encontradas):
+    """Nomes das tabelas/partições de Encomenda lidas no plano (EXPLAIN JSON)."""
+    nome = plano.get("Relation Name", "")
+    if nome.startswith(TABELAS):
+        encontradas.add(nome)
+    for filho in plano.get("Plans", []):
+        _relacoes(filho, encontradas)
+    return encontradas
+
+
+class Command(BaseCommand):
+    help = (
+        "Mostra o partition pruning nas consultas quentes a Encomenda/Encomendas_Produtos: "
+        "partições lidas (EXPLAIN ANALYZE) e latência. Correr antes e depois de "
+        "ScriptsBD/Particionamento.sql para comparar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iteracoes", type=int, default=30)
+        parser.add_argument("--nao-guardar", action="store_true")
+
+    def handle(self, *args, **opts):
+        with connection.cursor() as cur:
+            cur.execute("""
+                SELECT id_encomenda, data_encomenda, id_utilizador
+                FROM Encomenda
+                WHERE estado_encomenda <> 'Carrinho'
+                ORDER BY data_encomenda DESC, id_encomenda DESC
+                LIMIT 1
+            """)
+            amostra = cur.fetchone()
+            if amostra is None:
+                raise CommandError("Não existem encomendas (correr 'manage.py gerar_dados_sinteticos').")
+
+            cur.execute("""
+                SELECT COUNT(*)
+                FROM pg_inherits
+                WHERE inhparent = 'encomenda'::regclass
+            """)
+            particoes = cur.fetchone()[0]
+
+        self.stdout.write(
+            f"Encomenda: {f'{particoes} partições' if particoes else 'não particionada'}\n"
+        )
+        self.stdout.write(f"{'consulta':22} {'partições':>10} {'p50':>8} {'p95':>8}")
+
+        resultados = {"particoes": particoes, "consultas": {}}
+        for nome, sql, params in _consultas(amostra):
+            with connection.cursor() as cur:
+                cur.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+                plano = cur.fetchone()[0]
+                if isinstance(plano, str):
+                    plano = json.loads(plano)
+                lidas = sorted(_relacoes(plano[0]["Plan"], set()))
+
+                latencias = []
+                for _ in range(opts["iteracoes"]):
+                    inicio = time.perf_counter()
+                    cur.execute(sql, params)
+                    cur.fetchall()
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+
+            r = resumo_latencias(latencias)
+            r["relacoes_lidas"] = lidas
+            resultados["consultas"][nome] = r
+            self.stdout.write(
+                f"{nome:22} {len(lidas):>10} {formatar_ms(r['p50_ms'])} {formatar_ms(r['p95_ms'])}"
+            )
+
+        anterior = ultimo_resultado("bench_particoes")
+        if anterior:
+            self.stdout.write(f"\nAnterior ({anterior['commit']}, {anterior['data']}):")
+            for nome, r in anterior["resultados"]["consultas"].items():
+                atual = resultados["consultas"].get(nome)
+                if atual:
+                    self.stdout.write(
+                        f"{nome:22} {len(r['relacoes_lidas']):>10} {formatar_ms(r['p50_ms'])} "
+                        f"-> {formatar_ms(atual['p50_ms'])}"
+                    )
+
+        if not opts["nao_guardar"]:
+            caminho = guardar_resultado("bench_particoes", resultados)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados em {caminho}"))
@@ -0,0 +1,129 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from Core import db
+from Core.benchmarks import formatar_ms, guardar_resultado, resumo_latencias, ultimo_resultado
+from Core.metricas import registo
+from Core.views import SQL_FORNECEDOR_POR_EMAIL, SQL_LOJA_CARRINHO
+from Utilizadores.views import SQL_UTILIZADOR_POR_EMAIL
+
+
+def _um(cur, sql):
+    cur.execute(sql)
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _consultas(cur):
+    """(Preparada, params) das consultas quentes, com valores que existem na BD."""
+    user_id = _um(cur, "SELECT id_utilizador FROM vw_loja_carrinho ORDER BY id_encomenda LIMIT 1")
+    fornecedor = _um(cur, "SELECT email FROM vw_fornecedores ORDER BY id_fornecedor LIMIT 1")
+    utilizador = _um(cur, "SELECT email FROM Utilizador ORDER BY id_utilizador LIMIT 1")
+    if user_id is None or fornecedor is None or utilizador is None:
+        raise CommandError("Faltam dados (correr 'manage.py gerar_dados_sinteticos').")
+    return [
+        (SQL_LOJA_CARRINHO, [user_id]),
+        (SQL_FORNECEDOR_POR_EMAIL, [fornecedor]),
+        (SQL_UTILIZADOR_POR_EMAIL, [utilizador]),
+    ]
+
+
+def _planeamento_ms(cur, sql, params):
+    """Planning Time do EXPLAIN ANALYZE (ms, no servidor)."""
+    cur.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+    plano = cur.fetchone()[0]
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return plano[0]["Planning Time"]
+
+
+def _hits():
+    totais = {}
+    for (nome, labels), valor in registo.contadores.items():
+        if nome == "rs_sql_preparadas_total":
+            resultado = dict(labels)["resultado"]
+            totais[resultado] = totais.get(resultado, 0) + valor
+    return totais
+
+
+class Command(BaseCommand):
+    help = (
+        "Tempo de planeamento (EXPLAIN ANALYZE) e latência das consultas mais repetidas "
+        "com o SQL enviado como texto e como statement preparado (Core/db.py). "
+        "Os CALL das procedures não entram: não podem ser preparados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iteracoes", type=int, default=500)
+        parser.add_argument("--nao-guardar", action="store_true")
+
+    def handle(self, *args, **opts):
+        n = opts["iteracoes"]
+        if n < 10:
+            raise CommandError("--iteracoes tem de ser >= 10.")
+
+        self.stdout.write(f"{n} execuções de cada, na mesma ligação\n")
+        self.stdout.write(
+            f"{'consulta':22} {'plan texto':>10} {'plan prep':>10} {'p50 texto':>10} {'p50 prep':>10}"
+        )
+
+        antes = _hits()
+        resultados = {"iteracoes": n, "consultas": {}}
+        with connection.cursor() as cur:
+            for preparada, params in _consultas(cur):
+                texto, prep = [], []
+                plan_texto, plan_prep = [], []
+                for i in range(n):
+                    inicio = time.perf_counter()
+                    cur.execute(preparada.sql, params)
+                    cur.fetchall()
+                    texto.append((time.perf_counter() - inicio) * 1000)
+
+                    inicio = time.perf_counter()
+                    db.executar(cur, preparada, params)
+                    cur.fetchall()
+                    prep.append((time.perf_counter() - inicio) * 1000)
+
+                    # amostras de planeamento no fim, já com o plano genérico escolhido
+                    if i >= n - 10:
+                        plan_texto.append(_planeamento_ms(cur, preparada.sql, params))
+                        plan_prep.append(_planeamento_ms(cur, preparada.texto_execute(cur.db), params))
+
+                r = {
+                    "planeamento_texto_ms": statistics.median(plan_texto),
+                    "planeamento_preparada_ms": statistics.median(plan_prep),
+                    "texto": resumo_latencias(texto),
+                    "preparada": resumo_latencias(prep),
+                }
+                resultados["consultas"][preparada.nome] = r
+                self.stdout.write(
+                    f"{preparada.nome:22} {formatar_ms(r['planeamento_texto_ms'])}  "
+                    f"{formatar_ms(r['planeamento_preparada_ms'])}  "
+                    f"{formatar_ms(r['texto']['p50_ms'])}  {formatar_ms(r['preparada']['p50_ms'])}"
+                )
+
+        depois = _hits()
+        hits = depois.get("hit", 0) - antes.get("hit", 0)
+        total = hits + depois.get("prepare", 0) - antes.get("prepare", 0)
+        resultados["taxa_hit"] = hits / total if total else None
+        if total:
+            self.stdout.write(f"\nStatements já preparados na ligação: {hits}/{total} ({hits / total:.1%})")
+
+        anterior = ultimo_resultado("bench_preparadas")
+        if anterior:
+            self.stdout.write(f"\nAnterior ({anterior['commit']}, {anterior['data']}), p50 preparada:")
+            for nome, r in anterior["resultados"]["consultas"].items():
+                atual = resultados["consultas"].get(nome)
+                if atual:
+                    self.stdout.write(
+                        f"{nome:22} {formatar_ms(r['preparada']['p50_ms'])} "
+                        f"-> {formatar_ms(atual['preparada']['p50_ms'])}"
+                    )
+
+        if not opts["nao_guardar"]:
+            caminho = guardar_resultado("bench_preparadas", resultados)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados em {caminho}"))
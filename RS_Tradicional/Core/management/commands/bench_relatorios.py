@@ -0,0 +1,66 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from Core.benchmarks import formatar_ms, guardar_resultado, resumo_latencias
+from Core.relatorios import BACKENDS, GRANULARIDADES, obter_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara os backends de relatórios (Mongo e Postgres) com os mesmos dados: "
+        "tempo de atualização e latência do cálculo dos KPIs de admin_relatorios."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iteracoes", type=int, default=20)
+        parser.add_argument("--backends", nargs="*", choices=sorted(BACKENDS), default=sorted(BACKENDS))
+        parser.add_argument("--granularidade", choices=list(GRANULARIDADES), default="dia")
+        parser.add_argument("--dias", type=int, default=30, help="Tamanho do período (até hoje).")
+        parser.add_argument("--sem-sync", action="store_true",
+                            help="Não atualizar os backends antes de medir.")
+        parser.add_argument("--nao-guardar", action="store_true")
+
+    def handle(self, *args, **opts):
+        resultados = {}
+        fim = date.today()
+        inicio = fim - timedelta(days=max(opts["dias"], 1) - 1)
+        periodo = (inicio, fim, opts["granularidade"])
+
+        for nome in opts["backends"]:
+            backend = obter_backend(nome)
+            r = {}
+
+            if not opts["sem_sync"]:
+                inicio = time.perf_counter()
+                backend.sincronizar()
+                r["sync_ms"] = (time.perf_counter() - inicio) * 1000
+
+            backend.kpis(*periodo)  # aquecimento
+            latencias = []
+            for _ in range(opts["iteracoes"]):
+                inicio = time.perf_counter()
+                contexto = backend.kpis(*periodo)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+            r.update(resumo_latencias(latencias))
+            r["total_periodo"] = round(float(contexto["total_periodo"]), 2)
+            r["count_periodo"] = contexto["count_periodo"]
+            resultados[nome] = r
+
+        self.stdout.write(f"{'backend':10} {'sync':>10} {'p50':>8} {'p95':>8} {'p99':>8}  total_periodo / count_periodo")
+        for nome, r in resultados.items():
+            sync = formatar_ms(r.get("sync_ms")) if "sync_ms" in r else formatar_ms(None)
+            self.stdout.write(
+                f"{nome:10} {sync:>10} {formatar_ms(r['p50_ms'])} {formatar_ms(r['p95_ms'])} "
+                f"{formatar_ms(r['p99_ms'])}  {r['total_periodo']} / {r['count_periodo']}"
+            )
+
+        totais = {(r["total_periodo"], r["count_periodo"]) for r in resultados.values()}
+        if len(totais) > 1:
+            self.stdout.write(self.style.WARNING("Os backends devolvem KPIs diferentes (dados desatualizados?)."))
+
+        if not opts["nao_guardar"]:
+            caminho = guardar_resultado("bench_relatorios", resultados)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados em {caminho}"))
@@ -0,0 +1,146 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.template.loader import render_to_string
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test import RequestFactory
+
+from Core.benchmarks import formatar_ms, guardar_resultado, resumo_latencias, ultimo_resultado
+from Core.views import ESTADOS_ENCOMENDA, PERIODOS_ENCOMENDAS
+
+
+def _produtos_loja(n):
+    return [{
+        "id_produto": i,
+        "nome": f"Produto {i}",
+        "descricao": "Produto tradicional da região, feito de forma artesanal. " * 2,
+        "preco": Decimal("4.50") + i % 20,
+        "stock": 10 + i % 50,
+        "versao": 1,
+        "imagem": None,
+    } for i in range(1, n + 1)]
+
+
+def _produtos_admin(n):
+    return [{
+        "id_produto": i,
+        "nome": f"Produto {i}",
+        "descricao": "",
+        "preco": Decimal("4.50") + i % 20,
+        "stock": 10 + i % 50,
+        "is_approved": i % 3 != 0,
+        "estado_produto": "Ativo",
+        "id_tipo_produto": 1,
+        "tipo_designacao": "Doçaria",
+        "id_fornecedor": i % 15,
+        "fornecedor_nome": f"Fornecedor {i % 15}",
+        "versao": 1,
+    } for i in range(1, n + 1)]
+
+
+def _encomendas_admin(n):
+    hoje = date.today()
+    return [{
+        "id_encomenda": i,
+        "data_encomenda": hoje - timedelta(days=i % 90),
+        "estado_encomenda": ESTADOS_ENCOMENDA[i % len(ESTADOS_ENCOMENDA)],
+        "id_utilizador": i % 200,
+        "utilizador_nome": f"Cliente {i % 200}",
+        "utilizador_email": f"cliente{i % 200}@exemplo.pt",
+    } for i in range(1, n + 1)]
+
+
+def _cenarios(n):
+    """(nome, template, contexto) com `n` linhas cada."""
+    return [
+        ("loja_produtos", "loja/produtos.html", {"produtos": _produtos_loja(n)}),
+        ("admin_produtos", "admin/produtos/list.html", {"produtos": _produtos_admin(n)}),
+        ("admin_encomendas", "admin/encomendas/list.html", {
+            "encomendas": _encomendas_admin(n),
+            "estados": ESTADOS_ENCOMENDA,
+            "estado_filtro": "",
+            "periodos": PERIODOS_ENCOMENDAS,
+            "periodo": PERIODOS_ENCOMENDAS[0][0],
+        }),
+    ]
+
+
+def _pedido():
+    request = RequestFactory().get("/")
+    request.session = SessionStore()
+    request.session.update({"user_id": 1, "user_tipo": "Admin", "user_nome": "Admin"})
+    request._messages = FallbackStorage(request)
+    return request
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o tempo de render (ms por 1000 linhas) das listas grandes: loja/produtos.html, "
+        "admin/produtos/list.html e admin/encomendas/list.html, com a cache de fragmentos "
+        "vazia (frio) e cheia (quente). Não usa a BD."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--linhas", type=int, default=1000)
+        parser.add_argument("--repeticoes", type=int, default=5)
+        parser.add_argument("--nao-guardar", action="store_true")
+
+    def handle(self, *args, **opts):
+        n = opts["linhas"]
+        if n < 1 or opts["repeticoes"] < 1:
+            raise CommandError("--linhas e --repeticoes têm de ser >= 1.")
+
+        fragmentos = caches["template_fragments"]
+        cache_templates = any(isinstance(l, CachedLoader) for l in engines["django"].engine.template_loaders)
+        self.stdout.write(
+            f"{n} linhas, {opts['repeticoes']} repetições; cached.Loader: "
+            f"{'sim' if cache_templates else 'não'}\n"
+        )
+        self.stdout.write(f"{'template':18} {'modo':6} {'p50':>8} {'ms/1000':>8} {'KB':>6}")
+
+        resultados = {"linhas": n, "templates": {}}
+        for nome, template, contexto in _cenarios(n):
+            resultados["templates"][nome] = {}
+            for modo in ("frio", "quente"):
+                fragmentos.clear()
+                if modo == "quente":
+                    render_to_string(template, contexto, request=_pedido())
+
+                tempos, tamanho = [], 0
+                for _ in range(opts["repeticoes"]):
+                    if modo == "frio":
+                        fragmentos.clear()
+                    request = _pedido()
+                    inicio = time.perf_counter()
+                    html = render_to_string(template, contexto, request=request)
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+                    tamanho = len(html)
+
+                r = resumo_latencias(tempos)
+                r["ms_por_1000"] = r["p50_ms"] * 1000 / n
+                resultados["templates"][nome][modo] = r
+                self.stdout.write(
+                    f"{nome:18} {modo:6} {formatar_ms(r['p50_ms'])} {r['ms_por_1000']:>8.1f} {tamanho // 1024:>6}"
+                )
+        fragmentos.clear()
+
+        anterior = ultimo_resultado("bench_render")
+        if anterior:
+            self.stdout.write(f"\nAnterior ({anterior['commit']}, {anterior['data']}), ms/1000 linhas:")
+            for nome, modos in anterior["resultados"]["templates"].items():
+                atual = resultados["templates"].get(nome, {})
+                for modo, r in modos.items():
+                    if modo in atual:
+                        self.stdout.write(
+                            f"{nome:18} {modo:6} {r['ms_por_1000']:>8.1f} -> {atual[modo]['ms_por_1000']:.1f}"
+                        )
+
+        if not opts["nao_guardar"]:
+            caminho = guardar_resultado("bench_render", resultados)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados em {caminho}"))
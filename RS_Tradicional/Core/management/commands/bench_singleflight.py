@@ -0,0 +1,141 @@
+import multiprocessing
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from Core import cache, cache_invalidacao
+from Core.benchmarks import formatar_ms, guardar_resultado, resumo_latencias, ultimo_resultado
+
+MODOS = ("ingenuo", "singleflight")
+
+
+def _inicializar_processo():
+    # com "spawn" (macOS/Windows) o processo filho começa sem o Django carregado
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _calcular(custo, calculos):
+    """O cálculo caro (uma consulta à BD); regista (início, fim) para medir a concorrência."""
+    inicio = time.time()
+    try:
+        with connection.cursor() as cur:
+            cur.execute("SELECT pg_sleep(%s), now()", [custo])
+            return cur.fetchone()[1]
+    finally:
+        calculos.append((inicio, time.time()))
+
+
+def _trabalhador(modo, chave, ttl, custo, fim):
+    """Um worker (processo): pedidos seguidos até `fim`; devolve (latências, cálculos)."""
+    backend = cache_invalidacao.cache_local()
+    latencias, calculos = [], []
+
+    def calcular():
+        return _calcular(custo, calculos)
+
+    try:
+        while time.time() < fim:
+            inicio = time.perf_counter()
+            if modo == "ingenuo":
+                if backend.get(chave) is None:
+                    backend.set(chave, calcular(), ttl)
+            else:
+                cache.obter(chave, calcular, ttl=ttl, stale=ttl * 4, nome="bench")
+            latencias.append((time.perf_counter() - inicio) * 1000)
+    finally:
+        connections.close_all()
+    return latencias, calculos
+
+
+def _pico(intervalos):
+    """Máximo de cálculos em simultâneo (de todos os processos)."""
+    eventos = sorted([(a, 1) for a, _ in intervalos] + [(b, -1) for _, b in intervalos])
+    atual = pico = 0
+    for _, delta in eventos:
+        atual += delta
+        pico = max(pico, atual)
+    return pico
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a carga na BD quando uma entrada da cache expira com muitos pedidos "
+        "em simultâneo, em processos separados (como os workers do gunicorn): "
+        "get/calcular/set simples contra Core/cache.py (single-flight, "
+        "stale-while-revalidate e XFetch), ambos com os valores na cache de cada "
+        "processo; os travões de Core/cache.py são os da CACHE_CALCULOS[\"CACHE\"]."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processos", type=int, default=8)
+        parser.add_argument("--duracao", type=float, default=10.0, help="Segundos por modo.")
+        parser.add_argument("--ttl", type=float, default=1.0)
+        parser.add_argument("--custo", type=float, default=0.2,
+                            help="Segundos de cada cálculo (pg_sleep).")
+        parser.add_argument("--nao-guardar", action="store_true")
+
+    def handle(self, *args, **opts):
+        if opts["processos"] < 1 or opts["ttl"] <= 0:
+            raise CommandError("--processos tem de ser >= 1 e --ttl > 0.")
+
+        self.stdout.write(
+            f"{opts['processos']} processos, {opts['duracao']:.0f}s por modo, "
+            f"TTL {opts['ttl']}s, cálculo {opts['custo'] * 1000:.0f}ms\n"
+        )
+        self.stdout.write(
+            f"{'modo':13} {'pedidos':>8} {'cálculos':>9} {'pico BD':>8} {'máx/s':>6} {'p50':>8} {'p99':>8}"
+        )
+
+        resultados = {"opcoes": {k: opts[k] for k in ("processos", "duracao", "ttl", "custo")}, "modos": {}}
+        for modo in MODOS:
+            r = self._correr(modo, opts)
+            resultados["modos"][modo] = r
+            self.stdout.write(
+                f"{modo:13} {r['n']:>8} {r['calculos']:>9} {r['pico_bd']:>8} {r['max_por_segundo']:>6} "
+                f"{formatar_ms(r['p50_ms'])} {formatar_ms(r['p99_ms'])}"
+            )
+
+        anterior = ultimo_resultado("bench_singleflight")
+        if anterior:
+            self.stdout.write(f"\nAnterior ({anterior['commit']}, {anterior['data']}):")
+            for modo, r in anterior["resultados"]["modos"].items():
+                self.stdout.write(f"{modo:13} {r['calculos']:>9} cálculos, pico BD {r['pico_bd']}")
+
+        if not opts["nao_guardar"]:
+            caminho = guardar_resultado("bench_singleflight", resultados)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados em {caminho}"))
+
+    def _correr(self, modo, opts):
+        chave = f"bench:singleflight:{uuid.uuid4().hex}"
+        # as ligações abertas não podem ser herdadas pelos processos filhos
+        connections.close_all()
+        contexto = multiprocessing.get_context("fork" if sys.platform.startswith("linux") else "spawn")
+        n = opts["processos"]
+        with ProcessPoolExecutor(n, mp_context=contexto, initializer=_inicializar_processo) as pool:
+            # o fim é comum: os processos arrancam a tempos diferentes
+            fim = time.time() + 2 + opts["duracao"]
+            futuros = [pool.submit(_trabalhador, modo, chave, opts["ttl"], opts["custo"], fim) for _ in range(n)]
+            partes = [f.result() for f in futuros]
+        # os valores morreram com os processos; o travão é partilhado
+        cache._cache().delete(f"travao:{chave}")
+
+        latencias = [ms for proprias, _ in partes for ms in proprias]
+        calculos = [c for _, proprios in partes for c in proprios]
+        por_segundo = {}
+        for inicio, _ in calculos:
+            por_segundo[int(inicio)] = por_segundo.get(int(inicio), 0) + 1
+
+        r = resumo_latencias(latencias)
+        r.update({
+            "calculos": len(calculos),
+            "pico_bd": _pico(calculos),
+            "max_por_segundo": max(por_segundo.values(), default=0),
+        })
+        return r
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from Core.metricas import registar_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Soma os eventos de Versao_Dados_Evento (um por escrita no catálogo/notícias) "
+        "à versão de cada recurso em Versao_Dados. Não muda a versão lida pelas "
+        "páginas; só impede a tabela de eventos de crescer. Correr a cada poucos minutos."
+    )
+
+    def handle(self, *args, **opts):
+        inicio = time.perf_counter()
+        try:
+            with connection.cursor() as cur:
+                cur.execute("CALL sp_compactar_versao_dados(NULL)")
+                eventos = cur.fetchone()[0]
+        except Exception:
+            registar_job("compactar_versao_dados", time.perf_counter() - inicio, sucesso=False)
+            raise
+        duracao = time.perf_counter() - inicio
+        registar_job("compactar_versao_dados", duracao, documentos=eventos)
+
+        self.stdout.write(self.style.SUCCESS(f"Compactados {eventos} eventos em {duracao:.1f}s."))
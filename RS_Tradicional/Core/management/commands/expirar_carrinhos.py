@@ -0,0 +1,95 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from Core.metricas import registar_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Apaga os carrinhos sem atividade há mais de N dias. Corre em lotes, cada "
+        "um na sua transação; carrinhos bloqueados (em uso) são saltados (SKIP LOCKED) "
+        "e ficam para a próxima execução."
+    )
+
+    def add_arguments(self, parser):
+        config = settings.CARRINHOS
+        parser.add_argument("--dias", type=int, default=config["EXPIRAR_DIAS"],
+                            help="Idade mínima (dias sem atividade) dos carrinhos a apagar.")
+        parser.add_argument("--lote", type=int, default=config["LOTE_EXPIRACAO"],
+                            help="Carrinhos apagados por transação.")
+        parser.add_argument("--max-lotes", type=int, default=None,
+                            help="Parar ao fim de N lotes (limita a duração de cada execução).")
+        parser.add_argument("--pausa", type=float, default=0.0,
+                            help="Segundos de pausa entre lotes.")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Apenas contar os carrinhos que seriam apagados.")
+
+    def handle(self, *args, **opts):
+        dias, lote = opts["dias"], opts["lote"]
+        if dias < 1 or lote < 1:
+            raise CommandError("--dias e --lote têm de ser >= 1.")
+
+        if opts["dry_run"]:
+            with connection.cursor() as cur:
+                cur.execute("""
+                    SELECT COUNT(*)
+                    FROM Encomenda
+                    WHERE estado_encomenda = 'Carrinho'
+                      AND data_encomenda < CURRENT_DATE - %s
+                """, [dias])
+                self.stdout.write(f"{cur.fetchone()[0]} carrinhos com mais de {dias} dias sem atividade.")
+            return
+
+        inicio = time.perf_counter()
+        try:
+            carrinhos, linhas, lotes = self._expirar(dias, lote, opts["max_lotes"], opts["pausa"])
+        except Exception:
+            registar_job("expirar_carrinhos", time.perf_counter() - inicio, sucesso=False)
+            raise
+        duracao = time.perf_counter() - inicio
+        registar_job("expirar_carrinhos", duracao, documentos=carrinhos)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Expirados {carrinhos} carrinhos ({linhas} linhas) em {lotes} lotes, {duracao:.1f}s."
+        ))
+
+    def _expirar(self, dias, lote, max_lotes, pausa):
+        carrinhos = linhas = lotes = 0
+
+        while max_lotes is None or lotes < max_lotes:
+            with transaction.atomic(), connection.cursor() as cur:
+                # usa ix_encomenda_carrinho_atividade; a condição volta a ser
+                # avaliada depois do lock (um carrinho usado entretanto não sai)
+                cur.execute("""
+                    SELECT array_agg(id_encomenda)
+                    FROM (
+                        SELECT id_encomenda
+                        FROM Encomenda
+                        WHERE estado_encomenda = 'Carrinho'
+                          AND data_encomenda < CURRENT_DATE - %s
+                        ORDER BY data_encomenda, id_encomenda
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    ) c
+                """, [dias, lote])
+                ids = cur.fetchone()[0] or []
+                if not ids:
+                    break
+
+                cur.execute("DELETE FROM Encomendas_Produtos WHERE id_encomenda = ANY(%s)", [ids])
+                linhas += cur.rowcount
+                cur.execute("DELETE FROM Encomenda WHERE id_encomenda = ANY(%s)", [ids])
+                carrinhos += cur.rowcount
+
+            lotes += 1
+            if self.verbosity > 1:
+                self.stdout.write(f"  lote {lotes}: {len(ids)} carrinhos")
+            if len(ids) < lote:
+                break
+            if pausa:
+                time.sleep(pausa)
+
+        return carrinhos, linhas, lotes
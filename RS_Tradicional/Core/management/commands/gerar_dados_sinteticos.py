@@ -0,0 +1,287 @@
+import csv
+import io
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+
+# distribuição de estados das encomendas geradas (Carrinho tratado à parte)
+ESTADOS = [
+    ("Concluída", 45),
+    ("Enviada", 20),
+    ("Pendente", 15),
+    ("Em processamento", 10),
+    ("Cancelada", 5),
+]
+
+PASSWORD_PADRAO = "bench12345"
+
+
+def _pesos_zipf(n, s):
+    """Pesos 1/rank^s: poucos itens "quentes" concentram a maioria das escolhas."""
+    return [1.0 / ((i + 1) ** s) for i in range(n)]
+
+
+class _CopyBuffer:
+    """Acumula linhas CSV e envia-as com COPY em blocos."""
+
+    def __init__(self, cur, copy_sql, bloco=50_000):
+        self.cur = cur
+        self.copy_sql = copy_sql
+        self.bloco = bloco
+        self.total = 0
+        self._novo()
+
+    def _novo(self):
+        self.buf = io.StringIO()
+        self.writer = csv.writer(self.buf)
+        self.pendentes = 0
+
+    def linha(self, valores):
+        self.writer.writerow(["\\N" if v is None else v for v in valores])
+        self.pendentes += 1
+        if self.pendentes >= self.bloco:
+            self.enviar()
+
+    def enviar(self):
+        if not self.pendentes:
+            return
+        self.buf.seek(0)
+        self.cur.copy_expert(self.copy_sql, self.buf)
+        self.total += self.pendentes
+        self._novo()
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera dados sintéticos (utilizadores, fornecedores, produtos, encomendas e linhas) "
+        "com COPY, com distribuição enviesada (produtos e clientes 'quentes')."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--utilizadores", type=int, default=10_000)
+        parser.add_argument("--fornecedores", type=int, default=200)
+        parser.add_argument("--produtos", type=int, default=5_000)
+        parser.add_argument("--encomendas", type=int, default=100_000)
+        parser.add_argument("--linhas-max", type=int, default=6,
+                            help="Máximo de linhas por encomenda (mínimo 1).")
+        parser.add_argument("--dias", type=int, default=365,
+                            help="Janela temporal das encomendas (dias até hoje).")
+        parser.add_argument("--enviesamento", type=float, default=1.1,
+                            help="Expoente Zipf para produtos/clientes quentes (0 = uniforme).")
+        parser.add_argument("--carrinhos", type=float, default=0.05,
+                            help="Fração de clientes com um Carrinho aberto.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--password", default=PASSWORD_PADRAO,
+                            help="Password comum a todos os utilizadores gerados.")
+
+    def handle(self, *args, **opts):
+        if opts["linhas_max"] < 1:
+            raise CommandError("--linhas-max tem de ser >= 1.")
+
+        rnd = random.Random(opts["seed"])
+        inicio = time.perf_counter()
+
+        with transaction.atomic(), connection.cursor() as cur:
+            tipos = self._tipos(cur)
+            password_hash = make_password(opts["password"])
+
+            clientes = self._utilizadores(cur, rnd, opts["utilizadores"], tipos["cliente"], password_hash)
+            admins = self._utilizadores(cur, rnd, 2, tipos["admin"], password_hash, prefixo="admin")
+            fornecedores = self._fornecedores(cur, rnd, opts["fornecedores"], password_hash)
+            tipos_produto = self._tipos_produto(cur)
+            produtos = self._produtos(cur, rnd, opts["produtos"], tipos_produto, fornecedores)
+            n_enc, n_linhas = self._encomendas(cur, rnd, opts, clientes, produtos)
+
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"Gerados {len(clientes)} clientes, {len(admins)} admins, {len(fornecedores)} fornecedores, "
+            f"{len(produtos)} produtos, {n_enc} encomendas e {n_linhas} linhas em {duracao:.1f}s. "
+            f"Password comum: '{opts['password']}'."
+        ))
+
+    # --------------------------------------------------------------
+
+    def _proximo_id(self, cur, tabela, coluna):
+        cur.execute(f"SELECT COALESCE(MAX({coluna}), 0) + 1 FROM {tabela}")
+        return cur.fetchone()[0]
+
+    def _acertar_sequencia(self, cur, tabela, coluna):
+        cur.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, %s), (SELECT COALESCE(MAX({coluna}), 1) FROM {tabela}))",
+            [tabela.lower(), coluna],
+        )
+
+    def _tipos(self, cur):
+        ids = {}
+        for designacao in ("Admin", "Cliente", "Fornecedor"):
+            cur.execute(
+                "SELECT id_tipo_utilizador FROM Tipo_Utilizador WHERE lower(designacao) = lower(%s) LIMIT 1",
+                [designacao],
+            )
+            row = cur.fetchone()
+            if row is None:
+                cur.execute(
+                    "INSERT INTO Tipo_Utilizador (designacao) VALUES (%s) RETURNING id_tipo_utilizador",
+                    [designacao],
+                )
+                row = cur.fetchone()
+            ids[designacao.lower()] = row[0]
+        return ids
+
+    def _tipos_produto(self, cur):
+        cur.execute("SELECT id_tipo_produto FROM Tipo_Produto")
+        ids = [r[0] for r in cur.fetchall()]
+        if not ids:
+            for designacao in ("Queijos", "Enchidos", "Doces", "Vinhos", "Azeites", "Cabazes"):
+                cur.execute(
+                    "INSERT INTO Tipo_Produto (designacao) VALUES (%s) RETURNING id_tipo_produto",
+                    [designacao],
+                )
+                ids.append(cur.fetchone()[0])
+        return ids
+
+    def _utilizadores(self, cur, rnd, n, id_tipo, password_hash, prefixo="cliente"):
+        primeiro = self._proximo_id(cur, "Utilizador", "id_utilizador")
+        copy = _CopyBuffer(cur, (
+            "COPY Utilizador (id_utilizador, nome, email, password, morada, nif, id_tipo_utilizador) "
+            "FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        ))
+        ids = []
+        for i in range(n):
+            uid = primeiro + i
+            copy.linha([
+                uid,
+                f"{prefixo.capitalize()} {uid}",
+                f"{prefixo}{uid}@bench.rstradicional.pt",
+                password_hash,
+                f"Rua {rnd.randint(1, 500)}, Viseu",
+                f"{500_000_000 + uid:09d}"[-9:],
+                id_tipo,
+            ])
+            ids.append(uid)
+        copy.enviar()
+        self._acertar_sequencia(cur, "Utilizador", "id_utilizador")
+        return ids
+
+    def _fornecedores(self, cur, rnd, n, password_hash):
+        primeiro = self._proximo_id(cur, "Fornecedor", "id_fornecedor")
+        copy = _CopyBuffer(cur, (
+            "COPY Fornecedor (id_fornecedor, nome, contacto, email, nif, isSingular, morada, imagem_fornecedor) "
+            "FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        ))
+        ids = []
+        for i in range(n):
+            fid = primeiro + i
+            singular = rnd.random() < 0.3
+            copy.linha([
+                fid,
+                f"Fornecedor {fid}",
+                f"+3519{rnd.randint(10_000_000, 99_999_999)}",
+                f"fornecedor{fid}@bench.rstradicional.pt",
+                f"{600_000_000 + fid:09d}"[-9:],
+                "t" if singular else "f",
+                None if singular else f"Zona Industrial {fid}",
+                None,
+            ])
+            ids.append(fid)
+        copy.enviar()
+        self._acertar_sequencia(cur, "Fornecedor", "id_fornecedor")
+
+        # o trigger trg_fornecedor_cria_utilizador cria o utilizador com password placeholder
+        cur.execute(
+            "UPDATE Utilizador SET password = %s WHERE email LIKE 'fornecedor%%@bench.rstradicional.pt'",
+            [password_hash],
+        )
+        return ids
+
+    def _produtos(self, cur, rnd, n, tipos_produto, fornecedores):
+        primeiro = self._proximo_id(cur, "Produto", "id_produto")
+        copy = _CopyBuffer(cur, (
+            "COPY Produto (id_produto, nome, descricao, preco, stock, is_approved, estado_produto, "
+            "id_tipo_produto, id_fornecedor) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        ))
+        produtos = []
+        for i in range(n):
+            pid = primeiro + i
+            aprovado = rnd.random() < 0.95
+            preco = round(rnd.lognormvariate(2.3, 0.6), 2)
+            copy.linha([
+                pid,
+                f"Produto {pid}",
+                "Produto tradicional gerado para testes de carga.",
+                f"{preco:.2f}",
+                rnd.randint(0, 5_000),
+                "t" if aprovado else "f",
+                "Ativo" if aprovado else "Pendente",
+                rnd.choice(tipos_produto),
+                rnd.choice(fornecedores) if fornecedores else None,
+            ])
+            produtos.append(pid)
+        copy.enviar()
+        self._acertar_sequencia(cur, "Produto", "id_produto")
+        return produtos
+
+    def _encomendas(self, cur, rnd, opts, clientes, produtos):
+        if not clientes or not produtos:
+            return 0, 0
+
+        s = opts["enviesamento"]
+        pesos_prod = _pesos_zipf(len(produtos), s)
+        pesos_cli = _pesos_zipf(len(clientes), s / 2)
+        # embaralhar para que os ids "quentes" não sejam sempre os primeiros
+        produtos_ord = produtos[:]
+        clientes_ord = clientes[:]
+        rnd.shuffle(produtos_ord)
+        rnd.shuffle(clientes_ord)
+
+        estados = [e for e, _ in ESTADOS]
+        pesos_estados = [p for _, p in ESTADOS]
+        hoje = date.today()
+
+        primeira = self._proximo_id(cur, "Encomenda", "id_encomenda")
+        copy_enc = _CopyBuffer(cur, (
+            "COPY Encomenda (id_encomenda, data_encomenda, id_utilizador, estado_encomenda) "
+            "FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        ))
+        linhas = []
+
+        n = opts["encomendas"]
+        clientes_escolhidos = rnd.choices(clientes_ord, weights=pesos_cli, k=n)
+        estados_escolhidos = rnd.choices(estados, weights=pesos_estados, k=n)
+
+        for i in range(n):
+            eid = primeira + i
+            dias = int(rnd.triangular(0, opts["dias"], 0))  # mais encomendas recentes
+            data = hoje - timedelta(days=dias)
+            copy_enc.linha([eid, data, clientes_escolhidos[i], estados_escolhidos[i]])
+            k = rnd.randint(1, opts["linhas_max"])
+            for pid in set(rnd.choices(produtos_ord, weights=pesos_prod, k=k)):
+                linhas.append((eid, data, pid, rnd.randint(1, 5)))
+
+        # carrinhos abertos (no máximo um por cliente)
+        n_carrinhos = int(len(clientes) * opts["carrinhos"])
+        for j, uid in enumerate(rnd.sample(clientes, n_carrinhos)):
+            eid = primeira + n + j
+            data = hoje - timedelta(days=rnd.randint(0, 90))
+            copy_enc.linha([eid, data, uid, "Carrinho"])
+            for pid in set(rnd.choices(produtos_ord, weights=pesos_prod, k=rnd.randint(1, 3))):
+                linhas.append((eid, data, pid, rnd.randint(1, 3)))
+
+        copy_enc.enviar()
+        self._acertar_sequencia(cur, "Encomenda", "id_encomenda")
+
+        copy_lin = _CopyBuffer(cur, (
+            # com a data: numa BD particionada a linha é encaminhada por ela
+            "COPY Encomendas_Produtos (id_encomenda, data_encomenda, id_produto, quantidade) "
+            "FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        ))
+        for linha in linhas:
+            copy_lin.linha(linha)
+        copy_lin.enviar()
+
+        return copy_enc.total, copy_lin.total
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Core.mongo import get_mongo_db, mongo_disponivel
+from Core.relatorios import SCHEMA_VERSAO, criar_indices_mongo
+
+
+def _dinheiro(expr):
+    # float -> Decimal128 arredondado ao cêntimo (evita 12.300000000000000710...)
+    return {"$round": [{"$toDecimal": expr}, 2]}
+
+
+# versão de origem -> (filtro, pipeline de update executado no servidor)
+MIGRACOES = {
+    # v1: data "YYYY-MM-DD" e valores float (sem campo schema_versao)
+    1: (
+        {"schema_versao": {"$exists": False}},
+        [{"$set": {
+            "data": {"$dateFromString": {"dateString": "$data", "format": "%Y-%m-%d", "timezone": "UTC"}},
+            "total": _dinheiro("$total"),
+            "linhas": {"$map": {
+                "input": {"$ifNull": ["$linhas", []]},
+                "as": "l",
+                "in": {"$mergeObjects": ["$$l", {
+                    "preco": _dinheiro("$$l.preco"),
+                    "subtotal": _dinheiro("$$l.subtotal"),
+                }]},
+            }},
+            "schema_versao": 2,
+        }}],
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Migra os documentos de relatórios no Mongo para o schema atual "
+        f"(versão {SCHEMA_VERSAO}: datas BSON e valores Decimal128). Corre no servidor, sem ler os documentos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Apenas contar os documentos por migrar.")
+
+    def handle(self, *args, **opts):
+        if not mongo_disponivel(forcar=True):
+            raise CommandError("O MongoDB não está disponível.")
+
+        orders = get_mongo_db()["orders"]
+
+        for versao in sorted(MIGRACOES):
+            filtro, pipeline = MIGRACOES[versao]
+            pendentes = orders.count_documents(filtro)
+            if opts["dry_run"]:
+                self.stdout.write(f"v{versao} -> v{versao + 1}: {pendentes} documentos por migrar.")
+                continue
+            if not pendentes:
+                continue
+
+            inicio = time.perf_counter()
+            res = orders.update_many(filtro, pipeline)
+            self.stdout.write(
+                f"v{versao} -> v{versao + 1}: {res.modified_count} documentos em {time.perf_counter() - inicio:.1f}s."
+            )
+
+        if opts["dry_run"]:
+            return
+
+        criar_indices_mongo(orders)
+        antigos = orders.count_documents({"schema_versao": {"$ne": SCHEMA_VERSAO}})
+        if antigos:
+            raise CommandError(f"Ficaram {antigos} documentos noutra versão do schema.")
+        self.stdout.write(self.style.SUCCESS(f"Relatórios no schema v{SCHEMA_VERSAO}."))
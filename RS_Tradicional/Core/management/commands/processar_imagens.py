@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from Core import imagens
+from Core.metricas import registar_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera as variantes WebP/JPEG das imagens guardadas (Core/imagens.py), em lotes "
+        "no pool de processos: as que ainda não têm variantes (ex: carregadas sem o "
+        "Pillow) ou, com --todas, todas (ex: depois de mudar IMAGENS['LARGURAS'])."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--todas", action="store_true")
+        parser.add_argument("--lote", type=int, default=50)
+
+    def handle(self, *args, **opts):
+        if not imagens.pillow_disponivel():
+            raise CommandError("O Pillow não está instalado (pip install pillow).")
+        if opts["lote"] < 1:
+            raise CommandError("--lote tem de ser >= 1.")
+
+        with connection.cursor() as cur:
+            cur.execute(f"""
+                SELECT hash, extensao, tamanho_bytes
+                FROM Imagem
+                {'' if opts['todas'] else "WHERE cardinality(larguras) = 0"}
+                ORDER BY criada_em
+            """)
+            itens = cur.fetchall()
+
+        inicio = time.perf_counter()
+        feitas = 0
+        for i in range(0, len(itens), opts["lote"]):
+            lote = itens[i:i + opts["lote"]]
+            imagens.processar(lote)
+            feitas += len(lote)
+            self.stdout.write(f"  {feitas}/{len(itens)}")
+
+        duracao = time.perf_counter() - inicio
+        registar_job("processar_imagens", duracao, documentos=feitas)
+        self.stdout.write(self.style.SUCCESS(f"{feitas} imagens processadas em {duracao:.1f}s."))
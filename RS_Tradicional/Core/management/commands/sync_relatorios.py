@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Core.relatorios import BACKENDS, obter_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Atualiza os relatórios no backend configurado em RELATORIOS['BACKEND'] "
+        "(sync para o Mongo ou REFRESH das materialized views)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", choices=sorted(BACKENDS),
+                            help="Ignorar a configuração e usar este backend.")
+
+    def handle(self, *args, **opts):
+        try:
+            backend = obter_backend(opts["backend"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        backend.sincronizar()
+        self.stdout.write(self.style.SUCCESS(f"Relatórios atualizados ({backend.nome})."))
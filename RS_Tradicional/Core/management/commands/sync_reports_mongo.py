@@ -1,27 +1,62 @@
-from django.core.management.base import BaseCommand
-from django.db import connection
-from decimal import Decimal
-from datetime import date
-
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+import multiprocessing
+import queue
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from Core.db import fetchall_linhas, iterar
 from Core.mongo import get_mongo_db
-
-
-def fetchall_dicts(sql, params=None):
-    with connection.cursor() as cur:
-        cur.execute(sql, params or [])
-        cols = [c[0] for c in cur.description]
-        return [dict(zip(cols, row)) for row in cur.fetchall()]
-
-
-class Command(BaseCommand):
-    help = "Sync reports data from Postgres views to MongoDB"
-
-    def handle(self, *args, **options):
-        db = get_mongo_db()
-        orders = db["orders"]
-
+from Core.relatorios import criar_indices_mongo, dinheiro, documento_encomenda
+from Core.metricas import registar_job
+
+
+def _inicializar_processo():
+    # com "spawn" (macOS/Windows) o processo filho começa sem o Django carregado
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _mapas_fornecedor():
+    # lidos em blocos direto para os dicionários, sem lista intermédia
+    # Produto -> fornecedor
+    prod_map = iterar("""
+        SELECT id_produto, id_fornecedor
+        FROM vw_admin_produtos
+    """)
+    # Fornecedor -> nome (para top fornecedores no dashboard)
+    forn_map = iterar("""
+        SELECT id_fornecedor, nome
+        FROM vw_fornecedores
+    """)
+    return (
+        {p.id_produto: p.id_fornecedor for p in prod_map},
+        {f.id_fornecedor: f.nome for f in forn_map},
+    )
+
+
+def _sincronizar_intervalo(worker, id_min, id_max, lote, avisar=None):
+    """
+    Sincroniza as encomendas com id entre id_min e id_max (inclusive).
+    Em modo paralelo corre num thread ou processo próprio (ver _worker), com
+    a sua ligação ao Postgres. Lê e escreve em lotes de `lote` encomendas
+    (keyset por id_encomenda + um bulk_write por lote). `avisar(texto)`
+    recebe o progresso de cada lote.
+    """
+    from pymongo import UpdateOne
+
+    inicio = time.perf_counter()
+    total = 0
+    orders = get_mongo_db()["orders"]
+    prod_to_fornecedor, fornecedor_nome = _mapas_fornecedor()
+
+    ultimo = id_min - 1
+    while True:
         # Cabeçalhos (admin) - exclui Carrinho
-        encomendas = fetchall_dicts("""
+        encomendas = fetchall_linhas("""
             SELECT
                 id_encomenda,
                 data_encomenda,
@@ -31,10 +66,20 @@ class Command(BaseCommand):
                 utilizador_email
             FROM vw_admin_encomendas
             WHERE estado_encomenda <> 'Carrinho'
-        """)
-
-        # Linhas (produto + preço + quantidade)
-        linhas = fetchall_dicts("""
+              AND id_encomenda > %s
+              AND id_encomenda <= %s
+            ORDER BY id_encomenda
+            LIMIT %s
+        """, [ultimo, id_max, lote])
+        if not encomendas:
+            break
+
+        primeiro, ultimo = encomendas[0].id_encomenda, encomendas[-1].id_encomenda
+        datas = [e.data_encomenda for e in encomendas]
+
+        # Linhas (produto + preço + quantidade) só deste lote; as datas do lote
+        # limitam a leitura às partições desses meses
+        linhas = fetchall_linhas("""
             SELECT
                 id_encomenda,
                 id_produto,
@@ -42,72 +87,169 @@ class Command(BaseCommand):
                 produto_nome,
                 produto_preco
             FROM vw_encomendas_produtos
-        """)
-
-        # Produto -> fornecedor
-        prod_map = fetchall_dicts("""
-            SELECT id_produto, id_fornecedor
-            FROM vw_admin_produtos
-        """)
-        prod_to_fornecedor = {p["id_produto"]: p["id_fornecedor"] for p in prod_map}
-
-        # Fornecedor -> nome (para top fornecedores no dashboard)
-        forn_map = fetchall_dicts("""
-            SELECT id_fornecedor, nome
-            FROM vw_fornecedores
-        """)
-        fornecedor_nome = {f["id_fornecedor"]: f["nome"] for f in forn_map}
-
-        # Agrupar linhas por encomenda
+            WHERE id_encomenda BETWEEN %s AND %s
+              AND data_encomenda BETWEEN %s AND %s
+        """, [primeiro, ultimo, min(datas), max(datas)])
+
+        # Agrupar linhas por encomenda (valores em Decimal; Decimal128 no documento)
         linhas_por_encomenda = {}
         for l in linhas:
-            eid = l["id_encomenda"]
-            preco = Decimal(str(l["produto_preco"])) if l["produto_preco"] is not None else Decimal("0")
-            qtd = int(l["quantidade"] or 0)
-            subtotal = float(preco * qtd)
-
-            fid = prod_to_fornecedor.get(l["id_produto"])
-            linhas_por_encomenda.setdefault(eid, []).append({
-                "id_produto": l["id_produto"],
-                "nome": l["produto_nome"],
-                "preco": float(preco),
+            preco = dinheiro(l.produto_preco)
+            qtd = int(l.quantidade or 0)
+
+            fid = prod_to_fornecedor.get(l.id_produto)
+            linhas_por_encomenda.setdefault(l.id_encomenda, []).append({
+                "id_produto": l.id_produto,
+                "nome": l.produto_nome,
+                "preco": preco,
                 "quantidade": qtd,
-                "subtotal": subtotal,
+                "subtotal": preco * qtd,
                 "id_fornecedor": fid,
                 "fornecedor_nome": fornecedor_nome.get(fid),
             })
 
-        # Upsert no Mongo
+        operacoes = []
         for e in encomendas:
-            eid = e["id_encomenda"]
-            doc_linhas = linhas_por_encomenda.get(eid, [])
-            total = sum(x["subtotal"] for x in doc_linhas)
-
-            data_enc = e["data_encomenda"]
-            # guardar data como string para facilitar group-by no Mongo
-            data_str = data_enc.isoformat() if isinstance(data_enc, date) else str(data_enc)
-
-            doc = {
-                "_id": eid,
-                "id_encomenda": eid,
-                "data": data_str,
-                "estado": e["estado_encomenda"],
-                "cliente": {
-                    "id": e["id_utilizador"],
-                    "nome": e["utilizador_nome"],
-                    "email": e["utilizador_email"],
-                },
-                "linhas": doc_linhas,
-                "total": float(total),
-            }
-
-            orders.update_one({"_id": eid}, {"$set": doc}, upsert=True)
-
-        # Índices úteis
-        orders.create_index("data")
-        orders.create_index("estado")
-        orders.create_index("cliente.id")
-        orders.create_index("linhas.id_produto")
-        orders.create_index("linhas.id_fornecedor")
-
-        self.stdout.write(self.style.SUCCESS("Sync Mongo concluído com sucesso."))
+            doc = documento_encomenda(e, linhas_por_encomenda.get(e.id_encomenda, []))
+            operacoes.append(UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True))
+        orders.bulk_write(operacoes, ordered=False)
+
+        total += len(encomendas)
+        if avisar is not None:
+            dur = time.perf_counter() - inicio
+            avisar(
+                f"[worker {worker}] {total} encomendas (até #{ultimo} de {id_max}) "
+                f"· {total / dur if dur else 0:.0f} docs/s"
+            )
+
+    return {"worker": worker, "id_min": id_min, "id_max": id_max,
+            "documentos": total, "duracao": time.perf_counter() - inicio}
+
+
+def _worker(worker, id_min, id_max, lote, fila):
+    # o progresso volta ao comando por uma fila: só ele escreve no self.stdout
+    avisar = fila.put if fila is not None else None
+    try:
+        return _sincronizar_intervalo(worker, id_min, id_max, lote, avisar)
+    finally:
+        # threads/processos do pool não passam pelo request_finished
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Sync reports data from Postgres views to MongoDB"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Número de workers; cada um sincroniza um intervalo de id_encomenda.")
+        parser.add_argument("--modo", choices=["processos", "threads"], default="processos",
+                            help="Pool de processos (usa vários cores) ou de threads.")
+        parser.add_argument("--lote", type=int, default=2000,
+                            help="Encomendas lidas e escritas (bulk_write) de cada vez.")
+        parser.add_argument("--recriar", action="store_true",
+                            help="Apagar a coleção antes (reconstrução total, ex: após mudar o schema).")
+        parser.add_argument("--progresso", action="store_true",
+                            help="Mostrar o progresso de cada worker a cada lote.")
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["lote"] < 1:
+            raise CommandError("--workers e --lote têm de ser >= 1.")
+
+        inicio = time.perf_counter()
+        try:
+            resultados = self._sincronizar(options)
+        except Exception:
+            registar_job("sync_reports_mongo", time.perf_counter() - inicio, sucesso=False)
+            raise
+        duracao = time.perf_counter() - inicio
+        total_docs = sum(r["documentos"] for r in resultados)
+        registar_job("sync_reports_mongo", duracao, documentos=total_docs)
+
+        if len(resultados) > 1:
+            for r in sorted(resultados, key=lambda r: r["worker"]):
+                taxa = r["documentos"] / r["duracao"] if r["duracao"] else 0
+                self.stdout.write(
+                    f"  worker {r['worker']}: #{r['id_min']}–#{r['id_max']} · {r['documentos']} docs "
+                    f"em {r['duracao']:.1f}s ({taxa:.0f} docs/s)"
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f"Sync Mongo concluído com sucesso: {total_docs} documentos em {duracao:.1f}s "
+            f"({total_docs / duracao if duracao else 0:.0f} docs/s)."
+        ))
+
+    def _intervalos(self, n):
+        """Divide os ids (sem carrinhos) em n intervalos com o mesmo número de encomendas."""
+        if n == 1:
+            with connection.cursor() as cur:
+                cur.execute("SELECT MIN(id_encomenda), MAX(id_encomenda) FROM Encomenda WHERE estado_encomenda <> 'Carrinho'")
+                id_min, id_max = cur.fetchone()
+            return [] if id_min is None else [(id_min, id_max)]
+
+        fracoes = [i / n for i in range(n + 1)]
+        with connection.cursor() as cur:
+            cur.execute("""
+                SELECT percentile_disc(%s::float8[]) WITHIN GROUP (ORDER BY id_encomenda)
+                FROM Encomenda
+                WHERE estado_encomenda <> 'Carrinho'
+            """, [fracoes])
+            limites = cur.fetchone()[0]
+        if not limites or limites[0] is None:
+            return []
+
+        intervalos = []
+        anterior = limites[0] - 1
+        for limite in limites[1:]:
+            if limite > anterior:
+                intervalos.append((anterior + 1, limite))
+                anterior = limite
+        return intervalos
+
+    def _sincronizar(self, options):
+        db = get_mongo_db()
+        orders = db["orders"]
+        if options["recriar"]:
+            orders.drop()
+
+        intervalos = self._intervalos(options["workers"])
+        lote, progresso = options["lote"], options["progresso"]
+
+        if len(intervalos) <= 1:
+            avisar = self.stdout.write if progresso else None
+            resultados = [_sincronizar_intervalo(1, a, b, lote, avisar) for a, b in intervalos]
+        elif options["modo"] == "processos":
+            # as ligações abertas não podem ser herdadas pelos processos filhos
+            connections.close_all()
+            contexto = multiprocessing.get_context("fork" if sys.platform.startswith("linux") else "spawn")
+            with contexto.Manager() as gestor:
+                fila = gestor.Queue() if progresso else None
+                pool = ProcessPoolExecutor(len(intervalos), mp_context=contexto, initializer=_inicializar_processo)
+                resultados = self._executar(pool, intervalos, lote, fila)
+        else:
+            fila = queue.Queue() if progresso else None
+            resultados = self._executar(ThreadPoolExecutor(len(intervalos)), intervalos, lote, fila)
+
+        criar_indices_mongo(orders)
+        return resultados
+
+    def _executar(self, pool, intervalos, lote, fila):
+        """Um _worker por intervalo; escreve o progresso que chega pela fila enquanto esperam."""
+        with pool:
+            pendentes = [
+                pool.submit(_worker, i, a, b, lote, fila)
+                for i, (a, b) in enumerate(intervalos, start=1)
+            ]
+            futuros = list(pendentes)
+            while pendentes:
+                _feitos, pendentes = wait(pendentes, timeout=0.5)
+                self._escrever_progresso(fila)
+        self._escrever_progresso(fila)
+        return [f.result() for f in futuros]
+
+    def _escrever_progresso(self, fila):
+        if fila is None:
+            return
+        while True:
+            try:
+                self.stdout.write(fila.get_nowait())
+            except queue.Empty:
+                return
@@ -0,0 +1,508 @@
+"""
+Métricas no formato de texto do Prometheus, sem serviços externos.
+
+Cada processo (ex: worker do gunicorn) acumula contadores/histogramas em
+memória e escreve-os periodicamente para METRICAS["DIRETORIO"]/proc-<pid>.json
+(escrita atómica via rename). O endpoint /metrics lê todos os ficheiros e
+agrega-os; os ficheiros de processos que já morreram são somados a
+agregado.json e apagados, para os contadores nunca andarem para trás. Os jobs (ex: sync_reports_mongo) correm noutro processo e
+escrevem job-<nome>.json com os dados da última execução.
+"""
+import atexit
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection, DatabaseError
+from django.db.backends.signals import connection_created
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows (só o runserver de desenvolvimento)
+    fcntl = None
+
+
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+AJUDA = {
+    "rs_http_requests_total": ("counter", "Pedidos HTTP por url_name, método e status."),
+    "rs_http_request_errors_total": ("counter", "Pedidos HTTP com status >= 500."),
+    "rs_http_request_duration_seconds": ("histogram", "Latência dos pedidos HTTP por url_name."),
+    "rs_procedure_calls_total": ("counter", "Chamadas a stored procedures via _safe_callproc."),
+    "rs_procedure_errors_total": ("counter", "Chamadas a stored procedures que falharam."),
+    "rs_procedure_duration_seconds": ("histogram", "Duração das stored procedures."),
+    "rs_db_connections_open": ("gauge", "Ligações Django abertas (soma dos processos vivos)."),
+    "rs_db_server_connections": ("gauge", "Ligações no servidor Postgres por estado (pg_stat_activity)."),
+    "rs_job_last_duration_seconds": ("gauge", "Duração da última execução do job."),
+    "rs_job_last_documents": ("gauge", "Documentos/linhas processados na última execução do job."),
+    "rs_job_last_run_timestamp_seconds": ("gauge", "Instante (epoch) da última execução do job."),
+    "rs_job_last_success": ("gauge", "1 se a última execução do job terminou sem erro."),
+    "rs_cache_pedidos_total": ("counter", "Leituras da cache com invalidação (hit/miss)."),
+    "rs_cache_invalidacoes_total": ("counter", "Notificações de alteração recebidas por tabela (LISTEN rs_cache)."),
+    "rs_cache_calculos_total": ("counter", "Leituras da cache de cálculos caros por resultado (hit, stale, xfetch, miss, esperou, ...)."),
+    "rs_sql_preparadas_total": ("counter", "Execuções de statements preparados (Core/db.py) por resultado: hit (já preparado na ligação), prepare, invalidada."),
+}
+
+
+def _config():
+    cfg = getattr(settings, "METRICAS", {}) or {}
+    return {
+        "ATIVAS": cfg.get("ATIVAS", True),
+        "DIRETORIO": str(cfg.get("DIRETORIO") or os.path.join(tempfile.gettempdir(), "rs_tradicional_metricas")),
+        "INTERVALO_FLUSH": cfg.get("INTERVALO_FLUSH", 5),
+        "IPS_PERMITIDOS": cfg.get("IPS_PERMITIDOS"),
+        "TOKEN": cfg.get("TOKEN"),
+    }
+
+
+def _escrever_json_atomico(caminho, dados):
+    pasta = os.path.dirname(caminho)
+    os.makedirs(pasta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=pasta, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(dados, f)
+        os.replace(tmp, caminho)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def _arranque_processo(pid):
+    """Instante de arranque do processo (em ticks, /proc/<pid>/stat) ou None fora do Linux."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # o nome do comando pode ter espaços: os campos contam a partir do último ')'
+            return int(f.read().rsplit(")", 1)[1].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RegistoMetricas:
+    """Métricas do processo atual."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._arranque = _arranque_processo(self._pid)
+        # um PID reutilizado não pode escrever por cima do ficheiro do processo antigo
+        self._ficheiro = f"proc-{self._pid}-{self._arranque or uuid.uuid4().hex[:12]}.json"
+        self._ultimo_flush = 0.0
+        self.contadores = {}
+        self.histogramas = {}
+        self.gauges = {}
+
+    def _verificar_fork(self):
+        # depois de um fork (gunicorn --preload) o filho começa do zero
+        if os.getpid() != self._pid:
+            self.__init__()
+
+    def incrementar(self, nome, labels, valor=1):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            self._verificar_fork()
+            self.contadores[chave] = self.contadores.get(chave, 0) + valor
+
+    def observar(self, nome, labels, valor, buckets=BUCKETS_PADRAO):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            self._verificar_fork()
+            h = self.histogramas.get(chave)
+            if h is None:
+                h = {"buckets": list(buckets), "contagens": [0] * len(buckets), "soma": 0.0, "total": 0}
+                self.histogramas[chave] = h
+            for i, limite in enumerate(h["buckets"]):
+                if valor <= limite:
+                    h["contagens"][i] += 1
+            h["soma"] += valor
+            h["total"] += 1
+
+    def definir(self, nome, labels, valor):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            self._verificar_fork()
+            self.gauges[chave] = valor
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": self._pid,
+                "arranque": self._arranque,
+                "contadores": [[n, list(map(list, l)), v] for (n, l), v in self.contadores.items()],
+                "histogramas": [[n, list(map(list, l)), h] for (n, l), h in self.histogramas.items()],
+                "gauges": [[n, list(map(list, l)), v] for (n, l), v in self.gauges.items()],
+            }
+
+    def flush_pendente(self):
+        """True se já passou INTERVALO_FLUSH desde a última escrita."""
+        return time.monotonic() - self._ultimo_flush >= _config()["INTERVALO_FLUSH"]
+
+    def flush(self, forcar=False):
+        cfg = _config()
+        agora = time.monotonic()
+        if not forcar and agora - self._ultimo_flush < cfg["INTERVALO_FLUSH"]:
+            return
+        self._ultimo_flush = agora
+        with self._lock:
+            self._verificar_fork()
+            nome = self._ficheiro
+        _escrever_json_atomico(os.path.join(cfg["DIRETORIO"], nome), self.snapshot())
+
+
+registo = RegistoMetricas()
+
+
+@atexit.register
+def _flush_ao_sair():
+    if _config()["ATIVAS"]:
+        registo.flush(forcar=True)
+
+
+# ligações Django de todos os threads do processo (cada thread, e cada
+# sync_to_async sob ASGI, tem a sua); saem quando o thread acaba
+_ligacoes = weakref.WeakSet()
+_ligacoes_lock = threading.Lock()
+
+
+def _ao_criar_ligacao(sender, connection, **kwargs):
+    with _ligacoes_lock:
+        _ligacoes.add(connection)
+
+
+connection_created.connect(_ao_criar_ligacao, dispatch_uid="Core.metricas")
+
+
+def ligacoes_abertas():
+    """Ligações Django abertas neste processo, em todos os threads."""
+    with _ligacoes_lock:
+        ligacoes = list(_ligacoes)
+    return sum(1 for ligacao in ligacoes if ligacao.connection is not None)
+
+
+# ------------------------------------------------------------------
+# API usada pelo resto do projeto
+# ------------------------------------------------------------------
+
+def registar_procedure(nome, duracao, ok):
+    if not _config()["ATIVAS"]:
+        return
+    registo.incrementar("rs_procedure_calls_total", {"procedure": nome})
+    if not ok:
+        registo.incrementar("rs_procedure_errors_total", {"procedure": nome})
+    registo.observar("rs_procedure_duration_seconds", {"procedure": nome}, duracao)
+    registo.flush()
+
+
+def registar_job(nome, duracao, documentos=None, sucesso=True):
+    """Guarda os dados da última execução de um job (ex: sync_reports_mongo)."""
+    if not _config()["ATIVAS"]:
+        return
+    caminho = os.path.join(_config()["DIRETORIO"], f"job-{nome}.json")
+    _escrever_json_atomico(caminho, {
+        "job": nome,
+        "duracao": duracao,
+        "documentos": documentos,
+        "sucesso": bool(sucesso),
+        "instante": time.time(),
+    })
+
+
+class MetricasMiddleware:
+    """Latência, contagem e erros por url_name (ver Core/urls.py)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # sob ASGI a cadeia é async: sem adaptar, cada pedido passava por um thread
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        if not _config()["ATIVAS"]:
+            return self.get_response(request)
+
+        inicio = time.perf_counter()
+        response = self.get_response(request)
+        self._registar(request, response, time.perf_counter() - inicio)
+        return response
+
+    async def __acall__(self, request):
+        if not _config()["ATIVAS"]:
+            return await self.get_response(request)
+
+        inicio = time.perf_counter()
+        response = await self.get_response(request)
+        self._registar(request, response, time.perf_counter() - inicio, flush=False)
+        # a escrita do ficheiro bloqueava o event loop: num thread, e só quando toca
+        if registo.flush_pendente():
+            await sync_to_async(registo.flush, thread_sensitive=False)()
+        return response
+
+    def _registar(self, request, response, duracao, flush=True):
+        match = getattr(request, "resolver_match", None)
+        url_name = (match.url_name if match else None) or "desconhecido"
+
+        registo.incrementar("rs_http_requests_total", {
+            "url_name": url_name,
+            "method": request.method,
+            "status": str(response.status_code),
+        })
+        if response.status_code >= 500:
+            registo.incrementar("rs_http_request_errors_total", {"url_name": url_name})
+        registo.observar("rs_http_request_duration_seconds", {"url_name": url_name}, duracao)
+
+        registo.definir("rs_db_connections_open", {}, ligacoes_abertas())
+
+        if flush:
+            registo.flush()
+
+
+# ------------------------------------------------------------------
+# Agregação / exportação
+# ------------------------------------------------------------------
+
+def _pid_vivo(pid):
+    if not isinstance(pid, int) or pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _processo_vivo(proc):
+    pid = proc.get("pid", -1)
+    if not _pid_vivo(pid):
+        return False
+    # PID reutilizado por outro processo: o arranque não bate certo
+    arranque = proc.get("arranque")
+    if arranque is not None:
+        atual = _arranque_processo(pid)
+        if atual is not None and atual != arranque:
+            return False
+    return True
+
+
+@contextmanager
+def _travao_diretorio(diretorio):
+    """Exclusão entre scrapes concorrentes (um por worker) ao juntar os processos mortos."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(diretorio, exist_ok=True)
+    with open(os.path.join(diretorio, ".travao"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _ler_json(caminho):
+    try:
+        with open(caminho) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _ler_ficheiros(diretorio):
+    """([(caminho, dados)] dos processos, [dados] dos jobs)."""
+    procs, jobs = [], []
+    try:
+        nomes = os.listdir(diretorio)
+    except FileNotFoundError:
+        return procs, jobs
+
+    for nome in nomes:
+        if not nome.endswith(".json"):
+            continue
+        caminho = os.path.join(diretorio, nome)
+        dados = _ler_json(caminho)
+        if dados is None:
+            continue
+        if nome.startswith("proc-"):
+            procs.append((caminho, dados))
+        elif nome.startswith("job-"):
+            jobs.append(dados)
+    return procs, jobs
+
+
+def _acumular(contadores, histogramas, dados):
+    for nome, labels, valor in dados.get("contadores", []):
+        chave = (nome, tuple(map(tuple, labels)))
+        contadores[chave] = contadores.get(chave, 0) + valor
+    for nome, labels, h in dados.get("histogramas", []):
+        chave = (nome, tuple(map(tuple, labels)))
+        acc = histogramas.get(chave)
+        if acc is None:
+            acc = {"buckets": h["buckets"], "contagens": [0] * len(h["buckets"]), "soma": 0.0, "total": 0}
+            histogramas[chave] = acc
+        if acc["buckets"] == h["buckets"]:
+            acc["contagens"] = [a + b for a, b in zip(acc["contagens"], h["contagens"])]
+        acc["soma"] += h["soma"]
+        acc["total"] += h["total"]
+
+
+def _recolher_mortos(diretorio, procs):
+    """
+    Soma os contadores/histogramas dos processos mortos a agregado.json e
+    apaga os ficheiros deles. Devolve (dados dos processos vivos, agregado).
+    Chamar com _travao_diretorio() adquirido.
+    """
+    caminho = os.path.join(diretorio, "agregado.json")
+    agregado = _ler_json(caminho) or {}
+    vivos, mortos = [], []
+    for c, dados in procs:
+        if _processo_vivo(dados):
+            vivos.append(dados)
+        else:
+            mortos.append((c, dados))
+    if not mortos:
+        return vivos, agregado
+
+    contadores, histogramas = {}, {}
+    _acumular(contadores, histogramas, agregado)
+    for _, dados in mortos:
+        _acumular(contadores, histogramas, dados)
+    agregado = {
+        "contadores": [[n, list(map(list, l)), v] for (n, l), v in contadores.items()],
+        "histogramas": [[n, list(map(list, l)), h] for (n, l), h in histogramas.items()],
+    }
+    # só apaga depois de o agregado estar escrito
+    if _escrever_json_atomico(caminho, agregado):
+        for c, _ in mortos:
+            try:
+                os.unlink(c)
+            except FileNotFoundError:
+                pass
+    else:
+        vivos += [dados for _, dados in mortos]
+    return vivos, agregado
+
+
+def _fmt_labels(labels):
+    if not labels:
+        return ""
+    partes = []
+    for k, v in labels:
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        partes.append(f'{k}="{v}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _fmt_num(v):
+    if isinstance(v, float) and v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _gauges_servidor():
+    """Ligações no Postgres por estado (uma query, só no scrape)."""
+    try:
+        with connection.cursor() as cur:
+            cur.execute("""
+                SELECT COALESCE(state, 'desconhecido'), COUNT(*)
+                FROM pg_stat_activity
+                WHERE datname = current_database()
+                GROUP BY 1
+            """)
+            return cur.fetchall()
+    except DatabaseError:
+        return []
+
+
+def exportar_texto():
+    cfg = _config()
+    registo.flush(forcar=True)
+    with _travao_diretorio(cfg["DIRETORIO"]):
+        procs, jobs = _ler_ficheiros(cfg["DIRETORIO"])
+        vivos, agregado = _recolher_mortos(cfg["DIRETORIO"], procs)
+
+    contadores, histogramas, gauges = {}, {}, {}
+
+    _acumular(contadores, histogramas, agregado)
+    for proc in vivos:
+        _acumular(contadores, histogramas, proc)
+        # gauges só dos processos vivos
+        for nome, labels, valor in proc.get("gauges", []):
+            chave = (nome, tuple(map(tuple, labels)))
+            gauges[chave] = gauges.get(chave, 0) + valor
+
+    for estado, total in _gauges_servidor():
+        gauges[("rs_db_server_connections", (("state", estado),))] = total
+
+    for job in jobs:
+        labels = (("job", job.get("job")),)
+        gauges[("rs_job_last_duration_seconds", labels)] = job.get("duracao") or 0
+        gauges[("rs_job_last_run_timestamp_seconds", labels)] = job.get("instante") or 0
+        gauges[("rs_job_last_success", labels)] = 1 if job.get("sucesso") else 0
+        if job.get("documentos") is not None:
+            gauges[("rs_job_last_documents", labels)] = job["documentos"]
+
+    linhas = []
+    vistos = set()
+
+    def cabecalho(nome):
+        if nome in vistos:
+            return
+        vistos.add(nome)
+        tipo, ajuda = AJUDA.get(nome, ("untyped", nome))
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+
+    for (nome, labels), valor in sorted(contadores.items()):
+        cabecalho(nome)
+        linhas.append(f"{nome}{_fmt_labels(labels)} {_fmt_num(valor)}")
+
+    for (nome, labels), h in sorted(histogramas.items()):
+        cabecalho(nome)
+        for limite, contagem in zip(h["buckets"], h["contagens"]):
+            linhas.append(f"{nome}_bucket{_fmt_labels(labels + (('le', _fmt_num(float(limite))),))} {contagem}")
+        linhas.append(f"{nome}_bucket{_fmt_labels(labels + (('le', '+Inf'),))} {h['total']}")
+        linhas.append(f"{nome}_sum{_fmt_labels(labels)} {_fmt_num(float(h['soma']))}")
+        linhas.append(f"{nome}_count{_fmt_labels(labels)} {h['total']}")
+
+    for (nome, labels), valor in sorted(gauges.items()):
+        cabecalho(nome)
+        linhas.append(f"{nome}{_fmt_labels(labels)} {_fmt_num(valor)}")
+
+    return "\n".join(linhas) + "\n"
+
+
+def pedido_autorizado(request):
+    """
+    Com METRICAS["TOKEN"] exige "Authorization: Bearer <token>". Sem token o
+    /metrics só responde em DEBUG: atrás de um proxy o REMOTE_ADDR é o do
+    proxy, por isso IPS_PERMITIDOS sozinho não chega para o proteger.
+    """
+    cfg = _config()
+    if cfg["TOKEN"]:
+        enviado = request.META.get("HTTP_AUTHORIZATION", "")
+        if not hmac.compare_digest(enviado.encode(), f"Bearer {cfg['TOKEN']}".encode()):
+            return False
+    elif not settings.DEBUG:
+        return False
+
+    ips = cfg["IPS_PERMITIDOS"]
+    return not ips or request.META.get("REMOTE_ADDR") in ips
@@ -1,13 +1,147 @@
+"""
+Gestão dos clientes MongoDB (relatórios).
+
+Os clientes são criados na primeira utilização e guardados por processo:
+depois de um fork (ex: gunicorn --preload) o filho cria o seu próprio
+MongoClient em vez de reutilizar o do pai, como o pymongo exige.
+As opções (pool, timeouts, read preference, compressão) vêm de settings.MONGO.
+
+As views async (Core/assincrono.py) usam get_mongo_db_async(): um
+AsyncMongoClient do pymongo por event loop, com as mesmas opções.
+
+`mongo_disponivel()` é uma verificação rápida (timeout curto e resultado em
+cache durante uns segundos) para as páginas poderem degradar sem ficarem
+presas à espera do server selection timeout.
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+
 from django.conf import settings
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 
-_clients = {}
+from Core.instrumentacao import MonitorMongo
 
-def get_mongo_db():
+
+_lock = threading.Lock()
+_clients = {}   # nome -> (pid, MongoClient)
+_saude = {}     # nome -> (pid, instante, disponivel)
+_clients_async = weakref.WeakKeyDictionary()  # event loop -> (pid, AsyncMongoClient)
+
+
+def _config():
     cfg = settings.MONGO
-    name = cfg.get("CLIENT_NAME", "default")
+    return {
+        "CLIENT_NAME": cfg.get("CLIENT_NAME", "default"),
+        "URI": cfg["URI"],
+        "DB_NAME": cfg["DB_NAME"],
+        "MAX_POOL_SIZE": int(cfg.get("MAX_POOL_SIZE", 20)),
+        "MIN_POOL_SIZE": int(cfg.get("MIN_POOL_SIZE", 0)),
+        "CONNECT_TIMEOUT_MS": int(cfg.get("CONNECT_TIMEOUT_MS", 2000)),
+        "SOCKET_TIMEOUT_MS": int(cfg.get("SOCKET_TIMEOUT_MS", 10000)),
+        "SERVER_SELECTION_TIMEOUT_MS": int(cfg.get("SERVER_SELECTION_TIMEOUT_MS", 2000)),
+        "READ_PREFERENCE": cfg.get("READ_PREFERENCE", "primary"),
+        "COMPRESSORS": cfg.get("COMPRESSORS") or None,
+        "APP_NAME": cfg.get("APP_NAME", "rs_tradicional"),
+        "SAUDE_TIMEOUT_MS": int(cfg.get("SAUDE_TIMEOUT_MS", 300)),
+        "SAUDE_CACHE_SEGUNDOS": float(cfg.get("SAUDE_CACHE_SEGUNDOS", 10)),
+    }
+
+
+def _opcoes(cfg):
+    opcoes = {
+        "maxPoolSize": cfg["MAX_POOL_SIZE"],
+        "minPoolSize": cfg["MIN_POOL_SIZE"],
+        "connectTimeoutMS": cfg["CONNECT_TIMEOUT_MS"],
+        "socketTimeoutMS": cfg["SOCKET_TIMEOUT_MS"],
+        "serverSelectionTimeoutMS": cfg["SERVER_SELECTION_TIMEOUT_MS"],
+        "readPreference": cfg["READ_PREFERENCE"],
+        "appname": cfg["APP_NAME"],
+        "event_listeners": [MonitorMongo()],
+    }
+    if cfg["COMPRESSORS"]:
+        opcoes["compressors"] = cfg["COMPRESSORS"]
+    return opcoes
+
+
+def get_mongo_client():
+    cfg = _config()
+    nome = cfg["CLIENT_NAME"]
+    pid = os.getpid()
+
+    atual = _clients.get(nome)
+    if atual is not None and atual[0] == pid:
+        return atual[1]
+
+    with _lock:
+        atual = _clients.get(nome)
+        if atual is None or atual[0] != pid:
+            # o cliente herdado do pai (se existir) não é fechado aqui:
+            # os sockets são partilhados com o processo pai
+            _clients[nome] = (pid, MongoClient(cfg["URI"], **_opcoes(cfg)))
+        return _clients[nome][1]
+
+
+def get_mongo_db():
+    return get_mongo_client()[_config()["DB_NAME"]]
+
+
+def mongo_async_disponivel():
+    """True se o pymongo instalado tem a API async (AsyncMongoClient, 4.10+)."""
+    try:
+        from pymongo import AsyncMongoClient  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_mongo_db_async():
+    """Base de dados dos relatórios num AsyncMongoClient do event loop atual."""
+    from pymongo import AsyncMongoClient
+
+    cfg = _config()
+    loop = asyncio.get_running_loop()
+    pid = os.getpid()
+    atual = _clients_async.get(loop)
+    if atual is None or atual[0] != pid:
+        # o cliente async fica preso ao loop onde faz a primeira operação
+        atual = (pid, AsyncMongoClient(cfg["URI"], **_opcoes(cfg)))
+        _clients_async[loop] = atual
+    return atual[1][cfg["DB_NAME"]]
+
+
+def mongo_disponivel(forcar=False):
+    """
+    True se o Mongo responde a um ping dentro de SAUDE_TIMEOUT_MS.
+    O resultado fica em cache SAUDE_CACHE_SEGUNDOS por processo.
+    """
+    cfg = _config()
+    nome = cfg["CLIENT_NAME"]
+    pid = os.getpid()
+    agora = time.monotonic()
+
+    cache = _saude.get(nome)
+    if not forcar and cache and cache[0] == pid and agora - cache[1] < cfg["SAUDE_CACHE_SEGUNDOS"]:
+        return cache[2]
 
-    if name not in _clients:
-        _clients[name] = MongoClient(cfg["URI"])
+    # cliente próprio com timeouts curtos, para não herdar os do cliente principal
+    timeout = cfg["SAUDE_TIMEOUT_MS"]
+    try:
+        with MongoClient(
+            cfg["URI"],
+            serverSelectionTimeoutMS=timeout,
+            connectTimeoutMS=timeout,
+            socketTimeoutMS=timeout,
+            maxPoolSize=1,
+            appname=f"{cfg['APP_NAME']}-saude",
+        ) as sonda:
+            sonda.admin.command("ping")
+        disponivel = True
+    except PyMongoError:
+        disponivel = False
 
-    return _clients[name][cfg["DB_NAME"]]
+    _saude[nome] = (pid, agora, disponivel)
+    return disponivel
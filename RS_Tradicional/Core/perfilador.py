@@ -0,0 +1,184 @@
+"""
+Profiling opcional de pedidos em produção.
+
+Com PERFILADOR["ATIVO"] o middleware corre o cProfile numa fração
+(PERFILADOR["AMOSTRAGEM"]) dos pedidos, ou sempre que um admin envia o
+header PERFILADOR["HEADER"]. Cada perfil é guardado como JSON em
+PERFILADOR["DIRETORIO"] com as funções mais pesadas e as queries mais
+lentas (vindas de Core.instrumentacao). A página admin/perfis/ lista-os.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from Core.instrumentacao import estatisticas_atuais
+
+# Um perfil de cada vez por processo: desde o Python 3.12 o cProfile usa o
+# sys.monitoring, que só aceita um profiler ativo, e o enable() de um segundo
+# pedido concorrente falhava com "Another profiling tool is already active".
+_perfilando = threading.Lock()
+
+
+def _config():
+    cfg = getattr(settings, "PERFILADOR", {}) or {}
+    return {
+        "ATIVO": cfg.get("ATIVO", False),
+        "AMOSTRAGEM": float(cfg.get("AMOSTRAGEM", 0.0)),
+        "HEADER": cfg.get("HEADER", "X-RS-Profile"),
+        "DIRETORIO": str(cfg.get("DIRETORIO") or os.path.join(tempfile.gettempdir(), "rs_tradicional_perfis")),
+        "MAX_PERFIS": int(cfg.get("MAX_PERFIS", 200)),
+        "TOP_FUNCOES": int(cfg.get("TOP_FUNCOES", 25)),
+        "TOP_SQL": int(cfg.get("TOP_SQL", 10)),
+    }
+
+
+def _pedido_por_header(request, cfg):
+    if not request.headers.get(cfg["HEADER"]):
+        return False
+    session = getattr(request, "session", None)
+    if session is None:
+        return False
+    return (session.get("user_tipo") or "").lower() == "admin"
+
+
+def _top_funcoes(profiler, limite):
+    stats = pstats.Stats(profiler)
+    linhas = []
+    for (ficheiro, linha, funcao), (cc, nc, tt, ct, _callers) in stats.stats.items():
+        linhas.append({
+            "funcao": funcao,
+            "local": f"{ficheiro}:{linha}",
+            "chamadas": nc,
+            "tempo_proprio_ms": round(tt * 1000, 3),
+            "tempo_acumulado_ms": round(ct * 1000, 3),
+        })
+    linhas.sort(key=lambda x: x["tempo_acumulado_ms"], reverse=True)
+    return linhas[:limite]
+
+
+def _top_sql(limite):
+    stats = estatisticas_atuais()
+    if stats is None:
+        return [], {}
+    queries = sorted(stats.queries_sql, key=lambda q: q[1], reverse=True)[:limite]
+    return (
+        [{"sql": " ".join(sql.split()), "ms": round(d * 1000, 3)} for sql, d in queries],
+        stats.para_dict(),
+    )
+
+
+def _guardar(cfg, perfil):
+    pasta = cfg["DIRETORIO"]
+    os.makedirs(pasta, exist_ok=True)
+    nome = f"{int(perfil['instante'] * 1000)}-{uuid.uuid4().hex[:8]}.json"
+    tmp = os.path.join(pasta, f".tmp-{nome}")
+    with open(tmp, "w") as f:
+        json.dump(perfil, f, ensure_ascii=False, default=str)
+    os.replace(tmp, os.path.join(pasta, nome))
+
+    # manter no máximo MAX_PERFIS (apaga os mais antigos)
+    ficheiros = sorted(n for n in os.listdir(pasta) if n.endswith(".json") and not n.startswith("."))
+    for antigo in ficheiros[:-cfg["MAX_PERFIS"]]:
+        try:
+            os.unlink(os.path.join(pasta, antigo))
+        except OSError:
+            pass
+
+
+def listar_perfis(limite=50):
+    """Perfis guardados, do mais lento para o mais rápido."""
+    pasta = _config()["DIRETORIO"]
+    perfis = []
+    try:
+        nomes = os.listdir(pasta)
+    except FileNotFoundError:
+        return perfis
+
+    for nome in nomes:
+        if not nome.endswith(".json") or nome.startswith("."):
+            continue
+        try:
+            with open(os.path.join(pasta, nome)) as f:
+                perfis.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+
+    perfis.sort(key=lambda p: p.get("total_ms", 0), reverse=True)
+    return perfis[:limite]
+
+
+class PerfiladorMiddleware:
+    """
+    Tem de ficar depois do SessionMiddleware e do InstrumentacaoMiddleware.
+    Sob ASGI não perfila: o cProfile mede o thread todo e no event loop
+    misturava os pedidos que correm ao mesmo tempo.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.get_response(request)
+        cfg = _config()
+        if not cfg["ATIVO"]:
+            return self.get_response(request)
+
+        por_header = _pedido_por_header(request, cfg)
+        if not por_header and random.random() >= cfg["AMOSTRAGEM"]:
+            return self.get_response(request)
+
+        # pedido sorteado enquanto outro é perfilado: segue sem perfil
+        if not _perfilando.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # outra ferramenta (debugger, coverage) já ocupa o profiler
+                return self.get_response(request)
+            inicio = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            total = time.perf_counter() - inicio
+        finally:
+            _perfilando.release()
+
+        sql, resumo_db = _top_sql(cfg["TOP_SQL"])
+        match = getattr(request, "resolver_match", None)
+
+        try:
+            _guardar(cfg, {
+                "instante": time.time(),
+                "metodo": request.method,
+                "caminho": request.get_full_path(),
+                "url_name": match.url_name if match else None,
+                "status": response.status_code,
+                "origem": "header" if por_header else "amostragem",
+                "total_ms": round(total * 1000, 2),
+                "db": resumo_db,
+                "funcoes": _top_funcoes(profiler, cfg["TOP_FUNCOES"]),
+                "sql": sql,
+            })
+        except OSError:
+            pass
+
+        return response
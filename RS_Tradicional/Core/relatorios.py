@@ -0,0 +1,385 @@
+"""
+Backends dos relatórios de admin (admin/relatorios/).
+
+RELATORIOS["BACKEND"] escolhe de onde vêm os KPIs:
+  - "mongo":    coleção orders, preenchida por `manage.py sync_reports_mongo`;
+  - "postgres": materialized views de ScriptsBD/Relatorios.sql, atualizadas
+                com REFRESH MATERIALIZED VIEW CONCURRENTLY.
+
+Os dois devolvem exatamente o mesmo contexto para o template, o que permite
+dispensar o Mongo em instalações pequenas e comparar os dois com os mesmos dados.
+Cada um tem também kpis_async(), usado pela view async sob ASGI.
+
+O total, o nº de encomendas e a série respeitam o período escolhido; as
+encomendas por estado e os tops de produtos e fornecedores são de sempre.
+A faturação vem nos dois das linhas (quantidade × preço copiado no checkout),
+não de Encomenda.total_encomenda.
+
+Documentos do Mongo (SCHEMA_VERSAO = 2): `data` é uma data BSON (meia-noite
+UTC do dia da encomenda) e os valores monetários são Decimal128, para que o
+agrupamento por dia/semana/mês ($dateTrunc) e as somas sejam feitos no
+servidor sem erros de arredondamento. Documentos antigos (sem
+`schema_versao`) são convertidos com `manage.py migrar_relatorios_mongo`.
+"""
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+
+from Core.metricas import registar_job
+
+
+DIAS_PADRAO = 30
+TOP_N = 8
+
+SCHEMA_VERSAO = 2
+
+# granularidade -> unidade do $dateTrunc / date_trunc
+GRANULARIDADES = {
+    "dia": "day",
+    "semana": "week",
+    "mes": "month",
+}
+
+CENTIMO = Decimal("0.01")
+
+
+class RelatoriosIndisponiveis(Exception):
+    """O backend não respondeu (ex: Mongo em baixo)."""
+
+
+def periodo_padrao(hoje=None):
+    hoje = hoje or date.today()
+    return hoje - timedelta(days=DIAS_PADRAO - 1), hoje
+
+
+def _limites(inicio, fim):
+    padrao_inicio, padrao_fim = periodo_padrao()
+    inicio = inicio or padrao_inicio
+    fim = fim or padrao_fim
+    if inicio > fim:
+        inicio, fim = fim, inicio
+    return inicio, fim
+
+
+def _meia_noite(d):
+    """date -> datetime (meia-noite, sem tz: o pymongo guarda como UTC)."""
+    return datetime(d.year, d.month, d.day)
+
+
+def dinheiro(valor):
+    """Decimal arredondado ao cêntimo (aceita Decimal, float, int, str, Decimal128 ou None)."""
+    if valor is None:
+        return Decimal("0.00")
+    if hasattr(valor, "to_decimal"):
+        valor = valor.to_decimal()
+    return Decimal(str(valor)).quantize(CENTIMO, rounding=ROUND_HALF_UP)
+
+
+def contexto_vazio(inicio=None, fim=None, granularidade="dia"):
+    inicio, fim = _limites(inicio, fim)
+    return _contexto(Decimal("0.00"), 0, [], [], [], [], inicio, fim, granularidade)
+
+
+def _contexto(total, count, serie, por_estado, top_produtos, top_fornecedores, inicio, fim, granularidade):
+    return {
+        "total_periodo": total,
+        "count_periodo": count,
+        "ticket_medio": (total / count).quantize(CENTIMO) if count else Decimal("0.00"),
+        "daily": serie,
+        "por_estado": por_estado,
+        "top_produtos": top_produtos,
+        "top_fornecedores": top_fornecedores,
+        "start": inicio.isoformat(),
+        "today": fim.isoformat(),
+        "granularidade": granularidade,
+        "granularidades": list(GRANULARIDADES),
+    }
+
+
+# ------------------------------------------------------------------
+# Documento do Mongo (usado pelo sync)
+# ------------------------------------------------------------------
+
+def documento_encomenda(encomenda, linhas):
+    """
+    Documento `orders` (SCHEMA_VERSAO 2) a partir da linha de vw_admin_encomendas
+    e das linhas já resolvidas (preço/subtotal em Decimal).
+    """
+    from bson.decimal128 import Decimal128
+
+    doc_linhas = []
+    total = Decimal("0")
+    for l in linhas:
+        subtotal = dinheiro(l["subtotal"])
+        total += subtotal
+        doc_linhas.append({
+            **l,
+            "preco": Decimal128(dinheiro(l["preco"])),
+            "subtotal": Decimal128(subtotal),
+        })
+
+    data_enc = encomenda["data_encomenda"]
+    if isinstance(data_enc, datetime):
+        data_enc = data_enc.date()
+    elif not isinstance(data_enc, date):
+        data_enc = date.fromisoformat(str(data_enc))
+
+    eid = encomenda["id_encomenda"]
+    return {
+        "_id": eid,
+        "schema_versao": SCHEMA_VERSAO,
+        "id_encomenda": eid,
+        "data": _meia_noite(data_enc),
+        "estado": encomenda["estado_encomenda"],
+        "cliente": {
+            "id": encomenda["id_utilizador"],
+            "nome": encomenda["utilizador_nome"],
+            "email": encomenda["utilizador_email"],
+        },
+        "linhas": doc_linhas,
+        "total": Decimal128(total),
+    }
+
+
+def criar_indices_mongo(orders):
+    orders.create_index([("data", 1), ("estado", 1)])
+    orders.create_index("estado")
+    orders.create_index("schema_versao")
+    orders.create_index("cliente.id")
+    orders.create_index("linhas.id_produto")
+    orders.create_index("linhas.id_fornecedor")
+
+
+# ------------------------------------------------------------------
+# Backends
+# ------------------------------------------------------------------
+
+class BackendMongo:
+    nome = "mongo"
+
+    def disponivel(self):
+        from Core.mongo import mongo_disponivel
+        return mongo_disponivel()
+
+    def kpis(self, inicio=None, fim=None, granularidade="dia"):
+        from pymongo.errors import PyMongoError
+
+        if not self.disponivel():
+            raise RelatoriosIndisponiveis("O MongoDB não está disponível.")
+        try:
+            return self._kpis(inicio, fim, granularidade)
+        except PyMongoError as e:
+            raise RelatoriosIndisponiveis(str(e)) from e
+
+    async def kpis_async(self, inicio=None, fim=None, granularidade="dia"):
+        """kpis() no AsyncMongoClient (views async, ver Core/assincrono.py)."""
+        from asgiref.sync import sync_to_async
+        from pymongo.errors import PyMongoError
+
+        from Core.mongo import get_mongo_db_async, mongo_async_disponivel
+
+        if not mongo_async_disponivel():
+            return await sync_to_async(self.kpis)(inicio, fim, granularidade)
+        # o ping tem timeout curto e fica em cache; corre fora do event loop
+        if not await sync_to_async(self.disponivel, thread_sensitive=False)():
+            raise RelatoriosIndisponiveis("O MongoDB não está disponível.")
+
+        inicio, fim = _limites(inicio, fim)
+        try:
+            cursor = await get_mongo_db_async()["orders"].aggregate(
+                self._pipeline(inicio, fim, GRANULARIDADES[granularidade])
+            )
+            res = (await cursor.to_list(None))[0]
+        except PyMongoError as e:
+            raise RelatoriosIndisponiveis(str(e)) from e
+        return self._contexto(res, inicio, fim, granularidade)
+
+    def _kpis(self, inicio, fim, granularidade):
+        from Core.mongo import get_mongo_db
+
+        inicio, fim = _limites(inicio, fim)
+        orders = get_mongo_db()["orders"]
+        res = list(orders.aggregate(self._pipeline(inicio, fim, GRANULARIDADES[granularidade])))[0]
+        return self._contexto(res, inicio, fim, granularidade)
+
+    def _pipeline(self, inicio, fim, unidade):
+        # intervalo fechado em dias -> [inicio, fim + 1 dia[
+        periodo = {"$match": {
+            "data": {"$gte": _meia_noite(inicio), "$lt": _meia_noite(fim + timedelta(days=1))},
+        }}
+
+        # estados e tops são de sempre: o período só entra no total e na série
+        return [
+            {"$match": {"schema_versao": SCHEMA_VERSAO}},
+            {"$facet": {
+                "total": [
+                    periodo,
+                    {"$group": {"_id": None, "total": {"$sum": "$total"}, "count": {"$sum": 1}}},
+                ],
+                "serie": [
+                    periodo,
+                    {"$group": {
+                        "_id": {"$dateTrunc": {"date": "$data", "unit": unidade, "startOfWeek": "monday"}},
+                        "total": {"$sum": "$total"},
+                        "encomendas": {"$sum": 1},
+                    }},
+                    {"$sort": {"_id": 1}},
+                ],
+                "estados": [
+                    {"$group": {"_id": "$estado", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}},
+                ],
+                "produtos": [
+                    {"$unwind": "$linhas"},
+                    {"$group": {"_id": "$linhas.nome", "qtd": {"$sum": "$linhas.quantidade"}, "total": {"$sum": "$linhas.subtotal"}}},
+                    {"$sort": {"qtd": -1}},
+                    {"$limit": TOP_N},
+                ],
+                "fornecedores": [
+                    {"$unwind": "$linhas"},
+                    {"$group": {"_id": "$linhas.fornecedor_nome", "total": {"$sum": "$linhas.subtotal"}}},
+                    {"$sort": {"total": -1}},
+                    {"$limit": TOP_N},
+                ],
+            }},
+        ]
+
+    def _contexto(self, res, inicio, fim, granularidade):
+        total = dinheiro(res["total"][0]["total"]) if res["total"] else Decimal("0.00")
+        count = res["total"][0]["count"] if res["total"] else 0
+
+        # Decimal128/datetime não são serializáveis pelo json_script: float e ISO
+        return _contexto(
+            total,
+            count,
+            [{"_id": s["_id"].date().isoformat(), "total": float(dinheiro(s["total"])), "encomendas": s["encomendas"]}
+             for s in res["serie"]],
+            [{"_id": e["_id"], "count": e["count"]} for e in res["estados"]],
+            [{"_id": p["_id"], "qtd": p["qtd"], "total": float(dinheiro(p["total"]))} for p in res["produtos"]],
+            [{"_id": f["_id"], "total": float(dinheiro(f["total"]))} for f in res["fornecedores"]],
+            inicio,
+            fim,
+            granularidade,
+        )
+
+    def sincronizar(self):
+        call_command("sync_reports_mongo")
+
+
+_SQL_SERIE = """
+    SELECT date_trunc(%s, dia)::date AS bucket, SUM(total), SUM(encomendas)
+    FROM mv_relatorio_vendas_diarias
+    WHERE dia BETWEEN %s AND %s
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+# estados e tops: de sempre, como no Mongo
+_SQL_ESTADOS = """
+    SELECT estado, SUM(encomendas) AS n
+    FROM mv_relatorio_estados
+    GROUP BY estado
+    ORDER BY n DESC
+"""
+
+_SQL_PRODUTOS = """
+    SELECT produto_nome, SUM(quantidade) AS qtd, SUM(total)
+    FROM mv_relatorio_produtos
+    GROUP BY produto_nome
+    ORDER BY qtd DESC
+    LIMIT %s
+"""
+
+_SQL_FORNECEDORES = """
+    SELECT MAX(fornecedor_nome), SUM(total) AS t
+    FROM mv_relatorio_fornecedores
+    GROUP BY id_fornecedor
+    ORDER BY t DESC
+    LIMIT %s
+"""
+
+
+class BackendPostgres:
+    nome = "postgres"
+
+    def disponivel(self):
+        return True
+
+    def _linhas(self, cur, sql, params=None):
+        cur.execute(sql, params or [])
+        return cur.fetchall()
+
+    def _consultas(self, inicio, fim, unidade):
+        """(sql, params) das quatro consultas, independentes entre si."""
+        return [
+            (_SQL_SERIE, [unidade, inicio, fim]),
+            (_SQL_ESTADOS, []),
+            (_SQL_PRODUTOS, [TOP_N]),
+            (_SQL_FORNECEDORES, [TOP_N]),
+        ]
+
+    def kpis(self, inicio=None, fim=None, granularidade="dia"):
+        inicio, fim = _limites(inicio, fim)
+        consultas = self._consultas(inicio, fim, GRANULARIDADES[granularidade])
+
+        with connection.cursor() as cur:
+            resultados = [self._linhas(cur, sql, params) for sql, params in consultas]
+        return self._contexto(*resultados, inicio, fim, granularidade)
+
+    async def kpis_async(self, inicio=None, fim=None, granularidade="dia"):
+        """kpis() com as quatro consultas em simultâneo (Core/assincrono.py)."""
+        from Core import assincrono
+
+        inicio, fim = _limites(inicio, fim)
+        consultas = self._consultas(inicio, fim, GRANULARIDADES[granularidade])
+        resultados = await asyncio.gather(*(assincrono.fetchall(sql, params) for sql, params in consultas))
+        return self._contexto(*resultados, inicio, fim, granularidade)
+
+    def _contexto(self, serie_rows, estados, produtos, fornecedores, inicio, fim, granularidade):
+        total = sum((dinheiro(t) for _b, t, _n in serie_rows), Decimal("0.00"))
+        count = sum(int(n) for _b, _t, n in serie_rows)
+
+        # mesmo formato que os pipelines do Mongo (_id + métricas, números em float)
+        return _contexto(
+            total,
+            count,
+            [{"_id": b.isoformat(), "total": float(dinheiro(t)), "encomendas": int(n)} for b, t, n in serie_rows],
+            [{"_id": estado, "count": int(n)} for estado, n in estados],
+            [{"_id": nome, "qtd": int(qtd), "total": float(dinheiro(t))} for nome, qtd, t in produtos],
+            [{"_id": nome, "total": float(dinheiro(t))} for nome, t in fornecedores],
+            inicio,
+            fim,
+            granularidade,
+        )
+
+    def sincronizar(self):
+        inicio = time.perf_counter()
+        try:
+            with connection.cursor() as cur:
+                cur.execute("CALL sp_relatorios_refrescar()")
+        except Exception:
+            registar_job("relatorios_postgres", time.perf_counter() - inicio, sucesso=False)
+            raise
+        registar_job("relatorios_postgres", time.perf_counter() - inicio)
+
+
+BACKENDS = {
+    BackendMongo.nome: BackendMongo,
+    BackendPostgres.nome: BackendPostgres,
+}
+
+
+def obter_backend(nome=None):
+    """Backend indicado, ou o de RELATORIOS["BACKEND"] (por omissão "mongo")."""
+    if nome is None:
+        cfg = getattr(settings, "RELATORIOS", {}) or {}
+        nome = cfg.get("BACKEND", "mongo")
+    try:
+        return BACKENDS[nome.lower()]()
+    except KeyError:
+        raise ValueError(f"Backend de relatórios desconhecido: {nome!r} (opções: {', '.join(BACKENDS)})")
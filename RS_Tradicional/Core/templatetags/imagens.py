@@ -0,0 +1,63 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html
+
+from Core.imagens import caminho_relativo, ler_referencia
+
+register = template.Library()
+
+
+def _url(hash_, sufixo):
+    return f"{settings.MEDIA_URL}{caminho_relativo(hash_, sufixo)}"
+
+
+def _srcset(img, extensao):
+    return ", ".join(
+        f"{_url(img['hash'], f'-{w}.{extensao}')} {w}w" for w in img["larguras"]
+    )
+
+
+@register.simple_tag
+def imagem(img, alt="", sizes="100vw", classe="", carregar="lazy"):
+    """
+    <picture> com srcset WebP + JPEG para uma imagem de Core/imagens.py.
+    `img` é um dict de imagens_produtos()/imagens_noticias() ou uma
+    referência em texto (ex: Fornecedor.imagem_fornecedor).
+    """
+    if not img:
+        return ""
+    if isinstance(img, str):
+        ref = ler_referencia(img)
+        img = {"ref": img, "hash": ref[0] if ref else None, "extensao": ref[1] if ref else None, "larguras": []}
+
+    if not img.get("hash"):
+        # URL antigo, guardado antes do pipeline
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            img["ref"], alt, classe, carregar,
+        )
+
+    if not img.get("larguras"):
+        # sem variantes (Pillow não instalado quando foi carregada)
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            _url(img["hash"], f".{img['extensao']}"), alt, classe, carregar,
+        )
+
+    maior = max(img["larguras"])
+    dimensoes = ""
+    if img.get("largura") and img.get("altura"):
+        # reserva o espaço antes de a imagem chegar (sem saltos no layout)
+        dimensoes = format_html(
+            ' width="{}" height="{}"', maior, round(img["altura"] * maior / img["largura"])
+        )
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}"{} loading="{}" decoding="async">'
+        '</picture>',
+        _srcset(img, "webp"), sizes,
+        _url(img["hash"], f"-{maior}.jpg"), _srcset(img, "jpg"), sizes,
+        alt, classe, dimensoes, carregar,
+    )
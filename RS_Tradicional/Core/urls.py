@@ -1,8 +1,10 @@
 from django.urls import path
 from . import views
+from .assincrono import escolher
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path("metrics", views.metricas, name="metricas"),
     path("admin/", views.admin_dashboard, name="admin_dashboard"),
 
     # ADMIN – PRODUTOS
@@ -43,6 +45,7 @@ urlpatterns = [
     # ADMIN – ENCOMENDAS
     path("admin/encomendas/", views.admin_encomenda_list, name="admin_encomenda_list"),
     path("admin/encomendas/novo/", views.admin_encomenda_create, name="admin_encomenda_create"),
+    path("admin/encomendas/estado-lote/", views.admin_encomenda_transicao_lote, name="admin_encomenda_transicao_lote"),
     path("admin/encomendas/<int:encomenda_id>/editar/", views.admin_encomenda_edit, name="admin_encomenda_edit"),
     path("admin/encomendas/<int:encomenda_id>/remover/", views.admin_encomenda_delete, name="admin_encomenda_delete"),
     path("admin/encomendas/<int:encomenda_id>/detalhe/", views.admin_encomenda_detail, name="admin_encomenda_detail"),
@@ -59,7 +62,10 @@ urlpatterns = [
 
     # ADMIN – RELATÓRIOS
     path("admin/relatorios/sync/", views.admin_relatorios_sync, name="admin_relatorios_sync"),
-    path("admin/relatorios/", views.admin_relatorios, name="admin_relatorios"),
+    path("admin/relatorios/", escolher(views.admin_relatorios, views.admin_relatorios_async), name="admin_relatorios"),
+
+    # ADMIN – DESEMPENHO
+    path("admin/perfis/", views.admin_perfis, name="admin_perfis"),
 
     # ÁREA DE UTILIZADOR – CLIENTE
 
@@ -72,7 +78,7 @@ urlpatterns = [
 
 
     # LOJA / CLIENTE
-    path("loja/", views.loja_produtos, name="loja_produtos"),
+    path("loja/", escolher(views.loja_produtos, views.loja_produtos_async), name="loja_produtos"),
     path("loja/adicionar/<int:produto_id>/", views.loja_adicionar_produto, name="loja_adicionar_produto"),
     path("loja/carrinho/", views.loja_carrinho, name="loja_carrinho"),
    # path("loja/carrinho/remover/<int:produto_id>/", views.loja_remover_linha, name="loja_remover_linha"),
@@ -83,8 +89,8 @@ urlpatterns = [
 
 
     # NOTÍCIAS – CLIENTE
-    path("noticias/", views.noticias_lista, name="noticias_lista"),
-    path("noticias/<int:noticia_id>/", views.noticia_detalhe, name="noticia_detalhe"),
+    path("noticias/", escolher(views.noticias_lista, views.noticias_lista_async), name="noticias_lista"),
+    path("noticias/<int:noticia_id>/", escolher(views.noticia_detalhe, views.noticia_detalhe_async), name="noticia_detalhe"),
     
 
     # ÁREA DE UTILIZADOR – FORNECEDOR
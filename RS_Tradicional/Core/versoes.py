@@ -0,0 +1,156 @@
+"""
+GET condicional (ETag / Last-Modified) das páginas públicas.
+
+Os triggers de ScriptsBD/Triggers.sql (fn_trg_versao_dados) incrementam a
+versão de um recurso sempre que as tabelas dele mudam (um evento em
+Versao_Dados_Evento, somado por vw_versao_dados). O decorador `condicional`
+calcula o ETag a partir dessa versão (lida pela cache de
+Core/cache_invalidacao, invalidada pelo NOTIFY de versao_dados_evento) e
+responde 304 antes de a view correr a consulta principal.
+
+Uso:
+
+    @condicional("catalogo")
+    def loja_produtos(request): ...
+
+Também aceita views async (Core/assincrono.py).
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db import connection
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from Core import cache_invalidacao, carrinho_convidado
+from Core.benchmarks import commit_atual
+
+_SEM_VERSAO = (0, None)
+_versao_app = []
+
+
+def _config():
+    cfg = getattr(settings, "GET_CONDICIONAL", {}) or {}
+    return {
+        "ATIVO": cfg.get("ATIVO", True),
+        "VERSAO_APP": cfg.get("VERSAO_APP", ""),
+    }
+
+
+def versao_app():
+    """Parte fixa do ETag: muda com o código/templates servidos."""
+    if not _versao_app:
+        versao = _config()["VERSAO_APP"] or commit_atual()
+        if versao == "desconhecido":
+            # sem git nem VERSAO_APP: cada processo tem a sua (só custa 200 a mais)
+            versao = f"arranque-{time.time_ns()}"
+        _versao_app.append(versao)
+    return _versao_app[0]
+
+
+def _ler_versao(recurso):
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT versao, atualizado_em FROM vw_versao_dados WHERE recurso = %s",
+            [recurso],
+        )
+        row = cur.fetchone()
+    return tuple(row) if row else _SEM_VERSAO
+
+
+def versao(recurso):
+    """(versao, atualizado_em) do recurso; sem SQL enquanto a cache estiver válida."""
+    return cache_invalidacao.obter(
+        f"versao_dados:{recurso}", ["versao_dados", "versao_dados_evento"],
+        lambda: _ler_versao(recurso),
+    )
+
+
+def _versao_pedido(request, recurso):
+    # o condition() pede o ETag e o Last-Modified em separado: uma leitura por pedido
+    versoes = request.__dict__.setdefault("_versoes_dados", {})
+    if recurso not in versoes:
+        versoes[recurso] = versao(recurso)
+    return versoes[recurso]
+
+
+def _tem_mensagens(request):
+    # mensagens por mostrar mudam a página mas não a versão; len() não as consome
+    return len(get_messages(request)) > 0
+
+
+def _etag(recurso):
+    def etag(request, *args, **kwargs):
+        if _tem_mensagens(request):
+            return None
+        numero, _ = _versao_pedido(request, recurso)
+        sessao = request.session
+        partes = [
+            versao_app(),
+            recurso,
+            str(numero),
+            repr(args),
+            repr(sorted(kwargs.items())),
+            # a navegação do base.html depende de quem está autenticado
+            str(sessao.get("user_id", "")),
+            str(sessao.get("user_tipo", "")),
+            str(sessao.get("user_nome", "")),
+            # o HTML leva o token CSRF e o carrinho do visitante entra nos formulários
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+            request.COOKIES.get(carrinho_convidado.COOKIE, ""),
+        ]
+        return hashlib.sha1("|".join(partes).encode("utf-8")).hexdigest()
+    return etag
+
+
+def _last_modified(recurso):
+    def last_modified(request, *args, **kwargs):
+        # If-Modified-Since não distingue utilizadores: só para visitantes
+        if _tem_mensagens(request) or request.session.get("user_id"):
+            return None
+        return _versao_pedido(request, recurso)[1]
+    return last_modified
+
+
+def _preparar_pedido(request, recurso):
+    request.session.get("user_id")
+    if not _tem_mensagens(request) and recurso is not None:
+        _versao_pedido(request, recurso)
+
+
+def _cabecalhos(response):
+    # o browser guarda a página mas revalida sempre; proxies não a partilham
+    patch_vary_headers(response, ["Cookie"])
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def condicional(recurso):
+    """Decorador: 304 Not Modified enquanto a versão de `recurso` não mudar."""
+    def decorador(view):
+        view_condicional = condition(
+            etag_func=_etag(recurso), last_modified_func=_last_modified(recurso)
+        )(view)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                ativo = _config()["ATIVO"]
+                # o condition() chama o ETag/Last-Modified sem await: a sessão, as
+                # mensagens e a versão (SQL) são lidas antes, num thread
+                await sync_to_async(_preparar_pedido)(request, recurso if ativo else None)
+                if not ativo:
+                    return await view(request, *args, **kwargs)
+                return _cabecalhos(await view_condicional(request, *args, **kwargs))
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if not _config()["ATIVO"]:
+                    return view(request, *args, **kwargs)
+                return _cabecalhos(view_condicional(request, *args, **kwargs))
+        return wrapper
+    return decorador
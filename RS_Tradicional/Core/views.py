@@ -1,16 +1,37 @@
+import asyncio
+import time
 from decimal import Decimal, InvalidOperation
 from datetime import datetime, date
 
+from django.conf import settings
 from django.db import connection, DatabaseError
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render, redirect
+from django.urls import reverse
+from urllib.parse import urlencode
 from django.contrib import messages
+from django.core.paginator import Paginator
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.hashers import check_password
 
 from datetime import date, timedelta
-from Core.mongo import get_mongo_db
-
-from django.core.management import call_command
+from Core.relatorios import (
+    GRANULARIDADES,
+    RelatoriosIndisponiveis,
+    contexto_vazio,
+    obter_backend,
+    periodo_padrao,
+)
+from Core import assincrono, cache, carrinho_convidado, imagens
+from Core.db import (
+    Preparada,
+    fetchall_dicts as _fetchall_dicts,
+    fetchall_linhas as _fetchall_linhas,
+    fetchone_dict as _fetchone_dict,
+)
+from Core.metricas import registar_procedure, exportar_texto, pedido_autorizado
+from Core.perfilador import listar_perfis
+from Core.versoes import condicional
 
 def admin_relatorios_sync(request):
     if not _require_admin(request):
@@ -20,109 +41,113 @@ def admin_relatorios_sync(request):
         return redirect("admin_relatorios")
 
     try:
-        call_command("sync_reports_mongo")
+        obter_backend().sincronizar()
+        cache.invalidar("relatorios:kpis")
         messages.success(request, "Relatórios atualizados com sucesso.")
     except Exception as e:
         messages.error(request, f"Não foi possível atualizar os relatórios: {e}")
 
     return redirect("admin_relatorios")
 
+@cache.em_cache("relatorios:kpis")
+def _kpis_relatorios(backend, inicio, fim, granularidade):
+    # o nome do backend entra na chave; as exceções (indisponível) não ficam em cache
+    return obter_backend(backend).kpis(inicio, fim, granularidade)
+
+
+@cache.em_cache("relatorios:kpis")
+async def _kpis_relatorios_async(backend, inicio, fim, granularidade):
+    # mesmo nome e argumentos que _kpis_relatorios: partilham o valor guardado
+    return await obter_backend(backend).kpis_async(inicio, fim, granularidade)
+
+
+def _filtros_relatorios(request):
+    inicio, fim = periodo_padrao()
+    try:
+        if request.GET.get("inicio"):
+            inicio = date.fromisoformat(request.GET["inicio"])
+        if request.GET.get("fim"):
+            fim = date.fromisoformat(request.GET["fim"])
+    except ValueError:
+        messages.error(request, "Datas inválidas. A mostrar os últimos 30 dias.")
+        inicio, fim = periodo_padrao()
+
+    granularidade = request.GET.get("granularidade") or "dia"
+    if granularidade not in GRANULARIDADES:
+        granularidade = "dia"
+    return inicio, fim, granularidade
+
+
+def _relatorios_indisponiveis(request, inicio, fim, granularidade):
+    messages.warning(request, "Os relatórios estão temporariamente indisponíveis. Tenta mais tarde.")
+    context = contexto_vazio(inicio, fim, granularidade)
+    context["indisponivel"] = True
+    return context
+
+
 def admin_relatorios(request):
     if not _require_admin(request):
         return redirect("home")
 
-    db = get_mongo_db()
-    orders = db["orders"]
+    inicio, fim, granularidade = _filtros_relatorios(request)
 
-    # últimos 30 dias (data guardada como "YYYY-MM-DD")
-    today = date.today()
-    start = (today - timedelta(days=29)).isoformat()
+    # backend escolhido em settings.RELATORIOS (Mongo ou materialized views)
+    try:
+        context = _kpis_relatorios(obter_backend().nome, inicio, fim, granularidade)
+    except RelatoriosIndisponiveis:
+        context = _relatorios_indisponiveis(request, inicio, fim, granularidade)
+    return render(request, "admin/relatorios.html", context)
 
-    # KPIs base
-    match_30d = {"data": {"$gte": start}}
-    pipeline_total_30d = [
-        {"$match": match_30d},
-        {"$group": {"_id": None, "total": {"$sum": "$total"}, "count": {"$sum": 1}}},
-    ]
-    res_total = list(orders.aggregate(pipeline_total_30d))
-    total_30d = (res_total[0]["total"] if res_total else 0)
-    count_30d = (res_total[0]["count"] if res_total else 0)
-    ticket_medio = (total_30d / count_30d) if count_30d else 0
-
-    # Vendas por dia (30d)
-    pipeline_daily = [
-        {"$match": match_30d},
-        {"$group": {"_id": "$data", "total": {"$sum": "$total"}, "encomendas": {"$sum": 1}}},
-        {"$sort": {"_id": 1}},
-    ]
-    daily = list(orders.aggregate(pipeline_daily))
 
-    # Encomendas por estado
-    pipeline_estado = [
-        {"$group": {"_id": "$estado", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-    ]
-    por_estado = list(orders.aggregate(pipeline_estado))
-
-    # Top produtos (por quantidade)
-    pipeline_top_prod = [
-        {"$unwind": "$linhas"},
-        {"$group": {"_id": "$linhas.nome", "qtd": {"$sum": "$linhas.quantidade"}, "total": {"$sum": "$linhas.subtotal"}}},
-        {"$sort": {"qtd": -1}},
-        {"$limit": 8},
-    ]
-    top_produtos = list(orders.aggregate(pipeline_top_prod))
-
-    # Top fornecedores (por faturação)
-    pipeline_top_forn = [
-        {"$unwind": "$linhas"},
-        {"$group": {"_id": "$linhas.fornecedor_nome", "total": {"$sum": "$linhas.subtotal"}}},
-        {"$sort": {"total": -1}},
-        {"$limit": 8},
-    ]
-    top_fornecedores = list(orders.aggregate(pipeline_top_forn))
+async def admin_relatorios_async(request):
+    await assincrono.carregar_sessao(request)
+    if not _require_admin(request):
+        return redirect("home")
 
-    context = {
-        "total_30d": total_30d,
-        "count_30d": count_30d,
-        "ticket_medio": ticket_medio,
-        "daily": daily,
-        "por_estado": por_estado,
-        "top_produtos": top_produtos,
-        "top_fornecedores": top_fornecedores,
-        "start": start,
-        "today": today.isoformat(),
-    }
+    inicio, fim, granularidade = _filtros_relatorios(request)
+    try:
+        context = await _kpis_relatorios_async(obter_backend().nome, inicio, fim, granularidade)
+    except RelatoriosIndisponiveis:
+        context = _relatorios_indisponiveis(request, inicio, fim, granularidade)
     return render(request, "admin/relatorios.html", context)
 
 
+def metricas(request):
+    if not pedido_autorizado(request):
+        return HttpResponseForbidden("Acesso negado.")
+
+    return HttpResponse(exportar_texto(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # ======================================================
 #  HELPERS PARA SQL
 # ======================================================
 
-def _fetchall_dicts(sql, params=None):
+class _ConsultaPaginada:
     """
-    Executa um SELECT e devolve lista de dicts:
-    [{"col1": valor, "col2": valor, ...}, ...]
+    "Lista" preguiçosa para o Paginator do Django: o total vem de um COUNT
+    e cada página de LIMIT/OFFSET, sem carregar o resultado todo.
+    `sql` tem de incluir o ORDER BY.
     """
-    with connection.cursor() as cur:
-        cur.execute(sql, params or [])
-        cols = [c[0] for c in cur.description]
-        return [dict(zip(cols, row)) for row in cur.fetchall()]
 
+    def __init__(self, sql, sql_count, params=None):
+        self.sql = sql
+        self.sql_count = sql_count
+        self.params = list(params or [])
 
-def _fetchone_dict(sql, params=None):
-    """
-    Executa um SELECT que devolve 0 ou 1 linha.
-    Retorna um dict ou None.
-    """
-    with connection.cursor() as cur:
-        cur.execute(sql, params or [])
-        cols = [c[0] for c in cur.description]
-        row = cur.fetchone()
-    if not row:
-        return None
-    return dict(zip(cols, row))
+    def count(self):
+        row = _fetchone_dict(self.sql_count, self.params)
+        return next(iter(row.values())) if row else 0
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, fatia):
+        inicio = fatia.start or 0
+        return _fetchall_dicts(
+            f"{self.sql} LIMIT %s OFFSET %s",
+            self.params + [fatia.stop - inicio, inicio],
+        )
 
 
 def _user_friendly_db_error(err: str) -> str:
@@ -159,14 +184,45 @@ def _safe_callproc(proc_name, params=None):
     params = params or []
     placeholders = ", ".join(["%s"] * len(params))
 
+    inicio = time.perf_counter()
     try:
         with connection.cursor() as cur:
+            # CALL não pode ser preparado (PREPARE só aceita SELECT/INSERT/UPDATE/
+            # DELETE/VALUES); o plpgsql guarda os planos do corpo da procedure na
+            # sessão, reutilizada entre pedidos com CONN_MAX_AGE
             cur.execute(f"CALL {proc_name}({placeholders})", params)
+        registar_procedure(proc_name, time.perf_counter() - inicio, ok=True)
         return True, None
     except DatabaseError as e:
+        registar_procedure(proc_name, time.perf_counter() - inicio, ok=False)
         return False, str(e.__cause__ or e)
 
 
+def _guardar_imagens(request, campo):
+    """
+    Guarda as imagens enviadas em request.FILES[campo] (Core/imagens.py).
+    Devolve as referências, ou None (com mensagem de erro) se alguma for inválida.
+    """
+    try:
+        return imagens.guardar_uploads(request.FILES.getlist(campo))
+    except imagens.ImagemInvalida as e:
+        messages.error(request, str(e))
+        return None
+
+
+def _adicionar_imagens(request, proc_name, exec_id, entidade_id):
+    """Associa as imagens enviadas no campo "imagens" a um produto/notícia."""
+    refs = _guardar_imagens(request, "imagens")
+    if refs is None:
+        return False
+    for ref in refs:
+        ok, erro = _safe_callproc(proc_name, [exec_id, entidade_id, ref])
+        if not ok:
+            messages.error(request, f"Erro ao associar imagem: {erro}")
+            return False
+    return True
+
+
 # ======================================================
 #  HELPERS DE PERMISSÕES
 # ======================================================
@@ -243,6 +299,22 @@ def admin_dashboard(request):
     return render(request, "admin/admin_dashboard.html", context)
 
 
+def admin_perfis(request):
+    if not _require_admin_only(request):
+        return redirect("home")
+
+    perfis = listar_perfis(limite=50)
+    for p in perfis:
+        p["data"] = datetime.fromtimestamp(p.get("instante", 0))
+
+    context = {
+        "perfis": perfis,
+        "perfilador_ativo": settings.PERFILADOR.get("ATIVO", False),
+        "header": settings.PERFILADOR.get("HEADER", "X-RS-Profile"),
+    }
+    return render(request, "admin/perfis/list.html", context)
+
+
 # ======================================================
 #  ADMIN – PRODUTOS
 # ======================================================
@@ -251,7 +323,7 @@ def admin_product_list(request):
     if not _require_admin(request):
         return redirect("home")
 
-    produtos = _fetchall_dicts("""
+    produtos = _fetchall_linhas("""
         SELECT
             id_produto,
             nome,
@@ -263,7 +335,8 @@ def admin_product_list(request):
             id_tipo_produto,
             tipo_designacao,
             id_fornecedor,
-            fornecedor_nome
+            fornecedor_nome,
+            versao
         FROM vw_admin_produtos
         ORDER BY id_produto
     """)
@@ -436,7 +509,7 @@ def admin_product_edit(request, produto_id):
                 )
                 if not ok:
                     messages.error(request, f"Erro ao atualizar produto: {erro}")
-                else:
+                elif _adicionar_imagens(request, "sp_admin_produto_imagem_adicionar", exec_id, produto_id):
                     messages.success(request, "Produto atualizado com sucesso.")
                     return redirect("admin_product_list")
 
@@ -642,7 +715,7 @@ def admin_fornecedor_list(request):
     if not _require_admin(request):
         return redirect("home")
 
-    fornecedores = _fetchall_dicts("""
+    fornecedores = _fetchall_linhas("""
         SELECT
             id_fornecedor,
             nome,
@@ -684,15 +757,20 @@ def admin_fornecedor_create(request):
         elif (not is_singular) and not morada:
             messages.error(request, "Para fornecedores não singulares, a morada é obrigatória.")
         else:
-            ok, erro = _safe_callproc(
-                "sp_admin_fornecedor_criar",
-                [exec_id, nome, contacto, email, nif, is_singular, morada if morada else None, imagem if imagem else None],
-            )
-            if not ok:
-                messages.error(request, f"Erro ao criar fornecedor: {erro}")
-            else:
-                messages.success(request, "Fornecedor criado com sucesso.")
-                return redirect("admin_fornecedor_list")
+            enviadas = _guardar_imagens(request, "imagem_ficheiro")
+            # um ficheiro enviado substitui o URL escrito à mão
+            if enviadas:
+                imagem = enviadas[0]
+            if enviadas is not None:
+                ok, erro = _safe_callproc(
+                    "sp_admin_fornecedor_criar",
+                    [exec_id, nome, contacto, email, nif, is_singular, morada if morada else None, imagem if imagem else None],
+                )
+                if not ok:
+                    messages.error(request, f"Erro ao criar fornecedor: {erro}")
+                else:
+                    messages.success(request, "Fornecedor criado com sucesso.")
+                    return redirect("admin_fornecedor_list")
 
     context = {"acao": "Criar"}
     return render(request, "admin/fornecedores/form.html", context)
@@ -740,15 +818,20 @@ def admin_fornecedor_edit(request, fornecedor_id):
         elif (not is_singular) and not morada:
             messages.error(request, "Para fornecedores não singulares, a morada é obrigatória.")
         else:
-            ok, erro = _safe_callproc(
-                "sp_admin_fornecedor_atualizar",
-                [exec_id, fornecedor_id, nome, contacto, email, nif, is_singular, morada if morada else None, imagem if imagem else None],
-            )
-            if not ok:
-                messages.error(request, f"Erro ao atualizar fornecedor: {erro}")
-            else:
-                messages.success(request, "Fornecedor atualizado com sucesso.")
-                return redirect("admin_fornecedor_list")
+            enviadas = _guardar_imagens(request, "imagem_ficheiro")
+            # um ficheiro enviado substitui o URL escrito à mão
+            if enviadas:
+                imagem = enviadas[0]
+            if enviadas is not None:
+                ok, erro = _safe_callproc(
+                    "sp_admin_fornecedor_atualizar",
+                    [exec_id, fornecedor_id, nome, contacto, email, nif, is_singular, morada if morada else None, imagem if imagem else None],
+                )
+                if not ok:
+                    messages.error(request, f"Erro ao atualizar fornecedor: {erro}")
+                else:
+                    messages.success(request, "Fornecedor atualizado com sucesso.")
+                    return redirect("admin_fornecedor_list")
 
     context = {"acao": "Editar", "fornecedor": fornecedor}
     return render(request, "admin/fornecedores/form.html", context)
@@ -786,6 +869,14 @@ def admin_fornecedor_delete(request, fornecedor_id):
 #  FORNECEDOR – SUBMETER PRODUTO / OS MEUS PRODUTOS
 # ======================================================
 
+# fornecedor da sessão, em cada página da área de fornecedor
+SQL_FORNECEDOR_POR_EMAIL = Preparada("fornecedor_por_email", """
+    SELECT id_fornecedor, nome, email
+    FROM vw_fornecedores
+    WHERE LOWER(email) = LOWER(%s)
+""", tipos=("text",))
+
+
 def fornecedor_product_create(request):
     user_tipo = (request.session.get("user_tipo") or "").lower()
     if user_tipo != "fornecedor":
@@ -795,11 +886,7 @@ def fornecedor_product_create(request):
     exec_id = request.session.get("user_id")
     user_email = request.session.get("user_email")
 
-    fornecedor = _fetchone_dict("""
-        SELECT id_fornecedor, nome, email
-        FROM vw_fornecedores
-        WHERE LOWER(email) = LOWER(%s)
-    """, [user_email])
+    fornecedor = _fetchone_dict(SQL_FORNECEDOR_POR_EMAIL, [user_email])
 
     if not fornecedor:
         messages.error(
@@ -874,11 +961,7 @@ def fornecedor_product_list(request):
 
     user_email = request.session.get("user_email")
 
-    fornecedor = _fetchone_dict("""
-        SELECT id_fornecedor, nome, email
-        FROM vw_fornecedores
-        WHERE LOWER(email) = LOWER(%s)
-    """, [user_email])
+    fornecedor = _fetchone_dict(SQL_FORNECEDOR_POR_EMAIL, [user_email])
 
     if not fornecedor:
         messages.error(
@@ -1017,7 +1100,7 @@ def admin_user_list(request):
     if not _require_admin_only(request):
         return redirect("home")
 
-    utilizadores = _fetchall_dicts("""
+    utilizadores = _fetchall_linhas("""
         SELECT
             id_utilizador,
             nome,
@@ -1172,11 +1255,35 @@ def admin_user_delete(request, user_id):
 #  ADMIN – ENCOMENDAS
 # ======================================================
 
+ESTADOS_ENCOMENDA = ["Pendente", "Em processamento", "Enviada", "Concluída", "Cancelada"]
+
+# Por omissão só as encomendas recentes: com Encomenda particionada por mês
+# (ScriptsBD/Particionamento.sql) a lista lê apenas as partições do período.
+PERIODOS_ENCOMENDAS = [("90", "Últimos 90 dias"), ("365", "Último ano"), ("todas", "Todas")]
+
+
 def admin_encomenda_list(request):
     if not _require_admin(request):
         return redirect("home")
 
-    encomendas = _fetchall_dicts("""
+    estado_filtro = request.GET.get("estado", "").strip()
+    periodo = request.GET.get("dias", PERIODOS_ENCOMENDAS[0][0])
+    if periodo not in dict(PERIODOS_ENCOMENDAS):
+        periodo = PERIODOS_ENCOMENDAS[0][0]
+
+    filtros, params = [], []
+    if estado_filtro:
+        filtros.append("estado_encomenda = %s")
+        params.append(estado_filtro)
+    # por omissão só os últimos 90 dias: o template diz desde quando e liga para "Todas"
+    periodo_desde = None
+    if periodo != "todas":
+        periodo_desde = date.today() - timedelta(days=int(periodo))
+        filtros.append("data_encomenda >= %s")
+        params.append(periodo_desde)
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+
+    encomendas = _fetchall_linhas(f"""
         SELECT
             id_encomenda,
             data_encomenda,
@@ -1185,13 +1292,57 @@ def admin_encomenda_list(request):
             utilizador_nome,
             utilizador_email
         FROM vw_admin_encomendas
+        {where}
         ORDER BY data_encomenda DESC, id_encomenda DESC
-    """)
+    """, params)
 
-    context = {"encomendas": encomendas}
+    context = {
+        "encomendas": encomendas,
+        "estados": ESTADOS_ENCOMENDA,
+        "estado_filtro": estado_filtro,
+        "periodos": PERIODOS_ENCOMENDAS,
+        "periodo": periodo,
+        "periodo_rotulo": dict(PERIODOS_ENCOMENDAS)[periodo],
+        "periodo_desde": periodo_desde,
+    }
     return render(request, "admin/encomendas/list.html", context)
 
 
+def admin_encomenda_transicao_lote(request):
+    if not _require_admin(request):
+        return redirect("home")
+
+    if request.method != "POST":
+        return redirect("admin_encomenda_list")
+
+    exec_id = request.session.get("user_id")
+    estado = request.POST.get("estado_destino", "").strip()
+    estado_filtro = request.POST.get("estado_filtro", "").strip()
+    periodo = request.POST.get("dias", "").strip()
+
+    try:
+        ids = sorted({int(x) for x in request.POST.getlist("encomendas")})
+    except ValueError:
+        ids = []
+
+    if not ids:
+        messages.error(request, "Seleciona pelo menos uma encomenda.")
+    elif estado not in ESTADOS_ENCOMENDA:
+        messages.error(request, "Estado de destino inválido.")
+    else:
+        ok, erro = _safe_callproc("sp_admin_encomendas_transicao_lote", [exec_id, ids, estado])
+        if not ok:
+            messages.error(request, f"Erro ao atualizar encomendas: {_user_friendly_db_error(erro)}")
+        else:
+            messages.success(request, f"{len(ids)} encomenda(s) passaram para \"{estado}\".")
+
+    # voltar à lista com os mesmos filtros
+    filtros = {k: v for k, v in (("estado", estado_filtro), ("dias", periodo)) if v}
+    if filtros:
+        return redirect(f"{reverse('admin_encomenda_list')}?{urlencode(filtros)}")
+    return redirect("admin_encomenda_list")
+
+
 def admin_encomenda_create(request):
     if not _require_admin(request):
         return redirect("home")
@@ -1230,22 +1381,45 @@ def admin_encomenda_create(request):
     return render(request, "admin/encomendas/form.html", context)
 
 
+def _data_encomenda_pedido(request):
+    """Data da encomenda vinda do link (?data=AAAA-MM-DD), ou None."""
+    try:
+        return date.fromisoformat(request.GET.get("data") or "")
+    except ValueError:
+        return None
+
+
+def _fetch_encomenda(sql, params, data):
+    """
+    Cabeçalho de uma encomenda procurada por id (`sql` acaba no WHERE). Com a
+    data, a consulta só lê a partição desse mês (Particionamento.sql); se não
+    houver data ou ela já não bater certo (link antigo, data alterada no
+    admin), procura só pelo id, em todas as partições.
+    """
+    if data is not None:
+        encomenda = _fetchone_dict(sql + "  AND data_encomenda = %s", [*params, data])
+        if encomenda:
+            return encomenda
+    return _fetchone_dict(sql, params)
+
+
 def admin_encomenda_edit(request, encomenda_id):
     if not _require_admin(request):
         return redirect("home")
 
     exec_id = request.session.get("user_id")
 
-    encomenda = _fetchone_dict("""
+    encomenda = _fetch_encomenda("""
         SELECT
             id_encomenda,
             data_encomenda,
             estado_encomenda,
             id_utilizador,
-            utilizador_nome
+            utilizador_nome,
+            total_encomenda
         FROM vw_admin_encomendas
         WHERE id_encomenda = %s
-    """, [encomenda_id])
+    """, [encomenda_id], _data_encomenda_pedido(request))
 
     if not encomenda:
         messages.error(request, "Encomenda não encontrada.")
@@ -1289,11 +1463,11 @@ def admin_encomenda_delete(request, encomenda_id):
 
     exec_id = request.session.get("user_id")
 
-    encomenda = _fetchone_dict("""
+    encomenda = _fetch_encomenda("""
         SELECT id_encomenda
         FROM vw_admin_encomendas
         WHERE id_encomenda = %s
-    """, [encomenda_id])
+    """, [encomenda_id], _data_encomenda_pedido(request))
 
     if not encomenda:
         messages.error(request, "Encomenda não encontrada.")
@@ -1315,21 +1489,23 @@ def admin_encomenda_detail(request, encomenda_id):
     if not _require_admin(request):
         return redirect("home")
 
-    encomenda = _fetchone_dict("""
+    encomenda = _fetch_encomenda("""
         SELECT
             id_encomenda,
             data_encomenda,
             estado_encomenda,
             id_utilizador,
-            utilizador_nome
+            utilizador_nome,
+            total_encomenda
         FROM vw_admin_encomendas
         WHERE id_encomenda = %s
-    """, [encomenda_id])
+    """, [encomenda_id], _data_encomenda_pedido(request))
 
     if not encomenda:
         messages.error(request, "Encomenda não encontrada.")
         return redirect("admin_encomenda_list")
 
+    # a data do cabeçalho limita as linhas à partição da encomenda
     linhas = _fetchall_dicts("""
         SELECT
             id_encomenda,
@@ -1339,13 +1515,11 @@ def admin_encomenda_detail(request, encomenda_id):
             quantidade
         FROM vw_admin_encomenda_linhas
         WHERE id_encomenda = %s
+          AND data_encomenda = %s
         ORDER BY nome_produto
-    """, [encomenda_id])
+    """, [encomenda_id, encomenda["data_encomenda"]])
 
-    total_encomenda = Decimal("0.00")
-    for linha in linhas:
-        if linha["preco_produto"] is not None:
-            total_encomenda += linha["preco_produto"] * linha["quantidade"]
+    total_encomenda = encomenda["total_encomenda"] or Decimal("0.00")
 
     produtos = _fetchall_dicts("""
         SELECT id_produto, nome
@@ -1437,7 +1611,7 @@ def admin_noticia_list(request):
     if not _require_admin(request):
         return redirect("home")
 
-    noticias = _fetchall_dicts("""
+    noticias = _fetchall_linhas("""
         SELECT
             id_noticia,
             titulo,
@@ -1578,7 +1752,7 @@ def admin_noticia_edit(request, noticia_id):
                 )
                 if not ok:
                     messages.error(request, f"Erro ao atualizar notícia: {erro}")
-                else:
+                elif _adicionar_imagens(request, "sp_admin_noticia_imagem_adicionar", exec_id, noticia_id):
                     messages.success(request, "Notícia atualizada com sucesso.")
                     return redirect("admin_noticia_list")
 
@@ -1620,8 +1794,7 @@ def admin_noticia_delete(request, noticia_id):
     return render(request, "admin/noticias/confirm_delete.html", context)
 
 
-def noticias_lista(request):
-    noticias = _fetchall_dicts("""
+_SQL_NOTICIAS = """
     SELECT
         id_noticia,
         titulo,
@@ -1630,31 +1803,66 @@ def noticias_lista(request):
         tipo_noticia_nome AS tipo_noticia,
         autor_nome
     FROM vw_noticias
-    ORDER BY data_publicacao DESC, id_noticia DESC
-""")
+"""
+
+
+@condicional("noticias")
+def noticias_lista(request):
+    noticias = _fetchall_dicts(_SQL_NOTICIAS + " ORDER BY data_publicacao DESC, id_noticia DESC")
+
+    # primeira imagem de cada notícia, numa só consulta
+    por_noticia = imagens.imagens_noticias([n["id_noticia"] for n in noticias])
+    for n in noticias:
+        n["imagem"] = por_noticia.get(n["id_noticia"])
 
     context = {"noticias": noticias}
     return render(request, "noticias/lista.html", context)
 
 
+@condicional("noticias")
+async def noticias_lista_async(request):
+    # lista e imagens em simultâneo (as imagens filtram por vw_noticias)
+    noticias, por_noticia = await asyncio.gather(
+        assincrono.fetchall_dicts(_SQL_NOTICIAS + " ORDER BY data_publicacao DESC, id_noticia DESC"),
+        imagens.imagens_noticias_async(),
+    )
+    for n in noticias:
+        n["imagem"] = por_noticia.get(n["id_noticia"])
+
+    context = {"noticias": noticias}
+    return render(request, "noticias/lista.html", context)
+
+
+@condicional("noticias")
 def noticia_detalhe(request, noticia_id):
-    noticia = _fetchone_dict("""
-    SELECT
-        id_noticia,
-        titulo,
-        conteudo,
-        data_publicacao,
-        tipo_noticia_nome AS tipo_noticia,
-        autor_nome
-    FROM vw_noticias
-    WHERE id_noticia = %s
-""", [noticia_id])
+    noticia = _fetchone_dict(_SQL_NOTICIAS + " WHERE id_noticia = %s", [noticia_id])
 
     if not noticia:
         messages.error(request, "Notícia não encontrada.")
         return redirect("noticias_lista")
 
-    context = {"noticia": noticia}
+    context = {
+        "noticia": noticia,
+        "imagens": imagens.imagens_noticias([noticia_id], todas=True).get(noticia_id, []),
+    }
+    return render(request, "noticias/detalhe.html", context)
+
+
+@condicional("noticias")
+async def noticia_detalhe_async(request, noticia_id):
+    noticia, por_noticia = await asyncio.gather(
+        assincrono.fetchone_dict(_SQL_NOTICIAS + " WHERE id_noticia = %s", [noticia_id]),
+        imagens.imagens_noticias_async([noticia_id], todas=True),
+    )
+
+    if not noticia:
+        messages.error(request, "Notícia não encontrada.")
+        return redirect("noticias_lista")
+
+    context = {
+        "noticia": noticia,
+        "imagens": por_noticia.get(noticia_id, []),
+    }
     return render(request, "noticias/detalhe.html", context)
 
 
@@ -1668,38 +1876,22 @@ def minhas_encomendas(request):
         messages.error(request, "Precisas de iniciar sessão para veres as tuas encomendas.")
         return redirect("login")
 
+    # total gravado na encomenda ao finalizar: uma única query para a lista
     encomendas = _fetchall_dicts("""
         SELECT
             id_encomenda,
             data_encomenda,
-            estado_encomenda
+            estado_encomenda,
+            total_encomenda
         FROM vw_cliente_encomendas
         WHERE id_utilizador = %s
         ORDER BY data_encomenda DESC, id_encomenda DESC
     """, [user_id])
 
-    encomendas_info = []
-    for enc in encomendas:
-        linhas = _fetchall_dicts("""
-            SELECT
-                id_encomenda,
-                id_produto,
-                nome_produto,
-                preco_produto,
-                quantidade
-            FROM vw_cliente_encomenda_detalhe
-            WHERE id_encomenda = %s
-        """, [enc["id_encomenda"]])
-
-        total = Decimal("0.00")
-        for linha in linhas:
-            if linha["preco_produto"] is not None:
-                total += linha["preco_produto"] * linha["quantidade"]
-
-        encomendas_info.append({
-            "encomenda": enc,
-            "total": total,
-        })
+    encomendas_info = [
+        {"encomenda": enc, "total": enc["total_encomenda"] or Decimal("0.00")}
+        for enc in encomendas
+    ]
 
     context = {"encomendas_info": encomendas_info}
     return render(request, "conta/minhas_encomendas.html", context)
@@ -1711,16 +1903,17 @@ def minha_encomenda_detail(request, encomenda_id):
         messages.error(request, "Precisas de iniciar sessão para veres as tuas encomendas.")
         return redirect("login")
 
-    encomenda = _fetchone_dict("""
+    encomenda = _fetch_encomenda("""
         SELECT
             id_encomenda,
             data_encomenda,
             estado_encomenda,
-            id_utilizador
+            id_utilizador,
+            total_encomenda
         FROM vw_cliente_encomendas
         WHERE id_encomenda = %s
           AND id_utilizador = %s
-    """, [encomenda_id, user_id])
+    """, [encomenda_id, user_id], _data_encomenda_pedido(request))
 
     if not encomenda:
         messages.error(request, "Encomenda não encontrada.")
@@ -1735,24 +1928,16 @@ def minha_encomenda_detail(request, encomenda_id):
             quantidade
         FROM vw_cliente_encomenda_detalhe
         WHERE id_encomenda = %s
-    """, [encomenda_id])
+          AND data_encomenda = %s
+    """, [encomenda_id, encomenda["data_encomenda"]])
 
-    total = Decimal("0.00")
+    # linhas antigas só têm preco_unitario depois do backfill_linhas_encomenda
     for linha in linhas:
-        preco = linha.get("preco_produto")
-        qtd = linha.get("quantidade") or 0
-
-        if preco is None:
-            linha["subtotal"] = Decimal("0.00")
-            continue
-
-    # garantir Decimal
-    preco = Decimal(str(preco))
-    qtd = int(qtd)
-
-    linha["subtotal"] = preco * qtd
-    total += linha["subtotal"]
+        linha["subtotal"] = (linha["preco_produto"] or Decimal("0.00")) * int(linha["quantidade"] or 0)
 
+    total = encomenda["total_encomenda"]
+    if total is None:
+        total = sum((l["subtotal"] for l in linhas), Decimal("0.00"))
 
     context = {"encomenda": encomenda, "linhas": linhas, "total_encomenda": total}
     return render(request, "conta/encomenda_detalhe.html", context)
@@ -1762,30 +1947,96 @@ def minha_encomenda_detail(request, encomenda_id):
 #  LOJA / CARRINHO – CLIENTE
 # ======================================================
 
+_SQL_LOJA_PRODUTOS = """
+    SELECT
+        id_produto,
+        nome,
+        descricao,
+        preco,
+        stock,
+        versao
+    FROM vw_loja_produtos
+    ORDER BY nome
+"""
+
+_TABELAS_LOJA = ["produto", "fornecedor", "tipo_produto", "imagem_produto", "imagem"]
+
+
+def _loja_produtos_com_imagens():
+    produtos = _fetchall_dicts(_SQL_LOJA_PRODUTOS)
+    # imagem principal de todos os produtos da página numa só consulta
+    por_produto = imagens.imagens_produtos([p["id_produto"] for p in produtos])
+    for p in produtos:
+        p["imagem"] = por_produto.get(p["id_produto"])
+    return produtos
+
+
+async def _loja_produtos_com_imagens_async():
+    produtos, por_produto = await asyncio.gather(
+        assincrono.fetchall_dicts(_SQL_LOJA_PRODUTOS),
+        imagens.imagens_loja_async(),
+    )
+    for p in produtos:
+        p["imagem"] = por_produto.get(p["id_produto"])
+    return produtos
+
+
+@condicional("catalogo")
 def loja_produtos(request):
-    produtos = _fetchall_dicts("""
-        SELECT
-            id_produto,
-            nome,
-            descricao,
-            preco,
-            stock
-        FROM vw_loja_produtos
-        ORDER BY nome
-    """)
+    # invalidado pelos triggers de Produto/Fornecedor/Tipo_Produto (inclui o stock
+    # alterado por trg_encomenda_stock), ver Core/cache_invalidacao.py; cada
+    # checkout invalida, por isso só um pedido recalcula (Core/cache.py)
+    produtos = cache.obter("loja:produtos", _loja_produtos_com_imagens, tabelas=_TABELAS_LOJA)
 
     context = {"produtos": produtos}
     return render(request, "loja/produtos.html", context)
 
 
+@condicional("catalogo")
+async def loja_produtos_async(request):
+    # a mesma entrada de cache que loja_produtos
+    produtos = await cache.obter_async(
+        "loja:produtos", _loja_produtos_com_imagens_async, tabelas=_TABELAS_LOJA
+    )
+
+    context = {"produtos": produtos}
+    return render(request, "loja/produtos.html", context)
+
+
+def _visitante(request):
+    # sem sessão iniciada o carrinho vive no cookie (ver Core/carrinho_convidado.py)
+    return not request.session.get("user_id")
+
+
+def _visitante_adicionar(request, produto_id, quantidade, mensagem):
+    carrinho = carrinho_convidado.ler(request)
+    atual = carrinho.get(produto_id, 0)
+
+    stock = carrinho_convidado.stock_disponivel(produto_id)
+    if stock is None:
+        messages.error(request, "Produto inválido ou inativo.")
+        return redirect("loja_produtos")
+    if atual + quantidade > stock:
+        messages.error(
+            request,
+            f"Quantidade total ({atual} + {quantidade}) excede o stock disponível ({stock}).",
+        )
+        return redirect("loja_carrinho")
+    if not atual and len(carrinho) >= carrinho_convidado.MAX_PRODUTOS:
+        messages.error(request, "O carrinho está cheio. Inicia sessão para continuar a comprar.")
+        return redirect("loja_carrinho")
+
+    carrinho[produto_id] = atual + quantidade
+    messages.success(request, mensagem)
+    resp = redirect("loja_carrinho")
+    carrinho_convidado.guardar(resp, carrinho)
+    return resp
+
+
 def loja_adicionar_produto(request, produto_id):
     if request.method != "POST":
         return redirect("loja_produtos")
 
-    user_id = _require_cliente(request)
-    if user_id is None:
-        return redirect("login")
-
     qtd_str = request.POST.get("quantidade", "1").strip()
     try:
         quantidade = int(qtd_str)
@@ -1795,6 +2046,13 @@ def loja_adicionar_produto(request, produto_id):
         messages.error(request, "Quantidade inválida.")
         return redirect("loja_produtos")
 
+    if _visitante(request):
+        return _visitante_adicionar(request, produto_id, quantidade, "Produto adicionado ao carrinho.")
+
+    user_id = _require_cliente(request)
+    if user_id is None:
+        return redirect("login")
+
     ok, erro = _safe_callproc("sp_loja_adicionar_produto", [user_id, produto_id, quantidade])
     if not ok:
         messages.error(request, _user_friendly_db_error(erro))
@@ -1804,19 +2062,34 @@ def loja_adicionar_produto(request, produto_id):
     return redirect("loja_carrinho")
 
 
+SQL_LOJA_CARRINHO = Preparada("loja_carrinho", """
+    SELECT
+        id_encomenda,
+        data_encomenda,
+        estado_encomenda
+    FROM vw_loja_carrinho
+    WHERE id_utilizador = %s
+""", tipos=("integer",))
+
+
 def loja_carrinho(request):
+    if _visitante(request):
+        carrinho = carrinho_convidado.ler(request)
+        linhas, total, valido, avisos = carrinho_convidado.linhas_validadas(carrinho)
+        for aviso in avisos:
+            messages.warning(request, aviso)
+
+        context = {"carrinho": None, "linhas": linhas, "total_encomenda": total, "visitante": True}
+        resp = render(request, "loja/carrinho.html", context)
+        if valido != carrinho:
+            carrinho_convidado.guardar(resp, valido)
+        return resp
+
     user_id = _require_cliente(request)
     if user_id is None:
         return redirect("login")
 
-    carrinho = _fetchone_dict("""
-        SELECT
-            id_encomenda,
-            data_encomenda,
-            estado_encomenda
-        FROM vw_loja_carrinho
-        WHERE id_utilizador = %s
-    """, [user_id])
+    carrinho = _fetchone_dict(SQL_LOJA_CARRINHO, [user_id])
 
     linhas = []
     total = Decimal("0.00")
@@ -1832,7 +2105,8 @@ def loja_carrinho(request):
                 quantidade
             FROM vw_loja_carrinho_linhas
             WHERE id_encomenda = %s
-        """, [carrinho["id_encomenda"]])
+              AND data_encomenda = %s
+        """, [carrinho["id_encomenda"], carrinho["data_encomenda"]])
 
         for linha in linhas:
             if linha["preco_produto"] is not None:
@@ -1863,6 +2137,10 @@ def loja_remover_linha(request, produto_id):
 
 
 def loja_finalizar_encomenda(request):
+    if _visitante(request):
+        messages.info(request, "Inicia sessão para finalizar a encomenda. O teu carrinho fica guardado.")
+        return redirect("login")
+
     user_id = _require_cliente(request)
     if user_id is None:
         return redirect("login")
@@ -1900,10 +2178,6 @@ def cliente_cancelar_encomenda(request, encomenda_id):
 
 
 def loja_remover_quantidade(request, produto_id):
-    user_id = _require_cliente(request)
-    if user_id is None:
-        return redirect("login")
-
     if request.method != "POST":
         return redirect("loja_carrinho")
 
@@ -1916,6 +2190,23 @@ def loja_remover_quantidade(request, produto_id):
         messages.error(request, "Quantidade a remover inválida.")
         return redirect("loja_carrinho")
 
+    if _visitante(request):
+        carrinho = carrinho_convidado.ler(request)
+        if produto_id not in carrinho:
+            messages.error(request, "O produto não está no carrinho.")
+            return redirect("loja_carrinho")
+        restante = carrinho.pop(produto_id) - qtd
+        if restante > 0:
+            carrinho[produto_id] = restante
+        messages.success(request, "Carrinho atualizado.")
+        resp = redirect("loja_carrinho")
+        carrinho_convidado.guardar(resp, carrinho)
+        return resp
+
+    user_id = _require_cliente(request)
+    if user_id is None:
+        return redirect("login")
+
     ok, erro = _safe_callproc("sp_loja_diminuir_quantidade", [user_id, produto_id, qtd])
     if not ok:
         messages.error(request, _user_friendly_db_error(erro))
@@ -1925,10 +2216,6 @@ def loja_remover_quantidade(request, produto_id):
 
 
 def loja_adicionar_quantidade(request, produto_id):
-    user_id = _require_cliente(request)
-    if user_id is None:
-        return redirect("login")
-
     if request.method != "POST":
         return redirect("loja_carrinho")
 
@@ -1941,36 +2228,21 @@ def loja_adicionar_quantidade(request, produto_id):
         messages.error(request, "Quantidade a adicionar inválida.")
         return redirect("loja_carrinho")
 
-    ok, erro = _safe_callproc("sp_loja_adicionar_produto", [user_id, produto_id, qtd])
-    if not ok:
-        messages.error(request, _user_friendly_db_error(erro))
-    else:
-        messages.success(request, "Carrinho atualizado.")
-    return redirect("loja_carrinho")
-def loja_adicionar_quantidade(request, produto_id):
+    if _visitante(request):
+        return _visitante_adicionar(request, produto_id, qtd, "Carrinho atualizado.")
+
     user_id = _require_cliente(request)
     if user_id is None:
         return redirect("login")
 
-    if request.method != "POST":
-        return redirect("loja_carrinho")
-
-    qtd_str = request.POST.get("quantidade_adicionar", "1").strip()
-    try:
-        qtd = int(qtd_str)
-        if qtd <= 0:
-            raise ValueError
-    except ValueError:
-        messages.error(request, "Quantidade a adicionar inválida.")
-        return redirect("loja_carrinho")
-
     ok, erro = _safe_callproc("sp_loja_adicionar_produto", [user_id, produto_id, qtd])
     if not ok:
-        messages.error(request, f"Não foi possível atualizar o carrinho: {erro}")
+        messages.error(request, _user_friendly_db_error(erro))
     else:
         messages.success(request, "Carrinho atualizado.")
     return redirect("loja_carrinho")
 
+
 def area_utilizador(request):
     user_id = request.session.get("user_id")
     user_tipo = (request.session.get("user_tipo") or "").lower()
@@ -2061,6 +2333,10 @@ def conta_alterar_password(request):
 
     return render(request, "conta/password_form.html")
 
+
+FORNECEDOR_ENCOMENDAS_POR_PAGINA = 25
+
+
 def fornecedor_encomendas_list(request):
     user_tipo = (request.session.get("user_tipo") or "").lower()
     if user_tipo != "fornecedor":
@@ -2069,17 +2345,13 @@ def fornecedor_encomendas_list(request):
 
     user_email = request.session.get("user_email")
 
-    fornecedor = _fetchone_dict("""
-        SELECT id_fornecedor, nome, email
-        FROM vw_fornecedores
-        WHERE LOWER(email) = LOWER(%s)
-    """, [user_email])
+    fornecedor = _fetchone_dict(SQL_FORNECEDOR_POR_EMAIL, [user_email])
 
     if not fornecedor:
         messages.error(request, "Não foi encontrado fornecedor associado ao teu email.")
         return redirect("home")
 
-    encomendas = _fetchall_dicts("""
+    consulta = _ConsultaPaginada("""
         SELECT
             id_encomenda,
             data_encomenda,
@@ -2090,11 +2362,18 @@ def fornecedor_encomendas_list(request):
         FROM vw_fornecedor_encomendas
         WHERE id_fornecedor = %s
         ORDER BY data_encomenda DESC, id_encomenda DESC
+    """, """
+        SELECT COUNT(*) AS total
+        FROM Fornecedor_Encomenda_Resumo
+        WHERE id_fornecedor = %s
     """, [fornecedor["id_fornecedor"]])
 
+    page_obj = Paginator(consulta, FORNECEDOR_ENCOMENDAS_POR_PAGINA).get_page(request.GET.get("pagina"))
+
     return render(request, "fornecedor/encomendas/list.html", {
         "fornecedor": fornecedor,
-        "encomendas": encomendas,
+        "encomendas": page_obj.object_list,
+        "page_obj": page_obj,
     })
 
 
@@ -2106,11 +2385,7 @@ def fornecedor_encomenda_detail(request, encomenda_id):
 
     user_email = request.session.get("user_email")
 
-    fornecedor = _fetchone_dict("""
-        SELECT id_fornecedor, nome, email
-        FROM vw_fornecedores
-        WHERE LOWER(email) = LOWER(%s)
-    """, [user_email])
+    fornecedor = _fetchone_dict(SQL_FORNECEDOR_POR_EMAIL, [user_email])
 
     if not fornecedor:
         messages.error(request, "Não foi encontrado fornecedor associado ao teu email.")
@@ -2143,10 +2418,11 @@ def fornecedor_encomenda_detail(request, encomenda_id):
         FROM vw_fornecedor_encomenda_linhas
         WHERE id_fornecedor = %s
           AND id_encomenda = %s
+          AND data_encomenda = %s
         ORDER BY nome_produto
-    """, [fornecedor["id_fornecedor"], encomenda_id])
+    """, [fornecedor["id_fornecedor"], encomenda_id, encomenda["data_encomenda"]])
 
-    return render(request, "fornecedor/encomendas/detail.html", {
+    return render(request, "fornecedor/encomendas/details.html", {
         "fornecedor": fornecedor,
         "encomenda": encomenda,
         "linhas": linhas,
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RS_Tradicional.settings')
+# liga as views async da loja, notícias e relatórios (settings.ASSINCRONO)
+os.environ.setdefault('RS_SERVIDOR', 'asgi')
 
 application = get_asgi_application()
@@ -49,11 +49,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'Core.estaticos.EstaticosMiddleware',
+    'Core.metricas.MetricasMiddleware',
+    'Core.instrumentacao.InstrumentacaoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'Core.perfilador.PerfiladorMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -69,11 +73,23 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'Core.contexto.navegacao',
             ],
         },
     },
 ]
 
+if not DEBUG:
+    # em produção os templates são compilados uma vez por processo, explicitamente
+    # (verificado por Core.apps: check "Core.W001")
+    TEMPLATES[0]["APP_DIRS"] = False
+    TEMPLATES[0]["OPTIONS"]["loaders"] = [
+        ("django.template.loaders.cached.Loader", [
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ]),
+    ]
+
 WSGI_APPLICATION = 'RS_Tradicional.wsgi.application'
 
 
@@ -88,6 +104,13 @@ DATABASES = {
         'PASSWORD': '2012',
         'HOST': 'localhost',
         'PORT': '5432',
+        # ligações reutilizadas entre pedidos: os statements preparados
+        # (SQL_PREPARADO) e os planos das procedures ficam na sessão.
+        # Sob ASGI não: cada pedido corre o SQL síncrono num thread do
+        # sync_to_async e as ligações persistentes desses threads nunca
+        # eram fechadas (a leitura async usa o pool do asyncpg)
+        'CONN_MAX_AGE': 0 if os.getenv("RS_SERVIDOR") == "asgi" else int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        'CONN_HEALTH_CHECKS': True,
         'TEST': {
             'NAME': 'RS_Tradicional_test',
         }
@@ -170,6 +193,22 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# collectstatic grava nomes com hash e cópias .gz/.br (Core/estaticos.py)
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "Core.estaticos.ArmazenamentoEstaticos"},
+}
+
+ESTATICOS = {
+    # servir STATIC_ROOT pelo Django (instalações sem servidor web à frente);
+    # em DEBUG o runserver serve os ficheiros originais
+    "SERVIR": os.getenv("ESTATICOS_SERVIR", "0" if DEBUG else "1") == "1",
+    "COMPRIMIR": ("css", "js", "svg", "json", "txt", "map"),
+    "TAMANHO_MINIMO": 256,
+    # ficheiros sem hash no nome (referidos fora do {% static %})
+    "MAX_AGE_SEM_HASH": 60,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -179,6 +218,18 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Imagens de produtos/notícias/fornecedores (Core/imagens.py). Os nomes têm o
+# hash do conteúdo: o servidor web pode servir MEDIA_URL + DIRETORIO com
+# "Cache-Control: public, max-age=31536000, immutable".
+IMAGENS = {
+    "DIRETORIO": "imagens",
+    "LARGURAS": [320, 640, 1024, 1600],
+    "QUALIDADE": int(os.getenv("IMAGENS_QUALIDADE", "80")),
+    "MAX_BYTES": 10 * 1024 * 1024,
+    # processos para gerar as variantes (precisa do Pillow); 0 = no próprio pedido
+    "PROCESSOS": int(os.getenv("IMAGENS_PROCESSOS", "2")),
+}
+
 # =========================
 # MongoDB (Relatórios)
 # =========================
@@ -186,4 +237,200 @@ MONGO = {
     "CLIENT_NAME": "rs_tradicional",
     "URI": os.getenv("MONGO_URI", "mongodb://localhost:27017"),
     "DB_NAME": os.getenv("MONGO_DB_NAME", "rs_tradicional_reports"),
+    # pool e timeouts (ms): falhar depressa se o Mongo estiver em baixo
+    "MAX_POOL_SIZE": int(os.getenv("MONGO_MAX_POOL_SIZE", "20")),
+    "MIN_POOL_SIZE": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    "CONNECT_TIMEOUT_MS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "2000")),
+    "SOCKET_TIMEOUT_MS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000")),
+    "SERVER_SELECTION_TIMEOUT_MS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "2000")),
+    # primary | primaryPreferred | secondary | secondaryPreferred | nearest
+    "READ_PREFERENCE": os.getenv("MONGO_READ_PREFERENCE", "primary"),
+    # ex: "zstd,snappy,zlib" (zstd/snappy precisam dos pacotes respetivos)
+    "COMPRESSORS": os.getenv("MONGO_COMPRESSORS", ""),
+    # verificação rápida usada por admin_relatorios
+    "SAUDE_TIMEOUT_MS": int(os.getenv("MONGO_SAUDE_TIMEOUT_MS", "300")),
+    "SAUDE_CACHE_SEGUNDOS": float(os.getenv("MONGO_SAUDE_CACHE_SEGUNDOS", "10")),
+}
+
+# =========================
+# Relatórios de admin: "mongo" (sync_reports_mongo) ou "postgres"
+# (materialized views de ScriptsBD/Relatorios.sql)
+# =========================
+RELATORIOS = {
+    "BACKEND": os.getenv("RELATORIOS_BACKEND", "mongo"),
+}
+
+# =========================
+# Cache em memória por processo, invalidada por LISTEN/NOTIFY
+# (Core/cache_invalidacao.py + fn_trg_notificar_cache em Triggers.sql)
+# =========================
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "rs_tradicional",
+        "TIMEOUT": 3600,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+    # {% cache %} dos templates (cartões da loja, linhas das listas do admin);
+    # separada para não expulsar os dados da "default"
+    "template_fragments": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "rs_tradicional_fragmentos",
+        "TIMEOUT": 86400,
+        "OPTIONS": {"MAX_ENTRIES": 50000},
+    },
+    # travões dos cálculos caros (Core/cache.py): partilhada pelos processos,
+    # para o single-flight valer entre workers; tabela criada em CreateDatabase.sql
+    "calculos": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "rs_cache_calculos",
+        "TIMEOUT": 900,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+
+CACHE_INVALIDACAO = {
+    "ATIVA": os.getenv("CACHE_INVALIDACAO_ATIVA", "1") == "1",
+    "CANAL": "rs_cache",
+    "CACHE": "default",
+    # TTL longo: a invalidação é feita pelas notificações
+    "TIMEOUT": int(os.getenv("CACHE_TIMEOUT", "3600")),
+    "RELIGAR_SEGUNDOS": 5,
+    "KEEPALIVE_SEGUNDOS": 60,
+}
+
+# =========================
+# Cache de cálculos caros com proteção contra stampede (Core/cache.py).
+# Os valores ficam na cache do processo (CACHE_INVALIDACAO["CACHE"]); os
+# travões em CACHES["calculos"], partilhada por todos os processos (por omissão
+# uma tabela no Postgres; pode ser Redis/Memcached). Com uma LocMemCache o
+# single-flight é só por processo.
+# =========================
+CACHE_CALCULOS = {
+    "ATIVA": os.getenv("CACHE_CALCULOS_ATIVA", "1") == "1",
+    "CACHE": os.getenv("CACHE_CALCULOS_CACHE", "calculos"),
+    "TTL": int(os.getenv("CACHE_CALCULOS_TTL", "300")),
+    # depois do TTL o valor antigo ainda é servido enquanto um pedido o recalcula
+    "STALE": int(os.getenv("CACHE_CALCULOS_STALE", "600")),
+    # refresh antecipado (XFetch): 0 desliga, > 1 antecipa mais
+    "BETA": 1.0,
+    "TRAVAO_SEGUNDOS": 30,
+    "ESPERA_SEGUNDOS": 0.05,
+    "ESPERA_MAX_SEGUNDOS": 10,
+}
+
+# =========================
+# GET condicional das páginas públicas (Core/versoes.py)
+# =========================
+GET_CONDICIONAL = {
+    "ATIVO": os.getenv("GET_CONDICIONAL_ATIVO", "1") == "1",
+    # entra no ETag: mudar a cada deploy (templates/CSS novos) para não servir
+    # 304 com HTML antigo; vazio = commit atual ou, sem git, o arranque do processo
+    "VERSAO_APP": os.getenv("VERSAO_APP", ""),
+}
+
+# =========================
+# Leitura assíncrona sob ASGI (Core/assincrono.py)
+# =========================
+ASSINCRONO = {
+    # loja, notícias e relatórios pelas views async; o asgi.py define
+    # RS_SERVIDOR=asgi (uvicorn RS_Tradicional.asgi:application)
+    "VIEWS": os.getenv("ASSINCRONO_VIEWS", "1" if os.getenv("RS_SERVIDOR") == "asgi" else "0") == "1",
+    "BD": "default",
+    # pool do asyncpg, por worker
+    "POOL_MIN": int(os.getenv("ASSINCRONO_POOL_MIN", "1")),
+    "POOL_MAX": int(os.getenv("ASSINCRONO_POOL_MAX", "10")),
+    "POOL_TIMEOUT": float(os.getenv("ASSINCRONO_POOL_TIMEOUT", "10")),
+}
+
+# =========================
+# Statements preparados das consultas mais repetidas (Core/db.py)
+# =========================
+SQL_PREPARADO = {
+    # desligar atrás de um pgbouncer em modo transaction
+    "ATIVO": os.getenv("SQL_PREPARADO_ATIVO", "1") == "1",
+}
+
+# =========================
+# Carrinhos abandonados (manage.py expirar_carrinhos)
+# =========================
+CARRINHOS = {
+    # dias sem atividade até o carrinho ser apagado
+    "EXPIRAR_DIAS": int(os.getenv("CARRINHOS_EXPIRAR_DIAS", "30")),
+    # carrinhos apagados por transação (cada lote bloqueia só estas linhas)
+    "LOTE_EXPIRACAO": int(os.getenv("CARRINHOS_LOTE_EXPIRACAO", "500")),
+}
+
+# =========================
+# Arquivo de encomendas antigas (manage.py arquivar_encomendas; só com
+# Encomenda particionada, ver ScriptsBD/Particionamento.sql)
+# =========================
+ARQUIVO = {
+    # meses completos mantidos nas tabelas, além do mês atual
+    "MANTER_MESES": int(os.getenv("ARQUIVO_MANTER_MESES", "24")),
+    # partições criadas à frente do mês atual
+    "MESES_FUTUROS": 3,
+    "DIRETORIO": os.getenv("ARQUIVO_DIRETORIO", str(BASE_DIR / "var" / "arquivo")),
+}
+
+# =========================
+# Instrumentação por pedido (queries, tempo de BD, Mongo)
+# =========================
+INSTRUMENTACAO = {
+    "ATIVA": os.getenv("INSTRUMENTACAO_ATIVA", "1") == "1",
+    # pedidos com mais queries do que isto são registados como WARNING
+    "LIMITE_QUERIES": int(os.getenv("INSTRUMENTACAO_LIMITE_QUERIES", "20")),
+    "HEADER_SERVER_TIMING": True,
+    "SQL_MAX_CHARS": 300,
+}
+
+# =========================
+# Métricas (/metrics, formato Prometheus)
+# =========================
+METRICAS = {
+    "ATIVAS": os.getenv("METRICAS_ATIVAS", "1") == "1",
+    # partilhado por todos os workers do gunicorn (um ficheiro por processo)
+    "DIRETORIO": os.getenv("METRICAS_DIRETORIO", str(BASE_DIR / "var" / "metricas")),
+    "INTERVALO_FLUSH": 5,
+    # None = sem restrição
+    "IPS_PERMITIDOS": [ip for ip in os.getenv("METRICAS_IPS", "127.0.0.1,::1").split(",") if ip] or None,
+    # sem token o /metrics só responde com DEBUG=True (ver Core.metricas.pedido_autorizado)
+    "TOKEN": os.getenv("METRICAS_TOKEN") or None,
+}
+
+# =========================
+# Profiling de pedidos (cProfile por amostragem ou header de admin)
+# =========================
+PERFILADOR = {
+    "ATIVO": os.getenv("PERFILADOR_ATIVO", "0") == "1",
+    # fração de pedidos perfilados (0.01 = 1%)
+    "AMOSTRAGEM": float(os.getenv("PERFILADOR_AMOSTRAGEM", "0.0")),
+    # um admin autenticado pode forçar o profiling com este header
+    "HEADER": "X-RS-Profile",
+    "DIRETORIO": os.getenv("PERFILADOR_DIRETORIO", str(BASE_DIR / "var" / "perfis")),
+    "MAX_PERFIS": 200,
+    "TOP_FUNCOES": 25,
+    "TOP_SQL": 10,
+}
+
+# =========================
+# Benchmarks (comandos bench_*)
+# =========================
+BENCHMARKS = {
+    "DIRETORIO": os.getenv("BENCHMARKS_DIRETORIO", str(BASE_DIR / "var" / "benchmarks")),
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "Core.instrumentacao": {
+            "handlers": ["console"],
+            "level": os.getenv("INSTRUMENTACAO_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
 }
@@ -1,7 +1,12 @@
 # RS_Tradicional/urls.py
+from django.conf import settings
+from django.conf.urls.static import static
 from django.urls import path, include
 
 urlpatterns = [
     path("", include("Core.urls"), name="core"),
     path("conta/", include("Utilizadores.urls"), name="conta"),
 ]
+
+# em produção /media/ é servido pelo servidor web (ver settings.IMAGENS)
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
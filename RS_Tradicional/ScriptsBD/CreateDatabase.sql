@@ -1,3 +1,4 @@
+DROP TABLE IF EXISTS Fornecedor_Encomenda_Resumo CASCADE;
 DROP TABLE IF EXISTS Encomendas_Produtos CASCADE;
 DROP TABLE IF EXISTS Encomenda CASCADE;
 DROP TABLE IF EXISTS Imagem_Noticia CASCADE;
@@ -56,6 +57,7 @@ CREATE TABLE Produto
     estado_produto VARCHAR(64) NOT NULL,
     id_tipo_produto INT NULL,
     id_fornecedor INT NULL,
+    versao BIGINT NOT NULL DEFAULT 1,
     CONSTRAINT FK_fornecedor FOREIGN KEY (id_fornecedor) REFERENCES Fornecedor(id_fornecedor) ON DELETE SET NULL,
     CONSTRAINT FK_tipo_produto FOREIGN KEY (id_tipo_produto) REFERENCES Tipo_Produto(id_tipo_produto) ON DELETE SET NULL
 );
@@ -108,15 +110,107 @@ CREATE TABLE Encomenda
     data_encomenda DATE NOT NULL,
     id_utilizador INT NOT NULL,
     estado_encomenda VARCHAR(64) NOT NULL,
-    CONSTRAINT FK_id_utilizador FOREIGN KEY (id_utilizador) REFERENCES Utilizador(id_utilizador) ON DELETE CASCADE
+    total_encomenda NUMERIC NULL, /*gravado ao finalizar; NULL enquanto Carrinho*/
+    CONSTRAINT FK_id_utilizador FOREIGN KEY (id_utilizador) REFERENCES Utilizador(id_utilizador) ON DELETE CASCADE,
+    /*alvo das FKs (id_encomenda, data_encomenda): a data é a chave de partição (ver Particionamento.sql)*/
+    CONSTRAINT UQ_encomenda_data UNIQUE (id_encomenda, data_encomenda)
 );
 
 CREATE TABLE Encomendas_Produtos
 (
     id SERIAL PRIMARY KEY,
-    id_encomenda INT NOT NULL REFERENCES Encomenda(id_encomenda) ON DELETE CASCADE,
+    id_encomenda   INT NOT NULL,
+    /*cópia da data da encomenda (mantida pela FK); as linhas ficam na mesma partição que a encomenda*/
+    data_encomenda DATE NOT NULL,
     id_produto   INT NOT NULL REFERENCES Produto(id_produto)     ON DELETE CASCADE,
     quantidade   INT DEFAULT 1,
-    UNIQUE (id_encomenda, id_produto)
+    /*cópia do produto no momento da compra (preenchida por trigger e atualizada ao finalizar)*/
+    preco_unitario NUMERIC NOT NULL CHECK (preco_unitario >= 0),
+    nome_produto   VARCHAR(255) NOT NULL,
+    UNIQUE (id_encomenda, id_produto, data_encomenda),
+    CONSTRAINT FK_linha_encomenda FOREIGN KEY (id_encomenda, data_encomenda)
+        REFERENCES Encomenda(id_encomenda, data_encomenda) ON UPDATE CASCADE ON DELETE CASCADE
+);
+
+CREATE INDEX ix_encomendas_produtos_produto ON Encomendas_Produtos (id_produto);
+
+/*Encomendas de um cliente (minhas_encomendas) e o seu Carrinho (vw_loja_carrinho)*/
+CREATE INDEX ix_encomenda_utilizador ON Encomenda (id_utilizador, estado_encomenda);
+
+/*Carrinhos por data da última atividade (expirar_carrinhos); parcial, só tem carrinhos*/
+CREATE INDEX ix_encomenda_carrinho_atividade
+    ON Encomenda (data_encomenda, id_encomenda)
+    WHERE estado_encomenda = 'Carrinho';
+
+/*Resumo por (fornecedor, encomenda), mantido por triggers (ver Triggers.sql).
+  Substitui o GROUP BY de vw_fornecedor_encomendas: as páginas do fornecedor
+  leem apenas as suas linhas pelo índice.*/
+CREATE TABLE Fornecedor_Encomenda_Resumo
+(
+    id_fornecedor    INT NOT NULL REFERENCES Fornecedor(id_fornecedor) ON DELETE CASCADE,
+    id_encomenda     INT NOT NULL,
+    data_encomenda   DATE NOT NULL,
+    estado_encomenda VARCHAR(64) NOT NULL,
+    id_utilizador    INT NOT NULL,
+    total_fornecedor NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (id_fornecedor, id_encomenda),
+    CONSTRAINT FK_resumo_encomenda FOREIGN KEY (id_encomenda, data_encomenda)
+        REFERENCES Encomenda(id_encomenda, data_encomenda) ON UPDATE CASCADE ON DELETE CASCADE
+);
+
+CREATE INDEX ix_fornecedor_resumo_pagina
+    ON Fornecedor_Encomenda_Resumo (id_fornecedor, data_encomenda DESC, id_encomenda DESC);
+CREATE INDEX ix_fornecedor_resumo_encomenda
+    ON Fornecedor_Encomenda_Resumo (id_encomenda);
+
+
+-- versão dos dados públicos (catálogo, notícias), incrementada pelos triggers
+-- de Triggers.sql; serve de ETag/Last-Modified às páginas (Core/versoes.py)
+CREATE TABLE Versao_Dados
+(
+    recurso       VARCHAR(64) PRIMARY KEY,
+    versao        BIGINT NOT NULL DEFAULT 0,
+    atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO Versao_Dados (recurso) VALUES ('catalogo'), ('noticias');
+
+-- uma linha por escrita (INSERT sem conflitos, em vez de UPDATE à linha do
+-- recurso); a versão é Versao_Dados.versao + nº de eventos (vw_versao_dados)
+-- e sp_compactar_versao_dados soma-os periodicamente
+CREATE TABLE Versao_Dados_Evento
+(
+    id_evento BIGSERIAL PRIMARY KEY,
+    recurso   VARCHAR(64) NOT NULL,
+    criado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX ix_versao_dados_evento_recurso ON Versao_Dados_Evento (recurso);
+
+-- CACHES["calculos"] (DatabaseCache do Django, Core/cache.py): partilhada
+-- pelos processos; o mesmo que 'manage.py createcachetable'
+CREATE TABLE rs_cache_calculos
+(
+    cache_key VARCHAR(255) NOT NULL PRIMARY KEY,
+    value     TEXT NOT NULL,
+    expires   TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX rs_cache_calculos_expires ON rs_cache_calculos (expires);
+
+-- imagens guardadas por conteúdo (Core/imagens.py): Imagem_Produto.caminho,
+-- Imagem_Noticia.uri e Fornecedor.imagem_fornecedor referem-nas como
+-- 'sha256:<hash>.<extensao>'; os valores antigos (URLs) continuam válidos
+CREATE TABLE Imagem
+(
+    hash          CHAR(64) PRIMARY KEY,
+    extensao      VARCHAR(8) NOT NULL,
+    largura       INT NULL,
+    altura        INT NULL,
+    tamanho_bytes INT NOT NULL,
+    larguras      INT[] NOT NULL DEFAULT '{}',
+    criada_em     TIMESTAMPTZ NOT NULL DEFAULT now()
 );
 
+CREATE INDEX ix_imagem_produto_produto ON Imagem_Produto (id_produto, id_imagem);
+CREATE INDEX ix_imagem_noticia_noticia ON Imagem_Noticia (id_noticia, id_imagem);
@@ -0,0 +1,130 @@
+-- =========================================
+-- PARTICIONAMENTO de Encomenda e Encomendas_Produtos por mês (data_encomenda)
+--
+-- Requer PostgreSQL >= 15: mudar a data de uma encomenda (checkout, carrinho
+-- com atividade noutro mês, edição no admin) move-a de partição e as FKs
+-- (id_encomenda, data_encomenda) ON UPDATE CASCADE levam as linhas e o resumo
+-- por fornecedor com ela.
+--
+-- Converte as tabelas de uma BD já atualizada com Upgrade.sql. As views,
+-- triggers e materialized views ficam presos às tabelas antigas e são
+-- apagados com elas, por isso a ordem é:
+--   Particionamento.sql -> functions_views.sql -> Triggers.sql ->
+--   Procedures.sql -> Relatorios.sql
+--
+-- Manutenção: manage.py arquivar_encomendas cria as partições dos meses
+-- seguintes e desanexa/exporta as antigas.
+-- =========================================
+
+-- Cria as partições mensais em falta entre p_inicio e p_fim (nas duas tabelas).
+-- Se a partição DEFAULT já tiver linhas desse mês o CREATE falha: as linhas
+-- têm de ser movidas antes (não deve acontecer com as partições criadas a tempo).
+CREATE OR REPLACE FUNCTION fn_particoes_garantir(p_inicio DATE, p_fim DATE)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_mes     DATE := date_trunc('month', p_inicio)::DATE;
+    v_tabela  TEXT;
+    v_nome    TEXT;
+    v_criadas INT := 0;
+BEGIN
+    WHILE v_mes <= p_fim LOOP
+        FOREACH v_tabela IN ARRAY ARRAY['encomenda', 'encomendas_produtos'] LOOP
+            v_nome := v_tabela || to_char(v_mes, '"_p"YYYY_MM');
+            IF to_regclass(v_nome) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                    v_nome, v_tabela, v_mes, (v_mes + INTERVAL '1 month')::DATE
+                );
+                v_criadas := v_criadas + 1;
+            END IF;
+        END LOOP;
+        v_mes := (v_mes + INTERVAL '1 month')::DATE;
+    END LOOP;
+    RETURN v_criadas;
+END;
+$$;
+
+
+BEGIN;
+
+-- o resumo volta a apontar para a nova Encomenda no fim
+ALTER TABLE Fornecedor_Encomenda_Resumo DROP CONSTRAINT IF EXISTS FK_resumo_encomenda;
+
+ALTER TABLE Encomendas_Produtos RENAME TO encomendas_produtos_antiga;
+ALTER TABLE Encomenda RENAME TO encomenda_antiga;
+
+-- as sequências dos SERIAL passam para as novas tabelas
+ALTER SEQUENCE encomenda_id_encomenda_seq OWNED BY NONE;
+ALTER SEQUENCE encomendas_produtos_id_seq OWNED BY NONE;
+
+CREATE TABLE Encomenda
+(
+    id_encomenda     INT NOT NULL DEFAULT nextval('encomenda_id_encomenda_seq'),
+    data_encomenda   DATE NOT NULL,
+    id_utilizador    INT NOT NULL,
+    estado_encomenda VARCHAR(64) NOT NULL,
+    total_encomenda  NUMERIC NULL,
+    CONSTRAINT PK_encomenda PRIMARY KEY (id_encomenda, data_encomenda),
+    CONSTRAINT FK_id_utilizador FOREIGN KEY (id_utilizador) REFERENCES Utilizador(id_utilizador) ON DELETE CASCADE
+) PARTITION BY RANGE (data_encomenda);
+
+CREATE TABLE Encomendas_Produtos
+(
+    id             INT NOT NULL DEFAULT nextval('encomendas_produtos_id_seq'),
+    id_encomenda   INT NOT NULL,
+    data_encomenda DATE NOT NULL,
+    id_produto     INT NOT NULL REFERENCES Produto(id_produto) ON DELETE CASCADE,
+    quantidade     INT DEFAULT 1,
+    preco_unitario NUMERIC NOT NULL CHECK (preco_unitario >= 0),
+    nome_produto   VARCHAR(255) NOT NULL,
+    CONSTRAINT PK_encomendas_produtos PRIMARY KEY (id, data_encomenda),
+    CONSTRAINT UQ_linha_encomenda_produto UNIQUE (id_encomenda, id_produto, data_encomenda),
+    CONSTRAINT FK_linha_encomenda FOREIGN KEY (id_encomenda, data_encomenda)
+        REFERENCES Encomenda(id_encomenda, data_encomenda) ON UPDATE CASCADE ON DELETE CASCADE
+) PARTITION BY RANGE (data_encomenda);
+
+-- um mês por partição, do mais antigo até 3 meses à frente
+SELECT fn_particoes_garantir(
+    COALESCE((SELECT MIN(data_encomenda) FROM encomenda_antiga), CURRENT_DATE),
+    GREATEST(
+        (SELECT MAX(data_encomenda) FROM encomenda_antiga),
+        (CURRENT_DATE + INTERVAL '3 months')::DATE
+    )
+);
+
+-- datas fora das partições (ex: editadas no admin para daqui a um ano)
+CREATE TABLE encomenda_default PARTITION OF Encomenda DEFAULT;
+CREATE TABLE encomendas_produtos_default PARTITION OF Encomendas_Produtos DEFAULT;
+
+-- sem triggers nas tabelas novas: a cópia não recalcula resumos nem totais
+INSERT INTO Encomenda (id_encomenda, data_encomenda, id_utilizador, estado_encomenda, total_encomenda)
+SELECT id_encomenda, data_encomenda, id_utilizador, estado_encomenda, total_encomenda
+FROM encomenda_antiga;
+
+INSERT INTO Encomendas_Produtos (id, id_encomenda, data_encomenda, id_produto, quantidade, preco_unitario, nome_produto)
+SELECT id, id_encomenda, data_encomenda, id_produto, quantidade, preco_unitario, nome_produto
+FROM encomendas_produtos_antiga;
+
+DROP TABLE encomendas_produtos_antiga CASCADE;
+DROP TABLE encomenda_antiga CASCADE;
+
+ALTER SEQUENCE encomenda_id_encomenda_seq OWNED BY Encomenda.id_encomenda;
+ALTER SEQUENCE encomendas_produtos_id_seq OWNED BY Encomendas_Produtos.id;
+
+-- índices criados depois da cópia (um por partição)
+CREATE INDEX ix_encomenda_utilizador ON Encomenda (id_utilizador, estado_encomenda);
+CREATE INDEX ix_encomenda_carrinho_atividade
+    ON Encomenda (data_encomenda, id_encomenda)
+    WHERE estado_encomenda = 'Carrinho';
+CREATE INDEX ix_encomendas_produtos_produto ON Encomendas_Produtos (id_produto);
+
+ALTER TABLE Fornecedor_Encomenda_Resumo
+    ADD CONSTRAINT FK_resumo_encomenda FOREIGN KEY (id_encomenda, data_encomenda)
+        REFERENCES Encomenda(id_encomenda, data_encomenda) ON UPDATE CASCADE ON DELETE CASCADE;
+
+COMMIT;
+
+ANALYZE Encomenda;
+ANALYZE Encomendas_Produtos;
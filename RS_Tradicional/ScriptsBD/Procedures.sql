@@ -1005,6 +1005,7 @@ AS $$
 DECLARE
     v_tipo_cliente TEXT;
     v_encomenda_id INT;
+    v_data         DATE;
     v_stock        INT;
     v_qtd_atual    INT;
 BEGIN
@@ -1035,24 +1036,36 @@ BEGIN
         RAISE EXCEPTION 'Stock inválido para produto %.', p_id_produto;
     END IF;
 
-    SELECT id_encomenda
-    INTO v_encomenda_id
+    SELECT id_encomenda, data_encomenda
+    INTO v_encomenda_id, v_data
     FROM Encomenda
     WHERE id_utilizador = p_id_utilizador
       AND estado_encomenda = 'Carrinho'
-    LIMIT 1;
+    LIMIT 1
+    -- espera por um expirar_carrinhos em curso: se este apagar o carrinho, o
+    -- SELECT não devolve nada e é criado um novo (em vez de a FK das linhas falhar)
+    FOR UPDATE;
 
     IF v_encomenda_id IS NULL THEN
         INSERT INTO Encomenda (data_encomenda, id_utilizador, estado_encomenda)
         VALUES (CURRENT_DATE, p_id_utilizador, 'Carrinho')
-        RETURNING id_encomenda INTO v_encomenda_id;
+        RETURNING id_encomenda, data_encomenda INTO v_encomenda_id, v_data;
+    ELSIF v_data < CURRENT_DATE THEN
+        -- num Carrinho a data é a da última atividade (ver expirar_carrinhos);
+        -- a FK leva a nova data às linhas
+        UPDATE Encomenda
+        SET data_encomenda = CURRENT_DATE
+        WHERE id_encomenda = v_encomenda_id
+          AND data_encomenda = v_data;
+        v_data := CURRENT_DATE;
     END IF;
 
     SELECT quantidade
     INTO v_qtd_atual
     FROM Encomendas_Produtos
-    WHERE id_encomenda = v_encomenda_id
-      AND id_produto   = p_id_produto;
+    WHERE id_encomenda   = v_encomenda_id
+      AND data_encomenda = v_data
+      AND id_produto     = p_id_produto;
 
     v_qtd_atual := COALESCE(v_qtd_atual, 0);
 
@@ -1062,14 +1075,87 @@ BEGIN
             v_qtd_atual, p_quantidade, v_stock, p_id_produto;
     END IF;
 
-    INSERT INTO Encomendas_Produtos (id_encomenda, id_produto, quantidade)
-    VALUES (v_encomenda_id, p_id_produto, p_quantidade)
-    ON CONFLICT (id_encomenda, id_produto)
+    INSERT INTO Encomendas_Produtos (id_encomenda, data_encomenda, id_produto, quantidade)
+    VALUES (v_encomenda_id, v_data, p_id_produto, p_quantidade)
+    ON CONFLICT (id_encomenda, id_produto, data_encomenda)
     DO UPDATE SET quantidade = Encomendas_Produtos.quantidade + EXCLUDED.quantidade;
 END;
 $$;
 
 
+-- Loja: juntar o carrinho de visitante (cookie) ao Carrinho do cliente, no login.
+-- Um único INSERT para todas as linhas; produtos que deixaram de estar à venda
+-- são ignorados e as quantidades ficam limitadas ao stock (sem erro, o
+-- visitante não tem como corrigir o carrinho antes de entrar).
+DROP PROCEDURE IF EXISTS sp_loja_juntar_carrinho(INT, INT[], INT[]);
+
+CREATE OR REPLACE PROCEDURE sp_loja_juntar_carrinho(
+    p_id_utilizador INT,
+    p_produtos      INT[],
+    p_quantidades   INT[]
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_tipo_cliente TEXT;
+    v_encomenda_id INT;
+    v_data         DATE;
+BEGIN
+    v_tipo_cliente := fn_get_tipo_utilizador(p_id_utilizador);
+    IF v_tipo_cliente IS NULL OR lower(v_tipo_cliente) <> 'cliente' THEN
+        RAISE EXCEPTION 'Apenas clientes podem usar o carrinho.';
+    END IF;
+
+    IF cardinality(p_produtos) IS DISTINCT FROM cardinality(p_quantidades) THEN
+        RAISE EXCEPTION 'Produtos e quantidades com tamanhos diferentes.';
+    END IF;
+
+    IF COALESCE(cardinality(p_produtos), 0) = 0 THEN
+        RETURN;
+    END IF;
+
+    SELECT id_encomenda, data_encomenda
+    INTO v_encomenda_id, v_data
+    FROM Encomenda
+    WHERE id_utilizador = p_id_utilizador
+      AND estado_encomenda = 'Carrinho'
+    LIMIT 1
+    FOR UPDATE;
+
+    IF v_encomenda_id IS NULL THEN
+        INSERT INTO Encomenda (data_encomenda, id_utilizador, estado_encomenda)
+        VALUES (CURRENT_DATE, p_id_utilizador, 'Carrinho')
+        RETURNING id_encomenda, data_encomenda INTO v_encomenda_id, v_data;
+    ELSIF v_data < CURRENT_DATE THEN
+        -- num Carrinho a data é a da última atividade (ver expirar_carrinhos)
+        UPDATE Encomenda
+        SET data_encomenda = CURRENT_DATE
+        WHERE id_encomenda = v_encomenda_id
+          AND data_encomenda = v_data;
+        v_data := CURRENT_DATE;
+    END IF;
+
+    INSERT INTO Encomendas_Produtos (id_encomenda, data_encomenda, id_produto, quantidade)
+    SELECT v_encomenda_id, v_data, p.id_produto, LEAST(c.quantidade, p.stock)
+    FROM (
+        SELECT id_produto, SUM(quantidade)::INT AS quantidade
+        FROM unnest(p_produtos, p_quantidades) AS u(id_produto, quantidade)
+        WHERE quantidade > 0
+        GROUP BY id_produto
+    ) c
+    JOIN Produto p ON p.id_produto = c.id_produto
+    WHERE p.is_approved = TRUE
+      AND p.estado_produto = 'Ativo'
+      AND p.stock > 0
+    ON CONFLICT (id_encomenda, id_produto, data_encomenda)
+    DO UPDATE SET quantidade = LEAST(
+        Encomendas_Produtos.quantidade + EXCLUDED.quantidade,
+        (SELECT stock FROM Produto WHERE id_produto = EXCLUDED.id_produto)
+    );
+END;
+$$;
+
+
 -- Loja: finalizar encomenda (Carrinho -> Pendente)
 DROP PROCEDURE IF EXISTS sp_loja_finalizar_encomenda(INT);
 
@@ -1081,32 +1167,57 @@ AS $$
 DECLARE
     v_tipo_cliente TEXT;
     v_encomenda_id INT;
+    v_data         DATE;
 BEGIN
     v_tipo_cliente := fn_get_tipo_utilizador(p_id_utilizador);
     IF v_tipo_cliente IS NULL OR lower(v_tipo_cliente) <> 'cliente' THEN
         RAISE EXCEPTION 'Apenas clientes podem finalizar encomendas.';
     END IF;
 
-    SELECT id_encomenda
-    INTO v_encomenda_id
+    SELECT id_encomenda, data_encomenda
+    INTO v_encomenda_id, v_data
     FROM Encomenda
     WHERE id_utilizador = p_id_utilizador
       AND estado_encomenda = 'Carrinho'
-    LIMIT 1;
+    LIMIT 1
+    -- apagado entretanto por expirar_carrinhos: cai na mensagem abaixo
+    FOR UPDATE;
 
     IF v_encomenda_id IS NULL THEN
         RAISE EXCEPTION 'Não existe carrinho para este utilizador.';
     END IF;
 
-    IF NOT EXISTS (SELECT 1 FROM Encomendas_Produtos WHERE id_encomenda = v_encomenda_id) THEN
+    -- a data em todos os acessos limita-os à partição do carrinho
+    IF NOT EXISTS (
+        SELECT 1 FROM Encomendas_Produtos
+        WHERE id_encomenda = v_encomenda_id AND data_encomenda = v_data
+    ) THEN
         RAISE EXCEPTION 'O carrinho está vazio.';
     END IF;
 
+    -- fixar preço e nome atuais nas linhas (a encomenda deixa de depender de Produto)
+    UPDATE Encomendas_Produtos ep
+    SET
+        preco_unitario = p.preco,
+        nome_produto   = p.nome
+    FROM Produto p
+    WHERE p.id_produto = ep.id_produto
+      AND ep.id_encomenda = v_encomenda_id
+      AND ep.data_encomenda = v_data
+      AND (ep.preco_unitario, ep.nome_produto) IS DISTINCT FROM (p.preco, p.nome);
+
     UPDATE Encomenda
     SET
         estado_encomenda = 'Pendente',
-        data_encomenda   = CURRENT_DATE
-    WHERE id_encomenda = v_encomenda_id;
+        data_encomenda   = CURRENT_DATE,
+        total_encomenda  = (
+            SELECT COALESCE(SUM(quantidade * preco_unitario), 0)
+            FROM Encomendas_Produtos
+            WHERE id_encomenda = v_encomenda_id
+              AND data_encomenda = v_data
+        )
+    WHERE id_encomenda = v_encomenda_id
+      AND data_encomenda = v_data;
 END;
 $$;
 
@@ -1120,21 +1231,25 @@ LANGUAGE plpgsql
 AS $$
 DECLARE
     v_encomenda_id INT;
+    v_data         DATE;
 BEGIN
-    SELECT id_encomenda
-    INTO v_encomenda_id
+    SELECT id_encomenda, data_encomenda
+    INTO v_encomenda_id, v_data
     FROM Encomenda
     WHERE id_utilizador = p_id_utilizador
       AND estado_encomenda = 'Carrinho'
-    LIMIT 1;
+    LIMIT 1
+    -- apagado entretanto por expirar_carrinhos: cai na mensagem abaixo
+    FOR UPDATE;
 
     IF v_encomenda_id IS NULL THEN
         RAISE EXCEPTION 'Não existe carrinho para este utilizador.';
     END IF;
 
     DELETE FROM Encomendas_Produtos
-    WHERE id_encomenda = v_encomenda_id
-      AND id_produto   = p_id_produto;
+    WHERE id_encomenda   = v_encomenda_id
+      AND data_encomenda = v_data
+      AND id_produto     = p_id_produto;
 END;
 $$;
 
@@ -1253,6 +1368,97 @@ END;
 $$;
 
 
+-- Transições de estado permitidas (admin/gestor)
+DROP FUNCTION IF EXISTS fn_encomenda_transicao_valida(TEXT, TEXT);
+
+CREATE OR REPLACE FUNCTION fn_encomenda_transicao_valida(
+    p_origem  TEXT,
+    p_destino TEXT
+)
+RETURNS BOOLEAN
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT CASE p_origem
+        WHEN 'Pendente'         THEN p_destino IN ('Em processamento', 'Enviada', 'Cancelada')
+        WHEN 'Em processamento' THEN p_destino IN ('Enviada', 'Cancelada')
+        WHEN 'Enviada'          THEN p_destino IN ('Concluída')
+        ELSE FALSE
+    END;
+$$;
+
+
+-- Admin: mudar o estado de várias encomendas de uma só vez (COM p_id_exec)
+-- Um único UPDATE: o trg_encomenda_stock (statement-level) trata o stock do lote todo.
+DROP PROCEDURE IF EXISTS sp_admin_encomendas_transicao_lote(INT, INT[], TEXT);
+
+CREATE OR REPLACE PROCEDURE sp_admin_encomendas_transicao_lote(
+    p_id_exec       INT,
+    p_ids_encomenda INT[],
+    p_estado        TEXT
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_tipo_exec   TEXT;
+    v_estado      TEXT;
+    v_total       INT;
+    v_encontradas INT;
+    v_invalidas   TEXT;
+BEGIN
+    v_tipo_exec := fn_get_tipo_utilizador(p_id_exec);
+    IF v_tipo_exec IS NULL OR lower(v_tipo_exec) NOT IN ('admin','gestor') THEN
+        RAISE EXCEPTION 'Apenas admin/gestor podem gerir encomendas.';
+    END IF;
+
+    v_estado := NULLIF(btrim(p_estado), '');
+    IF v_estado IS NULL THEN
+        RAISE EXCEPTION 'O estado de destino é obrigatório.';
+    END IF;
+
+    IF p_ids_encomenda IS NULL OR cardinality(p_ids_encomenda) = 0 THEN
+        RAISE EXCEPTION 'Nenhuma encomenda selecionada.';
+    END IF;
+
+    SELECT COUNT(DISTINCT x) INTO v_total FROM unnest(p_ids_encomenda) AS x;
+
+    -- Bloquear o lote (ordem fixa para evitar deadlocks entre lotes concorrentes)
+    SELECT COUNT(*)
+    INTO v_encontradas
+    FROM (
+        SELECT id_encomenda
+        FROM Encomenda
+        WHERE id_encomenda = ANY(p_ids_encomenda)
+        ORDER BY id_encomenda
+        FOR UPDATE
+    ) bloqueadas;
+
+    IF v_encontradas <> v_total THEN
+        RAISE EXCEPTION 'Existem % encomenda(s) selecionada(s) que não existem.', v_total - v_encontradas;
+    END IF;
+
+    SELECT string_agg(format('#%s (%s)', id_encomenda, estado_encomenda), ', ' ORDER BY id_encomenda)
+    INTO v_invalidas
+    FROM (
+        SELECT id_encomenda, estado_encomenda
+        FROM Encomenda
+        WHERE id_encomenda = ANY(p_ids_encomenda)
+          AND NOT fn_encomenda_transicao_valida(estado_encomenda, v_estado)
+        ORDER BY id_encomenda
+        LIMIT 10
+    ) t;
+
+    IF v_invalidas IS NOT NULL THEN
+        RAISE EXCEPTION 'Transição para "%" não permitida: %.', v_estado, v_invalidas;
+    END IF;
+
+    UPDATE Encomenda
+    SET estado_encomenda = v_estado
+    WHERE id_encomenda = ANY(p_ids_encomenda);
+END;
+$$;
+
+
 -- Admin: gerir linhas da encomenda (COM p_id_exec)
 DROP PROCEDURE IF EXISTS sp_admin_encomenda_adicionar_item(INT, INT, INT, INT);
 
@@ -1266,6 +1472,7 @@ LANGUAGE plpgsql
 AS $$
 DECLARE
     v_tipo_exec TEXT;
+    v_data      DATE;
 BEGIN
     v_tipo_exec := fn_get_tipo_utilizador(p_id_exec);
     IF v_tipo_exec IS NULL OR lower(v_tipo_exec) NOT IN ('admin','gestor') THEN
@@ -1276,7 +1483,12 @@ BEGIN
         RAISE EXCEPTION 'Quantidade inválida.';
     END IF;
 
-    IF NOT EXISTS (SELECT 1 FROM Encomenda WHERE id_encomenda = p_id_encomenda) THEN
+    SELECT data_encomenda
+    INTO v_data
+    FROM Encomenda
+    WHERE id_encomenda = p_id_encomenda;
+
+    IF v_data IS NULL THEN
         RAISE EXCEPTION 'Encomenda inválida.';
     END IF;
 
@@ -1284,9 +1496,9 @@ BEGIN
         RAISE EXCEPTION 'Produto inválido.';
     END IF;
 
-    INSERT INTO Encomendas_Produtos(id_encomenda, id_produto, quantidade)
-    VALUES(p_id_encomenda, p_id_produto, p_quantidade)
-    ON CONFLICT (id_encomenda, id_produto)
+    INSERT INTO Encomendas_Produtos(id_encomenda, data_encomenda, id_produto, quantidade)
+    VALUES(p_id_encomenda, v_data, p_id_produto, p_quantidade)
+    ON CONFLICT (id_encomenda, id_produto, data_encomenda)
     DO UPDATE SET quantidade = Encomendas_Produtos.quantidade + EXCLUDED.quantidade;
 END;
 $$;
@@ -1590,6 +1802,7 @@ AS $$
 DECLARE
     v_tipo_cliente TEXT;
     v_encomenda_id INT;
+    v_data         DATE;
     v_qtd_atual    INT;
     v_nova_qtd     INT;
 BEGIN
@@ -1602,22 +1815,26 @@ BEGIN
         RAISE EXCEPTION 'Quantidade inválida.';
     END IF;
 
-    SELECT id_encomenda
-    INTO v_encomenda_id
+    SELECT id_encomenda, data_encomenda
+    INTO v_encomenda_id, v_data
     FROM Encomenda
     WHERE id_utilizador = p_id_utilizador
       AND estado_encomenda = 'Carrinho'
-    LIMIT 1;
+    LIMIT 1
+    -- apagado entretanto por expirar_carrinhos: cai na mensagem abaixo
+    FOR UPDATE;
 
     IF v_encomenda_id IS NULL THEN
         RAISE EXCEPTION 'Não existe carrinho para este utilizador.';
     END IF;
 
+    -- a data em todos os acessos limita-os à partição do carrinho
     SELECT quantidade
     INTO v_qtd_atual
     FROM Encomendas_Produtos
-    WHERE id_encomenda = v_encomenda_id
-      AND id_produto   = p_id_produto;
+    WHERE id_encomenda   = v_encomenda_id
+      AND data_encomenda = v_data
+      AND id_produto     = p_id_produto;
 
     IF v_qtd_atual IS NULL THEN
         RAISE EXCEPTION 'Produto não existe no carrinho.';
@@ -1627,20 +1844,32 @@ BEGIN
 
     IF v_nova_qtd <= 0 THEN
         DELETE FROM Encomendas_Produtos
-        WHERE id_encomenda = v_encomenda_id
-          AND id_produto   = p_id_produto;
+        WHERE id_encomenda   = v_encomenda_id
+          AND data_encomenda = v_data
+          AND id_produto     = p_id_produto;
     ELSE
         UPDATE Encomendas_Produtos
         SET quantidade = v_nova_qtd
-        WHERE id_encomenda = v_encomenda_id
-          AND id_produto   = p_id_produto;
+        WHERE id_encomenda   = v_encomenda_id
+          AND data_encomenda = v_data
+          AND id_produto     = p_id_produto;
     END IF;
 
     -- Se o carrinho ficar vazio, apagar a encomenda "Carrinho"
-    IF NOT EXISTS (SELECT 1 FROM Encomendas_Produtos WHERE id_encomenda = v_encomenda_id) THEN
+    IF NOT EXISTS (
+        SELECT 1 FROM Encomendas_Produtos
+        WHERE id_encomenda = v_encomenda_id AND data_encomenda = v_data
+    ) THEN
         DELETE FROM Encomenda
-        WHERE id_encomenda = v_encomenda_id
+        WHERE id_encomenda   = v_encomenda_id
+          AND data_encomenda = v_data
           AND estado_encomenda = 'Carrinho';
+    ELSE
+        UPDATE Encomenda
+        SET data_encomenda = CURRENT_DATE
+        WHERE id_encomenda   = v_encomenda_id
+          AND data_encomenda = v_data
+          AND v_data < CURRENT_DATE;
     END IF;
 END;
 $$;
@@ -1724,3 +1953,136 @@ BEGIN
     WHERE id_utilizador = p_id_exec;
 END;
 $$;
+
+
+-- =========================
+-- IMAGENS (Core/imagens.py)
+-- =========================
+
+DROP PROCEDURE IF EXISTS sp_imagem_registar(TEXT, TEXT, INT, INT, INT, INT[]);
+
+-- Regista (ou atualiza, ao reprocessar) uma imagem guardada por conteúdo.
+CREATE OR REPLACE PROCEDURE sp_imagem_registar(
+    p_hash          TEXT,
+    p_extensao      TEXT,
+    p_largura       INT,
+    p_altura        INT,
+    p_tamanho_bytes INT,
+    p_larguras      INT[]
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF p_hash IS NULL OR p_hash !~ '^[0-9a-f]{64}$' THEN
+        RAISE EXCEPTION 'Hash de imagem inválido.';
+    END IF;
+
+    INSERT INTO Imagem (hash, extensao, largura, altura, tamanho_bytes, larguras)
+    VALUES (p_hash, p_extensao, p_largura, p_altura, p_tamanho_bytes, COALESCE(p_larguras, '{}'))
+    ON CONFLICT (hash) DO UPDATE
+        SET largura  = EXCLUDED.largura,
+            altura   = EXCLUDED.altura,
+            larguras = EXCLUDED.larguras;
+END;
+$$;
+
+
+DROP PROCEDURE IF EXISTS sp_admin_produto_imagem_adicionar(INT, INT, TEXT);
+
+CREATE OR REPLACE PROCEDURE sp_admin_produto_imagem_adicionar(
+    p_id_exec    INT,
+    p_id_produto INT,
+    p_caminho    TEXT
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_tipo_exec TEXT;
+BEGIN
+    v_tipo_exec := fn_get_tipo_utilizador(p_id_exec);
+    IF v_tipo_exec IS NULL OR lower(v_tipo_exec) NOT IN ('admin','gestor') THEN
+        RAISE EXCEPTION 'Apenas admin/gestor podem gerir produtos.';
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM Produto WHERE id_produto = p_id_produto) THEN
+        RAISE EXCEPTION 'Produto com id % não existe.', p_id_produto;
+    END IF;
+
+    -- a mesma imagem (mesmo conteúdo) não é associada duas vezes
+    IF NOT EXISTS (
+        SELECT 1 FROM Imagem_Produto
+        WHERE id_produto = p_id_produto AND caminho = p_caminho
+    ) THEN
+        INSERT INTO Imagem_Produto (id_produto, caminho)
+        VALUES (p_id_produto, p_caminho);
+    END IF;
+END;
+$$;
+
+
+DROP PROCEDURE IF EXISTS sp_admin_noticia_imagem_adicionar(INT, INT, TEXT);
+
+CREATE OR REPLACE PROCEDURE sp_admin_noticia_imagem_adicionar(
+    p_id_exec    INT,
+    p_id_noticia INT,
+    p_uri        TEXT
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_tipo_exec TEXT;
+BEGIN
+    v_tipo_exec := fn_get_tipo_utilizador(p_id_exec);
+    IF v_tipo_exec IS NULL OR lower(v_tipo_exec) NOT IN ('admin','gestor') THEN
+        RAISE EXCEPTION 'Apenas admin/gestor podem gerir notícias.';
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM Noticia WHERE id_noticia = p_id_noticia) THEN
+        RAISE EXCEPTION 'Notícia com id % não existe.', p_id_noticia;
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM Imagem_Noticia
+        WHERE id_noticia = p_id_noticia AND uri = p_uri
+    ) THEN
+        INSERT INTO Imagem_Noticia (id_noticia, uri)
+        VALUES (p_id_noticia, p_uri);
+    END IF;
+END;
+$$;
+
+
+-- =========================
+-- VERSÃO DOS DADOS PÚBLICOS (Core/versoes.py)
+-- =========================
+
+-- Soma os eventos de Versao_Dados_Evento à linha de cada recurso, numa só
+-- instrução: quem lê vw_versao_dados vê a mesma versão antes e depois. Os
+-- eventos de transações ainda por confirmar não são apagados e contam quando
+-- confirmarem. Chamada por manage.py compactar_versao_dados.
+CREATE OR REPLACE PROCEDURE sp_compactar_versao_dados(
+    INOUT p_eventos INT DEFAULT 0
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    WITH apagados AS (
+        DELETE FROM Versao_Dados_Evento
+        RETURNING recurso, criado_em
+    ),
+    somas AS (
+        SELECT recurso, COUNT(*) AS eventos, MAX(criado_em) AS ultimo
+        FROM apagados
+        GROUP BY recurso
+    ),
+    somados AS (
+        INSERT INTO Versao_Dados (recurso, versao, atualizado_em)
+        SELECT recurso, eventos, ultimo FROM somas
+        ON CONFLICT (recurso) DO UPDATE
+            SET versao        = Versao_Dados.versao + EXCLUDED.versao,
+                atualizado_em = GREATEST(Versao_Dados.atualizado_em, EXCLUDED.atualizado_em)
+        RETURNING 1
+    )
+    SELECT COALESCE(SUM(eventos), 0) INTO p_eventos FROM somas;
+END;
+$$;
@@ -0,0 +1,96 @@
+-- =========================================
+-- RELATÓRIOS em Postgres (alternativa ao MongoDB)
+-- Usado quando RELATORIOS["BACKEND"] = "postgres" (ver Core/relatorios.py).
+-- Correr depois de CreateDatabase.sql / functions_views.sql.
+--
+-- Cada materialized view tem um índice único para poder ser atualizada
+-- com REFRESH MATERIALIZED VIEW CONCURRENTLY (leituras não bloqueiam).
+-- Os valores usam o preço copiado para a linha no checkout
+-- (Encomendas_Produtos.preco_unitario), tal como o sync para o Mongo; o
+-- total de cada dia é a soma das linhas, como o `total` dos documentos.
+-- Todas as views estão ao dia: o intervalo pedido e o agrupamento por
+-- semana/mês (date_trunc) são aplicados na consulta.
+-- =========================================
+
+DROP PROCEDURE IF EXISTS sp_relatorios_refrescar();
+DROP MATERIALIZED VIEW IF EXISTS mv_relatorio_vendas_diarias;
+DROP MATERIALIZED VIEW IF EXISTS mv_relatorio_estados;
+DROP MATERIALIZED VIEW IF EXISTS mv_relatorio_produtos;
+DROP MATERIALIZED VIEW IF EXISTS mv_relatorio_fornecedores;
+
+
+-- Vendas por dia (todas as encomendas exceto Carrinho; sem linhas conta 0)
+CREATE MATERIALIZED VIEW mv_relatorio_vendas_diarias AS
+SELECT
+    e.data_encomenda          AS dia,
+    COUNT(*)                  AS encomendas,
+    COALESCE(SUM(l.total), 0) AS total
+FROM Encomenda e
+LEFT JOIN (
+    SELECT id_encomenda, SUM(quantidade * preco_unitario) AS total
+    FROM Encomendas_Produtos
+    GROUP BY id_encomenda
+) l ON l.id_encomenda = e.id_encomenda
+WHERE e.estado_encomenda <> 'Carrinho'
+GROUP BY e.data_encomenda;
+
+CREATE UNIQUE INDEX ux_mv_relatorio_vendas_diarias ON mv_relatorio_vendas_diarias (dia);
+
+
+-- Encomendas por estado
+CREATE MATERIALIZED VIEW mv_relatorio_estados AS
+SELECT
+    e.data_encomenda   AS dia,
+    e.estado_encomenda AS estado,
+    COUNT(*)           AS encomendas
+FROM Encomenda e
+WHERE e.estado_encomenda <> 'Carrinho'
+GROUP BY e.data_encomenda, e.estado_encomenda;
+
+CREATE UNIQUE INDEX ux_mv_relatorio_estados ON mv_relatorio_estados (dia, estado);
+
+
+-- Quantidade e faturação por produto (agrupado pelo nome, como no Mongo)
+CREATE MATERIALIZED VIEW mv_relatorio_produtos AS
+SELECT
+    e.data_encomenda                       AS dia,
+    ep.nome_produto                        AS produto_nome,
+    SUM(ep.quantidade)                     AS quantidade,
+    SUM(ep.quantidade * ep.preco_unitario) AS total
+FROM Encomendas_Produtos ep
+JOIN Encomenda e ON e.id_encomenda = ep.id_encomenda
+WHERE e.estado_encomenda <> 'Carrinho'
+GROUP BY e.data_encomenda, ep.nome_produto;
+
+CREATE UNIQUE INDEX ux_mv_relatorio_produtos ON mv_relatorio_produtos (dia, produto_nome);
+
+
+-- Faturação por fornecedor (0 = produtos sem fornecedor; o índice único
+-- não pode depender de NULLs para o REFRESH CONCURRENTLY)
+CREATE MATERIALIZED VIEW mv_relatorio_fornecedores AS
+SELECT
+    e.data_encomenda                       AS dia,
+    COALESCE(p.id_fornecedor, 0)           AS id_fornecedor,
+    MAX(f.nome)                            AS fornecedor_nome,
+    SUM(ep.quantidade * ep.preco_unitario) AS total
+FROM Encomendas_Produtos ep
+JOIN Encomenda e ON e.id_encomenda = ep.id_encomenda
+JOIN Produto p ON p.id_produto = ep.id_produto
+LEFT JOIN Fornecedor f ON f.id_fornecedor = p.id_fornecedor
+WHERE e.estado_encomenda <> 'Carrinho'
+GROUP BY e.data_encomenda, COALESCE(p.id_fornecedor, 0);
+
+CREATE UNIQUE INDEX ux_mv_relatorio_fornecedores ON mv_relatorio_fornecedores (dia, id_fornecedor);
+
+
+-- Atualizar todas as views (chamado por Core/relatorios.py / manage.py sync_relatorios)
+CREATE OR REPLACE PROCEDURE sp_relatorios_refrescar()
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_relatorio_vendas_diarias;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_relatorio_estados;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_relatorio_produtos;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_relatorio_fornecedores;
+END;
+$$;
@@ -1,6 +1,8 @@
 
 -- =========================
 -- TRIGGER: stock ao alterar estado da encomenda
+-- (statement-level com transition tables: um UPDATE a N encomendas
+--  valida e aplica o stock num único passo, em vez de N execuções)
 -- =========================
 
 DROP TRIGGER IF EXISTS trg_encomenda_stock ON Encomenda;
@@ -11,51 +13,74 @@ RETURNS TRIGGER
 LANGUAGE plpgsql
 AS $$
 DECLARE
-    v_id_produto INT;
-    v_qtd        INT;
-    v_stock      INT;
+    v_produtos     INT[];
+    v_encomendas   INT[];
+    v_deltas       INT[];
+    v_id_produto   INT;
+    v_id_encomenda INT;
+    v_qtd          INT;
+    v_stock        INT;
 BEGIN
-    -- Carrinho -> outro estado: validar e descer stock
-    IF (OLD.estado_encomenda = 'Carrinho') AND (NEW.estado_encomenda <> 'Carrinho') THEN
-
-        FOR v_id_produto, v_qtd, v_stock IN
-            SELECT ep.id_produto,
-                   ep.quantidade,
-                   p.stock
-            FROM Encomendas_Produtos ep
-            JOIN Produto p ON p.id_produto = ep.id_produto
-            WHERE ep.id_encomenda = NEW.id_encomenda
-        LOOP
-            IF v_qtd > v_stock THEN
-                RAISE EXCEPTION
-                    'Stock insuficiente para o produto % na encomenda % (quantidade=%; stock=%).',
-                    v_id_produto, NEW.id_encomenda, v_qtd, v_stock;
-            END IF;
-        END LOOP;
-
-        UPDATE Produto p
-        SET stock = p.stock - ep.quantidade
-        FROM Encomendas_Produtos ep
-        WHERE ep.id_encomenda = NEW.id_encomenda
-          AND ep.id_produto   = p.id_produto;
+    -- Sinal do movimento por encomenda:
+    --   Carrinho -> outro estado: desce stock (-1)
+    --   outro estado -> Cancelada: repõe stock (+1)
+    --   Carrinho -> Cancelada: os dois anulam-se (0)
+    SELECT
+        array_agg(x.id_produto),
+        array_agg(x.id_encomenda),
+        array_agg(x.delta)
+    INTO v_produtos, v_encomendas, v_deltas
+    FROM (
+        SELECT
+            ep.id_produto,
+            MIN(ep.id_encomenda)         AS id_encomenda,
+            SUM(m.sinal * ep.quantidade)::INT AS delta
+        FROM (
+            SELECT
+                n.id_encomenda,
+                (CASE WHEN o.estado_encomenda = 'Carrinho' AND n.estado_encomenda <> 'Carrinho' THEN -1 ELSE 0 END)
+              + (CASE WHEN o.estado_encomenda <> 'Cancelada' AND n.estado_encomenda = 'Cancelada' THEN 1 ELSE 0 END) AS sinal
+            FROM encomendas_antigas o
+            JOIN encomendas_novas n ON n.id_encomenda = o.id_encomenda
+        ) m
+        JOIN Encomendas_Produtos ep ON ep.id_encomenda = m.id_encomenda
+        WHERE m.sinal <> 0
+        GROUP BY ep.id_produto
+        HAVING SUM(m.sinal * ep.quantidade) <> 0
+    ) x;
+
+    IF v_produtos IS NULL THEN
+        RETURN NULL;
     END IF;
 
-    -- Repor stock se encomenda passa para "Cancelada" e já não estava cancelada
-    IF (OLD.estado_encomenda <> 'Cancelada') AND (NEW.estado_encomenda = 'Cancelada') THEN
-        UPDATE Produto p
-        SET stock = p.stock + ep.quantidade
-        FROM Encomendas_Produtos ep
-        WHERE ep.id_encomenda = NEW.id_encomenda
-          AND ep.id_produto   = p.id_produto;
+    -- Validar stock para o conjunto (quantidade agregada por produto)
+    SELECT d.id_produto, d.id_encomenda, -d.delta, p.stock
+    INTO v_id_produto, v_id_encomenda, v_qtd, v_stock
+    FROM unnest(v_produtos, v_encomendas, v_deltas) AS d(id_produto, id_encomenda, delta)
+    JOIN Produto p ON p.id_produto = d.id_produto
+    WHERE p.stock + d.delta < 0
+    ORDER BY d.id_produto
+    LIMIT 1;
+
+    IF FOUND THEN
+        RAISE EXCEPTION
+            'Stock insuficiente para o produto % na encomenda % (quantidade=%; stock=%).',
+            v_id_produto, v_id_encomenda, v_qtd, v_stock;
     END IF;
 
-    RETURN NEW;
+    UPDATE Produto p
+    SET stock = p.stock + d.delta
+    FROM unnest(v_produtos, v_deltas) AS d(id_produto, delta)
+    WHERE d.id_produto = p.id_produto;
+
+    RETURN NULL;
 END;
 $$;
 
 CREATE TRIGGER trg_encomenda_stock
 AFTER UPDATE ON Encomenda
-FOR EACH ROW
+REFERENCING OLD TABLE AS encomendas_antigas NEW TABLE AS encomendas_novas
+FOR EACH STATEMENT
 EXECUTE FUNCTION fn_trg_encomenda_stock();
 
 
@@ -111,3 +136,430 @@ CREATE TRIGGER trg_fornecedor_cria_utilizador
 AFTER INSERT ON Fornecedor
 FOR EACH ROW
 EXECUTE FUNCTION fn_trg_fornecedor_cria_utilizador();
+
+
+-- =========================
+-- TRIGGER: copiar preço/nome do produto (e a data da encomenda) para a linha
+-- (qualquer INSERT, incluindo COPY; sp_loja_finalizar_encomenda volta a
+--  copiar os valores atuais no checkout)
+-- =========================
+
+DROP TRIGGER IF EXISTS trg_encomendas_produtos_snapshot ON Encomendas_Produtos;
+DROP FUNCTION IF EXISTS fn_trg_encomendas_produtos_snapshot();
+
+CREATE OR REPLACE FUNCTION fn_trg_encomendas_produtos_snapshot()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.preco_unitario IS NULL OR NEW.nome_produto IS NULL THEN
+        SELECT
+            COALESCE(NEW.preco_unitario, p.preco),
+            COALESCE(NEW.nome_produto, p.nome)
+        INTO NEW.preco_unitario, NEW.nome_produto
+        FROM Produto p
+        WHERE p.id_produto = NEW.id_produto;
+    END IF;
+
+    -- só em tabelas não particionadas: com partições a linha já foi
+    -- encaminhada pela data e tem de a trazer preenchida
+    IF NEW.data_encomenda IS NULL THEN
+        SELECT data_encomenda
+        INTO NEW.data_encomenda
+        FROM Encomenda
+        WHERE id_encomenda = NEW.id_encomenda;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER trg_encomendas_produtos_snapshot
+BEFORE INSERT ON Encomendas_Produtos
+FOR EACH ROW
+EXECUTE FUNCTION fn_trg_encomendas_produtos_snapshot();
+
+
+-- =========================
+-- TRIGGERS: resumo por fornecedor (Fornecedor_Encomenda_Resumo) e
+-- Encomenda.total_encomenda
+-- (statement-level: um COPY/UPDATE em lote recalcula cada encomenda afetada
+--  uma única vez; carrinhos não entram no resumo nem têm total gravado)
+-- =========================
+
+DROP TRIGGER IF EXISTS trg_fornecedor_resumo_linhas_ins ON Encomendas_Produtos;
+DROP TRIGGER IF EXISTS trg_fornecedor_resumo_linhas_upd ON Encomendas_Produtos;
+DROP TRIGGER IF EXISTS trg_fornecedor_resumo_linhas_del ON Encomendas_Produtos;
+DROP TRIGGER IF EXISTS trg_fornecedor_resumo_encomenda ON Encomenda;
+DROP TRIGGER IF EXISTS trg_fornecedor_resumo_produto ON Produto;
+DROP FUNCTION IF EXISTS fn_trg_fornecedor_resumo_linhas();
+DROP FUNCTION IF EXISTS fn_trg_fornecedor_resumo_encomenda();
+DROP FUNCTION IF EXISTS fn_trg_fornecedor_resumo_produto();
+DROP FUNCTION IF EXISTS fn_fornecedor_resumo_recalcular(INT[]);
+DROP FUNCTION IF EXISTS fn_encomenda_total_recalcular(INT[]);
+DROP PROCEDURE IF EXISTS sp_fornecedor_resumo_reconstruir();
+
+-- Recalcula o resumo das encomendas indicadas (apaga e volta a inserir)
+CREATE OR REPLACE FUNCTION fn_fornecedor_resumo_recalcular(p_ids_encomenda INT[])
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF p_ids_encomenda IS NULL OR cardinality(p_ids_encomenda) = 0 THEN
+        RETURN;
+    END IF;
+
+    DELETE FROM Fornecedor_Encomenda_Resumo
+    WHERE id_encomenda = ANY(p_ids_encomenda);
+
+    INSERT INTO Fornecedor_Encomenda_Resumo
+        (id_fornecedor, id_encomenda, data_encomenda, estado_encomenda, id_utilizador, total_fornecedor)
+    SELECT
+        p.id_fornecedor,
+        e.id_encomenda,
+        e.data_encomenda,
+        e.estado_encomenda,
+        e.id_utilizador,
+        COALESCE(SUM(ep.quantidade * ep.preco_unitario), 0)
+    FROM Encomenda e
+    JOIN Encomendas_Produtos ep ON ep.id_encomenda = e.id_encomenda
+    JOIN Produto p ON p.id_produto = ep.id_produto
+    WHERE e.id_encomenda = ANY(p_ids_encomenda)
+      AND e.estado_encomenda <> 'Carrinho'
+      AND p.id_fornecedor IS NOT NULL
+    GROUP BY p.id_fornecedor, e.id_encomenda, e.data_encomenda, e.estado_encomenda, e.id_utilizador;
+END;
+$$;
+
+-- Total gravado na encomenda (a partir dos preços copiados para as linhas)
+CREATE OR REPLACE FUNCTION fn_encomenda_total_recalcular(p_ids_encomenda INT[])
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF p_ids_encomenda IS NULL OR cardinality(p_ids_encomenda) = 0 THEN
+        RETURN;
+    END IF;
+
+    UPDATE Encomenda e
+    SET total_encomenda = COALESCE((
+        SELECT SUM(ep.quantidade * ep.preco_unitario)
+        FROM Encomendas_Produtos ep
+        WHERE ep.id_encomenda = e.id_encomenda
+    ), 0)
+    WHERE e.id_encomenda = ANY(p_ids_encomenda)
+      AND e.estado_encomenda <> 'Carrinho';
+END;
+$$;
+
+-- Linhas inseridas/alteradas/apagadas (o nome das transition tables depende do evento)
+CREATE OR REPLACE FUNCTION fn_trg_fornecedor_resumo_linhas()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_ids INT[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT l.id_encomenda) INTO v_ids
+        FROM linhas_novas l
+        JOIN Encomenda e ON e.id_encomenda = l.id_encomenda
+        WHERE e.estado_encomenda <> 'Carrinho';
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(DISTINCT x.id_encomenda) INTO v_ids
+        FROM (
+            SELECT id_encomenda FROM linhas_novas
+            UNION
+            SELECT id_encomenda FROM linhas_antigas
+        ) x
+        JOIN Encomenda e ON e.id_encomenda = x.id_encomenda
+        WHERE e.estado_encomenda <> 'Carrinho';
+    ELSE
+        SELECT array_agg(DISTINCT l.id_encomenda) INTO v_ids
+        FROM linhas_antigas l
+        JOIN Encomenda e ON e.id_encomenda = l.id_encomenda
+        WHERE e.estado_encomenda <> 'Carrinho';
+    END IF;
+
+    PERFORM fn_fornecedor_resumo_recalcular(v_ids);
+    PERFORM fn_encomenda_total_recalcular(v_ids);
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_fornecedor_resumo_linhas_ins
+AFTER INSERT ON Encomendas_Produtos
+REFERENCING NEW TABLE AS linhas_novas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_trg_fornecedor_resumo_linhas();
+
+CREATE TRIGGER trg_fornecedor_resumo_linhas_upd
+AFTER UPDATE ON Encomendas_Produtos
+REFERENCING OLD TABLE AS linhas_antigas NEW TABLE AS linhas_novas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_trg_fornecedor_resumo_linhas();
+
+CREATE TRIGGER trg_fornecedor_resumo_linhas_del
+AFTER DELETE ON Encomendas_Produtos
+REFERENCING OLD TABLE AS linhas_antigas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_trg_fornecedor_resumo_linhas();
+
+-- Encomenda: mudança de estado/data/cliente.
+-- Entre estados "não carrinho" basta atualizar as colunas copiadas;
+-- entrar ou sair de Carrinho obriga a recalcular.
+CREATE OR REPLACE FUNCTION fn_trg_fornecedor_resumo_encomenda()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_ids INT[];
+BEGIN
+    UPDATE Fornecedor_Encomenda_Resumo r
+    SET data_encomenda   = n.data_encomenda,
+        estado_encomenda = n.estado_encomenda,
+        id_utilizador    = n.id_utilizador
+    FROM encomendas_novas n
+    JOIN encomendas_antigas o ON o.id_encomenda = n.id_encomenda
+    WHERE r.id_encomenda = n.id_encomenda
+      AND o.estado_encomenda <> 'Carrinho'
+      AND n.estado_encomenda <> 'Carrinho'
+      AND (n.data_encomenda, n.estado_encomenda, n.id_utilizador)
+          IS DISTINCT FROM (o.data_encomenda, o.estado_encomenda, o.id_utilizador);
+
+    SELECT array_agg(n.id_encomenda) INTO v_ids
+    FROM encomendas_novas n
+    JOIN encomendas_antigas o ON o.id_encomenda = n.id_encomenda
+    WHERE (o.estado_encomenda = 'Carrinho') <> (n.estado_encomenda = 'Carrinho');
+
+    PERFORM fn_fornecedor_resumo_recalcular(v_ids);
+
+    -- saída de Carrinho sem passar por sp_loja_finalizar_encomenda (ex: admin):
+    -- gravar o total; o UPDATE volta a disparar este trigger, mas sem mudanças de estado
+    SELECT array_agg(n.id_encomenda) INTO v_ids
+    FROM encomendas_novas n
+    WHERE n.estado_encomenda <> 'Carrinho'
+      AND n.total_encomenda IS NULL;
+
+    PERFORM fn_encomenda_total_recalcular(v_ids);
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_fornecedor_resumo_encomenda
+AFTER UPDATE ON Encomenda
+REFERENCING OLD TABLE AS encomendas_antigas NEW TABLE AS encomendas_novas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_trg_fornecedor_resumo_encomenda();
+
+-- Produto: mudar de fornecedor move as linhas para o resumo de outro fornecedor
+-- (o preço já não conta: as linhas guardam o preço da compra)
+CREATE OR REPLACE FUNCTION fn_trg_fornecedor_resumo_produto()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_ids INT[];
+BEGIN
+    SELECT array_agg(DISTINCT ep.id_encomenda) INTO v_ids
+    FROM produtos_novos n
+    JOIN produtos_antigos o ON o.id_produto = n.id_produto
+    JOIN Encomendas_Produtos ep ON ep.id_produto = n.id_produto
+    JOIN Encomenda e ON e.id_encomenda = ep.id_encomenda
+    WHERE n.id_fornecedor IS DISTINCT FROM o.id_fornecedor
+      AND e.estado_encomenda <> 'Carrinho';
+
+    PERFORM fn_fornecedor_resumo_recalcular(v_ids);
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_fornecedor_resumo_produto
+AFTER UPDATE ON Produto
+REFERENCING OLD TABLE AS produtos_antigos NEW TABLE AS produtos_novos
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_trg_fornecedor_resumo_produto();
+
+-- Reconstrução completa (bases de dados já existentes / após cargas sem triggers)
+CREATE OR REPLACE PROCEDURE sp_fornecedor_resumo_reconstruir()
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    TRUNCATE Fornecedor_Encomenda_Resumo;
+
+    INSERT INTO Fornecedor_Encomenda_Resumo
+        (id_fornecedor, id_encomenda, data_encomenda, estado_encomenda, id_utilizador, total_fornecedor)
+    SELECT
+        p.id_fornecedor,
+        e.id_encomenda,
+        e.data_encomenda,
+        e.estado_encomenda,
+        e.id_utilizador,
+        COALESCE(SUM(ep.quantidade * ep.preco_unitario), 0)
+    FROM Encomenda e
+    JOIN Encomendas_Produtos ep ON ep.id_encomenda = e.id_encomenda
+    JOIN Produto p ON p.id_produto = ep.id_produto
+    WHERE e.estado_encomenda <> 'Carrinho'
+      AND p.id_fornecedor IS NOT NULL
+    GROUP BY p.id_fornecedor, e.id_encomenda, e.data_encomenda, e.estado_encomenda, e.id_utilizador;
+END;
+$$;
+
+CALL sp_fornecedor_resumo_reconstruir();
+
+
+-- =========================
+-- TRIGGERS: NOTIFY para invalidar as caches em memória dos workers
+-- (Core/cache_invalidacao.py faz LISTEN rs_cache; o payload é a tabela).
+-- Um NOTIFY por instrução: os repetidos na mesma transação são entregues
+-- uma só vez e só no COMMIT (um ROLLBACK não invalida nada).
+-- Só as tabelas de que dependem valores em cache; em Produto o stock só
+-- conta quando o produto entra ou sai da loja (vw_loja_produtos: stock > 0),
+-- para os checkouts não invalidarem o catálogo (ver mais abaixo).
+-- =========================
+
+CREATE OR REPLACE FUNCTION fn_trg_notificar_cache()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('rs_cache', lower(TG_TABLE_NAME));
+    RETURN NULL;
+END;
+$$;
+
+DO $$
+DECLARE
+    v_tabela TEXT;
+BEGIN
+    -- nenhuma cache depende de Encomenda: o trigger antigo sai
+    DROP TRIGGER IF EXISTS trg_encomenda_notificar_cache ON Encomenda;
+
+    FOREACH v_tabela IN ARRAY ARRAY[
+        'tipo_produto', 'imagem_produto', 'fornecedor',
+        'noticia', 'tipo_noticia', 'imagem_noticia', 'produto_noticia',
+        'versao_dados', 'versao_dados_evento', 'imagem'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || v_tabela || '_notificar_cache', v_tabela);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION fn_trg_notificar_cache()',
+            'trg_' || v_tabela || '_notificar_cache', v_tabela
+        );
+    END LOOP;
+END;
+$$;
+
+
+-- =========================
+-- TRIGGERS: versão dos dados públicos (Versao_Dados)
+-- Cada escrita nas tabelas de um recurso incrementa a versão dele; as
+-- páginas públicas usam-na como ETag/Last-Modified (Core/versoes.py) e
+-- respondem 304 sem correr a consulta principal.
+-- A escrita é um INSERT em Versao_Dados_Evento e não um UPDATE à linha do
+-- recurso: essa linha ficava bloqueada até ao COMMIT e todos os checkouts
+-- (stock em Produto) esperavam uns pelos outros. vw_versao_dados soma os
+-- eventos; sp_compactar_versao_dados junta-os à linha fora dos pedidos.
+-- =========================
+
+CREATE OR REPLACE FUNCTION fn_trg_versao_dados()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO Versao_Dados_Evento (recurso) VALUES (TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$;
+
+DO $$
+DECLARE
+    v_par TEXT[];
+BEGIN
+    -- {tabela, recurso}; Utilizador entra nas notícias pelo nome do autor
+    FOREACH v_par SLICE 1 IN ARRAY ARRAY[
+        ['tipo_produto', 'catalogo'],
+        ['imagem_produto', 'catalogo'], ['fornecedor', 'catalogo'],
+        ['noticia', 'noticias'], ['tipo_noticia', 'noticias'],
+        ['imagem_noticia', 'noticias'], ['produto_noticia', 'noticias'],
+        ['utilizador', 'noticias'],
+        -- reprocessar uma imagem muda o srcset das duas páginas
+        ['imagem', 'catalogo'], ['imagem', 'noticias']
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || v_par[1] || '_versao_' || v_par[2], v_par[1]);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION fn_trg_versao_dados(%L)',
+            'trg_' || v_par[1] || '_versao_' || v_par[2], v_par[1], v_par[2]
+        );
+    END LOOP;
+END;
+$$;
+
+
+-- =========================
+-- TRIGGERS: NOTIFY e versão do catálogo para Produto
+-- As colunas da loja menos o stock (e a versao, mudada pelo
+-- trg_produto_versao): o checkout (trg_encomenda_stock) e a remoção de
+-- encomendas só mexem no stock e não invalidam nada, exceto quando o produto
+-- esgota ou volta a ter stock. O número de stock mostrado pode por isso ficar
+-- atrasado até à próxima alteração do catálogo; o carrinho e o checkout
+-- validam sempre o stock atual.
+-- =========================
+
+DO $$
+DECLARE
+    v_colunas TEXT := 'id_produto, nome, descricao, preco, is_approved, estado_produto, id_tipo_produto, id_fornecedor';
+BEGIN
+    DROP TRIGGER IF EXISTS trg_produto_notificar_cache ON Produto;
+    DROP TRIGGER IF EXISTS trg_produto_notificar_cache_stock ON Produto;
+    DROP TRIGGER IF EXISTS trg_produto_versao_catalogo ON Produto;
+    DROP TRIGGER IF EXISTS trg_produto_versao_catalogo_stock ON Produto;
+
+    EXECUTE format(
+        'CREATE TRIGGER trg_produto_notificar_cache AFTER INSERT OR UPDATE OF %s OR DELETE OR TRUNCATE ON Produto '
+        'FOR EACH STATEMENT EXECUTE FUNCTION fn_trg_notificar_cache()', v_colunas
+    );
+    EXECUTE format(
+        'CREATE TRIGGER trg_produto_versao_catalogo AFTER INSERT OR UPDATE OF %s OR DELETE OR TRUNCATE ON Produto '
+        'FOR EACH STATEMENT EXECUTE FUNCTION fn_trg_versao_dados(%L)', v_colunas, 'catalogo'
+    );
+END;
+$$;
+
+-- por linha, mas só as que esgotam ou voltam (o pg_notify repetido é entregue uma vez)
+CREATE TRIGGER trg_produto_notificar_cache_stock
+AFTER UPDATE OF stock ON Produto
+FOR EACH ROW
+WHEN ((OLD.stock > 0) IS DISTINCT FROM (NEW.stock > 0))
+EXECUTE FUNCTION fn_trg_notificar_cache();
+
+CREATE TRIGGER trg_produto_versao_catalogo_stock
+AFTER UPDATE OF stock ON Produto
+FOR EACH ROW
+WHEN ((OLD.stock > 0) IS DISTINCT FROM (NEW.stock > 0))
+EXECUTE FUNCTION fn_trg_versao_dados('catalogo');
+
+
+-- =========================
+-- TRIGGER: versão de cada produto
+-- Incrementada em qualquer alteração da linha (incluindo o stock no
+-- checkout); os templates usam-na na chave da cache de fragmentos
+-- ({% cache %} dos cartões da loja e das linhas do admin).
+-- =========================
+
+CREATE OR REPLACE FUNCTION fn_trg_produto_versao()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.versao := OLD.versao + 1;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_produto_versao ON Produto;
+CREATE TRIGGER trg_produto_versao
+BEFORE UPDATE ON Produto
+FOR EACH ROW
+WHEN (OLD.* IS DISTINCT FROM NEW.*)
+EXECUTE FUNCTION fn_trg_produto_versao();
@@ -0,0 +1,134 @@
+-- =========================================
+-- UPGRADE de bases de dados já existentes (idempotente)
+-- CreateDatabase.sql apaga e recria tudo; este script só acrescenta o que
+-- falta. Ordem: Upgrade.sql -> functions_views.sql -> Triggers.sql ->
+-- Procedures.sql -> manage.py backfill_linhas_encomenda
+-- (e, opcionalmente, Particionamento.sql)
+-- =========================================
+
+-- Resumo por fornecedor (preenchido por sp_fornecedor_resumo_reconstruir em Triggers.sql)
+CREATE TABLE IF NOT EXISTS Fornecedor_Encomenda_Resumo
+(
+    id_fornecedor    INT NOT NULL REFERENCES Fornecedor(id_fornecedor) ON DELETE CASCADE,
+    id_encomenda     INT NOT NULL REFERENCES Encomenda(id_encomenda)   ON DELETE CASCADE,
+    data_encomenda   DATE NOT NULL,
+    estado_encomenda VARCHAR(64) NOT NULL,
+    id_utilizador    INT NOT NULL,
+    total_fornecedor NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (id_fornecedor, id_encomenda)
+);
+
+CREATE INDEX IF NOT EXISTS ix_fornecedor_resumo_pagina
+    ON Fornecedor_Encomenda_Resumo (id_fornecedor, data_encomenda DESC, id_encomenda DESC);
+CREATE INDEX IF NOT EXISTS ix_fornecedor_resumo_encomenda
+    ON Fornecedor_Encomenda_Resumo (id_encomenda);
+CREATE INDEX IF NOT EXISTS ix_encomendas_produtos_produto
+    ON Encomendas_Produtos (id_produto);
+
+-- Preço/nome copiados para as linhas e total gravado na encomenda.
+-- Ficam NULL nas linhas antigas até correr `manage.py backfill_linhas_encomenda`,
+-- que no fim aplica os NOT NULL.
+ALTER TABLE Encomendas_Produtos ADD COLUMN IF NOT EXISTS preco_unitario NUMERIC NULL CHECK (preco_unitario >= 0);
+ALTER TABLE Encomendas_Produtos ADD COLUMN IF NOT EXISTS nome_produto   VARCHAR(255) NULL;
+ALTER TABLE Encomenda           ADD COLUMN IF NOT EXISTS total_encomenda NUMERIC NULL;
+
+-- Encomendas de um cliente (minhas_encomendas) e o seu Carrinho (vw_loja_carrinho)
+CREATE INDEX IF NOT EXISTS ix_encomenda_utilizador
+    ON Encomenda (id_utilizador, estado_encomenda);
+
+-- Expiração de carrinhos abandonados (manage.py expirar_carrinhos)
+CREATE INDEX IF NOT EXISTS ix_encomenda_carrinho_atividade
+    ON Encomenda (data_encomenda, id_encomenda)
+    WHERE estado_encomenda = 'Carrinho';
+
+-- Data da encomenda nas linhas e FKs por (id_encomenda, data_encomenda):
+-- é o que permite particionar as duas tabelas pela data (Particionamento.sql)
+ALTER TABLE Encomendas_Produtos ADD COLUMN IF NOT EXISTS data_encomenda DATE NULL;
+
+UPDATE Encomendas_Produtos ep
+SET data_encomenda = e.data_encomenda
+FROM Encomenda e
+WHERE e.id_encomenda = ep.id_encomenda
+  AND ep.data_encomenda IS DISTINCT FROM e.data_encomenda;
+
+ALTER TABLE Encomendas_Produtos ALTER COLUMN data_encomenda SET NOT NULL;
+
+DO $$
+BEGIN
+    -- depois de particionada a PK da Encomenda já é (id_encomenda, data_encomenda)
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_encomenda_data')
+       AND NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'encomenda'::regclass) THEN
+        ALTER TABLE Encomenda ADD CONSTRAINT UQ_encomenda_data UNIQUE (id_encomenda, data_encomenda);
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_linha_encomenda') THEN
+        ALTER TABLE Encomendas_Produtos
+            DROP CONSTRAINT IF EXISTS encomendas_produtos_id_encomenda_fkey,
+            DROP CONSTRAINT IF EXISTS encomendas_produtos_id_encomenda_id_produto_key,
+            ADD UNIQUE (id_encomenda, id_produto, data_encomenda),
+            ADD CONSTRAINT FK_linha_encomenda FOREIGN KEY (id_encomenda, data_encomenda)
+                REFERENCES Encomenda(id_encomenda, data_encomenda) ON UPDATE CASCADE ON DELETE CASCADE;
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_resumo_encomenda') THEN
+        ALTER TABLE Fornecedor_Encomenda_Resumo
+            DROP CONSTRAINT IF EXISTS fornecedor_encomenda_resumo_id_encomenda_fkey,
+            ADD CONSTRAINT FK_resumo_encomenda FOREIGN KEY (id_encomenda, data_encomenda)
+                REFERENCES Encomenda(id_encomenda, data_encomenda) ON UPDATE CASCADE ON DELETE CASCADE;
+    END IF;
+END;
+$$;
+
+
+-- versão dos dados públicos para o GET condicional (ETag/Last-Modified)
+CREATE TABLE IF NOT EXISTS Versao_Dados
+(
+    recurso       VARCHAR(64) PRIMARY KEY,
+    versao        BIGINT NOT NULL DEFAULT 0,
+    atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO Versao_Dados (recurso) VALUES ('catalogo'), ('noticias')
+ON CONFLICT (recurso) DO NOTHING;
+
+-- incrementos de Versao_Dados por compactar (fn_trg_versao_dados)
+CREATE TABLE IF NOT EXISTS Versao_Dados_Evento
+(
+    id_evento BIGSERIAL PRIMARY KEY,
+    recurso   VARCHAR(64) NOT NULL,
+    criado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_versao_dados_evento_recurso ON Versao_Dados_Evento (recurso);
+
+
+-- CACHES["calculos"] (Core/cache.py), partilhada pelos processos
+CREATE TABLE IF NOT EXISTS rs_cache_calculos
+(
+    cache_key VARCHAR(255) NOT NULL PRIMARY KEY,
+    value     TEXT NOT NULL,
+    expires   TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS rs_cache_calculos_expires ON rs_cache_calculos (expires);
+
+
+-- imagens guardadas por conteúdo (Core/imagens.py): Imagem_Produto.caminho,
+-- Imagem_Noticia.uri e Fornecedor.imagem_fornecedor referem-nas como
+-- 'sha256:<hash>.<extensao>'; os valores antigos (URLs) continuam válidos
+CREATE TABLE IF NOT EXISTS Imagem
+(
+    hash          CHAR(64) PRIMARY KEY,
+    extensao      VARCHAR(8) NOT NULL,
+    largura       INT NULL,
+    altura        INT NULL,
+    tamanho_bytes INT NOT NULL,
+    larguras      INT[] NOT NULL DEFAULT '{}',
+    criada_em     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_imagem_produto_produto ON Imagem_Produto (id_produto, id_imagem);
+CREATE INDEX IF NOT EXISTS ix_imagem_noticia_noticia ON Imagem_Noticia (id_noticia, id_imagem);
+
+-- versão de cada produto (trg_produto_versao): chave da cache dos fragmentos de template
+ALTER TABLE Produto ADD COLUMN IF NOT EXISTS versao BIGINT NOT NULL DEFAULT 1;
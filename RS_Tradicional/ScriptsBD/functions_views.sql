@@ -28,6 +28,7 @@ DROP VIEW IF EXISTS vw_conta_fornecedor_perfil CASCADE;
 DROP VIEW IF EXISTS vw_conta_perfil CASCADE;
 DROP VIEW IF EXISTS vw_fornecedor_encomendas CASCADE;
 DROP VIEW IF EXISTS vw_fornecedor_encomenda_linhas CASCADE;
+DROP VIEW IF EXISTS vw_versao_dados CASCADE;
 
 
 
@@ -95,13 +96,25 @@ $$;
 -- FUNÇÃO: total da encomenda
 -- =========================
 
+-- Encomendas finalizadas: total gravado em Encomenda.total_encomenda.
+-- Carrinho (total ainda NULL): soma com o preço atual dos produtos.
 CREATE OR REPLACE FUNCTION fn_encomenda_total(p_id_encomenda INT)
 RETURNS NUMERIC
 LANGUAGE plpgsql
+STABLE
 AS $$
 DECLARE
     v_total NUMERIC := 0;
 BEGIN
+    SELECT total_encomenda
+    INTO v_total
+    FROM Encomenda
+    WHERE id_encomenda = p_id_encomenda;
+
+    IF v_total IS NOT NULL THEN
+        RETURN v_total;
+    END IF;
+
     SELECT
         COALESCE(SUM(ep.quantidade * p.preco), 0)
     INTO v_total
@@ -188,7 +201,8 @@ SELECT
     p.id_tipo_produto,
     tp.designacao AS tipo_designacao,
     p.id_fornecedor,
-    f.nome AS fornecedor_nome
+    f.nome AS fornecedor_nome,
+    p.versao
 FROM Produto p
 LEFT JOIN Tipo_Produto tp
        ON tp.id_tipo_produto = p.id_tipo_produto
@@ -210,7 +224,8 @@ SELECT
     p.id_tipo_produto,
     tp.designacao AS tipo_designacao,
     p.id_fornecedor,
-    f.nome AS fornecedor_nome
+    f.nome AS fornecedor_nome,
+    p.versao
 FROM Produto p
 LEFT JOIN Tipo_Produto tp ON tp.id_tipo_produto = p.id_tipo_produto
 LEFT JOIN Fornecedor f ON f.id_fornecedor = p.id_fornecedor
@@ -232,30 +247,32 @@ SELECT
     u.nome AS utilizador_nome,
     u.email AS utilizador_email,
     e.estado_encomenda,
-    fn_encomenda_total(e.id_encomenda) AS total_encomenda
+    COALESCE(e.total_encomenda, fn_encomenda_total(e.id_encomenda)) AS total_encomenda
 FROM Encomenda e
 JOIN Utilizador u ON u.id_utilizador = e.id_utilizador;
 
 
 -- =========================
 -- VIEW: Linhas de Encomenda
+-- (preço e nome copiados para a linha: sem JOIN a Produto)
 -- =========================
 
 CREATE OR REPLACE VIEW vw_encomendas_produtos AS
 SELECT
     ep.id_encomenda,
+    ep.data_encomenda,
     ep.id_produto,
     ep.quantidade,
-    p.nome  AS produto_nome,
-    p.preco AS produto_preco
-FROM Encomendas_Produtos ep
-JOIN Produto p ON p.id_produto = ep.id_produto;
+    ep.nome_produto   AS produto_nome,
+    ep.preco_unitario AS produto_preco
+FROM Encomendas_Produtos ep;
 
 
 
 CREATE OR REPLACE VIEW vw_admin_encomenda_linhas AS
 SELECT
     id_encomenda,
+    data_encomenda,
     id_produto,
     quantidade,
     produto_nome  AS nome_produto,
@@ -268,7 +285,8 @@ SELECT
     e.id_encomenda,
     e.data_encomenda,
     e.estado_encomenda,
-    e.id_utilizador
+    e.id_utilizador,
+    e.total_encomenda
 FROM Encomenda e
 WHERE e.estado_encomenda <> 'Carrinho';
 
@@ -276,12 +294,12 @@ WHERE e.estado_encomenda <> 'Carrinho';
 CREATE OR REPLACE VIEW vw_cliente_encomenda_detalhe AS
 SELECT
     ep.id_encomenda,
+    ep.data_encomenda,
     ep.id_produto,
-    p.nome  AS nome_produto,
-    p.preco AS preco_produto,
+    ep.nome_produto,
+    ep.preco_unitario AS preco_produto,
     ep.quantidade
-FROM Encomendas_Produtos ep
-JOIN Produto p ON p.id_produto = ep.id_produto;
+FROM Encomendas_Produtos ep;
 
 
 
@@ -338,10 +356,15 @@ FROM Encomenda e
 WHERE e.estado_encomenda = 'Carrinho';
 
 
+-- numeração por encomenda: o filtro por id_encomenda e data_encomenda (colunas
+-- do PARTITION BY) desce para dentro da view, usa o índice e, com Encomenda
+-- particionada, só lê a partição da data; numa numeração global a janela
+-- obrigava a ler todas as linhas de todas as encomendas
 CREATE OR REPLACE VIEW vw_loja_carrinho_linhas AS
 SELECT
-    ROW_NUMBER() OVER (ORDER BY ep.id_encomenda, ep.id_produto) AS linha_id,
+    ROW_NUMBER() OVER (PARTITION BY ep.id_encomenda, ep.data_encomenda ORDER BY ep.id_produto) AS linha_id,
     ep.id_encomenda,
+    ep.data_encomenda,
     ep.id_produto,
     p.nome  AS nome_produto,
     p.preco AS preco_produto,
@@ -391,39 +414,46 @@ SELECT
 FROM Fornecedor f;
 
 
+-- Lê Fornecedor_Encomenda_Resumo (mantida por triggers, ver Triggers.sql):
+-- o filtro por id_fornecedor usa o índice em vez de agregar todas as linhas.
 CREATE OR REPLACE VIEW vw_fornecedor_encomendas AS
 SELECT
-    p.id_fornecedor,
-    e.id_encomenda,
-    e.data_encomenda,
-    e.estado_encomenda,
-    e.id_utilizador,
+    r.id_fornecedor,
+    r.id_encomenda,
+    r.data_encomenda,
+    r.estado_encomenda,
+    r.id_utilizador,
     u.nome  AS cliente_nome,
     u.email AS cliente_email,
-    COALESCE(SUM(ep.quantidade * p.preco), 0) AS total_fornecedor
-FROM Encomenda e
-JOIN Encomendas_Produtos ep ON ep.id_encomenda = e.id_encomenda
-JOIN Produto p ON p.id_produto = ep.id_produto
-JOIN Utilizador u ON u.id_utilizador = e.id_utilizador
-WHERE e.estado_encomenda <> 'Carrinho'
-GROUP BY
-    p.id_fornecedor,
-    e.id_encomenda,
-    e.data_encomenda,
-    e.estado_encomenda,
-    e.id_utilizador,
-    u.nome,
-    u.email;
+    r.total_fornecedor
+FROM Fornecedor_Encomenda_Resumo r
+JOIN Utilizador u ON u.id_utilizador = r.id_utilizador;
 
 
+-- Produto só é usado para saber o fornecedor; preço e nome vêm da linha
+-- (os de Produto só enquanto o backfill_linhas_encomenda não correu)
 CREATE OR REPLACE VIEW vw_fornecedor_encomenda_linhas AS
 SELECT
     p.id_fornecedor,
     ep.id_encomenda,
+    ep.data_encomenda,
     ep.id_produto,
-    p.nome  AS nome_produto,
-    p.preco AS preco_produto,
+    COALESCE(ep.nome_produto, p.nome) AS nome_produto,
+    COALESCE(ep.preco_unitario, p.preco) AS preco_produto,
     ep.quantidade,
-    (ep.quantidade * p.preco) AS subtotal
+    (ep.quantidade * COALESCE(ep.preco_unitario, p.preco)) AS subtotal
 FROM Encomendas_Produtos ep
 JOIN Produto p ON p.id_produto = ep.id_produto;
+
+
+-- Versão dos dados públicos (Core/versoes.py): a compactada em Versao_Dados
+-- mais os eventos ainda por somar. Só conta escritas confirmadas, por isso
+-- não sobe antes de os dados mudarem.
+CREATE OR REPLACE VIEW vw_versao_dados AS
+SELECT
+    d.recurso,
+    d.versao + COUNT(e.id_evento)               AS versao,
+    GREATEST(d.atualizado_em, MAX(e.criado_em)) AS atualizado_em
+FROM Versao_Dados d
+LEFT JOIN Versao_Dados_Evento e ON e.recurso = d.recurso
+GROUP BY d.recurso, d.versao, d.atualizado_em;
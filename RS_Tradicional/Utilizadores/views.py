@@ -4,6 +4,23 @@ from django.contrib import messages
 from django.contrib.auth.hashers import make_password, check_password
 from django.db import connection, DatabaseError
 
+from Core import carrinho_convidado
+from Core.db import Preparada, executar
+
+# login: corre em cada tentativa de autenticação
+SQL_UTILIZADOR_POR_EMAIL = Preparada("utilizador_por_email", """
+    SELECT
+        id_utilizador,
+        nome,
+        email,
+        password,
+        morada,
+        nif,
+        id_tipo_utilizador,
+        tipo_designacao
+    FROM fn_get_utilizador_por_email(%s)
+""", tipos=("text",))
+
 
 def register_view(request):
     if request.method == "POST":
@@ -59,21 +76,7 @@ def login_view(request):
 
         try:
             with connection.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT
-                        id_utilizador,
-                        nome,
-                        email,
-                        password,
-                        morada,
-                        nif,
-                        id_tipo_utilizador,
-                        tipo_designacao
-                    FROM fn_get_utilizador_por_email(%s)
-                    """,
-                    [email],
-                )
+                executar(cur, SQL_UTILIZADOR_POR_EMAIL, [email])
                 row = cur.fetchone()
         except DatabaseError as e:
             messages.error(request, f"Erro ao autenticar: {str(e.__cause__ or e)}")
@@ -110,7 +113,22 @@ def login_view(request):
                 request.session["user_tipo"] = (tipo_designacao or "").lower() or None
 
                 messages.success(request, f"Bem-vindo, {nome}!")
-                return redirect("home")
+                resp = redirect("home")
+
+                # Carrinho feito antes do login: passa para a BD de uma vez
+                carrinho = carrinho_convidado.ler(request)
+                if carrinho:
+                    if request.session["user_tipo"] == "cliente":
+                        try:
+                            carrinho_convidado.juntar_no_bd(id_utilizador, carrinho)
+                        except DatabaseError as e:
+                            # o cookie fica: volta a tentar-se no próximo login
+                            messages.warning(request, f"Não foi possível recuperar o carrinho: {str(e.__cause__ or e)}")
+                            return resp
+                        messages.info(request, "Os produtos que escolheste foram adicionados ao teu carrinho.")
+                        resp = redirect("loja_carrinho")
+                    carrinho_convidado.limpar(resp)
+                return resp
 
     return render(request, "conta/login.html")
 
@@ -0,0 +1,216 @@
+/*
+ * Gráficos dos relatórios de admin, servidos pelo próprio site (as
+ * instalações sem internet não chegam ao CDN do Chart.js).
+ *
+ * NÃO é o Chart.js nem substitui a API dele: é um gráfico mínimo, com nome
+ * próprio, só para admin/relatorios.html:
+ *   new Grafico(canvas, {type: "line" | "bar", data: {labels, datasets: [{label, data}]}})
+ * Outros tipos e `options` dão erro em vez de serem ignorados. Responsivo
+ * (largura do contentor, proporção dos atributos width/height do canvas),
+ * nítido em ecrãs HiDPI e com o valor do ponto sob o rato.
+ * Se os relatórios precisarem de mais (tooltips configuráveis, eixos
+ * duplos, zoom), trazer o bundle minificado do Chart.js para static/vendor/
+ * em vez de crescer este ficheiro.
+ */
+(function (global) {
+    "use strict";
+
+    var CORES = ["#e8739b", "#6c8ebf", "#f2b544", "#5bb98c", "#a77bca", "#e26d5a"];
+    var FONTE = "12px system-ui, -apple-system, 'Segoe UI', sans-serif";
+    var MARGEM = { topo: 28, direita: 12, baixo: 34, esquerda: 56 };
+
+    function maximoRedondo(valor) {
+        if (valor <= 0) { return 1; }
+        var potencia = Math.pow(10, Math.floor(Math.log(valor) / Math.LN10));
+        var passos = [1, 2, 2.5, 5, 10];
+        for (var i = 0; i < passos.length; i++) {
+            if (passos[i] * potencia >= valor) { return passos[i] * potencia; }
+        }
+        return 10 * potencia;
+    }
+
+    function formatar(valor) {
+        return Math.abs(valor) >= 1000
+            ? valor.toLocaleString("pt-PT", { maximumFractionDigits: 0 })
+            : valor.toLocaleString("pt-PT", { maximumFractionDigits: 2 });
+    }
+
+    function Grafico(canvas, config) {
+        if (!(this instanceof Grafico)) { return new Grafico(canvas, config); }
+        if (config.type !== "line" && config.type !== "bar") {
+            throw new Error("Grafico: tipo não suportado: " + config.type);
+        }
+        if (config.options) {
+            throw new Error("Grafico: options não são suportadas");
+        }
+        this.canvas = canvas;
+        this.ctx = canvas.getContext("2d");
+        this.tipo = config.type;
+        this.labels = (config.data && config.data.labels) || [];
+        this.datasets = (config.data && config.data.datasets) || [];
+        this.proporcao = (canvas.width || 300) / (canvas.height || 150);
+        this.ativo = null;
+
+        var self = this;
+        this._redimensionar = function () { self.desenhar(); };
+        global.addEventListener("resize", this._redimensionar);
+        canvas.addEventListener("mousemove", function (e) { self._rato(e); });
+        canvas.addEventListener("mouseleave", function () { self.ativo = null; self.desenhar(); });
+        this.desenhar();
+    }
+
+    Grafico.prototype.destroy = function () {
+        global.removeEventListener("resize", this._redimensionar);
+    };
+
+    Grafico.prototype._area = function () {
+        return {
+            x: MARGEM.esquerda,
+            y: MARGEM.topo,
+            w: this.largura - MARGEM.esquerda - MARGEM.direita,
+            h: this.altura - MARGEM.topo - MARGEM.baixo
+        };
+    };
+
+    Grafico.prototype._posicaoX = function (i, area) {
+        var n = Math.max(this.labels.length, 1);
+        return area.x + area.w * (i + 0.5) / n;
+    };
+
+    Grafico.prototype.desenhar = function () {
+        var canvas = this.canvas, ctx = this.ctx;
+        var dpr = global.devicePixelRatio || 1;
+        this.largura = (canvas.parentNode && canvas.parentNode.clientWidth) || canvas.clientWidth || 300;
+        this.altura = Math.round(this.largura / this.proporcao);
+        canvas.style.width = this.largura + "px";
+        canvas.style.height = this.altura + "px";
+        canvas.width = Math.round(this.largura * dpr);
+        canvas.height = Math.round(this.altura * dpr);
+        ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+        ctx.clearRect(0, 0, this.largura, this.altura);
+        ctx.font = FONTE;
+
+        var area = this._area();
+        var maior = 0;
+        this.datasets.forEach(function (d) {
+            (d.data || []).forEach(function (v) { if (v > maior) { maior = v; } });
+        });
+        var topo = maximoRedondo(maior);
+        this.escala = function (v) { return area.y + area.h - (v / topo) * area.h; };
+
+        this._eixos(area, topo);
+        this._legenda();
+        if (this.tipo === "line") { this._linhas(area); } else { this._barras(area); }
+        if (this.ativo !== null) { this._dica(area); }
+    };
+
+    Grafico.prototype._eixos = function (area, topo) {
+        var ctx = this.ctx;
+        ctx.strokeStyle = "#eee";
+        ctx.fillStyle = "#777";
+        ctx.textAlign = "right";
+        ctx.textBaseline = "middle";
+        for (var t = 0; t <= 5; t++) {
+            var v = topo * t / 5, y = this.escala(v);
+            ctx.beginPath();
+            ctx.moveTo(area.x, y);
+            ctx.lineTo(area.x + area.w, y);
+            ctx.stroke();
+            ctx.fillText(formatar(v), area.x - 6, y);
+        }
+
+        // rótulos do eixo X sem se sobreporem
+        ctx.textAlign = "center";
+        ctx.textBaseline = "top";
+        var passo = 1, maximo = Math.max(1, Math.floor(area.w / 70));
+        while (this.labels.length / passo > maximo) { passo++; }
+        for (var i = 0; i < this.labels.length; i += passo) {
+            var texto = String(this.labels[i]);
+            if (texto.length > 14) { texto = texto.slice(0, 13) + "…"; }
+            ctx.fillText(texto, this._posicaoX(i, area), area.y + area.h + 8);
+        }
+    };
+
+    Grafico.prototype._legenda = function () {
+        var ctx = this.ctx, x = MARGEM.esquerda;
+        ctx.textAlign = "left";
+        ctx.textBaseline = "middle";
+        this.datasets.forEach(function (d, i) {
+            ctx.fillStyle = d.backgroundColor || CORES[i % CORES.length];
+            ctx.fillRect(x, 8, 12, 12);
+            ctx.fillStyle = "#444";
+            ctx.fillText(d.label || "", x + 18, 14);
+            x += ctx.measureText(d.label || "").width + 40;
+        });
+    };
+
+    Grafico.prototype._linhas = function (area) {
+        var ctx = this.ctx, self = this;
+        this.datasets.forEach(function (d, k) {
+            var cor = d.borderColor || CORES[k % CORES.length];
+            ctx.strokeStyle = cor;
+            ctx.fillStyle = cor;
+            ctx.lineWidth = 2;
+            ctx.beginPath();
+            (d.data || []).forEach(function (v, i) {
+                var x = self._posicaoX(i, area), y = self.escala(v || 0);
+                if (i === 0) { ctx.moveTo(x, y); } else { ctx.lineTo(x, y); }
+            });
+            ctx.stroke();
+            (d.data || []).forEach(function (v, i) {
+                ctx.beginPath();
+                ctx.arc(self._posicaoX(i, area), self.escala(v || 0), 3, 0, 2 * Math.PI);
+                ctx.fill();
+            });
+        });
+        ctx.lineWidth = 1;
+    };
+
+    Grafico.prototype._barras = function (area) {
+        var ctx = this.ctx, self = this;
+        var n = Math.max(this.labels.length, 1), grupos = Math.max(this.datasets.length, 1);
+        var largura = (area.w / n) * 0.7 / grupos;
+        this.datasets.forEach(function (d, k) {
+            ctx.fillStyle = d.backgroundColor || CORES[k % CORES.length];
+            (d.data || []).forEach(function (v, i) {
+                var x = self._posicaoX(i, area) - (largura * grupos) / 2 + k * largura;
+                var y = self.escala(v || 0);
+                ctx.fillRect(x, y, largura - 1, area.y + area.h - y);
+            });
+        });
+    };
+
+    Grafico.prototype._rato = function (e) {
+        var caixa = this.canvas.getBoundingClientRect(), area = this._area();
+        var x = e.clientX - caixa.left;
+        var i = Math.floor((x - area.x) / (area.w / Math.max(this.labels.length, 1)));
+        var ativo = i >= 0 && i < this.labels.length ? i : null;
+        if (ativo !== this.ativo) {
+            this.ativo = ativo;
+            this.desenhar();
+        }
+    };
+
+    Grafico.prototype._dica = function (area) {
+        var ctx = this.ctx, i = this.ativo;
+        var linhas = [String(this.labels[i])];
+        this.datasets.forEach(function (d) {
+            linhas.push((d.label ? d.label + ": " : "") + formatar((d.data || [])[i] || 0));
+        });
+        var largura = 0;
+        linhas.forEach(function (l) { largura = Math.max(largura, ctx.measureText(l).width); });
+        largura += 16;
+        var alto = linhas.length * 16 + 8;
+        var x = Math.min(this._posicaoX(i, area) + 8, area.x + area.w - largura);
+        var y = area.y + 4;
+
+        ctx.fillStyle = "rgba(40, 40, 40, 0.85)";
+        ctx.fillRect(x, y, largura, alto);
+        ctx.fillStyle = "#fff";
+        ctx.textAlign = "left";
+        ctx.textBaseline = "top";
+        linhas.forEach(function (l, k) { ctx.fillText(l, x + 8, y + 6 + k * 16); });
+    };
+
+    global.Grafico = Grafico;
+})(window);
@@ -0,0 +1,72 @@
+import pytest, django
+django.setup()
+
+from django.urls import reverse
+
+@pytest.fixture
+def admin(client, admin_id):
+    sessao = client.session
+    sessao.update({"user_id": admin_id, "user_tipo": "Admin", "user_nome": "Admin Teste"})
+    sessao.save()
+    return client
+
+@pytest.fixture
+def encomenda_id(fabrica, utilizador_id):
+    produto = fabrica.produtos(1, preco=4.25, stock=50)[0]
+    return fabrica.encomendas(1, utilizador_id, produtos=[produto], quantidade=2)[0]
+
+@pytest.mark.django_db
+def test_lista_de_encomendas(admin, encomenda_id):
+    response = admin.get(reverse("admin_encomenda_list"))
+    assert response.status_code == 200
+    assert reverse("admin_encomenda_detail", args=[encomenda_id]) in response.content.decode()
+
+@pytest.mark.django_db
+def test_lista_mostra_o_periodo_ativo(admin, fabrica, utilizador_id):
+    from datetime import date, timedelta
+    antiga = fabrica.encomendas(1, utilizador_id, data=date.today() - timedelta(days=200))[0]
+    detalhe = reverse("admin_encomenda_detail", args=[antiga])
+
+    # por omissão: últimos 90 dias, e a página diz desde quando
+    response = admin.get(reverse("admin_encomenda_list"))
+    html = response.content.decode()
+    assert response.context["periodo"] == "90"
+    assert response.context["periodo_desde"] == date.today() - timedelta(days=90)
+    assert "A mostrar encomendas desde" in html
+    assert (date.today() - timedelta(days=90)).strftime("%d/%m/%Y") in html
+    assert "dias=todas" in html
+    assert detalhe not in html
+
+    response = admin.get(reverse("admin_encomenda_list"), {"dias": "todas"})
+    html = response.content.decode()
+    assert response.context["periodo_desde"] is None
+    assert "A mostrar encomendas desde" not in html
+    assert detalhe in html
+
+@pytest.mark.django_db
+def test_transicao_em_lote_mantem_os_filtros(admin, encomenda_id):
+    response = admin.post(reverse("admin_encomenda_transicao_lote"), {
+        "encomendas": [encomenda_id], "estado_destino": "Enviada",
+        "estado_filtro": "Pendente", "dias": "365",
+    })
+    assert response.url == reverse("admin_encomenda_list") + "?estado=Pendente&dias=365"
+
+@pytest.mark.django_db
+def test_detalhe_da_encomenda(admin, encomenda_id):
+    response = admin.get(reverse("admin_encomenda_detail", args=[encomenda_id]))
+    assert response.status_code == 200
+    assert response.context["total_encomenda"] == 8.5
+    html = response.content.decode()
+    assert "8.50 €" in html or "8,50 €" in html
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("data", ["hoje", "2001-01-01", "invalida"])
+def test_detalhe_com_data_no_link(admin, encomenda_id, data):
+    from datetime import date
+    if data == "hoje":
+        data = date.today().isoformat()
+    url = reverse("admin_encomenda_detail", args=[encomenda_id])
+    # data errada ou inválida: procura só pelo id
+    response = admin.get(url, {"data": data})
+    assert response.status_code == 200
+    assert len(response.context["linhas"]) == 1
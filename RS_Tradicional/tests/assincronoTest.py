@@ -0,0 +1,48 @@
+import asyncio, uuid
+import django
+django.setup()
+
+from asgiref.sync import iscoroutinefunction
+
+from Core import assincrono, cache
+from Core.views import loja_produtos_async, noticia_detalhe_async
+
+def test_converter_sql_para_marcadores_do_asyncpg():
+    sql = "SELECT 1 FROM Imagem_Produto WHERE caminho LIKE 'sha256:%%' AND id = ANY(%s) LIMIT %s"
+    assert assincrono.converter_sql(sql) == (
+        "SELECT 1 FROM Imagem_Produto WHERE caminho LIKE 'sha256:%' AND id = ANY($1) LIMIT $2"
+    )
+
+def test_views_async_continuam_async_com_condicional():
+    assert iscoroutinefunction(loja_produtos_async)
+    assert iscoroutinefunction(noticia_detalhe_async)
+
+def test_obter_async_um_so_calculo_com_tarefas_concorrentes(transactional_db):
+    # os travões estão em CACHES["calculos"] (BD), usada a partir de outros threads
+    chave = f"teste:{uuid.uuid4().hex}"
+    calculos = []
+
+    async def calcular():
+        calculos.append(1)
+        await asyncio.sleep(0.2)
+        return "valor"
+
+    async def correr():
+        return await asyncio.gather(*(cache.obter_async(chave, calcular, ttl=60) for _ in range(8)))
+
+    assert asyncio.run(correr()) == ["valor"] * 8
+    assert len(calculos) == 1
+
+def test_em_cache_partilha_valor_entre_sync_e_async(transactional_db):
+    nome = f"teste:{uuid.uuid4().hex}"
+
+    @cache.em_cache(nome, ttl=60)
+    def sincrona(x):
+        return x * 2
+
+    @cache.em_cache(nome, ttl=60)
+    async def assincrona(x):
+        return -1
+
+    assert sincrona(21) == 42
+    assert asyncio.run(assincrona(21)) == 42
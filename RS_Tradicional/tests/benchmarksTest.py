@@ -0,0 +1,59 @@
+import io, re
+import pytest, django
+from django.db import connection
+django.setup()
+
+from django.core.management import call_command
+from Core import benchmarks
+
+def test_percentis():
+    assert benchmarks.percentil([], 50) is None
+    assert benchmarks.percentil([7], 99) == 7
+    assert benchmarks.percentil([1, 2, 3, 4], 50) == 2.5
+    resumo = benchmarks.resumo_latencias([float(i) for i in range(1, 101)])
+    assert resumo["n"] == 100 and resumo["max_ms"] == 100
+    assert resumo["p50_ms"] == pytest.approx(50.5)
+    assert resumo["p99_ms"] == pytest.approx(99.01)
+
+def test_ultimo_resultado_ignora_o_atual(tmp_path):
+    assert benchmarks.ultimo_resultado("bench_teste", diretorio=str(tmp_path)) is None
+    (tmp_path / "bench_teste-1000-abc.json").write_text('{"resultados": {"n": 1}}')
+    atual = benchmarks.guardar_resultado("bench_teste", {"n": 2}, diretorio=str(tmp_path))
+    assert benchmarks.ultimo_resultado("bench_teste", diretorio=str(tmp_path))["resultados"] == {"n": 2}
+    anterior = benchmarks.ultimo_resultado("bench_teste", diretorio=str(tmp_path), excluir=atual)
+    assert anterior["resultados"] == {"n": 1}
+
+def _contar(sql):
+    with connection.cursor() as cur:
+        cur.execute(sql)
+        return cur.fetchone()[0]
+
+@pytest.fixture
+def dados_sinteticos(db):
+    call_command("gerar_dados_sinteticos", utilizadores=20, fornecedores=3, produtos=30,
+                 encomendas=50, carrinhos=0.1, stdout=io.StringIO())
+
+def test_gerar_dados_sinteticos(dados_sinteticos):
+    bench = "FROM Utilizador WHERE email LIKE '%%@bench.rstradicional.pt'"
+    # 20 clientes, 2 admins e os utilizadores criados pelo trigger dos fornecedores
+    assert _contar(f"SELECT COUNT(*) {bench}") == 25
+    assert _contar(f"""
+        SELECT COUNT(*) FROM Encomenda
+        WHERE estado_encomenda = 'Carrinho' AND id_utilizador IN (SELECT id_utilizador {bench})
+    """) == 2
+    assert _contar(f"""
+        SELECT COUNT(*) FROM Encomenda e
+        WHERE e.id_utilizador IN (SELECT id_utilizador {bench})
+          AND NOT EXISTS (SELECT 1 FROM Encomendas_Produtos ep WHERE ep.id_encomenda = e.id_encomenda)
+    """) == 0
+
+def test_bench_loja_percorre_os_cenarios(dados_sinteticos):
+    out = io.StringIO()
+    call_command("bench_loja", iteracoes=1, aquecimento=0, nao_guardar=True, stdout=out)
+    linhas = {l.split()[0]: l for l in out.getvalue().splitlines() if l.strip()}
+    for nome in ("home", "loja_produtos", "loja_carrinho", "minhas_encomendas", "admin_encomenda_list"):
+        assert nome in linhas
+    for linha in linhas.values():
+        status = re.search(r"\s([\d,]+)$", linha)
+        if status:
+            assert all(int(s) < 500 for s in status.group(1).split(",")), linha
@@ -0,0 +1,186 @@
+import select, threading, time, uuid
+import pytest, django
+from django.db import connection, connections
+django.setup()
+
+from Core import cache_invalidacao
+
+def _ligacao():
+    """Segunda ligação ao Postgres, fora da do teste."""
+    conn = connection.get_new_connection(connection.get_connection_params())
+    conn.autocommit = True
+    return conn
+
+def _esperar(condicao, segundos=5):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        if condicao():
+            return True
+        time.sleep(0.05)
+    return False
+
+def _notificacoes(conn, segundos=2):
+    """Payloads recebidos por `conn` até `segundos` sem tráfego."""
+    payloads = []
+    while select.select([conn], [], [], segundos) != ([], [], []):
+        conn.poll()
+        while conn.notifies:
+            payloads.append(conn.notifies.pop(0).payload)
+    return payloads
+
+def _produto(cur, nome):
+    cur.execute("""
+        INSERT INTO Produto (nome, descricao, preco, stock, is_approved, estado_produto, id_tipo_produto, id_fornecedor)
+        VALUES (%s, 'desc', 1, 10, TRUE, 'Ativo', NULL, NULL) RETURNING id_produto
+    """, [nome])
+    return cur.fetchone()[0]
+
+@pytest.fixture
+def estado():
+    """Estado do módulo limpo, sem o thread de LISTEN verdadeiro."""
+    cache_invalidacao._chaves.clear()
+    cache_invalidacao._geracoes.clear()
+    cache_invalidacao._ligado.set()
+    yield cache_invalidacao._cache()
+    cache_invalidacao._chaves.clear()
+    cache_invalidacao._ligado.clear()
+
+@pytest.fixture
+def ouvinte():
+    conn = _ligacao()
+    with conn.cursor() as cur:
+        cur.execute('LISTEN "rs_cache"')
+    yield conn
+    conn.close()
+
+# ---- triggers: o NOTIFY só sai com o COMMIT ----
+
+def test_escrita_em_produto_notifica(transactional_db, ouvinte):
+    with connection.cursor() as cur:
+        produto = _produto(cur, f"Notificar {uuid.uuid4().hex[:8]}")
+    try:
+        assert "produto" in _notificacoes(ouvinte)
+    finally:
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM Produto WHERE id_produto = %s", [produto])
+
+def test_checkout_nao_notifica(transactional_db, ouvinte):
+    with connection.cursor() as cur:
+        produto = _produto(cur, f"Stock {uuid.uuid4().hex[:8]}")
+    try:
+        _notificacoes(ouvinte, segundos=0.5)
+        with connection.cursor() as cur:
+            # o que o trg_encomenda_stock faz: só o stock, sem esgotar
+            cur.execute("UPDATE Produto SET stock = stock - 1 WHERE id_produto = %s", [produto])
+        assert _notificacoes(ouvinte, segundos=0.5) == []
+        with connection.cursor() as cur:
+            cur.execute("UPDATE Produto SET stock = 0 WHERE id_produto = %s", [produto])
+        assert "produto" in _notificacoes(ouvinte)
+    finally:
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM Produto WHERE id_produto = %s", [produto])
+
+def test_rollback_nao_notifica(transactional_db, ouvinte):
+    loja = connection.get_new_connection(connection.get_connection_params())
+    try:
+        with loja.cursor() as cur:
+            _produto(cur, "Rollback")
+        loja.rollback()
+    finally:
+        loja.close()
+    assert "produto" not in _notificacoes(ouvinte, segundos=0.5)
+
+# ---- invalidar(): só as chaves da tabela ----
+
+def test_invalidar_apaga_so_as_chaves_da_tabela(estado, monkeypatch):
+    monkeypatch.setattr(cache_invalidacao, "garantir_listener", lambda: None)
+    produtos, noticias = f"teste:{uuid.uuid4().hex}", f"teste:{uuid.uuid4().hex}"
+    calculos = []
+
+    def calcular(valor):
+        calculos.append(valor)
+        return valor
+
+    cache_invalidacao.obter(produtos, ["Produto", "Fornecedor"], lambda: calcular("p"))
+    cache_invalidacao.obter(noticias, ["Noticia"], lambda: calcular("n"))
+    cache_invalidacao.obter(produtos, ["Produto", "Fornecedor"], lambda: calcular("p"))
+    assert calculos == ["p", "n"]
+
+    cache_invalidacao.invalidar("fornecedor")
+    assert estado.get(produtos) is None
+    assert estado.get(noticias) == "n"
+    assert produtos not in cache_invalidacao._chaves.get("produto", set())
+
+def test_invalidacao_durante_o_calculo_nao_guarda(estado, monkeypatch):
+    monkeypatch.setattr(cache_invalidacao, "garantir_listener", lambda: None)
+    chave = f"teste:{uuid.uuid4().hex}"
+
+    def calcular():
+        cache_invalidacao.invalidar("produto")
+        return "antigo"
+
+    assert cache_invalidacao.obter(chave, ["produto"], calcular) == "antigo"
+    assert estado.get(chave) is None
+
+def test_sem_listener_nao_guarda(estado, monkeypatch):
+    monkeypatch.setattr(cache_invalidacao, "garantir_listener", lambda: None)
+    cache_invalidacao._ligado.clear()
+    chave = f"teste:{uuid.uuid4().hex}"
+    assert cache_invalidacao.obter(chave, ["produto"], lambda: "v") == "v"
+    assert estado.get(chave) is None
+
+# ---- o listener de ponta a ponta ----
+
+class _Ligacoes:
+    """connections do módulo, a guardar a ligação aberta pelo listener para a fechar no fim."""
+    def __init__(self):
+        self.abertas = []
+
+    def __getitem__(self, alias):
+        return self
+
+    def get_connection_params(self):
+        return connection.get_connection_params()
+
+    def get_new_connection(self, params):
+        conn = connection.get_new_connection(params)
+        self.abertas.append(conn)
+        return conn
+
+def test_listener_invalida_depois_de_escrita_em_produto(transactional_db, estado, monkeypatch):
+    ligacoes = _Ligacoes()
+    monkeypatch.setattr(cache_invalidacao, "connections", ligacoes)
+    monkeypatch.setattr(cache_invalidacao, "garantir_listener", lambda: None)
+    cache_invalidacao._ligado.clear()
+    cfg = dict(cache_invalidacao._config(), KEEPALIVE_SEGUNDOS=0.1)
+
+    def escutar():
+        try:
+            cache_invalidacao._escutar(cfg)
+        except Exception:
+            pass  # ligação fechada no fim do teste
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=escutar, daemon=True)
+    thread.start()
+    produto = None
+    try:
+        assert _esperar(cache_invalidacao.ligado)
+        produtos, noticias = f"teste:{uuid.uuid4().hex}", f"teste:{uuid.uuid4().hex}"
+        cache_invalidacao.obter(produtos, ["produto"], lambda: "p")
+        cache_invalidacao.obter(noticias, ["noticia"], lambda: "n")
+        assert estado.get(produtos) == "p"
+
+        with connection.cursor() as cur:
+            produto = _produto(cur, f"Listener {uuid.uuid4().hex[:8]}")
+
+        assert _esperar(lambda: estado.get(produtos) is None)
+        assert estado.get(noticias) == "n"
+    finally:
+        for conn in ligacoes.abertas:
+            conn.close()
+        thread.join(5)
+        if produto is not None:
+            with connection.cursor() as cur:
+                cur.execute("DELETE FROM Produto WHERE id_produto = %s", [produto])
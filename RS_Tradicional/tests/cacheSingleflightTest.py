@@ -0,0 +1,170 @@
+import multiprocessing, threading, time, uuid
+import pytest, django
+from django.db import connection, connections
+django.setup()
+
+from Core import cache, cache_invalidacao, versoes
+
+# os travões (CACHES["calculos"]) são uma tabela no Postgres: os threads e os
+# processos usam ligações próprias, por isso os dados têm de estar confirmados
+
+@pytest.fixture
+def limpar(transactional_db):
+    chaves = []
+    yield chaves
+    cache_invalidacao.cache_local().delete_many(chaves)
+    cache._cache().delete_many([f"travao:{c}" for c in chaves])
+
+def _em_paralelo(alvo, n):
+    def correr():
+        try:
+            alvo()
+        finally:
+            connections.close_all()
+    threads = [threading.Thread(target=correr) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def test_um_so_calculo_com_pedidos_concorrentes(limpar):
+    chave = f"teste:{uuid.uuid4().hex}"
+    limpar.append(chave)
+    calculos = []
+
+    def calcular():
+        calculos.append(1)
+        time.sleep(0.2)
+        return "valor"
+
+    resultados = []
+    _em_paralelo(lambda: resultados.append(cache.obter(chave, calcular, ttl=60)), 8)
+
+    assert len(calculos) == 1
+    assert resultados == ["valor"] * 8
+
+def test_expirado_serve_valor_antigo_enquanto_outro_recalcula(limpar):
+    chave = f"teste:{uuid.uuid4().hex}"
+    limpar.append(chave)
+    cache_invalidacao.cache_local().set(chave, ("antigo", 0.1, time.time() - 1), 60)
+    cache._cache().add(f"travao:{chave}", "outro", 30)
+
+    assert cache.obter(chave, lambda: "novo", ttl=60) == "antigo"
+
+# ---- entre processos (workers do gunicorn) ----
+
+def _processos(alvo, n):
+    # as ligações abertas não podem ser herdadas pelos processos filhos
+    connections.close_all()
+    contexto = multiprocessing.get_context("fork")
+
+    def correr(*args):
+        try:
+            alvo(*args)
+        finally:
+            connections.close_all()
+
+    processos = [contexto.Process(target=correr, args=(i,)) for i in range(n)]
+    for p in processos:
+        p.start()
+    for p in processos:
+        p.join(30)
+    assert [p.exitcode for p in processos] == [0] * n
+
+def test_um_calculo_de_cada_vez_entre_processos(limpar):
+    chave = f"teste:{uuid.uuid4().hex}"
+    limpar.append(chave)
+    contexto = multiprocessing.get_context("fork")
+    calculos, ativos, pico = contexto.Value("i", 0), contexto.Value("i", 0), contexto.Value("i", 0)
+
+    def calcular():
+        with calculos.get_lock():
+            calculos.value += 1
+            ativos.value += 1
+            pico.value = max(pico.value, ativos.value)
+        time.sleep(0.3)
+        with calculos.get_lock():
+            ativos.value -= 1
+        return "valor"
+
+    def pedido(i):
+        # dois pedidos por processo: o segundo lê a cache do processo
+        for _ in range(2):
+            assert cache.obter(chave, calcular, ttl=60) == "valor"
+
+    _processos(pedido, 6)
+    # cada processo guarda o seu valor, mas nunca dois cálculos ao mesmo tempo
+    assert pico.value == 1
+    assert calculos.value <= 6
+
+def _esperar(condicao, segundos=5):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        if condicao():
+            return True
+        time.sleep(0.05)
+    return False
+
+def _apagar_versao(nome):
+    with connection.cursor() as cur:
+        cur.execute("DELETE FROM Versao_Dados WHERE recurso = %s", [f"cache:{nome}"])
+
+def test_invalidar_noutro_processo(limpar):
+    nome = f"teste{uuid.uuid4().hex[:8]}"
+    calculos = []
+
+    @cache.em_cache(nome, ttl=60)
+    def calcular(x):
+        calculos.append(x)
+        return x * 2
+
+    try:
+        assert calcular(2) == 4 and calcular(2) == 4
+        antes = versoes.versao(f"cache:{nome}")
+        _processos(lambda i: cache.invalidar(nome), 1)
+        # a versão nova chega a este processo com o NOTIFY de versao_dados
+        assert _esperar(lambda: versoes.versao(f"cache:{nome}") != antes)
+        assert calcular(2) == 4
+        assert calculos == [2, 2]
+    finally:
+        _apagar_versao(nome)
+
+def test_invalidar_em_simultaneo_nao_perde_versoes(limpar):
+    nome = f"teste{uuid.uuid4().hex[:8]}"
+    try:
+        _processos(lambda i: [cache.invalidar(nome) for _ in range(5)], 4)
+        with connection.cursor() as cur:
+            cur.execute("SELECT versao FROM Versao_Dados WHERE recurso = %s", [f"cache:{nome}"])
+            assert cur.fetchone()[0] == 20
+    finally:
+        _apagar_versao(nome)
+
+def test_valor_com_tabelas_apagado_ao_invalidar(limpar, monkeypatch):
+    monkeypatch.setattr(cache_invalidacao, "garantir_listener", lambda: None)
+    cache_invalidacao._ligado.set()
+    chave = f"teste:{uuid.uuid4().hex}"
+    limpar.append(chave)
+    try:
+        assert cache.obter(chave, lambda: "antigo", ttl=60, tabelas=["produto"]) == "antigo"
+        assert cache.obter(chave, lambda: "novo", ttl=60, tabelas=["produto"]) == "antigo"
+
+        cache_invalidacao.invalidar("produto")
+        assert cache.obter(chave, lambda: "novo", ttl=60, tabelas=["produto"]) == "novo"
+    finally:
+        cache_invalidacao._ligado.clear()
+
+def test_invalidacao_durante_o_calculo_nao_guarda(limpar, monkeypatch):
+    monkeypatch.setattr(cache_invalidacao, "garantir_listener", lambda: None)
+    cache_invalidacao._ligado.set()
+    chave = f"teste:{uuid.uuid4().hex}"
+    limpar.append(chave)
+
+    def calcular():
+        cache_invalidacao.invalidar("produto")
+        return "antigo"
+
+    try:
+        assert cache.obter(chave, calcular, ttl=60, tabelas=["produto"]) == "antigo"
+        assert cache_invalidacao.cache_local().get(chave) is None
+    finally:
+        cache_invalidacao._ligado.clear()
@@ -0,0 +1,87 @@
+import pytest, django
+from django.db import connection, transaction
+django.setup()
+
+@pytest.mark.django_db
+def test_juntar_carrinho_soma_e_limita_ao_stock(utilizador_id, produto_ativo_id):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("CALL sp_loja_adicionar_produto(%s,%s,%s);", [utilizador_id, produto_ativo_id, 4])
+            cur.execute("CALL sp_loja_juntar_carrinho(%s,%s,%s);",
+                        [utilizador_id, [produto_ativo_id], [9]])
+            cur.execute("""
+                SELECT ep.quantidade
+                FROM encomendas_produtos ep
+                JOIN encomenda e ON e.id_encomenda = ep.id_encomenda
+                WHERE e.id_utilizador = %s AND e.estado_encomenda = 'Carrinho';
+            """, [utilizador_id])
+            assert cur.fetchall() == [(10,)]
+        finally:
+            transaction.savepoint_rollback(sp)
+
+@pytest.mark.django_db
+def test_juntar_carrinho_ignora_produtos_inativos(utilizador_id, produto_ativo_id, produto_id):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("CALL sp_loja_juntar_carrinho(%s,%s,%s);",
+                        [utilizador_id, [produto_ativo_id, produto_id], [2, 1]])
+            cur.execute("""
+                SELECT ep.id_produto, ep.quantidade
+                FROM encomendas_produtos ep
+                JOIN encomenda e ON e.id_encomenda = ep.id_encomenda
+                WHERE e.id_utilizador = %s AND e.estado_encomenda = 'Carrinho';
+            """, [utilizador_id])
+            assert cur.fetchall() == [(produto_ativo_id, 2)]
+        finally:
+            transaction.savepoint_rollback(sp)
+
+# ---- login: o carrinho do cookie passa para a BD ----
+
+@pytest.fixture
+def cliente_com_carrinho(client, utilizador_id, produto_ativo_id):
+    from django.contrib.auth.hashers import make_password
+    from django.core.signing import get_cookie_signer
+    from Core import carrinho_convidado
+    with connection.cursor() as cur:
+        cur.execute("UPDATE utilizador SET password = %s WHERE id_utilizador = %s;",
+                    [make_password("segredo"), utilizador_id])
+    signer = get_cookie_signer(salt=carrinho_convidado.COOKIE + carrinho_convidado.SALT)
+    client.cookies[carrinho_convidado.COOKIE] = signer.sign(f"{produto_ativo_id}:2")
+    return client
+
+def _login(client):
+    from django.urls import reverse
+    return client.post(reverse("login"), {"email": "alice@example.com", "password": "segredo"})
+
+@pytest.mark.django_db
+def test_login_junta_carrinho_e_apaga_cookie(cliente_com_carrinho, utilizador_id):
+    from django.urls import reverse
+    from Core import carrinho_convidado
+    response = _login(cliente_com_carrinho)
+    assert response.url == reverse("loja_carrinho")
+    assert response.cookies[carrinho_convidado.COOKIE].value == ""
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT ep.quantidade
+            FROM encomendas_produtos ep
+            JOIN encomenda e ON e.id_encomenda = ep.id_encomenda
+            WHERE e.id_utilizador = %s AND e.estado_encomenda = 'Carrinho';
+        """, [utilizador_id])
+        assert cur.fetchall() == [(2,)]
+
+@pytest.mark.django_db
+def test_login_com_falha_ao_juntar_mantem_cookie(cliente_com_carrinho, monkeypatch):
+    from django.db import DatabaseError
+    from Core import carrinho_convidado
+
+    def falhar(id_utilizador, carrinho):
+        raise DatabaseError("sp_loja_juntar_carrinho falhou")
+
+    monkeypatch.setattr(carrinho_convidado, "juntar_no_bd", falhar)
+    response = _login(cliente_com_carrinho)
+    assert response.status_code == 302
+    # o cookie não é apagado: o carrinho continua lá para o próximo login
+    assert carrinho_convidado.COOKIE not in response.cookies
+    assert cliente_com_carrinho.session["user_id"]
@@ -1,5 +1,308 @@
+import hashlib
+import itertools
+import json
+from pathlib import Path
+
+import django
 import pytest
-from django.db import connection
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# ---------- BASE DE DADOS DE TESTE ----------
+# As tabelas da aplicação não têm migrações: o esquema vem dos scripts de
+# ScriptsBD. É aplicado uma só vez numa BD modelo (o nome leva o hash dos
+# scripts, por isso só é refeita quando estes mudam) e cada worker do
+# pytest-xdist (-n) recebe uma cópia feita pelo Postgres com
+# CREATE DATABASE ... TEMPLATE, sem voltar a correr SQL nenhum.
+# Cada teste corre numa transação desfeita no fim (@pytest.mark.django_db);
+# um passo que deva falhar fica dentro de transaction.savepoint().
+SCRIPTS_ESQUEMA = (
+    "CreateDatabase.sql",
+    "functions_views.sql",
+    "Triggers.sql",
+    "Procedures.sql",
+    "Relatorios.sql",
+)
+# pg_advisory_lock partilhado pelos workers: um cria a BD modelo, os outros esperam
+_TRAVAO_MODELO = 7310049
+
+
+def _scripts():
+    pasta = Path(settings.BASE_DIR) / "ScriptsBD"
+    return [(nome, (pasta / nome).read_text(encoding="utf-8")) for nome in SCRIPTS_ESQUEMA]
+
+
+def _nome_modelo(scripts):
+    h = hashlib.sha256(django.get_version().encode())
+    for nome, texto in scripts:
+        h.update(nome.encode())
+        h.update(texto.encode())
+    return f"{settings.DATABASES['default']['NAME']}_modelo_{h.hexdigest()[:12]}"
+
+
+def _existe(cur, nome):
+    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", [nome])
+    return cur.fetchone() is not None
+
+
+def _criar_modelo(cur, modelo, scripts):
+    q = connection.ops.quote_name
+    cur.execute(f"CREATE DATABASE {q(modelo)}")
+
+    db = connections["default"]
+    original = db.settings_dict["NAME"]
+    db.close()
+    db.settings_dict["NAME"] = modelo
+    try:
+        with db.cursor() as c:
+            for nome, texto in scripts:
+                try:
+                    c.execute(texto)
+                except Exception as e:
+                    raise RuntimeError(f"ScriptsBD/{nome}: {e}") from e
+        # tabelas do Django (sessões, auth, ...)
+        call_command("migrate", database="default", run_syncdb=True, interactive=False, verbosity=0)
+    except Exception:
+        db.close()
+        cur.execute(f"DROP DATABASE IF EXISTS {q(modelo)} WITH (FORCE)")
+        raise
+    finally:
+        # o CREATE DATABASE ... TEMPLATE falha com ligações abertas ao modelo
+        db.close()
+        db.settings_dict["NAME"] = original
+
+    # modelos de versões antigas dos scripts
+    cur.execute(
+        "SELECT datname FROM pg_database WHERE datname LIKE %s AND datname <> %s",
+        [f"{original}\\_modelo\\_%", modelo],
+    )
+    for (antigo,) in cur.fetchall():
+        try:
+            cur.execute(f"DROP DATABASE {q(antigo)}")
+        except Exception:
+            pass  # em uso por outra execução; fica para a próxima
+
+
+@pytest.fixture(scope="session")
+def django_db_setup(request, django_test_environment, django_db_blocker, django_db_modify_db_settings):
+    """Substitui o do pytest-django: a BD de teste é uma cópia da BD modelo."""
+    q = connection.ops.quote_name
+    # já com o sufixo do worker (_gw0, _gw1, ...)
+    destino = connection.settings_dict["TEST"]["NAME"]
+    scripts = _scripts()
+    modelo = _nome_modelo(scripts)
+
+    with django_db_blocker.unblock():
+        with connection._nodb_cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", [_TRAVAO_MODELO])
+            try:
+                if not _existe(cur, modelo):
+                    _criar_modelo(cur, modelo, scripts)
+                cur.execute(f"DROP DATABASE IF EXISTS {q(destino)} WITH (FORCE)")
+                cur.execute(f"CREATE DATABASE {q(destino)} TEMPLATE {q(modelo)}")
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", [_TRAVAO_MODELO])
+
+        # os aliases (admin, cliente, fornecedor) partilham a mesma BD de teste
+        for alias in connections:
+            db = connections[alias]
+            if db.settings_dict.get("TEST", {}).get("NAME") == destino:
+                db.close()
+                db.settings_dict["NAME"] = destino
+
+    yield
+
+    # com --reuse-db a cópia fica (só é refeita no arranque seguinte)
+    if request.config.getvalue("reuse_db"):
+        return
+    with django_db_blocker.unblock():
+        for alias in connections:
+            connections[alias].close()
+        with connection._nodb_cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {q(destino)} WITH (FORCE)")
+
+
+# ---------- FÁBRICA (linhas em bloco) ----------
+class Fabrica:
+    """
+    Cria linhas de teste em bloco: cada chamada é um só INSERT ... SELECT
+    (generate_series / unnest) e devolve os ids criados, pela ordem.
+    """
+
+    def __init__(self):
+        # emails diferentes entre chamadas no mesmo teste
+        self._lotes = itertools.count(1)
+
+    def _ids(self, sql, params):
+        with connection.cursor() as cur:
+            cur.execute(sql, params)
+            return [row[0] for row in cur.fetchall()]
+
+    def tipo_utilizador(self, designacao="Cliente"):
+        return self._ids("""
+            INSERT INTO Tipo_Utilizador (designacao) VALUES (%s) RETURNING id_tipo_utilizador
+        """, [designacao])[0]
+
+    def tipo_produto(self, designacao="Teste"):
+        return self._ids("""
+            INSERT INTO Tipo_Produto (designacao) VALUES (%s) RETURNING id_tipo_produto
+        """, [designacao])[0]
+
+    def utilizadores(self, n, tipo="Cliente", password="hash"):
+        tipo_id = self.tipo_utilizador(tipo)
+        return self._ids("""
+            INSERT INTO Utilizador (nome, email, password, nif, id_tipo_utilizador)
+            SELECT 'Utilizador ' || g,
+                   'utilizador' || %s || '.' || g || '@teste.pt',
+                   %s,
+                   lpad(g::text, 9, '0'),
+                   %s
+            FROM generate_series(1, %s) AS g
+            ORDER BY g
+            RETURNING id_utilizador
+        """, [next(self._lotes), password, tipo_id, n])
+
+    def fornecedores(self, n):
+        return self._ids("""
+            INSERT INTO Fornecedor (nome, contacto, email, nif, isSingular)
+            SELECT 'Fornecedor ' || g,
+                   '9' || lpad(g::text, 8, '0'),
+                   'fornecedor' || %s || '.' || g || '@teste.pt',
+                   lpad(g::text, 9, '0'),
+                   TRUE
+            FROM generate_series(1, %s) AS g
+            ORDER BY g
+            RETURNING id_fornecedor
+        """, [next(self._lotes), n])
+
+    def produtos(self, n, fornecedor_id=None, tipo_id=None, preco=5, stock=10, ativo=True):
+        fornecedor_id = fornecedor_id or self.fornecedores(1)[0]
+        tipo_id = tipo_id or self.tipo_produto()
+        return self._ids("""
+            INSERT INTO Produto (nome, descricao, preco, stock, is_approved, estado_produto,
+                                 id_tipo_produto, id_fornecedor)
+            SELECT 'Produto ' || g, 'desc', %s, %s, %s, %s, %s, %s
+            FROM generate_series(1, %s) AS g
+            ORDER BY g
+            RETURNING id_produto
+        """, [preco, stock, ativo, "Ativo" if ativo else "Inativo", tipo_id, fornecedor_id, n])
+
+    def encomendas(self, n, utilizador_id, estado="Pendente", produtos=(), quantidade=1, data=None):
+        """`n` encomendas, cada uma com uma linha por produto de `produtos`."""
+        ids = self._ids("""
+            INSERT INTO Encomenda (data_encomenda, id_utilizador, estado_encomenda)
+            SELECT COALESCE(%s::date, CURRENT_DATE), %s, %s
+            FROM generate_series(1, %s) AS g
+            ORDER BY g
+            RETURNING id_encomenda
+        """, [data, utilizador_id, estado, n])
+        if produtos:
+            # data_encomenda, preço e nome da linha vêm do trigger (Triggers.sql)
+            with connection.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO Encomendas_Produtos (id_encomenda, id_produto, quantidade)
+                    SELECT e, p, %s
+                    FROM unnest(%s::int[]) AS e
+                    CROSS JOIN unnest(%s::int[]) AS p
+                """, [quantidade, ids, list(produtos)])
+        return ids
+
+
+@pytest.fixture
+def fabrica(db):
+    return Fabrica()
+
+
+# ---------- ORÇAMENTOS DE DESEMPENHO ----------
+# Limites por página (ver tests/orcamentosTest.py): nº de queries, linhas
+# lidas das tabelas (somadas nos nós de scan do EXPLAIN ANALYZE de cada
+# SELECT) e tabelas que não podem ser lidas por Seq Scan. O pedido corre
+# com o CaptureQueriesContext; cada consulta capturada volta a correr com
+# EXPLAIN (ANALYZE, FORMAT JSON) num savepoint desfeito a seguir.
+# feitos uma vez por ligação (Core/db.py): não contam para o orçamento
+_PREPARACAO = ("PREPARE", "DEALLOCATE")
+_EXPLICAVEIS = ("SELECT", "WITH", "EXECUTE")
+
+
+def _nos(plano):
+    yield plano
+    for filho in plano.get("Plans", []):
+        yield from _nos(filho)
+
+
+def _plano(sql):
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")
+        plano = cur.fetchone()[0]
+        transaction.set_rollback(True)
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return plano[0]["Plan"]
+
+
+def _linhas_e_seq_scans(plano, sem_seq_scan):
+    linhas, seq_scans = 0, []
+    for no in _nos(plano):
+        tabela = (no.get("Relation Name") or "").lower()
+        if not tabela:
+            continue
+        # valores por execução do nó
+        lidas = no.get("Actual Rows", 0) + no.get("Rows Removed by Filter", 0)
+        linhas += round(lidas * no.get("Actual Loops", 1))
+        if no["Node Type"] == "Seq Scan" and tabela.startswith(sem_seq_scan):
+            seq_scans.append(tabela)
+    return linhas, seq_scans
+
+
+def _sql(sql):
+    return " ".join(sql.split())
+
+
+@pytest.fixture
+def verificar_orcamento(client):
+    """
+    verificar_orcamento(url_name, {"queries": N, "linhas": N, "sem_seq_scan": (...)}, args=()):
+    GET à página; falha com o SQL em excesso. As tabelas de sem_seq_scan são
+    prefixos (apanham também as partições, ex: encomenda_p2025_01).
+    """
+
+    def verificar(url_name, orcamento, args=()):
+        sem_seq_scan = tuple(t.lower() for t in orcamento.get("sem_seq_scan", ()))
+        with CaptureQueriesContext(connection) as capturadas:
+            resposta = client.get(reverse(url_name, args=args))
+        assert resposta.status_code == 200, f"{url_name}: status {resposta.status_code}"
+
+        queries = [
+            q["sql"] for q in capturadas.captured_queries
+            if not q["sql"].lstrip().upper().startswith(_PREPARACAO)
+        ]
+        erros = []
+        if len(queries) > orcamento["queries"]:
+            erros.append(f"{len(queries)} queries (máximo {orcamento['queries']}):")
+            erros += [f"  {i}. {_sql(sql)}" for i, sql in enumerate(queries, 1)]
+
+        total, por_query = 0, []
+        for sql in queries:
+            if not sql.lstrip().upper().startswith(_EXPLICAVEIS):
+                continue
+            linhas, seq_scans = _linhas_e_seq_scans(_plano(sql), sem_seq_scan)
+            total += linhas
+            por_query.append((linhas, sql))
+            if seq_scans:
+                erros.append(f"Seq Scan em {', '.join(seq_scans)}:\n  {_sql(sql)}")
+
+        if total > orcamento["linhas"]:
+            erros.append(f"{total} linhas lidas (máximo {orcamento['linhas']}):")
+            erros += [f"  {linhas:>8}  {_sql(sql)}" for linhas, sql in sorted(por_query, reverse=True)]
+
+        if erros:
+            pytest.fail(f"Orçamento de {url_name} excedido\n" + "\n".join(erros), pytrace=False)
+
+    return verificar
+
 
 # ---------- TIPOS ----------
 @pytest.fixture
@@ -83,3 +386,31 @@ def noticia_id(tipo_noticia_id, utilizador_id):
             VALUES (%s,%s,%s,%s,%s) RETURNING id_noticia;
         """, ["Promo Dia X", "Conteudo", tipo_noticia_id, utilizador_id, "2025-01-01"])
         return cur.fetchone()[0]
+
+# ---------- ENCOMENDAS ----------
+@pytest.fixture
+def admin_id():
+    with connection.cursor() as cur:
+        cur.execute(
+            "INSERT INTO tipo_utilizador (designacao) VALUES (%s) RETURNING id_tipo_utilizador;",
+            ["Admin"]
+        )
+        tipo_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO utilizador (nome, email, password, morada, nif, id_tipo_utilizador)
+            VALUES (%s,%s,%s,%s,%s,%s) RETURNING id_utilizador;
+        """, ["Admin Teste", "admin.teste@example.com", "hash", None, "111222333", tipo_id])
+        return cur.fetchone()[0]
+
+@pytest.fixture
+def produto_ativo_id(tipo_produto_id, fornecedor_id):
+    with connection.cursor() as cur:
+        cur.execute("""
+            INSERT INTO produto (nome, descricao, preco, stock, is_approved, estado_produto, id_tipo_produto, id_fornecedor)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s) RETURNING id_produto;
+        """, ["Produto Ativo", "desc", 5.00, 10, True, "Ativo", tipo_produto_id, fornecedor_id])
+        return cur.fetchone()[0]
+
+@pytest.fixture
+def encomendas_pendentes_ids(fabrica, utilizador_id, produto_ativo_id):
+    return fabrica.encomendas(3, utilizador_id, produtos=[produto_ativo_id], quantidade=2)
@@ -0,0 +1,13 @@
+import django
+django.setup()
+
+from Core.contexto import navegacao
+
+class _Pedido:
+    def __init__(self, sessao):
+        self.session = sessao
+
+def test_flags_da_navegacao():
+    nav = navegacao(_Pedido({"user_id": 3, "user_tipo": "Gestor", "user_nome": "Ana"}))["nav"]
+    assert nav == {"autenticado": True, "nome": "Ana", "staff": True, "fornecedor": False}
+    assert navegacao(_Pedido({}))["nav"]["autenticado"] is False
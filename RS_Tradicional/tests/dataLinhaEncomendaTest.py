@@ -0,0 +1,32 @@
+import pytest, django
+from django.db import connection, transaction
+django.setup()
+
+@pytest.mark.django_db
+def test_linha_copia_data_da_encomenda(encomendas_pendentes_ids):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("""
+                SELECT COUNT(*)
+                FROM encomendas_produtos ep
+                JOIN encomenda e ON e.id_encomenda = ep.id_encomenda
+                WHERE ep.id_encomenda = ANY(%s) AND ep.data_encomenda = e.data_encomenda;
+            """, [encomendas_pendentes_ids])
+            assert cur.fetchone()[0] == len(encomendas_pendentes_ids)
+        finally:
+            transaction.savepoint_rollback(sp)
+
+@pytest.mark.django_db
+def test_mudar_data_leva_linhas_e_resumo(encomendas_pendentes_ids):
+    eid = encomendas_pendentes_ids[0]
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("UPDATE encomenda SET data_encomenda = DATE '2020-01-15' WHERE id_encomenda=%s;", [eid])
+            cur.execute("SELECT DISTINCT data_encomenda::text FROM encomendas_produtos WHERE id_encomenda=%s;", [eid])
+            assert cur.fetchall() == [("2020-01-15",)]
+            cur.execute("SELECT DISTINCT data_encomenda::text FROM fornecedor_encomenda_resumo WHERE id_encomenda=%s;", [eid])
+            assert cur.fetchall() == [("2020-01-15",)]
+        finally:
+            transaction.savepoint_rollback(sp)
@@ -0,0 +1,77 @@
+import sys
+import django
+django.setup()
+
+import pytest
+from django.db import DatabaseError
+
+from Core.db import Preparada, classe_linha
+
+def test_linha_le_como_dict_e_como_atributo():
+    Linha = classe_linha(("id_produto", "nome", "preco"))
+    linha = Linha._make((7, "Queijada", 2))
+
+    assert linha.nome == "Queijada"
+    assert linha["nome"] == "Queijada"
+    assert linha.get("stock", 0) == 0
+    assert dict(linha) == {"id_produto": 7, "nome": "Queijada", "preco": 2}
+    with pytest.raises(KeyError):
+        linha["stock"]
+
+def test_classe_reutilizada_e_sem_dict_por_linha():
+    Linha = classe_linha(("a", "b"))
+    assert classe_linha(("a", "b")) is Linha
+
+    linha = Linha._make((1, 2))
+    assert not hasattr(linha, "__dict__")
+    assert sys.getsizeof(linha) < sys.getsizeof(dict(linha))
+
+def test_colunas_sem_nome_valido_continuam_acessiveis():
+    linha = classe_linha(("?column?", "count"))._make((1, 2))
+    assert linha["?column?"] == 1
+    assert linha["count"] == 2
+
+class _Ligacao:
+    pass
+
+class _Cursor:
+    def __init__(self, erro=None):
+        self.db = _Ligacao()
+        self.executados = []
+        self.erro = erro
+
+    def execute(self, sql, params=None):
+        self.executados.append(sql)
+        if self.erro and sql.startswith("EXECUTE"):
+            erro, self.erro = self.erro, None
+            raise erro
+
+def test_preparada_so_prepara_uma_vez_por_ligacao():
+    p = Preparada("teste_carrinho", "SELECT 1 FROM vw_loja_carrinho WHERE id_utilizador = %s", tipos=("integer",))
+    cur = _Cursor()
+    p.executar(cur, [1])
+    p.executar(cur, [2])
+
+    assert cur.executados == [
+        "PREPARE rs_teste_carrinho (integer) AS SELECT 1 FROM vw_loja_carrinho WHERE id_utilizador = $1",
+        "EXECUTE rs_teste_carrinho(%s)",
+        "EXECUTE rs_teste_carrinho(%s)",
+    ]
+
+    outra = _Cursor()
+    p.executar(outra, [1])
+    assert outra.executados[0].startswith("PREPARE")
+
+def test_preparada_invalidada_volta_a_preparar_com_outro_nome():
+    causa = type("Erro", (Exception,), {"pgcode": "0A000"})()
+    erro = DatabaseError("cached plan must not change result type")
+    erro.__cause__ = causa
+
+    p = Preparada("teste_invalidada", "SELECT 1")
+    cur = _Cursor(erro=erro)
+    with pytest.raises(DatabaseError):
+        p.executar(cur)
+    p.executar(cur)
+
+    assert cur.executados[2].startswith("PREPARE rs_teste_invalidada_")
+    assert cur.executados[3] == cur.executados[2].split(" AS ")[0].replace("PREPARE", "EXECUTE")
@@ -0,0 +1,64 @@
+import io, uuid
+from datetime import date, datetime
+from decimal import Decimal
+import pytest, django
+django.setup()
+
+from bson.decimal128 import Decimal128
+from django.conf import settings
+from django.core.management import call_command
+from django.test import override_settings
+from Core import mongo, relatorios
+
+ENCOMENDA = {
+    "id_encomenda": 7,
+    "data_encomenda": date(2025, 3, 9),
+    "estado_encomenda": "Concluída",
+    "id_utilizador": 3,
+    "utilizador_nome": "Ana",
+    "utilizador_email": "ana@teste.pt",
+}
+
+def test_dinheiro_arredonda_ao_centimo():
+    assert relatorios.dinheiro(None) == Decimal("0.00")
+    assert relatorios.dinheiro(2.675) == Decimal("2.68")
+    assert relatorios.dinheiro(Decimal128("1.005")) == Decimal("1.01")
+
+def test_documento_v2():
+    linhas = [
+        {"id_produto": 1, "nome": "Queijo", "preco": Decimal("3.10"), "quantidade": 3, "subtotal": Decimal("9.30")},
+        {"id_produto": 2, "nome": "Mel", "preco": 0.1, "quantidade": 2, "subtotal": 0.2},
+    ]
+    doc = relatorios.documento_encomenda(ENCOMENDA, linhas)
+
+    assert doc["_id"] == 7 and doc["schema_versao"] == relatorios.SCHEMA_VERSAO
+    assert doc["data"] == datetime(2025, 3, 9)
+    assert doc["total"].to_decimal() == Decimal("9.50")
+    assert doc["linhas"][1]["preco"].to_decimal() == Decimal("0.10")
+    assert doc["cliente"] == {"id": 3, "nome": "Ana", "email": "ana@teste.pt"}
+
+@pytest.fixture
+def orders():
+    config = {**settings.MONGO, "CLIENT_NAME": "teste_migracao",
+              "DB_NAME": f"teste_{uuid.uuid4().hex[:8]}", "SAUDE_TIMEOUT_MS": 300}
+    with override_settings(MONGO=config):
+        if not mongo.mongo_disponivel(forcar=True):
+            pytest.skip("MongoDB indisponível")
+        db = mongo.get_mongo_db()
+        try:
+            yield db["orders"]
+        finally:
+            db.client.drop_database(db.name)
+
+def test_migrar_documentos_v1(orders):
+    orders.insert_one({
+        "_id": 1, "data": "2025-03-09", "estado": "Concluída", "total": 12.3,
+        "linhas": [{"nome": "Queijo", "preco": 4.1, "quantidade": 3, "subtotal": 12.3}],
+    })
+    call_command("migrar_relatorios_mongo", stdout=io.StringIO())
+
+    doc = orders.find_one({"_id": 1})
+    assert doc["schema_versao"] == 2
+    assert doc["data"] == datetime(2025, 3, 9)
+    assert doc["total"].to_decimal() == Decimal("12.30")
+    assert doc["linhas"][0]["preco"].to_decimal() == Decimal("4.10")
@@ -0,0 +1,41 @@
+import pytest, django
+from django.db import connection, transaction
+django.setup()
+
+@pytest.mark.django_db
+def test_sp_transicao_lote_enviada(admin_id, encomendas_pendentes_ids):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("CALL sp_admin_encomendas_transicao_lote(%s,%s,%s);",
+                        [admin_id, encomendas_pendentes_ids, "Enviada"])
+            cur.execute("SELECT COUNT(*) FROM encomenda WHERE id_encomenda = ANY(%s) AND estado_encomenda='Enviada';",
+                        [encomendas_pendentes_ids])
+            assert cur.fetchone()[0] == len(encomendas_pendentes_ids)
+        finally:
+            transaction.savepoint_rollback(sp)
+
+@pytest.mark.django_db
+def test_sp_transicao_lote_cancelada_repoe_stock(admin_id, encomendas_pendentes_ids, produto_ativo_id):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("SELECT stock FROM produto WHERE id_produto=%s;", [produto_ativo_id])
+            stock_antes = cur.fetchone()[0]
+            cur.execute("CALL sp_admin_encomendas_transicao_lote(%s,%s,%s);",
+                        [admin_id, encomendas_pendentes_ids, "Cancelada"])
+            cur.execute("SELECT stock FROM produto WHERE id_produto=%s;", [produto_ativo_id])
+            assert cur.fetchone()[0] == stock_antes + 2 * len(encomendas_pendentes_ids)
+        finally:
+            transaction.savepoint_rollback(sp)
+
+@pytest.mark.django_db
+def test_sp_transicao_lote_rejeita_transicao_invalida(admin_id, encomendas_pendentes_ids):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            with pytest.raises(Exception):
+                cur.execute("CALL sp_admin_encomendas_transicao_lote(%s,%s,%s);",
+                            [admin_id, encomendas_pendentes_ids, "Concluída"])
+        finally:
+            transaction.savepoint_rollback(sp)
@@ -0,0 +1,48 @@
+import json
+import django
+django.setup()
+
+from django.http import HttpResponse
+from Core import estaticos
+
+def test_comprime_e_serve_versao_gzip(tmp_path, settings, rf):
+    (tmp_path / "css").mkdir()
+    css = tmp_path / "css" / "base.0123456789ab.css"
+    css.write_text("body { color: #333; }\n" * 100)
+    (tmp_path / "staticfiles.json").write_text(json.dumps({"paths": {"css/base.css": "css/base.0123456789ab.css"}}))
+    assert ".gz" in estaticos.comprimir(str(css))
+
+    settings.STATIC_ROOT = str(tmp_path)
+    settings.STATIC_URL = "/static/"
+    settings.ESTATICOS = {"SERVIR": True}
+    middleware = estaticos.EstaticosMiddleware(lambda r: HttpResponse("app"))
+
+    resposta = middleware(rf.get("/static/css/base.0123456789ab.css", HTTP_ACCEPT_ENCODING="gzip, deflate"))
+    assert resposta["Content-Encoding"] == "gzip"
+    assert "immutable" in resposta["Cache-Control"]
+    assert resposta["Vary"] == "Accept-Encoding"
+
+    assert middleware(rf.get("/loja/")).content == b"app"
+
+def test_accept_encoding_com_q_zero():
+    assert estaticos._codificacoes_aceites("gzip;q=0, br") == {"br"}
+
+def test_etag_por_codificacao(tmp_path, settings, rf):
+    js = tmp_path / "app.js"
+    js.write_text("var x = 1;\n" * 200)
+    assert ".gz" in estaticos.comprimir(str(js))
+
+    settings.STATIC_ROOT = str(tmp_path)
+    settings.STATIC_URL = "/static/"
+    settings.ESTATICOS = {"SERVIR": True}
+    middleware = estaticos.EstaticosMiddleware(lambda r: HttpResponse("app"))
+
+    identidade = middleware(rf.get("/static/app.js"))
+    comprimida = middleware(rf.get("/static/app.js", HTTP_ACCEPT_ENCODING="gzip"))
+    assert "Content-Encoding" not in identidade
+    assert comprimida["ETag"] == identidade["ETag"][:-1] + '-gz"'
+
+    # o ETag de uma codificação não valida a outra
+    assert middleware(rf.get("/static/app.js", HTTP_IF_NONE_MATCH=comprimida["ETag"])).status_code == 200
+    assert middleware(rf.get("/static/app.js", HTTP_ACCEPT_ENCODING="gzip",
+                             HTTP_IF_NONE_MATCH=comprimida["ETag"])).status_code == 304
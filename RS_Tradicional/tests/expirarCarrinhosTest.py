@@ -0,0 +1,154 @@
+import io, threading, time
+import pytest, django
+import psycopg2
+from django.db import connection
+django.setup()
+
+from django.core.management import call_command
+
+def _ligacao():
+    """Segunda ligação ao Postgres, fora da do teste (autocommit desligado)."""
+    return connection.get_new_connection(connection.get_connection_params())
+
+def _ids(sql, params):
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+        return [row[0] for row in cur.fetchall()]
+
+def _existe(id_encomenda):
+    return bool(_ids("SELECT id_encomenda FROM Encomenda WHERE id_encomenda = %s", [id_encomenda]))
+
+def _carrinho(cliente, dias, estado="Carrinho"):
+    return _ids("""
+        INSERT INTO Encomenda (data_encomenda, id_utilizador, estado_encomenda)
+        VALUES (CURRENT_DATE - %s, %s, %s) RETURNING id_encomenda
+    """, [dias, cliente, estado])[0]
+
+@pytest.mark.django_db
+def test_expira_so_carrinhos_antigos(fabrica):
+    produto = fabrica.produtos(1)[0]
+    antigo, recente, pendente = fabrica.utilizadores(3)
+    velho = fabrica.encomendas(1, antigo, estado="Carrinho", produtos=[produto], data="2000-01-01")[0]
+    novo = _carrinho(recente, 2)
+    encomenda = fabrica.encomendas(1, pendente, produtos=[produto], data="2000-01-01")[0]
+
+    out = io.StringIO()
+    call_command("expirar_carrinhos", dias=30, stdout=out)
+
+    assert not _existe(velho)
+    assert _ids("SELECT 1 FROM Encomendas_Produtos WHERE id_encomenda = %s", [velho]) == []
+    assert _existe(novo) and _existe(encomenda)
+    assert "Expirados 1 carrinhos (1 linhas)" in out.getvalue()
+
+# ---- com duas ligações: os dados têm de estar confirmados ----
+
+@pytest.fixture
+def cliente_confirmado(transactional_db):
+    tipo = _ids("INSERT INTO Tipo_Utilizador (designacao) VALUES ('Cliente') RETURNING id_tipo_utilizador", [])[0]
+    cliente = _ids("""
+        INSERT INTO Utilizador (nome, email, password, nif, id_tipo_utilizador)
+        VALUES ('Carrinhos', 'expirar.carrinhos@teste.pt', 'hash', '999888777', %s) RETURNING id_utilizador
+    """, [tipo])[0]
+    yield cliente
+    with connection.cursor() as cur:
+        cur.execute("DELETE FROM Encomenda WHERE id_utilizador = %s", [cliente])
+        cur.execute("DELETE FROM Utilizador WHERE id_utilizador = %s", [cliente])
+        cur.execute("DELETE FROM Tipo_Utilizador WHERE id_tipo_utilizador = %s", [tipo])
+
+def _esperar_bloqueio(segundos=5):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        if _ids("SELECT COUNT(*) FROM pg_locks WHERE NOT granted", [])[0]:
+            return True
+        time.sleep(0.05)
+    return False
+
+def test_carrinho_em_uso_e_saltado(cliente_confirmado):
+    em_uso = _carrinho(cliente_confirmado, 60)
+    loja = _ligacao()
+    try:
+        with loja.cursor() as cur:
+            cur.execute("SELECT 1 FROM Encomenda WHERE id_encomenda = %s FOR UPDATE", [em_uso])
+        out = io.StringIO()
+        call_command("expirar_carrinhos", dias=30, stdout=out)
+        assert "Expirados 0 carrinhos" in out.getvalue()
+    finally:
+        loja.rollback()
+        loja.close()
+
+    assert _existe(em_uso)
+    call_command("expirar_carrinhos", dias=30, stdout=io.StringIO())
+    assert not _existe(em_uso)
+
+def test_checkout_de_carrinho_apagado_pelo_job(cliente_confirmado):
+    carrinho = _carrinho(cliente_confirmado, 60)
+    erros = []
+
+    def finalizar():
+        loja = _ligacao()
+        try:
+            with loja.cursor() as cur:
+                cur.execute("CALL sp_loja_finalizar_encomenda(%s)", [cliente_confirmado])
+            loja.commit()
+        except psycopg2.Error as e:
+            erros.append(e)
+        finally:
+            loja.close()
+
+    job = _ligacao()
+    try:
+        # o que o job faz num lote, ainda por confirmar
+        with job.cursor() as cur:
+            cur.execute("SELECT 1 FROM Encomenda WHERE id_encomenda = %s FOR UPDATE SKIP LOCKED", [carrinho])
+            cur.execute("DELETE FROM Encomenda WHERE id_encomenda = %s", [carrinho])
+        loja = threading.Thread(target=finalizar)
+        loja.start()
+        assert _esperar_bloqueio()
+        job.commit()
+        loja.join(10)
+    finally:
+        job.close()
+
+    assert len(erros) == 1
+    assert isinstance(erros[0], psycopg2.errors.RaiseException)
+    assert "Não existe carrinho" in str(erros[0])
+
+def test_adicionar_a_carrinho_apagado_pelo_job_cria_outro(cliente_confirmado):
+    carrinho = _carrinho(cliente_confirmado, 60)
+    produto = _ids("""
+        INSERT INTO Produto (nome, descricao, preco, stock, is_approved, estado_produto, id_tipo_produto, id_fornecedor)
+        VALUES ('Expirar', 'desc', 1, 10, TRUE, 'Ativo', NULL, NULL) RETURNING id_produto
+    """, [])[0]
+    erros = []
+
+    def adicionar():
+        loja = _ligacao()
+        try:
+            with loja.cursor() as cur:
+                cur.execute("CALL sp_loja_adicionar_produto(%s, %s, 1)", [cliente_confirmado, produto])
+            loja.commit()
+        except psycopg2.Error as e:
+            erros.append(e)
+        finally:
+            loja.close()
+
+    job = _ligacao()
+    try:
+        with job.cursor() as cur:
+            cur.execute("SELECT 1 FROM Encomenda WHERE id_encomenda = %s FOR UPDATE SKIP LOCKED", [carrinho])
+            cur.execute("DELETE FROM Encomenda WHERE id_encomenda = %s", [carrinho])
+        loja = threading.Thread(target=adicionar)
+        loja.start()
+        assert _esperar_bloqueio()
+        job.commit()
+        loja.join(10)
+
+        assert erros == []
+        novos = _ids("SELECT id_encomenda FROM Encomenda WHERE id_utilizador = %s AND estado_encomenda = 'Carrinho'",
+                     [cliente_confirmado])
+        assert len(novos) == 1 and novos[0] != carrinho
+    finally:
+        job.close()
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM Encomenda WHERE id_utilizador = %s", [cliente_confirmado])
+            cur.execute("DELETE FROM Produto WHERE id_produto = %s", [produto])
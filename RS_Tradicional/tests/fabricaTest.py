@@ -0,0 +1,28 @@
+import pytest, django
+from django.db import connection, transaction
+django.setup()
+
+def test_fabrica_cria_encomendas_em_bloco(fabrica):
+    cliente = fabrica.utilizadores(1)[0]
+    produtos = fabrica.produtos(20, preco=2)
+    encomendas = fabrica.encomendas(50, cliente, produtos=produtos, quantidade=3)
+
+    assert len(encomendas) == 50
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*), SUM(quantidade * preco_unitario)
+            FROM encomendas_produtos
+            WHERE id_encomenda = ANY(%s);
+        """, [encomendas])
+        assert cur.fetchone() == (50 * 20, 50 * 20 * 3 * 2)
+
+def test_erro_dentro_do_savepoint_nao_estraga_o_teste(fabrica):
+    cliente = fabrica.utilizadores(1)[0]
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        with pytest.raises(Exception):
+            cur.execute("CALL sp_loja_adicionar_produto(%s,%s,%s);", [cliente, -1, 1])
+        transaction.savepoint_rollback(sp)
+
+        cur.execute("SELECT COUNT(*) FROM utilizador WHERE id_utilizador = %s;", [cliente])
+        assert cur.fetchone()[0] == 1
@@ -0,0 +1,54 @@
+import pytest, django
+from django.db import connection, transaction
+django.setup()
+
+@pytest.mark.django_db
+def test_resumo_fornecedor_criado_com_linhas(encomendas_pendentes_ids, fornecedor_id):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("""
+                SELECT COUNT(*), SUM(total_fornecedor)
+                FROM fornecedor_encomenda_resumo
+                WHERE id_fornecedor=%s AND id_encomenda = ANY(%s);
+            """, [fornecedor_id, encomendas_pendentes_ids])
+            n, total = cur.fetchone()
+            assert n == len(encomendas_pendentes_ids)
+            assert total == 2 * 5 * len(encomendas_pendentes_ids)
+        finally:
+            transaction.savepoint_rollback(sp)
+
+@pytest.mark.django_db
+def test_resumo_fornecedor_acompanha_estado_mantem_preco(encomendas_pendentes_ids, produto_ativo_id, fornecedor_id):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("UPDATE encomenda SET estado_encomenda='Enviada' WHERE id_encomenda = ANY(%s);",
+                        [encomendas_pendentes_ids])
+            cur.execute("UPDATE produto SET preco=7 WHERE id_produto=%s;", [produto_ativo_id])
+            cur.execute("""
+                SELECT DISTINCT estado_encomenda, total_fornecedor
+                FROM fornecedor_encomenda_resumo
+                WHERE id_fornecedor=%s AND id_encomenda = ANY(%s);
+            """, [fornecedor_id, encomendas_pendentes_ids])
+            # o preço fica fixado na linha: mudar o produto não altera o histórico
+            assert cur.fetchall() == [("Enviada", 10)]
+        finally:
+            transaction.savepoint_rollback(sp)
+
+@pytest.mark.django_db
+def test_resumo_fornecedor_ignora_carrinho(utilizador_id, produto_ativo_id):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("""
+                INSERT INTO encomenda (data_encomenda, id_utilizador, estado_encomenda)
+                VALUES (CURRENT_DATE, %s, 'Carrinho') RETURNING id_encomenda;
+            """, [utilizador_id])
+            eid = cur.fetchone()[0]
+            cur.execute("INSERT INTO encomendas_produtos (id_encomenda, id_produto, quantidade) VALUES (%s,%s,1);",
+                        [eid, produto_ativo_id])
+            cur.execute("SELECT COUNT(*) FROM fornecedor_encomenda_resumo WHERE id_encomenda=%s;", [eid])
+            assert cur.fetchone()[0] == 0
+        finally:
+            transaction.savepoint_rollback(sp)
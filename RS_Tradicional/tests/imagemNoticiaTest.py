@@ -1,11 +1,11 @@
 import pytest, django
-from django.db import connection
+from django.db import connection, transaction
 django.setup()
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_imagem_noticia_create(noticia_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("CALL sp_imagem_noticia_create(%s,%s,%s);", [noticia_id, "https://img/x.png", None])
             iid = cur.fetchone()[0]
@@ -13,12 +13,12 @@ def test_sp_imagem_noticia_create(noticia_id):
             uri, nid = cur.fetchone()
             assert uri == "https://img/x.png" and nid == noticia_id
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_imagem_noticia_get(noticia_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("INSERT INTO imagem_noticia (id_noticia, uri) VALUES (%s,%s) RETURNING id_imagem;",
                         [noticia_id, "https://img/tmp.png"])
@@ -28,12 +28,12 @@ def test_sp_imagem_noticia_get(noticia_id):
             rows = cur.fetchall()
             assert len(rows) == 1 and rows[0][0] == iid
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_imagem_noticia_update(noticia_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("INSERT INTO imagem_noticia (id_noticia, uri) VALUES (%s,%s) RETURNING id_imagem;",
                         [noticia_id, "https://img/old.png"])
@@ -42,12 +42,12 @@ def test_sp_imagem_noticia_update(noticia_id):
             cur.execute("SELECT uri FROM imagem_noticia WHERE id_imagem=%s;", [iid])
             assert cur.fetchone()[0] == "https://img/new.png"
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_imagem_noticia_delete(noticia_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("INSERT INTO imagem_noticia (id_noticia, uri) VALUES (%s,%s) RETURNING id_imagem;",
                         [noticia_id, "https://img/del.png"])
@@ -56,4 +56,4 @@ def test_sp_imagem_noticia_delete(noticia_id):
             cur.execute("SELECT COUNT(*) FROM imagem_noticia WHERE id_imagem=%s;", [iid])
             assert cur.fetchone()[0] == 0
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
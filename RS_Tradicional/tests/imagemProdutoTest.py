@@ -1,11 +1,11 @@
 import pytest, django
-from django.db import connection
+from django.db import connection, transaction
 django.setup()
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_imagem_produto_create(produto_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("CALL sp_imagem_produto_create(%s,%s,%s);", [produto_id, "/img/p1.png", None])
             new_id = cur.fetchone()[0]
@@ -13,12 +13,12 @@ def test_sp_imagem_produto_create(produto_id):
             caminho, pid = cur.fetchone()
             assert caminho == "/img/p1.png" and pid == produto_id
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_imagem_produto_get(produto_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("INSERT INTO imagem_produto (id_produto, caminho) VALUES (%s, %s) RETURNING id_imagem;",
                         [produto_id, "/img/tmp.png"])
@@ -29,12 +29,12 @@ def test_sp_imagem_produto_get(produto_id):
             rows = cur.fetchall()
             assert len(rows) == 1 and rows[0][0] == iid
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_imagem_produto_update(produto_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("INSERT INTO imagem_produto (id_produto, caminho) VALUES (%s,%s) RETURNING id_imagem;",
                         [produto_id, "/img/old.png"])
@@ -43,12 +43,12 @@ def test_sp_imagem_produto_update(produto_id):
             cur.execute("SELECT caminho FROM imagem_produto WHERE id_imagem=%s;", [iid])
             assert cur.fetchone()[0] == "/img/new.png"
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_imagem_produto_delete(produto_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("INSERT INTO imagem_produto (id_produto, caminho) VALUES (%s,%s) RETURNING id_imagem;",
                         [produto_id, "/img/del.png"])
@@ -57,4 +57,4 @@ def test_sp_imagem_produto_delete(produto_id):
             cur.execute("SELECT COUNT(*) FROM imagem_produto WHERE id_imagem=%s;", [iid])
             assert cur.fetchone()[0] == 0
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
@@ -0,0 +1,25 @@
+import django
+django.setup()
+
+from Core import imagens
+from Core.templatetags.imagens import imagem
+
+HASH = "ab" * 32
+
+def test_referencia_e_formatos():
+    ref = imagens.referencia(HASH, "png")
+    assert imagens.ler_referencia(ref) == (HASH, "png")
+    assert imagens.ler_referencia("https://exemplo.pt/logo.png") is None
+    assert imagens._extensao(b"\x89PNG\r\n\x1a\n....") == "png"
+    assert imagens._extensao(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "webp"
+    assert imagens._extensao(b"<svg xmlns=") is None
+
+def test_srcset_com_variantes():
+    html = imagem({
+        "ref": imagens.referencia(HASH, "jpg"), "hash": HASH, "extensao": "jpg",
+        "largura": 2000, "altura": 1000, "larguras": [320, 640],
+    }, alt="Queijo")
+    assert 'type="image/webp"' in html
+    assert f"{HASH}-320.webp 320w" in html and f"{HASH}-640.jpg 640w" in html
+    assert 'width="640" height="320"' in html
+    assert imagem("https://exemplo.pt/logo.png").startswith('<img src="https://exemplo.pt/logo.png"')
@@ -0,0 +1,46 @@
+import logging
+import pytest, django
+from django.db import connection
+django.setup()
+
+from django.http import HttpResponse
+from django.test import override_settings
+from Core.instrumentacao import InstrumentacaoMiddleware, estatisticas_atuais, registar_linhas
+
+def _vista(n_queries, linhas=0):
+    def vista(request):
+        with connection.cursor() as cur:
+            for _ in range(n_queries):
+                cur.execute("SELECT 1;")
+                cur.fetchone()
+        registar_linhas(linhas)
+        return HttpResponse("ok")
+    return vista
+
+@pytest.mark.django_db
+def test_server_timing_conta_queries(rf):
+    response = InstrumentacaoMiddleware(_vista(3, linhas=7))(rf.get("/loja/"))
+    assert 'desc="3 queries"' in response["Server-Timing"]
+    assert "total;dur=" in response["Server-Timing"]
+
+@pytest.mark.django_db
+def test_estatisticas_so_dentro_do_pedido(rf):
+    request = rf.get("/loja/")
+    InstrumentacaoMiddleware(_vista(2, linhas=5))(request)
+    stats = request.rs_instrumentacao.para_dict()
+    assert stats["queries"] == 2 and stats["linhas"] == 5
+    assert stats["mais_lenta_sql"] == "SELECT 1;"
+    assert estatisticas_atuais() is None
+
+@pytest.mark.django_db
+def test_acima_do_limite_regista_warning(rf, caplog):
+    with override_settings(INSTRUMENTACAO={"LIMITE_QUERIES": 1}):
+        with caplog.at_level(logging.INFO, logger="Core.instrumentacao"):
+            InstrumentacaoMiddleware(_vista(2))(rf.get("/loja/"))
+    assert [r.levelno for r in caplog.records] == [logging.WARNING]
+    assert "mais de 1 queries" in caplog.records[0].getMessage()
+
+def test_desativada_nao_mexe_na_resposta(rf):
+    with override_settings(INSTRUMENTACAO={"ATIVA": False}):
+        response = InstrumentacaoMiddleware(_vista(0))(rf.get("/loja/"))
+    assert "Server-Timing" not in response
@@ -0,0 +1,120 @@
+import asyncio, json, os, subprocess, sys, threading
+import pytest, django
+django.setup()
+
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import override_settings
+from Core import metricas
+
+def _pid_morto():
+    p = subprocess.Popen([sys.executable, "-c", "pass"])
+    p.wait()
+    return p.pid
+
+def _escrever_proc(pasta, nome, pid, contadores=(), histogramas=(), gauges=(), arranque=None):
+    with open(os.path.join(pasta, nome), "w") as f:
+        json.dump({"pid": pid, "arranque": arranque, "contadores": list(contadores),
+                   "histogramas": list(histogramas), "gauges": list(gauges)}, f)
+
+@pytest.fixture
+def pasta(tmp_path, monkeypatch):
+    monkeypatch.setattr(metricas, "_gauges_servidor", lambda: [])
+    with override_settings(METRICAS={"DIRETORIO": str(tmp_path)}):
+        yield tmp_path
+
+def test_formato_de_exposicao(pasta):
+    labels = [["method", "GET"], ["status", "200"], ["url_name", 'teste"formato']]
+    h = {"buckets": [0.1, 1.0], "contagens": [1, 2], "soma": 0.6, "total": 3}
+    _escrever_proc(pasta, "proc-1-a.json", os.getpid(),
+                   contadores=[["rs_http_requests_total", labels, 4]],
+                   histogramas=[["rs_http_request_duration_seconds", [["url_name", "x_formato"]], h]])
+
+    linhas = metricas.exportar_texto().splitlines()
+
+    assert "# TYPE rs_http_requests_total counter" in linhas
+    assert 'rs_http_requests_total{method="GET",status="200",url_name="teste\\"formato"} 4' in linhas
+    assert "# TYPE rs_http_request_duration_seconds histogram" in linhas
+    assert 'rs_http_request_duration_seconds_bucket{url_name="x_formato",le="0.1"} 1' in linhas
+    assert 'rs_http_request_duration_seconds_bucket{url_name="x_formato",le="+Inf"} 3' in linhas
+    assert 'rs_http_request_duration_seconds_sum{url_name="x_formato"} 0.6' in linhas
+    assert 'rs_http_request_duration_seconds_count{url_name="x_formato"} 3' in linhas
+
+def test_processos_mortos_vao_para_o_agregado(pasta):
+    serie = [["rs_procedure_calls_total", [["procedure", "sp_teste_mortos"]]]]
+    linha = 'rs_procedure_calls_total{procedure="sp_teste_mortos"}'
+
+    _escrever_proc(pasta, "proc-a.json", _pid_morto(), contadores=[serie[0] + [3]],
+                   gauges=[["rs_db_connections_open", [["teste", "mortos"]], 9]])
+    texto = metricas.exportar_texto()
+    assert f"{linha} 3" in texto
+    assert 'teste="mortos"' not in texto  # gauges de processos mortos não contam
+    assert not (pasta / "proc-a.json").exists()
+
+    _escrever_proc(pasta, "proc-b.json", _pid_morto(), contadores=[serie[0] + [2]])
+    assert f"{linha} 5" in metricas.exportar_texto()
+    # a soma não anda para trás entre scrapes
+    assert f"{linha} 5" in metricas.exportar_texto()
+
+@pytest.mark.skipif(metricas._arranque_processo(os.getpid()) is None, reason="sem /proc")
+def test_pid_reutilizado_conta_como_morto(pasta):
+    arranque = metricas._arranque_processo(os.getpid())
+    assert metricas._processo_vivo({"pid": os.getpid(), "arranque": arranque})
+    assert not metricas._processo_vivo({"pid": os.getpid(), "arranque": arranque - 1})
+
+@pytest.mark.parametrize("token, debug, header, ip, esperado", [
+    ("segredo", False, "Bearer segredo", "127.0.0.1", True),
+    ("segredo", False, "Bearer outro", "127.0.0.1", False),
+    ("segredo", False, None, "127.0.0.1", False),
+    ("segredo", False, "Bearer segredo", "10.0.0.9", False),
+    (None, False, None, "127.0.0.1", False),
+    (None, True, None, "127.0.0.1", True),
+    (None, True, None, "10.0.0.9", False),
+])
+def test_acesso_ao_metrics(rf, token, debug, header, ip, esperado):
+    extra = {"REMOTE_ADDR": ip}
+    if header:
+        extra["HTTP_AUTHORIZATION"] = header
+    cfg = {"TOKEN": token, "IPS_PERMITIDOS": ["127.0.0.1"]}
+    with override_settings(METRICAS=cfg, DEBUG=debug):
+        assert metricas.pedido_autorizado(rf.get("/metrics", **extra)) is esperado
+
+def test_vista_recusa_sem_token(rf):
+    from Core.views import metricas as vista
+    with override_settings(METRICAS={"TOKEN": "segredo"}):
+        assert vista(rf.get("/metrics")).status_code == 403
+
+@pytest.mark.django_db(transaction=True)
+def test_ligacoes_abertas_conta_todos_os_threads():
+    connection.ensure_connection()
+    antes = metricas.ligacoes_abertas()
+    aberta, fechar = threading.Event(), threading.Event()
+
+    def noutro_thread():
+        connections["default"].ensure_connection()
+        aberta.set()
+        fechar.wait(5)
+        connections.close_all()
+
+    t = threading.Thread(target=noutro_thread)
+    t.start()
+    try:
+        assert aberta.wait(5)
+        assert metricas.ligacoes_abertas() == antes + 1
+    finally:
+        fechar.set()
+        t.join(5)
+    assert metricas.ligacoes_abertas() == antes
+
+def test_flush_async_fora_do_event_loop(pasta, monkeypatch):
+    threads = []
+    monkeypatch.setattr(metricas.registo, "flush", lambda forcar=False: threads.append(threading.current_thread()))
+    monkeypatch.setattr(metricas.registo, "_ultimo_flush", 0.0)
+
+    async def resposta(request):
+        return HttpResponse("ok")
+
+    from django.test import RequestFactory
+    middleware = metricas.MetricasMiddleware(resposta)
+    asyncio.run(middleware(RequestFactory().get("/loja/")))
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
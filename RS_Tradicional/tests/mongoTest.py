@@ -0,0 +1,74 @@
+import pytest, django
+django.setup()
+
+from django.test import override_settings
+from django.urls import reverse
+from pymongo.errors import ServerSelectionTimeoutError
+from Core import mongo, relatorios
+
+MONGO_TESTE = {"CLIENT_NAME": "teste", "URI": "mongodb://mongo.invalido:27017", "DB_NAME": "teste",
+               "MAX_POOL_SIZE": 7, "SAUDE_CACHE_SEGUNDOS": 60}
+
+class ClienteFalso:
+    criados = []
+    ping_falha = False
+
+    def __init__(self, uri, **opcoes):
+        self.uri, self.opcoes = uri, opcoes
+        ClienteFalso.criados.append(self)
+        self.admin = self
+
+    def command(self, nome):
+        if ClienteFalso.ping_falha:
+            raise ServerSelectionTimeoutError("sem servidor")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+@pytest.fixture
+def cliente_falso(monkeypatch):
+    ClienteFalso.criados, ClienteFalso.ping_falha = [], False
+    monkeypatch.setattr(mongo, "MongoClient", ClienteFalso)
+    monkeypatch.setattr(mongo, "_clients", {})
+    monkeypatch.setattr(mongo, "_saude", {})
+    with override_settings(MONGO=MONGO_TESTE):
+        yield ClienteFalso
+
+def test_cliente_por_processo(cliente_falso, monkeypatch):
+    primeiro = mongo.get_mongo_client()
+    assert mongo.get_mongo_client() is primeiro
+    assert primeiro.opcoes["maxPoolSize"] == 7
+    assert "compressors" not in primeiro.opcoes
+
+    # filho de um fork: não reutiliza o cliente do pai
+    monkeypatch.setattr(mongo.os, "getpid", lambda: -1)
+    assert mongo.get_mongo_client() is not primeiro
+
+def test_saude_em_cache(cliente_falso):
+    cliente_falso.ping_falha = True
+    assert mongo.mongo_disponivel() is False
+    sondas = len(cliente_falso.criados)
+
+    cliente_falso.ping_falha = False
+    assert mongo.mongo_disponivel() is False
+    assert len(cliente_falso.criados) == sondas
+    assert mongo.mongo_disponivel(forcar=True) is True
+
+def test_backend_mongo_indisponivel(monkeypatch):
+    monkeypatch.setattr(relatorios.BackendMongo, "disponivel", lambda self: False)
+    with pytest.raises(relatorios.RelatoriosIndisponiveis):
+        relatorios.BackendMongo().kpis()
+
+@pytest.mark.django_db
+def test_pagina_de_relatorios_sem_mongo(client, monkeypatch):
+    monkeypatch.setattr(relatorios.BackendMongo, "disponivel", lambda self: False)
+    sessao = client.session
+    sessao.update({"user_id": 1, "user_tipo": "Admin", "user_nome": "Admin"})
+    sessao.save()
+    with override_settings(RELATORIOS={"BACKEND": "mongo"}):
+        response = client.get(reverse("admin_relatorios"))
+    assert response.status_code == 200
+    assert response.context["indisponivel"] is True
@@ -0,0 +1,44 @@
+import pytest, django
+from django.db import connection
+django.setup()
+
+# Orçamentos por url_name. Os dados semeados têm de chegar para que um N+1 ou
+# um Seq Scan se notem: o cliente tem ENCOMENDAS_CLIENTE encomendas e um
+# carrinho com LINHAS_CARRINHO produtos, entre milhares de linhas de outros.
+ENCOMENDAS_CLIENTE = 30
+LINHAS_CARRINHO = 5
+
+ORCAMENTOS = {
+    "loja_carrinho": {"queries": 6, "linhas": 300, "sem_seq_scan": ("encomenda", "encomendas_produtos")},
+    "minhas_encomendas": {"queries": 5, "linhas": 200, "sem_seq_scan": ("encomenda",)},
+}
+
+@pytest.fixture
+def cliente(fabrica, client):
+    produtos = fabrica.produtos(50, stock=1000)
+    # outros clientes: 2000 encomendas com 2 linhas cada
+    for outro in fabrica.utilizadores(20):
+        fabrica.encomendas(100, outro, produtos=produtos[:2])
+
+    cliente_id = fabrica.utilizadores(1)[0]
+    fabrica.encomendas(ENCOMENDAS_CLIENTE, cliente_id, produtos=produtos[:3])
+    fabrica.encomendas(1, cliente_id, estado="Carrinho", produtos=produtos[:LINHAS_CARRINHO])
+
+    with connection.cursor() as cur:
+        # estatísticas para o planeador (as linhas ainda não estão confirmadas)
+        cur.execute("ANALYZE encomenda, encomendas_produtos, produto, utilizador;")
+
+    sessao = client.session
+    sessao.update({
+        "user_id": cliente_id,
+        "user_tipo": "Cliente",
+        "user_nome": "Cliente",
+        "user_email": "cliente@teste.pt",
+    })
+    sessao.save()
+    return cliente_id
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url_name", sorted(ORCAMENTOS))
+def test_orcamento_da_pagina(cliente, verificar_orcamento, url_name):
+    verificar_orcamento(url_name, ORCAMENTOS[url_name])
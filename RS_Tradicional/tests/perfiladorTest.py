@@ -0,0 +1,40 @@
+import os
+import pytest, django
+django.setup()
+
+from django.http import HttpResponse
+from django.test import override_settings
+from Core import perfilador
+
+@pytest.fixture
+def pasta(tmp_path):
+    with override_settings(PERFILADOR={"ATIVO": True, "AMOSTRAGEM": 1.0, "DIRETORIO": str(tmp_path)}):
+        yield tmp_path
+
+def _middleware():
+    return perfilador.PerfiladorMiddleware(lambda request: HttpResponse("ok"))
+
+def _perfis(pasta):
+    return [n for n in os.listdir(pasta) if n.endswith(".json") and not n.startswith(".")]
+
+def test_pedido_amostrado_guarda_perfil(rf, pasta):
+    assert _middleware()(rf.get("/loja/")).status_code == 200
+    assert len(_perfis(pasta)) == 1
+
+def test_pedido_concorrente_segue_sem_perfil(rf, pasta):
+    assert perfilador._perfilando.acquire(blocking=False)
+    try:
+        assert _middleware()(rf.get("/loja/")).status_code == 200
+    finally:
+        perfilador._perfilando.release()
+    assert _perfis(pasta) == []
+
+def test_profiler_ocupado_nao_da_erro(rf, pasta, monkeypatch):
+    class Ocupado:
+        def enable(self):
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(perfilador.cProfile, "Profile", Ocupado)
+    assert _middleware()(rf.get("/loja/")).status_code == 200
+    assert _perfis(pasta) == []
+    assert not perfilador._perfilando.locked()
@@ -0,0 +1,70 @@
+import pytest, django
+from django.db import connection, transaction
+django.setup()
+
+@pytest.mark.django_db
+def test_linha_copia_preco_e_nome(encomendas_pendentes_ids, produto_ativo_id):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("""
+                SELECT DISTINCT preco_unitario, nome_produto
+                FROM encomendas_produtos
+                WHERE id_encomenda = ANY(%s);
+            """, [encomendas_pendentes_ids])
+            assert cur.fetchall() == [(5, "Produto Ativo")]
+        finally:
+            transaction.savepoint_rollback(sp)
+
+@pytest.mark.django_db
+def test_total_encomenda_nao_muda_com_preco(encomendas_pendentes_ids, produto_ativo_id):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("UPDATE produto SET preco=99 WHERE id_produto=%s;", [produto_ativo_id])
+            cur.execute("SELECT DISTINCT total_encomenda FROM encomenda WHERE id_encomenda = ANY(%s);",
+                        [encomendas_pendentes_ids])
+            assert cur.fetchall() == [(10,)]
+        finally:
+            transaction.savepoint_rollback(sp)
+
+@pytest.mark.django_db
+def test_finalizar_grava_preco_atual_e_total(utilizador_id, produto_ativo_id):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("""
+                INSERT INTO encomenda (data_encomenda, id_utilizador, estado_encomenda)
+                VALUES (CURRENT_DATE, %s, 'Carrinho') RETURNING id_encomenda;
+            """, [utilizador_id])
+            eid = cur.fetchone()[0]
+            cur.execute("INSERT INTO encomendas_produtos (id_encomenda, id_produto, quantidade) VALUES (%s,%s,3);",
+                        [eid, produto_ativo_id])
+            cur.execute("UPDATE produto SET preco=6 WHERE id_produto=%s;", [produto_ativo_id])
+            cur.execute("CALL sp_loja_finalizar_encomenda(%s);", [utilizador_id])
+            cur.execute("SELECT total_encomenda FROM encomenda WHERE id_encomenda=%s;", [eid])
+            assert cur.fetchone()[0] == 18
+            cur.execute("SELECT preco_unitario FROM encomendas_produtos WHERE id_encomenda=%s;", [eid])
+            assert cur.fetchone()[0] == 6
+        finally:
+            transaction.savepoint_rollback(sp)
+
+@pytest.mark.django_db
+def test_linhas_sem_preco_antes_do_backfill(client, encomendas_pendentes_ids, utilizador_id, produto_ativo_id):
+    from django.urls import reverse
+    eid = encomendas_pendentes_ids[0]
+    with connection.cursor() as cur:
+        # como numa BD atualizada pelo Upgrade.sql, antes do backfill_linhas_encomenda
+        cur.execute("ALTER TABLE encomendas_produtos ALTER COLUMN preco_unitario DROP NOT NULL;")
+        cur.execute("UPDATE encomendas_produtos SET preco_unitario = NULL WHERE id_encomenda = %s;", [eid])
+        cur.execute("""
+            SELECT preco_produto, subtotal FROM vw_fornecedor_encomenda_linhas WHERE id_encomenda = %s;
+        """, [eid])
+        assert cur.fetchall() == [(5, 10)]
+
+    sessao = client.session
+    sessao.update({"user_id": utilizador_id, "user_tipo": "Cliente", "user_nome": "Alice Teste"})
+    sessao.save()
+    response = client.get(reverse("minha_encomenda_detail", args=[eid]))
+    assert response.status_code == 200
+    assert [l["subtotal"] for l in response.context["linhas"]] == [0]
@@ -1,22 +1,22 @@
 import pytest, django
-from django.db import connection
+from django.db import connection, transaction
 django.setup()
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_produto_carrinho_create(carrinho_id, produto_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("CALL sp_produto_carrinho_create(%s,%s,%s);", [carrinho_id, produto_id, 2])
             cur.execute("SELECT quantidade FROM produto_carrinho WHERE id_carrinho=%s AND id_produto=%s;", [carrinho_id, produto_id])
             assert cur.fetchone()[0] == 2
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_produto_carrinho_get(carrinho_id, produto_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("INSERT INTO produto_carrinho (id_carrinho, id_produto, quantidade) VALUES (%s,%s,%s);",
                         [carrinho_id, produto_id, 1])
@@ -25,12 +25,12 @@ def test_sp_produto_carrinho_get(carrinho_id, produto_id):
             rows = cur.fetchall()
             assert len(rows) == 1 and rows[0][0] == carrinho_id and rows[0][1] == produto_id
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_produto_carrinho_update(carrinho_id, produto_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("INSERT INTO produto_carrinho (id_carrinho, id_produto, quantidade) VALUES (%s,%s,%s);",
                         [carrinho_id, produto_id, 1])
@@ -38,12 +38,12 @@ def test_sp_produto_carrinho_update(carrinho_id, produto_id):
             cur.execute("SELECT quantidade FROM produto_carrinho WHERE id_carrinho=%s AND id_produto=%s;", [carrinho_id, produto_id])
             assert cur.fetchone()[0] == 5
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_produto_carrinho_delete(carrinho_id, produto_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("INSERT INTO produto_carrinho (id_carrinho, id_produto, quantidade) VALUES (%s,%s,%s);",
                         [carrinho_id, produto_id, 1])
@@ -51,4 +51,4 @@ def test_sp_produto_carrinho_delete(carrinho_id, produto_id):
             cur.execute("SELECT COUNT(*) FROM produto_carrinho WHERE id_carrinho=%s AND id_produto=%s;", [carrinho_id, produto_id])
             assert cur.fetchone()[0] == 0
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
@@ -1,23 +1,23 @@
 import pytest, django
-from django.db import connection
+from django.db import connection, transaction
 django.setup()
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_produto_noticia_create(noticia_id, produto_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("CALL sp_produto_noticia_create(%s,%s);", [noticia_id, produto_id])
             cur.execute("SELECT COUNT(*) FROM produto_noticia WHERE id_noticia=%s AND id_produto=%s;",
                         [noticia_id, produto_id])
             assert cur.fetchone()[0] == 1
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_produto_noticia_get(noticia_id, produto_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("INSERT INTO produto_noticia (id_noticia, id_produto) VALUES (%s,%s) ON CONFLICT DO NOTHING;",
                         [noticia_id, produto_id])
@@ -26,12 +26,12 @@ def test_sp_produto_noticia_get(noticia_id, produto_id):
             rows = cur.fetchall()
             assert len(rows) == 1 and rows[0][0] == noticia_id and rows[0][1] == produto_id
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_produto_noticia_delete(noticia_id, produto_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("INSERT INTO produto_noticia (id_noticia, id_produto) VALUES (%s,%s) ON CONFLICT DO NOTHING;",
                         [noticia_id, produto_id])
@@ -40,4 +40,4 @@ def test_sp_produto_noticia_delete(noticia_id, produto_id):
                         [noticia_id, produto_id])
             assert cur.fetchone()[0] == 0
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
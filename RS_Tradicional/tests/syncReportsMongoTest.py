@@ -0,0 +1,50 @@
+import io, uuid
+import pytest, django
+django.setup()
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import override_settings
+from Core import mongo
+from Core.management.commands.sync_reports_mongo import Command
+
+@pytest.fixture
+def encomendas(fabrica):
+    cliente = fabrica.utilizadores(1)[0]
+    produto = fabrica.produtos(1, preco=2, stock=100)[0]
+    ids = fabrica.encomendas(10, cliente, estado="Concluída", produtos=[produto], quantidade=3)
+    fabrica.encomendas(1, cliente, estado="Carrinho", produtos=[produto])
+    return ids
+
+@pytest.mark.django_db
+def test_intervalos_cobrem_todas_as_encomendas(encomendas):
+    intervalos = Command()._intervalos(3)
+    assert len(intervalos) == 3
+    cobertos = [i for a, b in intervalos for i in encomendas if a <= i <= b]
+    assert sorted(cobertos) == sorted(encomendas)
+    # sem sobreposição e com tamanhos parecidos
+    assert all(b < a2 for (_, b), (a2, _) in zip(intervalos, intervalos[1:]))
+    assert max(len([i for i in encomendas if a <= i <= b]) for a, b in intervalos) <= 4
+
+@pytest.fixture
+def orders():
+    config = {**settings.MONGO, "CLIENT_NAME": "teste_sync", "DB_NAME": f"teste_{uuid.uuid4().hex[:8]}"}
+    with override_settings(MONGO=config):
+        if not mongo.mongo_disponivel(forcar=True):
+            pytest.skip("MongoDB indisponível")
+        db = mongo.get_mongo_db()
+        try:
+            yield db["orders"]
+        finally:
+            db.client.drop_database(db.name)
+
+@pytest.mark.django_db
+def test_sync_com_progresso(encomendas, orders):
+    # um só worker: usa a ligação do teste e vê as linhas ainda por confirmar
+    out = io.StringIO()
+    call_command("sync_reports_mongo", lote=4, progresso=True, stdout=out)
+
+    assert orders.count_documents({"_id": {"$in": encomendas}}) == 10
+    assert orders.count_documents({"estado": "Carrinho"}) == 0
+    progresso = [l for l in out.getvalue().splitlines() if l.startswith("[worker 1]")]
+    assert len(progresso) >= 3
@@ -1,11 +1,11 @@
 import pytest, django
-from django.db import connection
+from django.db import connection, transaction
 django.setup()
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_utilizador_create(tipo_utilizador_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             args = ["Bob", "bob@example.com", "pw", "Rua B", "111222333", None, tipo_utilizador_id, None]
             cur.execute("CALL sp_utilizador_create(%s,%s,%s,%s,%s,%s,%s, %s);", args)
@@ -14,24 +14,24 @@ def test_sp_utilizador_create(tipo_utilizador_id):
             email, tipo = cur.fetchone()
             assert email == "bob@example.com" and tipo == tipo_utilizador_id
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_utilizador_get(utilizador_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("CALL sp_utilizador_get(%s, %s);", [utilizador_id, "curu"])
             cur.execute("FETCH ALL FROM curu;")
             rows = cur.fetchall()
             assert len(rows) == 1 and rows[0][0] == utilizador_id
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_utilizador_update(utilizador_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("""
                 CALL sp_utilizador_update(%s,%s,%s,%s,%s,%s,%s,%s);
@@ -39,15 +39,15 @@ def test_sp_utilizador_update(utilizador_id):
             cur.execute("SELECT nome FROM utilizador WHERE id_utilizador=%s;", [utilizador_id])
             assert cur.fetchone()[0] == "Alice Nova"
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
 
-@pytest.mark.django_db(transaction=True)
+@pytest.mark.django_db
 def test_sp_utilizador_delete(utilizador_id):
     with connection.cursor() as cur:
-        cur.execute("BEGIN;")
+        sp = transaction.savepoint()
         try:
             cur.execute("CALL sp_utilizador_delete(%s);", [utilizador_id])
             cur.execute("SELECT COUNT(*) FROM utilizador WHERE id_utilizador=%s;", [utilizador_id])
             assert cur.fetchone()[0] == 0
         finally:
-            cur.execute("ROLLBACK;")
+            transaction.savepoint_rollback(sp)
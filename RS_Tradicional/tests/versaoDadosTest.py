@@ -0,0 +1,120 @@
+import io
+import pytest, django
+from django.db import connection, transaction
+django.setup()
+
+from django.core.management import call_command
+
+def _versao(cur, recurso):
+    cur.execute("SELECT versao FROM vw_versao_dados WHERE recurso=%s;", [recurso])
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+@pytest.mark.django_db
+def test_alterar_produto_incrementa_catalogo(produto_id):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            catalogo, noticias = _versao(cur, "catalogo"), _versao(cur, "noticias")
+            cur.execute("UPDATE produto SET preco = preco WHERE id_produto=%s;", [produto_id])
+            assert _versao(cur, "catalogo") == catalogo + 1
+            assert _versao(cur, "noticias") == noticias
+        finally:
+            transaction.savepoint_rollback(sp)
+
+@pytest.mark.django_db
+def test_stock_so_conta_quando_esgota_ou_volta(produto_id):
+    with connection.cursor() as cur:
+        sp = transaction.savepoint()
+        try:
+            cur.execute("UPDATE produto SET stock = 2 WHERE id_produto=%s;", [produto_id])
+            catalogo = _versao(cur, "catalogo")
+            # um checkout: só o stock muda
+            cur.execute("UPDATE produto SET stock = stock - 1 WHERE id_produto=%s;", [produto_id])
+            assert _versao(cur, "catalogo") == catalogo
+            # esgotou: sai de vw_loja_produtos
+            cur.execute("UPDATE produto SET stock = stock - 1 WHERE id_produto=%s;", [produto_id])
+            assert _versao(cur, "catalogo") == catalogo + 1
+            cur.execute("UPDATE produto SET stock = 5 WHERE id_produto=%s;", [produto_id])
+            assert _versao(cur, "catalogo") == catalogo + 2
+        finally:
+            transaction.savepoint_rollback(sp)
+
+@pytest.mark.django_db
+def test_compactar_mantem_a_versao(produto_id):
+    with connection.cursor() as cur:
+        cur.execute("UPDATE produto SET preco = preco + 1 WHERE id_produto=%s;", [produto_id])
+        cur.execute("UPDATE produto SET preco = preco + 1 WHERE id_produto=%s;", [produto_id])
+        catalogo, noticias = _versao(cur, "catalogo"), _versao(cur, "noticias")
+
+        out = io.StringIO()
+        call_command("compactar_versao_dados", stdout=out)
+
+        cur.execute("SELECT COUNT(*) FROM versao_dados_evento;")
+        assert cur.fetchone()[0] == 0
+        assert _versao(cur, "catalogo") == catalogo
+        assert _versao(cur, "noticias") == noticias
+        cur.execute("UPDATE produto SET preco = preco + 1 WHERE id_produto=%s;", [produto_id])
+        assert _versao(cur, "catalogo") == catalogo + 1
+    assert "Compactados" in out.getvalue()
+
+def test_escritas_no_catalogo_nao_esperam_umas_pelas_outras(transactional_db):
+    with connection.cursor() as cur:
+        cur.execute("""
+            INSERT INTO Produto (nome, descricao, preco, stock, is_approved, estado_produto, id_tipo_produto, id_fornecedor)
+            VALUES ('Versao A', 'desc', 1, 10, TRUE, 'Ativo', NULL, NULL),
+                   ('Versao B', 'desc', 1, 10, TRUE, 'Ativo', NULL, NULL)
+            RETURNING id_produto
+        """)
+        a, b = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT versao FROM vw_versao_dados WHERE recurso='catalogo';")
+        antes = cur.fetchone()[0]
+
+    ligacoes = [connection.get_new_connection(connection.get_connection_params()) for _ in range(2)]
+    try:
+        checkout, outro = ligacoes
+        with checkout.cursor() as cur:
+            cur.execute("UPDATE produto SET preco = preco + 1 WHERE id_produto=%s;", [a])
+        with outro.cursor() as cur:
+            # com a transação do primeiro ainda aberta: falhava por lock_timeout
+            cur.execute("SET lock_timeout = '1s';")
+            cur.execute("UPDATE produto SET preco = preco + 1 WHERE id_produto=%s;", [b])
+        outro.commit()
+
+        with connection.cursor() as cur:
+            # só a escrita confirmada conta
+            assert _versao(cur, "catalogo") == antes + 1
+            checkout.commit()
+            assert _versao(cur, "catalogo") == antes + 2
+    finally:
+        for conn in ligacoes:
+            conn.rollback()
+            conn.close()
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM Produto WHERE id_produto = ANY(%s);", [[a, b]])
+            cur.execute("CALL sp_compactar_versao_dados(NULL);")
+
+@pytest.mark.django_db
+def test_etag_muda_com_a_versao(rf, monkeypatch):
+    from django.contrib.messages.storage.fallback import FallbackStorage
+    from django.contrib.sessions.backends.signed_cookies import SessionStore
+    from django.http import HttpResponse
+    from Core import versoes
+
+    numero = [1]
+    monkeypatch.setattr(versoes, "versao", lambda recurso: (numero[0], None))
+
+    @versoes.condicional("catalogo")
+    def pagina(request):
+        return HttpResponse("ok")
+
+    def pedido(**headers):
+        request = rf.get("/loja/", **headers)
+        request.session = SessionStore()
+        request._messages = FallbackStorage(request)
+        return pagina(request)
+
+    etag = pedido()["ETag"]
+    assert pedido(HTTP_IF_NONE_MATCH=etag).status_code == 304
+    numero[0] = 2
+    assert pedido(HTTP_IF_NONE_MATCH=etag).status_code == 200